@@ -1,9 +1,11 @@
 from django.contrib.auth.models import User, Group
 from django.core.exceptions import PermissionDenied
-import requests
+from django.utils import timezone
+
 from decimal import Decimal
-from django.conf import settings
-from .models import Moneda
+
+# Los tipos de cambio viven en productos.tipos_cambio (tabla con fechas de vigencia y caché)
+from productos import tipos_cambio
 
 # ==================== FUNCIONES DE PERMISOS ====================
 def es_admin(user):
@@ -66,26 +68,15 @@ def validar_stock(producto, cantidad):
         raise ValueError(f"Stock insuficiente. Disponible: {producto.stock}")
     return True
 
+# ==================== TIPOS DE CAMBIO ====================
+# Firmas anteriores, conservadas para quien las importe desde core.utils.
+# El código nuevo usa productos.tipos_cambio directamente.
 def obtener_tasa_cambio(origen, destino):
-    """
-    Obtiene la tasa de cambio entre dos monedas
-    Puedes implementar esta función con una API como exchangerate-api.com
-    """
-    # Ejemplo simplificado - en producción usar una API real
-    if origen == destino:
+    """Tasa vigente hoy entre dos códigos de moneda (1 si no hay tasa)"""
+    try:
+        return tipos_cambio.obtener_tasa_cambio(origen, destino)
+    except tipos_cambio.TipoCambioNoDisponible:
         return Decimal('1.0')
-    
-    # Tasas de cambio de ejemplo (deberías obtenerlas de una API)
-    tasas = {
-        'USD': {'NIO': Decimal('36.50'), 'EUR': Decimal('0.85')},
-        'NIO': {'USD': Decimal('0.027'), 'EUR': Decimal('0.023')},
-        'EUR': {'USD': Decimal('1.18'), 'NIO': Decimal('43.10')},
-    }
-    
-    if origen in tasas and destino in tasas[origen]:
-        return tasas[origen][destino]
-    
-    return Decimal('1.0')
 
 def convertir_moneda(monto, moneda_origen, moneda_destino):
     """Convierte un monto de una moneda a otra"""
@@ -93,4 +84,4 @@ def convertir_moneda(monto, moneda_origen, moneda_destino):
         return monto
     
     tasa = obtener_tasa_cambio(moneda_origen.codigo, moneda_destino.codigo)
-    return monto * tasa
\ No newline at end of file
+    return monto * tasa
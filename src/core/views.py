@@ -9,7 +9,7 @@ from clientes.models import Cliente
 from productos.models import Producto, CodigoProducto
 from productos.forms import CodigoProductoFormSet
 from categorias.models import Categoria
-from facturas.models import Factura
+from facturas.models import Factura, ResumenVentaDiaria
 from .models import Actividad
 from django.utils import timezone
 from django.db.models import Sum
@@ -100,7 +100,12 @@ class CustomLoginView(LoginView):
 @login_required
 def panel_administracion(request):
     mes_actual = timezone.now().month
+    inicio_mes = timezone.localdate().replace(day=1)
     org = getattr(request, 'organizacion', None)
+    # Ventas e ingresos del mes salen del resumen diario (pocas filas) y no de las facturas
+    ventas_mes = ResumenVentaDiaria.totales(org, inicio_mes)
+    ventas_mes_actual = ventas_mes['facturas']
+    ingresos_mes_actual = ventas_mes['total']
 
     # If there's an active organization (tenant), scope the dashboard to it.
     if org is not None:
@@ -110,8 +115,6 @@ def panel_administracion(request):
         total_facturas = Factura.objects.filter(organizacion=org).count()
         nuevos_clientes = Cliente.objects.filter(organizacion=org, fecha_registro__month=mes_actual).count()
         productos_bajo_stock = Producto.objects.filter(organizacion=org, stock__lt=10).count()
-        ventas_mes_actual = Factura.objects.filter(organizacion=org, fecha__month=mes_actual).count()
-        ingresos_mes_actual = Factura.objects.filter(organizacion=org, fecha__month=mes_actual).aggregate(Sum('total'))['total__sum'] or 0
         # 'Factura' does not have an 'estado' field; use 'pagada=False' to count pending invoices
         facturas_pendientes = Factura.objects.filter(organizacion=org, pagada=False).count()
         actividad_reciente = Actividad.objects.filter(usuario__organizaciones__organizacion=org).order_by('-fecha')[:5]
@@ -122,9 +125,7 @@ def panel_administracion(request):
         total_facturas = Factura.objects.count()
         nuevos_clientes = Cliente.objects.filter(fecha_registro__month=mes_actual).count()
         productos_bajo_stock = Producto.objects.filter(stock__lt=10).count()
-        ventas_mes_actual = Factura.objects.filter(fecha__month=mes_actual).count()
-        ingresos_mes_actual = Factura.objects.filter(fecha__month=mes_actual).aggregate(Sum('total'))['total__sum'] or 0
-        facturas_pendientes = Factura.objects.filter(estado='pendiente').count()
+        facturas_pendientes = Factura.objects.filter(pagada=False).count()
         actividad_reciente = Actividad.objects.all().order_by('-fecha')[:5]
 
     context = {
@@ -144,10 +145,25 @@ def panel_administracion(request):
 # --- Datos para gráficas del dashboard ---
 @login_required
 def dashboard_data(request):
+    org = getattr(request, 'organizacion', None)
+    hoy = timezone.localdate()
+    inicio_mes = hoy.replace(day=1)
+    resumenes = ResumenVentaDiaria.objects.filter(dia__gte=inicio_mes)
+    clientes = Cliente.objects.filter(fecha_registro__date__gte=inicio_mes)
+    productos = Producto.objects.filter(stock__lt=10)
+    if org is not None:
+        resumenes = resumenes.filter(organizacion=org)
+        clientes = clientes.filter(organizacion=org)
+        productos = productos.filter(organizacion=org)
+    por_dia = resumenes.values('dia').annotate(facturas=Sum('facturas'), total=Sum('total')).order_by('dia')
     data = {
-        'nuevos_clientes': 10,
-        'ventas_mes': 5000,
-        'productos_bajos_stock': 3
+        'nuevos_clientes': clientes.count(),
+        'ventas_mes': sum(d['facturas'] for d in por_dia),
+        'ingresos_mes': float(sum(d['total'] for d in por_dia)),
+        'productos_bajos_stock': productos.count(),
+        'ventas_por_dia': [
+            {'dia': d['dia'].isoformat(), 'facturas': d['facturas'], 'total': float(d['total'])} for d in por_dia
+        ],
     }
     return JsonResponse(data)
 
@@ -1,13 +1,14 @@
 from django.contrib import admin
-from .models import Factura
+from .models import Factura, FacturaArchivada, TasaImpuesto
+from . import busqueda
 
 @admin.register(Factura)
 class FacturaAdmin(admin.ModelAdmin):
     # Columnas que se mostrarán en la lista del admin
-    list_display = ('id', 'cliente', 'fecha', 'total')
+    list_display = ('id', 'numero', 'cliente', 'fecha', 'total')
     
     # Campos por los que se podrá buscar
-    search_fields = ('id', 'cliente__nombre', 'cliente__apellido')
+    search_fields = ('id', 'numero', 'cliente__nombre', 'cliente__apellido')
     
     # Filtros en el panel lateral
     list_filter = ('fecha',)
@@ -18,6 +19,12 @@ class FacturaAdmin(admin.ModelAdmin):
     # Cuántos registros mostrar por página
     list_per_page = 20
 
+    def get_search_results(self, request, queryset, search_term):
+        # Índice de texto completo en lugar de LIKE sobre cada campo de search_fields
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(id__in=busqueda.buscar(search_term, limite=1000)), False
+
     # Mostrar un selector de fecha avanzado
     date_hierarchy = 'fecha'
 
@@ -35,3 +42,24 @@ class FacturaAdmin(admin.ModelAdmin):
         }),
     )
 
+
+@admin.register(TasaImpuesto)
+class TasaImpuestoAdmin(admin.ModelAdmin):
+    # Sin organización = tasa general para las organizaciones que no tienen una propia
+    list_display = ('nombre', 'organizacion', 'porcentaje', 'actualizada_en')
+    list_filter = ('nombre',)
+    search_fields = ('organizacion__nombre',)
+
+
+@admin.register(FacturaArchivada)
+class FacturaArchivadaAdmin(admin.ModelAdmin):
+    # Solo consulta: las filas las escribe `archivar_facturas`
+    list_display = ('id', 'numero', 'organizacion', 'fecha', 'total', 'anulada')
+    list_filter = ('organizacion',)
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
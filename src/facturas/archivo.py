@@ -0,0 +1,119 @@
+# facturas/archivo.py
+"""Archivo de facturas de períodos cerrados.
+
+`Factura` y `DetalleFactura` solo crecen; `archivar` mueve las facturas
+anteriores al corte (por defecto el primer día del mes de hace
+`FACTURA_ARCHIVO_MESES` meses) a `FacturaArchivada` y
+`DetalleFacturaArchivado`, que tienen las mismas columnas y conservan los
+ids. Así los listados, reportes e índices de las tablas vigentes solo
+cargan con el período abierto.
+
+El movimiento es en línea y por lotes: cada lote de `lote` facturas es una
+transacción corta que copia las filas con INSERT ... SELECT y borra las
+originales (con sus trabajos de PDF y su documento de búsqueda). Las
+facturas al crédito sin pagar no se archivan mientras sigan abiertas.
+
+`obtener_factura` busca primero en las tablas vigentes y después en el
+archivo, para que el detalle y el PDF de una factura archivada sigan
+funcionando con la misma URL; las exportaciones también leen ambas tablas.
+"""
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import Http404
+from django.utils import timezone
+
+from .models import DetalleFactura, DetalleFacturaArchivado, Factura, FacturaArchivada, TrabajoPDF
+
+TAMANO_LOTE = 500
+
+
+def corte_por_defecto(hoy=None):
+    """Inicio (hora local) del mes de hace `FACTURA_ARCHIVO_MESES` meses: lo anterior es período cerrado"""
+    hoy = hoy or timezone.localdate()
+    meses = hoy.year * 12 + hoy.month - 1 - getattr(settings, 'FACTURA_ARCHIVO_MESES', 24)
+    return timezone.make_aware(datetime(meses // 12, meses % 12 + 1, 1))
+
+
+def pendientes(corte, organizacion=None):
+    """Facturas vigentes anteriores a `corte` que se pueden archivar"""
+    facturas = (
+        Factura.objects.filter(fecha__lt=corte).exclude(tipo_venta='credito', pagada=False, anulada=False)
+        # Las que aún no se sumaron al reporte de productos esperan a `actualizar_ventas_producto`
+        .filter(agregado_pendiente__isnull=True)
+    )
+    if organizacion is not None:
+        facturas = facturas.filter(organizacion=organizacion)
+    return facturas
+
+
+def _copiar(cursor, origen, destino, campo, ids):
+    # Las tablas de archivo tienen las mismas columnas que las vigentes
+    columnas = ', '.join(connection.ops.quote_name(f.column) for f in destino._meta.concrete_fields)
+    marcadores = ', '.join(['%s'] * len(ids))
+    cursor.execute(
+        f'INSERT INTO {connection.ops.quote_name(destino._meta.db_table)} ({columnas}) '
+        f'SELECT {columnas} FROM {connection.ops.quote_name(origen._meta.db_table)} '
+        f'WHERE {connection.ops.quote_name(campo)} IN ({marcadores})',
+        ids,
+    )
+
+
+def archivar_lote(corte, organizacion=None, lote=TAMANO_LOTE):
+    """Archiva hasta `lote` facturas anteriores a `corte` en una transacción. Devuelve cuántas movió."""
+    with transaction.atomic():
+        # Bloquear las filas del lote: una anulación concurrente espera en vez de perderse
+        ids = list(
+            pendientes(corte, organizacion).select_for_update().order_by('id').values_list('id', flat=True)[:lote]
+        )
+        if not ids:
+            return 0
+        with connection.cursor() as cursor:
+            _copiar(cursor, Factura, FacturaArchivada, 'id', ids)
+            _copiar(cursor, DetalleFactura, DetalleFacturaArchivado, 'factura_id', ids)
+        # El worker de PDFs solo lee facturas vigentes: sus trabajos pendientes se descartan
+        TrabajoPDF.objects.filter(factura_id__in=ids).delete()
+        DetalleFactura.objects.filter(factura_id__in=ids).delete()
+        Factura.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archivar(corte=None, organizacion=None, lote=TAMANO_LOTE, pausa=0, progreso=None):
+    """Archiva por lotes todas las facturas anteriores a `corte`. Devuelve cuántas movió.
+
+    `pausa` son segundos de espera entre lotes para no acaparar la base;
+    `progreso(total)` se llama después de cada lote.
+    """
+    corte = corte or corte_por_defecto()
+    total = 0
+    while True:
+        movidas = archivar_lote(corte, organizacion, lote)
+        if not movidas:
+            return total
+        total += movidas
+        if progreso is not None:
+            progreso(total)
+        if pausa:
+            time.sleep(pausa)
+
+
+def buscar_factura(pk, organizacion=None, relacionadas=()):
+    """Factura vigente o archivada con id `pk` (de la organización, si se indica), o None"""
+    for modelo in (Factura, FacturaArchivada):
+        facturas = modelo.objects.select_related(*relacionadas)
+        if organizacion is not None:
+            facturas = facturas.filter(organizacion=organizacion)
+        factura = facturas.filter(pk=pk).first()
+        if factura is not None:
+            return factura
+    return None
+
+
+def obtener_factura(pk, organizacion=None, relacionadas=()):
+    """Como `buscar_factura`, pero lanza Http404 si no existe"""
+    factura = buscar_factura(pk, organizacion, relacionadas)
+    if factura is None:
+        raise Http404('No existe la factura')
+    return factura
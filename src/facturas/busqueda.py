@@ -0,0 +1,179 @@
+# facturas/busqueda.py
+"""Búsqueda de texto completo de facturas.
+
+Cada factura tiene un documento de búsqueda (`DocumentoBusquedaFactura`)
+con su número, el nombre, NIT y cédula del cliente y los productos del
+ticket, ya normalizado (minúsculas, sin tildes). `confirmar_factura` lo
+escribe en la misma transacción que la factura.
+
+El índice depende del motor:
+
+- SQLite: tabla virtual FTS5 de contenido externo, sincronizada con
+  triggers sobre la tabla de documentos.
+- PostgreSQL: columna `tsvector` generada e índice GIN.
+- Otros motores: `LIKE` sobre el documento (sin índice).
+
+El documento incluye un término con la organización; la búsqueda lo
+combina con los términos del usuario, así el índice solo devuelve
+facturas de la organización sin filtrar después.
+
+Si la consulta es un solo término que coincide exactamente con un número
+de factura o con el NIT o la cédula de un cliente, esas facturas se
+resuelven primero con los índices de las tablas y encabezan el resultado,
+aunque sean más viejas que las coincidencias de texto.
+
+Para el resto, el índice entrega las `FACTURA_BUSQUEDA_CANDIDATOS` coincidencias más
+recientes (recorrerlas por id es barato) y se ordenan por relevancia en
+Python: primero las que contienen los términos como palabras completas.
+Ordenar con bm25/ts_rank obliga a puntuar todas las coincidencias, y con
+términos frecuentes ("gonzález", un producto común) eso son miles de filas
+por consulta.
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from clientes.models import Cliente
+from .models import DetalleFactura, DocumentoBusquedaFactura, Factura
+
+TABLA_FTS = 'facturas_busqueda_fts'
+TAMANO_LOTE = 1000
+MAX_TERMINOS = 8
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, igual para los documentos y las consultas"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def _termino_organizacion(organizacion_id):
+    return f'zzorg{organizacion_id or 0}'
+
+
+def documento(factura, cliente, nombres_productos):
+    """Texto de búsqueda de la factura (cliente y productos ya cargados)"""
+    partes = [_termino_organizacion(factura.organizacion_id), str(factura.numero or ''), str(factura.pk)]
+    if cliente is not None:
+        partes += [cliente.nombre, cliente.apellido]
+        for identificacion in (cliente.nit, cliente.cedula):
+            if identificacion:
+                # Con y sin separadores: "001-010190-0001A" también se encuentra como "0010101900001a"
+                partes += [identificacion, re.sub(r'[\W_]', '', identificacion)]
+    partes += sorted(set(nombre for nombre in nombres_productos if nombre))
+    return normalizar(' '.join(partes))
+
+
+def guardar_documentos(documentos):
+    """Inserta o reemplaza los documentos {factura_id: (organizacion_id, texto)} en una consulta"""
+    DocumentoBusquedaFactura.objects.bulk_create(
+        [DocumentoBusquedaFactura(factura_id=factura_id, organizacion_id=org_id, texto=texto)
+         for factura_id, (org_id, texto) in documentos.items()],
+        batch_size=TAMANO_LOTE, update_conflicts=True, unique_fields=['factura'],
+        update_fields=['organizacion', 'texto', 'actualizado_en'],
+    )
+
+
+def indexar_factura(factura, detalles):
+    """Documento de una factura recién confirmada, con las líneas que ya están en memoria"""
+    nombres = [d.producto.nombre for d in detalles if d.producto_id]
+    guardar_documentos({factura.pk: (factura.organizacion_id, documento(factura, factura.cliente, nombres))})
+
+
+def indexar_facturas(facturas, lote=TAMANO_LOTE):
+    """Reconstruye por lotes los documentos de `facturas` (queryset). Devuelve cuántos escribió."""
+    total = 0
+    ids = facturas.order_by('id').values_list('id', flat=True)
+    ultimo = 0
+    while True:
+        bloque = list(ids.filter(id__gt=ultimo)[:lote])
+        if not bloque:
+            return total
+        ultimo = bloque[-1]
+        productos = {}
+        for factura_id, nombre in (
+            DetalleFactura.objects.filter(factura_id__in=bloque, producto__isnull=False)
+            .values_list('factura_id', 'producto__nombre').distinct()
+        ):
+            productos.setdefault(factura_id, []).append(nombre)
+        guardar_documentos({
+            f.pk: (f.organizacion_id, documento(f, f.cliente, productos.get(f.pk, [])))
+            for f in Factura.objects.filter(id__in=bloque).select_related('cliente')
+        })
+        total += len(bloque)
+
+
+def _terminos(consulta):
+    return re.findall(r'[^\W_]+', normalizar(consulta))[:MAX_TERMINOS]
+
+
+def _candidatos(terminos, organizacion, cuantos):
+    """(factura_id, texto) de las coincidencias más recientes con todos los términos"""
+    terminos_org = [_termino_organizacion(organizacion.pk)] if organizacion is not None else []
+    if connection.vendor == 'sqlite':
+        sql = f'SELECT rowid, texto FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s ORDER BY rowid DESC LIMIT %s'
+        expresion = ' AND '.join([f'"{t}"' for t in terminos_org] + [f'"{t}"*' for t in terminos])
+    elif connection.vendor == 'postgresql':
+        sql = (f'SELECT factura_id, texto FROM {DocumentoBusquedaFactura._meta.db_table} '
+               "WHERE vector @@ to_tsquery('simple', %s) ORDER BY factura_id DESC LIMIT %s")
+        expresion = ' & '.join(terminos_org + [f'{t}:*' for t in terminos])
+    else:
+        documentos = DocumentoBusquedaFactura.objects.all()
+        if organizacion is not None:
+            documentos = documentos.filter(organizacion_id=organizacion.pk)
+        for termino in terminos:
+            documentos = documentos.filter(texto__contains=termino)
+        return list(documentos.order_by('-factura_id').values_list('factura_id', 'texto')[:cuantos])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [expresion, cuantos])
+        return cursor.fetchall()
+
+
+def _exactas(consulta, organizacion, limite):
+    """Ids de las facturas cuyo número, o el NIT o la cédula de su cliente, es exactamente `consulta`"""
+    consulta = consulta.strip()
+    if not consulta or len(consulta.split()) > 1:
+        return []
+    facturas = Factura.objects.all()
+    if organizacion is not None:
+        facturas = facturas.filter(organizacion=organizacion)
+    if consulta.isdigit():
+        numero = int(consulta)
+        return list(facturas.filter(Q(numero=numero) | Q(numero__isnull=True, pk=numero))
+                    .order_by('-id').values_list('id', flat=True)[:limite])
+    clientes = Cliente.objects.filter(Q(nit__iexact=consulta) | Q(cedula__iexact=consulta))
+    if organizacion is not None:
+        clientes = clientes.filter(organizacion=organizacion)
+    clientes = list(clientes.values_list('id', flat=True)[:limite])
+    if not clientes:
+        return []
+    return list(facturas.filter(cliente_id__in=clientes).order_by('-id').values_list('id', flat=True)[:limite])
+
+
+def _relevancia(texto, terminos):
+    # Palabra completa vale más que coincidencia por prefijo
+    palabras = set(re.findall(r'[^\W_]+', texto))
+    return sum(2 if termino in palabras else 1 for termino in terminos)
+
+
+def buscar(consulta, organizacion=None, limite=20):
+    """Ids de las facturas que contienen todos los términos de `consulta`, de la más relevante a la menos.
+
+    Cada término también encuentra palabras que empiezan con él ("gonz" -> "gonzález");
+    a igual relevancia van primero las facturas más recientes. Las coincidencias exactas
+    con el número de factura, NIT o cédula van antes que todas.
+    """
+    terminos = _terminos(consulta)
+    if not terminos:
+        return []
+    exactas = _exactas(consulta, organizacion, limite)
+    if len(exactas) >= limite:
+        return exactas
+    cuantos = max(limite, getattr(settings, 'FACTURA_BUSQUEDA_CANDIDATOS', 500))
+    candidatos = _candidatos(terminos, organizacion, cuantos)
+    candidatos.sort(key=lambda c: (_relevancia(c[1], terminos), c[0]), reverse=True)
+    vistas = set(exactas)
+    return (exactas + [factura_id for factura_id, _ in candidatos if factura_id not in vistas])[:limite]
@@ -0,0 +1,129 @@
+# facturas/caja.py
+"""Turnos de caja y cierre.
+
+`resumen_turno` calcula todo el cierre (totales por método de pago,
+efectivo recibido y vuelto, ventas a crédito, anuladas y desglose por
+moneda) con una sola consulta de agregación condicional sobre las facturas
+del turno. Así cerrar un turno con miles de ventas cuesta lo mismo que una
+consulta indexada por `turno_id` y no recorre las facturas en Python.
+"""
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from productos.models import Moneda
+from .models import METODO_PAGO_CHOICES, Factura, TurnoCaja
+
+CERO = Decimal('0.00')
+
+
+def turno_abierto(usuario, organizacion=None):
+    return TurnoCaja.objects.filter(organizacion=organizacion, usuario=usuario, cerrado_en__isnull=True).first()
+
+
+def abrir_turno(usuario, organizacion=None, monto_inicial=CERO):
+    """Abre un turno con el fondo de caja inicial. Lanza `ValidationError` si ya hay uno abierto."""
+    if monto_inicial < 0:
+        raise ValidationError('El fondo inicial no puede ser negativo')
+    try:
+        with transaction.atomic():
+            return TurnoCaja.objects.create(organizacion=organizacion, usuario=usuario, monto_inicial=monto_inicial)
+    except IntegrityError:
+        raise ValidationError('Ya tiene un turno de caja abierto')
+
+
+def _suma(campo, condicion):
+    return Sum(campo, filter=condicion, default=CERO)
+
+
+def resumen_turno(turno):
+    """Cierre del turno calculado con una única consulta sobre sus facturas.
+
+    Los montos son `Decimal`. Las anuladas solo se cuentan en `anuladas`;
+    el resto de los totales son de facturas vigentes.
+    """
+    vigente = Q(anulada=False)
+    efectivo = vigente & Q(metodo_pago='efectivo')
+    # Las monedas del catálogo (pocas filas) definen las columnas del desglose
+    monedas = list(Moneda.objects.order_by('codigo').values_list('codigo', flat=True)) + ['MULTI', '']
+
+    agregados = {
+        'facturas': Count('id', filter=vigente),
+        # Los alias no pueden repetir nombres de campos de Factura
+        'vigente_total': _suma('total', vigente),
+        'vigente_subtotal': _suma('subtotal', vigente),
+        'vigente_iva_total': _suma('iva_total', vigente),
+        'vigente_descuento': _suma('descuento', vigente),
+        'anuladas': Count('id', filter=Q(anulada=True)),
+        'total_anulado': _suma('total', Q(anulada=True)),
+        'credito_facturas': Count('id', filter=vigente & Q(tipo_venta='credito')),
+        'credito_total': _suma('total', vigente & Q(tipo_venta='credito')),
+        'efectivo_recibido': _suma('monto_recibido', efectivo),
+        'efectivo_vuelto': _suma('vuelto', efectivo),
+    }
+    for metodo, _ in METODO_PAGO_CHOICES:
+        agregados[f'metodo_{metodo}_facturas'] = Count('id', filter=vigente & Q(metodo_pago=metodo))
+        agregados[f'metodo_{metodo}_total'] = _suma('total', vigente & Q(metodo_pago=metodo))
+    for i, codigo in enumerate(monedas):
+        agregados[f'moneda_{i}_facturas'] = Count('id', filter=vigente & Q(moneda_codigo=codigo))
+        agregados[f'moneda_{i}_total'] = _suma('total', vigente & Q(moneda_codigo=codigo))
+
+    fila = Factura.objects.filter(turno=turno).aggregate(**agregados)
+
+    por_metodo = {
+        metodo: {'etiqueta': etiqueta, 'facturas': fila[f'metodo_{metodo}_facturas'], 'total': fila[f'metodo_{metodo}_total']}
+        for metodo, etiqueta in METODO_PAGO_CHOICES
+    }
+    por_moneda = {
+        codigo or 'Sin moneda': {'facturas': fila[f'moneda_{i}_facturas'], 'total': fila[f'moneda_{i}_total']}
+        for i, codigo in enumerate(monedas)
+        if fila[f'moneda_{i}_facturas']
+    }
+    # Lo que debería haber en el cajón: fondo inicial más las ventas en efectivo
+    efectivo_esperado = turno.monto_inicial + por_metodo['efectivo']['total']
+    return {
+        'facturas': fila['facturas'],
+        'total': fila['vigente_total'],
+        'subtotal': fila['vigente_subtotal'],
+        'iva_total': fila['vigente_iva_total'],
+        'descuento': fila['vigente_descuento'],
+        'anuladas': fila['anuladas'],
+        'total_anulado': fila['total_anulado'],
+        'credito': {'facturas': fila['credito_facturas'], 'total': fila['credito_total']},
+        'por_metodo': por_metodo,
+        'por_moneda': por_moneda,
+        'efectivo': {
+            'recibido': fila['efectivo_recibido'],
+            'vuelto': fila['efectivo_vuelto'],
+            'neto': fila['efectivo_recibido'] - fila['efectivo_vuelto'],
+        },
+        'monto_inicial': turno.monto_inicial,
+        'efectivo_esperado': efectivo_esperado,
+    }
+
+
+def _a_json(valor):
+    if isinstance(valor, dict):
+        return {clave: _a_json(v) for clave, v in valor.items()}
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def cerrar_turno(turno, efectivo_contado):
+    """Cierra el turno, guarda el resumen y la diferencia contra el efectivo contado."""
+    with transaction.atomic():
+        turno = TurnoCaja.objects.select_for_update().get(pk=turno.pk)
+        if not turno.abierto:
+            raise ValidationError('El turno ya está cerrado')
+        resumen = resumen_turno(turno)
+        resumen['efectivo_contado'] = efectivo_contado
+        resumen['diferencia'] = efectivo_contado - resumen['efectivo_esperado']
+        turno.cerrado_en = timezone.now()
+        turno.efectivo_contado = efectivo_contado
+        turno.resumen = _a_json(resumen)
+        turno.save(update_fields=['cerrado_en', 'efectivo_contado', 'resumen'])
+    return turno
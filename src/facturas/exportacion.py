@@ -0,0 +1,180 @@
+# facturas/exportacion.py
+"""Exportación masiva de PDFs de facturas (cierre de mes).
+
+Cada PDF se escribe en un archivo temporal y solo se pasa su ruta, de modo
+que no se acumulan todos los documentos en memoria:
+
+- ZIP: cada PDF se agrega al ZIP y se emite en cuanto está listo
+  (`generar_zip`, pensado para `StreamingHttpResponse`). Es el único
+  formato de la descarga web.
+- PDF unido: las páginas se copian con pypdf, por tramos de
+  `PDFS_POR_ARCHIVO` facturas, a uno o varios archivos (`unir_pdfs`).
+  pypdf arma cada archivo en memoria antes de escribirlo, así que el tramo
+  acota la memoria; lo usa solo el comando `exportar_facturas_pdf`.
+
+Por defecto se renderiza en el propio proceso. Con `workers` > 1 se usa un
+`ProcessPoolExecutor` (ReportLab es CPU intensivo y el GIL impide
+aprovechar varios núcleos con hilos); solo lo pide el comando, nunca un
+worker de gunicorn.
+
+El contenido de cada PDF sale de `pdf_cache.obtener_o_renderizar`, es decir,
+del mismo diseño que `factura_pdf` y reutilizando los PDFs ya pre-renderizados.
+Las facturas archivadas se exportan igual que las vigentes.
+"""
+import heapq
+import itertools
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections
+
+from . import archivo, pdf_cache
+
+# Facturas por tarea enviada al pool (reduce el costo de IPC)
+CHUNKSIZE = 4
+# Facturas por archivo del PDF unido: pypdf mantiene en memoria todo lo que va a escribir
+PDFS_POR_ARCHIVO = 500
+
+
+def workers_por_defecto():
+    return getattr(settings, 'FACTURA_EXPORT_WORKERS', None) or min(4, os.cpu_count() or 1)
+
+
+def ids_por_fecha(*facturas, limite=None):
+    """Ids de los querysets de facturas (vigentes y archivadas) intercalados por fecha e id, hasta `limite`"""
+    filas = [qs.order_by('fecha', 'id').values_list('fecha', 'id') for qs in facturas]
+    if limite is not None:
+        filas = [f[:limite] for f in filas]
+    return [pk for _, pk in itertools.islice(heapq.merge(*filas), limite)]
+
+
+def _inicializar_proceso():
+    # Con 'spawn' el proceso hijo arranca sin Django configurado
+    import django
+    django.setup()
+
+
+def renderizar_a_archivo(factura_id, carpeta):
+    """Escribe el PDF de la factura en `carpeta` y devuelve (id, ruta) o (id, None)."""
+    factura = archivo.buscar_factura(factura_id, relacionadas=('cliente', 'usuario', 'organizacion'))
+    if factura is None:
+        return factura_id, None
+    ruta = os.path.join(carpeta, f'factura_{factura.id}.pdf')
+    with open(ruta, 'wb') as f:
+        f.write(pdf_cache.obtener_o_renderizar(factura))
+    return factura_id, ruta
+
+
+def _renderizar_en_proceso(args):
+    close_old_connections()
+    try:
+        return renderizar_a_archivo(*args)
+    finally:
+        connection.close()
+
+
+@contextmanager
+def _archivos_renderizados(ids, workers):
+    """Itera (id, ruta) en el orden de `ids`; las rutas se borran al consumirse.
+
+    Con `workers` <= 1 se renderiza en el propio proceso (descarga web,
+    tests e instalaciones con un solo núcleo).
+    """
+    carpeta = tempfile.mkdtemp(prefix='facturas_export_')
+    pool = None
+    try:
+        if workers > 1:
+            # Los hijos no deben heredar la conexión abierta del proceso padre
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_proceso)
+            resultados = pool.map(_renderizar_en_proceso, [(i, carpeta) for i in ids], chunksize=CHUNKSIZE)
+        else:
+            resultados = (renderizar_a_archivo(i, carpeta) for i in ids)
+        yield resultados
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+class _SalidaZip:
+    """Objeto tipo archivo no posicionable: acumula lo que escribe zipfile hasta que se lee."""
+
+    def __init__(self):
+        self.partes = []
+        self.posicion = 0
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def generar_zip(ids, workers=1):
+    """Generador de bytes de un ZIP con un PDF por factura, en el orden de `ids`."""
+    salida = _SalidaZip()
+    with _archivos_renderizados(list(ids), workers) as resultados:
+        # Los PDFs ya vienen comprimidos: ZIP_STORED evita gastar CPU en nada
+        with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_STORED) as archivo_zip:
+            for factura_id, ruta in resultados:
+                if ruta is None:
+                    continue
+                archivo_zip.write(ruta, arcname=os.path.basename(ruta))
+                os.unlink(ruta)
+                yield salida.vaciar()
+        yield salida.vaciar()
+
+
+def _ruta_parte(destino, parte, partes):
+    if partes == 1:
+        return destino
+    base, extension = os.path.splitext(destino)
+    return f'{base}_{parte:03d}{extension or ".pdf"}'
+
+
+def unir_pdfs(ids, destino, workers=1, por_archivo=PDFS_POR_ARCHIVO):
+    """Une los PDFs de las facturas en `destino` y devuelve las rutas escritas.
+
+    Si hay más de `por_archivo` facturas se escriben varias partes
+    (`destino_001.pdf`, `destino_002.pdf`, ...), cada una armada y liberada
+    antes de empezar la siguiente. Requiere pypdf; se importa aquí porque
+    solo lo usa esta exportación.
+    """
+    from pypdf import PdfWriter
+
+    ids = list(ids)
+    partes = max(1, -(-len(ids) // por_archivo))
+    rutas = []
+    escritor, en_parte = None, 0
+    with _archivos_renderizados(ids, workers) as resultados:
+        for posicion, (factura_id, ruta) in enumerate(resultados, start=1):
+            if escritor is None:
+                escritor = PdfWriter()
+            if ruta is not None:
+                escritor.append(ruta)
+                os.unlink(ruta)
+                en_parte += 1
+            if posicion % por_archivo == 0 or posicion == len(ids):
+                if en_parte:
+                    rutas.append(_ruta_parte(destino, len(rutas) + 1, partes))
+                    with open(rutas[-1], 'wb') as f:
+                        escritor.write(f)
+                escritor.close()
+                escritor, en_parte = None, 0
+    return rutas
@@ -0,0 +1,175 @@
+# facturas/exportacion_datos.py
+"""Exportación de facturas y sus líneas a CSV o XLSX.
+
+Las filas se leen con `.iterator(chunk_size=...)` (en PostgreSQL usa un
+cursor del lado del servidor) y se escriben por bloques, así la memoria no
+crece con la cantidad de filas:
+
+- CSV: generador de bytes para `StreamingHttpResponse`, opcionalmente
+  comprimido con gzip sobre la marcha (`comprimir_gzip`).
+- XLSX: openpyxl en modo `write_only` vuelca las filas a un archivo
+  temporal que luego se sirve con `FileResponse`. openpyxl es opcional y
+  se importa solo al exportar.
+
+`filas_para_exportar` intercala las facturas vigentes con las archivadas
+(`facturas.archivo`) en el mismo orden, sin cargar ninguna de las dos.
+"""
+import csv
+import heapq
+import io
+import tempfile
+import zlib
+
+from django.utils.timezone import localtime
+
+from .models import DetalleFactura, DetalleFacturaArchivado, FacturaArchivada
+
+TAMANO_LOTE = 2000
+FILAS_POR_BLOQUE = 500
+# Excel admite 1.048.576 filas por hoja (una es el encabezado)
+MAX_FILAS_HOJA = 1_048_575
+
+
+def _fecha(valor):
+    # Hora local sin zona (Excel no admite fechas con zona horaria)
+    return localtime(valor).replace(tzinfo=None, microsecond=0) if valor else None
+
+
+def _cliente(factura):
+    cliente = factura.cliente
+    return f'{cliente.nombre} {cliente.apellido}'.strip() if cliente else 'Consumidor Final'
+
+
+COLUMNAS_FACTURAS = [
+    ('id', lambda f: f.id),
+    ('numero', lambda f: f.numero),
+    ('fecha', lambda f: _fecha(f.fecha)),
+    ('cliente', _cliente),
+    ('nit', lambda f: (f.cliente.nit or '') if f.cliente else ''),
+    ('usuario', lambda f: f.usuario.username),
+    ('tipo_venta', lambda f: f.tipo_venta),
+    ('pagada', lambda f: f.pagada),
+    ('moneda', lambda f: f.moneda_codigo),
+    ('subtotal', lambda f: f.subtotal),
+    ('descuento', lambda f: f.descuento),
+    ('iva', lambda f: f.iva_total),
+    ('total', lambda f: f.total),
+    ('monto_recibido', lambda f: f.monto_recibido),
+    ('vuelto', lambda f: f.vuelto),
+]
+
+COLUMNAS_DETALLES = [
+    ('factura_id', lambda d: d.factura_id),
+    ('fecha', lambda d: _fecha(d.factura.fecha)),
+    ('cliente', lambda d: _cliente(d.factura)),
+    ('producto_id', lambda d: d.producto_id),
+    ('producto', lambda d: d.producto.nombre if d.producto else ''),
+    ('cantidad', lambda d: d.cantidad),
+    ('precio_unitario', lambda d: d.precio_unitario),
+    ('iva', lambda d: d.iva),
+    ('subtotal', lambda d: d.subtotal),
+    ('tasa_iva', lambda d: d.tasa_iva),
+    ('iva_monto', lambda d: d.iva_monto),
+    ('total_con_iva', lambda d: d.total_con_iva),
+    ('moneda', lambda d: d.moneda.codigo if d.moneda else ''),
+    ('metodo_pago', lambda d: d.metodo_pago),
+    ('estado_pago', lambda d: d.estado_pago),
+]
+
+
+def facturas_para_exportar(facturas):
+    """Iterador de las facturas de `facturas` (ya filtradas por organización y fechas)."""
+    return (
+        facturas.select_related('cliente', 'usuario')
+        .only('id', 'numero', 'fecha', 'tipo_venta', 'pagada', 'moneda_codigo', 'subtotal', 'descuento', 'iva_total',
+              'total', 'monto_recibido', 'vuelto', 'cliente__nombre', 'cliente__apellido', 'cliente__nit',
+              'usuario__username')
+        .order_by('fecha', 'id')
+        .iterator(chunk_size=TAMANO_LOTE)
+    )
+
+
+def detalles_para_exportar(facturas):
+    """Iterador de las líneas de las facturas de `facturas`."""
+    detalles = DetalleFacturaArchivado if facturas.model is FacturaArchivada else DetalleFactura
+    return (
+        detalles.objects.filter(factura__in=facturas.values('id'))
+        .select_related('factura__cliente', 'producto', 'moneda')
+        .only('id', 'factura_id', 'producto_id', 'cantidad', 'precio_unitario', 'iva', 'subtotal', 'tasa_iva',
+              'iva_monto', 'total_con_iva', 'metodo_pago', 'estado_pago', 'factura__fecha', 'factura__cliente__nombre',
+              'factura__cliente__apellido', 'producto__nombre', 'moneda__codigo')
+        .order_by('factura_id', 'id')
+        .iterator(chunk_size=TAMANO_LOTE)
+    )
+
+
+TABLAS = {
+    'facturas': (facturas_para_exportar, COLUMNAS_FACTURAS),
+    'detalles': (detalles_para_exportar, COLUMNAS_DETALLES),
+}
+
+# Orden de cada tabla (el mismo de su consulta), para intercalar vigentes y archivadas
+ORDEN = {
+    'facturas': lambda f: (f.fecha, f.id),
+    'detalles': lambda d: (d.factura_id, d.id),
+}
+
+
+def filas_para_exportar(tabla, facturas, archivadas):
+    """Iterador de `tabla` para las facturas vigentes y archivadas filtradas, en un solo orden."""
+    consulta, _ = TABLAS[tabla]
+    return heapq.merge(consulta(archivadas), consulta(facturas), key=ORDEN[tabla])
+
+
+def generar_csv(objetos, columnas):
+    """Generador de bytes UTF-8 (con BOM para Excel) de un CSV, por bloques de filas."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')
+    escritor.writerow([nombre for nombre, _ in columnas])
+    for i, obj in enumerate(objetos, 1):
+        escritor.writerow([valor(obj) for _, valor in columnas])
+        if i % FILAS_POR_BLOQUE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def comprimir_gzip(bloques, nivel=6):
+    """Comprime un generador de bytes en formato gzip sin acumularlo."""
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for bloque in bloques:
+        datos = compresor.compress(bloque)
+        if datos:
+            yield datos
+    yield compresor.flush()
+
+
+def escribir_xlsx(objetos, columnas, titulo):
+    """Escribe un XLSX en un archivo temporal y devuelve su ruta (el llamador lo borra).
+
+    Lanza ImportError si openpyxl no está instalado.
+    """
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    encabezado = [nombre for nombre, _ in columnas]
+    hoja = None
+    filas_en_hoja = MAX_FILAS_HOJA
+    numero_hoja = 0
+    for obj in objetos:
+        if filas_en_hoja >= MAX_FILAS_HOJA:
+            numero_hoja += 1
+            hoja = libro.create_sheet(titulo if numero_hoja == 1 else f'{titulo} {numero_hoja}')
+            hoja.append(encabezado)
+            filas_en_hoja = 0
+        hoja.append([valor(obj) for _, valor in columnas])
+        filas_en_hoja += 1
+    if hoja is None:
+        libro.create_sheet(titulo).append(encabezado)
+
+    destino = tempfile.NamedTemporaryFile(prefix=f'{titulo}_', suffix='.xlsx', delete=False)
+    destino.close()
+    libro.save(destino.name)
+    return destino.name
@@ -0,0 +1,65 @@
+# facturas/impuestos.py
+"""Tasas de impuesto por organización, en caché del proceso.
+
+`porcentaje` busca la tasa de la organización en `TasaImpuesto`; si no
+tiene una propia usa la fila general (sin organización) y, si tampoco
+existe, `FACTURA_IVA_PORCENTAJE`. El resultado se guarda en memoria: al
+confirmar una venta no se consulta la tabla.
+
+Guardar o borrar una `TasaImpuesto` vacía la caché de este proceso (ver
+`signals.py`); los demás workers la renuevan a los `FACTURA_TASAS_TTL`
+segundos como mucho.
+"""
+import threading
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db.models import Q
+
+IVA = 'IVA'
+CENTAVO = Decimal('0.01')
+
+_tasas = {}
+_lock = threading.Lock()
+
+
+def _ttl():
+    return getattr(settings, 'FACTURA_TASAS_TTL', 300)
+
+
+def _cargar(organizacion_id, nombre):
+    from .models import TasaImpuesto
+
+    filas = dict(
+        TasaImpuesto.objects.filter(Q(organizacion_id=organizacion_id) | Q(organizacion__isnull=True), nombre=nombre)
+        .values_list('organizacion_id', 'porcentaje')
+    )
+    if organizacion_id in filas:
+        return filas[organizacion_id]
+    if None in filas:
+        return filas[None]
+    return Decimal(str(getattr(settings, 'FACTURA_IVA_PORCENTAJE', 15)))
+
+
+def porcentaje(organizacion_id, nombre=IVA):
+    """Tasa vigente (en %, p. ej. `Decimal('15.00')`) del impuesto `nombre` para la organización"""
+    clave = (organizacion_id, nombre)
+    ahora = time.monotonic()
+    encontrada = _tasas.get(clave)
+    if encontrada is not None and encontrada[1] > ahora:
+        return encontrada[0]
+    valor = _cargar(organizacion_id, nombre)
+    with _lock:
+        _tasas[clave] = (valor, ahora + _ttl())
+    return valor
+
+
+def calcular(base, tasa):
+    """Impuesto de `base` a la tasa `tasa` (en %), redondeado al centavo"""
+    return (base * tasa / 100).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+def limpiar_tasas():
+    with _lock:
+        _tasas.clear()
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from facturas import ventas_producto
+
+
+class Command(BaseCommand):
+    help = 'Incorpora las líneas de factura nuevas al agregado diario de ventas por producto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=ventas_producto.TAMANO_LOTE,
+                            help=f'Facturas por transacción (por defecto {ventas_producto.TAMANO_LOTE})')
+        parser.add_argument('--intervalo', type=float, default=None,
+                            help='Seguir corriendo y revisar cada N segundos (por defecto una sola pasada)')
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                inicio = time.perf_counter()
+                avance = ventas_producto.actualizar_todo(options['lote'])
+                total += avance
+                if avance:
+                    self.stdout.write(f'  {avance} líneas agregadas en {time.perf_counter() - inicio:.2f}s')
+                if options['intervalo'] is None:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'{total} líneas de factura incorporadas al agregado'))
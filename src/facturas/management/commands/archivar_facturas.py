@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from facturas import archivo
+from organizaciones.models import Organizacion
+
+
+class Command(BaseCommand):
+    help = 'Mueve por lotes las facturas de períodos cerrados a las tablas de archivo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--antes-de', help='Archivar las facturas anteriores a este día (AAAA-MM-DD); '
+                                               'por defecto el inicio del mes de hace FACTURA_ARCHIVO_MESES meses')
+        parser.add_argument('--organizacion', help='Slug de la organización (por defecto todas)')
+        parser.add_argument('--lote', type=int, default=archivo.TAMANO_LOTE, help='Facturas por transacción')
+        parser.add_argument('--pausa', type=float, default=0, help='Segundos de espera entre lotes')
+
+    def handle(self, *args, **options):
+        if options['antes_de']:
+            try:
+                dia = parse_date(options['antes_de'])
+            except ValueError:
+                dia = None
+            if dia is None:
+                raise CommandError('La fecha debe tener el formato AAAA-MM-DD')
+            corte = timezone.make_aware(datetime(dia.year, dia.month, dia.day))
+        else:
+            corte = archivo.corte_por_defecto()
+        hoy = timezone.localdate()
+        if corte > timezone.make_aware(datetime(hoy.year, hoy.month, 1)):
+            raise CommandError('Solo se pueden archivar períodos cerrados (anteriores al mes actual)')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que cero')
+
+        org = None
+        if options['organizacion']:
+            org = Organizacion.objects.filter(slug=options['organizacion']).first()
+            if org is None:
+                raise CommandError(f"No existe la organización '{options['organizacion']}'")
+
+        total = archivo.archivar(
+            corte, organizacion=org, lote=options['lote'], pausa=options['pausa'],
+            progreso=lambda n: self.stdout.write(f'  {n} facturas archivadas') if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f'{total} facturas anteriores a {timezone.localdate(corte)} archivadas'))
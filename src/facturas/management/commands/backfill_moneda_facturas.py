@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from facturas.models import Factura, DetalleFactura
+
+
+class Command(BaseCommand):
+    help = 'Rellena el resumen de moneda (moneda_codigo/simbolo/mixta) de las facturas existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000, help='Facturas por lote (por defecto 2000)')
+        parser.add_argument('--todas', action='store_true',
+                            help='Recalcular también las facturas que ya tienen moneda_codigo')
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        facturas = Factura.objects.all()
+        if not options['todas']:
+            facturas = facturas.filter(moneda_codigo='')
+
+        ultimo_id = 0
+        total = 0
+        while True:
+            # Paginación por id para no usar OFFSET sobre tablas grandes
+            ids = list(facturas.filter(id__gt=ultimo_id).order_by('id').values_list('id', flat=True)[:lote])
+            if not ids:
+                break
+            ultimo_id = ids[-1]
+
+            # Un único GROUP BY por lote en lugar de recorrer los detalles de cada factura
+            resumen = {
+                fila['factura_id']: fila
+                for fila in DetalleFactura.objects.filter(factura_id__in=ids, moneda__isnull=False)
+                .values('factura_id')
+                .annotate(
+                    monedas=Count('moneda__codigo', distinct=True),
+                    codigo=Max('moneda__codigo'),
+                    simbolo=Max('moneda__simbolo'),
+                )
+            }
+
+            actualizadas = []
+            for factura_id in ids:
+                fila = resumen.get(factura_id)
+                factura = Factura(id=factura_id)
+                if fila is None:
+                    factura.moneda_codigo, factura.moneda_simbolo, factura.moneda_mixta = '', '', False
+                elif fila['monedas'] > 1:
+                    factura.moneda_codigo, factura.moneda_simbolo, factura.moneda_mixta = 'MULTI', '', True
+                else:
+                    factura.moneda_codigo, factura.moneda_simbolo, factura.moneda_mixta = fila['codigo'], fila['simbolo'] or '', False
+                actualizadas.append(factura)
+
+            with transaction.atomic():
+                Factura.objects.bulk_update(actualizadas, ['moneda_codigo', 'moneda_simbolo', 'moneda_mixta'])
+            total += len(actualizadas)
+            self.stdout.write(f'  {total} facturas procesadas (hasta id {ultimo_id})')
+
+        self.stdout.write(self.style.SUCCESS(f'Resumen de moneda actualizado en {total} facturas'))
@@ -0,0 +1,146 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from organizaciones.models import Organizacion
+from categorias.models import Categoria
+from productos.models import Moneda, Producto
+from facturas import archivo
+from facturas.models import DetalleFactura, Factura
+
+LINEAS_POR_FACTURA = 5
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide las consultas de una organización antes y después de archivar los períodos cerrados sobre N líneas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lineas', type=int, default=10_000_000, help='Líneas de factura a generar (por defecto 10M)')
+        parser.add_argument('--meses', type=int, default=60, help='Meses de historia (por defecto 60)')
+        parser.add_argument('--lote', type=int, default=archivo.TAMANO_LOTE, help='Facturas por lote de archivo')
+        parser.add_argument('--repeticiones', type=int, default=20, help='Mediciones por consulta (por defecto 20)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                org = Organizacion.objects.create(nombre='Bench Archivo', slug='bench-archivo')
+                usuario = User.objects.create_user(username='bench_archivo')
+                categoria = Categoria.objects.create(nombre='Bench Archivo')
+                moneda, _ = Moneda.objects.get_or_create(codigo='USD', defaults={'nombre': 'Dólar', 'simbolo': '$', 'cambio_a_usd': 1})
+                productos = Producto.objects.bulk_create([
+                    Producto(nombre=f'Producto {i}', organizacion=org, categoria=categoria, moneda=moneda,
+                             precio=Decimal('10.00'), stock=0)
+                    for i in range(50)
+                ])
+                self._poblar(org, usuario, [p.pk for p in productos], options['lineas'] // LINEAS_POR_FACTURA,
+                             options['meses'])
+                consultas = self._consultas(org)
+                antes = {nombre: self._medir(consulta, options['repeticiones']) for nombre, consulta in consultas}
+
+                primera = Factura.objects.filter(organizacion=org).order_by('id').values_list('id', flat=True).first()
+                corte = archivo.corte_por_defecto()
+                lotes = []
+                inicio = time.perf_counter()
+                ultimo = [inicio]
+
+                def progreso(total):
+                    ahora = time.perf_counter()
+                    lotes.append((ahora - ultimo[0]) * 1000)
+                    ultimo[0] = ahora
+
+                movidas = archivo.archivar(corte, lote=options['lote'], progreso=progreso)
+                duracion = time.perf_counter() - inicio
+                despues = {nombre: self._medir(consulta, options['repeticiones']) for nombre, consulta in consultas}
+                lectura = self._medir(lambda: archivo.obtener_factura(primera, org), options['repeticiones'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{options['lineas']} líneas en {options['meses']} meses; "
+                          f'{movidas} facturas archivadas en {duracion:.1f} s '
+                          f'({movidas * LINEAS_POR_FACTURA / max(duracion, 1e-9):,.0f} líneas/s)')
+        lotes.sort()
+        self.stdout.write(f'  lote de {options["lote"]} facturas: p50 {statistics.median(lotes):.1f} ms, '
+                          f'p99 {lotes[min(len(lotes) - 1, int(len(lotes) * 0.99))]:.1f} ms')
+        for nombre, _ in consultas:
+            self.stdout.write(f'  {nombre:<28} antes {antes[nombre]:9.2f} ms   después {despues[nombre]:9.2f} ms')
+        self.stdout.write(f'  {"detalle de una archivada":<28} {lectura:9.2f} ms')
+
+    def _poblar(self, org, usuario, productos, total, meses):
+        inicio = time.perf_counter()
+        ahora = timezone.now()
+        segundos = int(timedelta(days=30.5 * meses).total_seconds())
+        columnas_f = [f.column for f in Factura._meta.concrete_fields]
+        columnas_d = [f.column for f in DetalleFactura._meta.concrete_fields]
+        siguiente_f = (Factura.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+        siguiente_d = (DetalleFactura.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+        lote = 20000
+        with connection.cursor() as cursor:
+            for desde in range(0, total, lote):
+                facturas, lineas = [], []
+                # Facturas en orden cronológico, como llegarían en producción
+                for n in range(desde, min(desde + lote, total)):
+                    fecha = connection.ops.adapt_datetimefield_value(ahora - timedelta(seconds=segundos * (total - n) // total))
+                    factura_id = siguiente_f + n
+                    valores = {
+                        'id': factura_id, 'fecha': fecha, 'organizacion_id': org.pk, 'cliente_id': None,
+                        'usuario_id': usuario.pk, 'tipo_venta': 'contado', 'subtotal': Decimal('50.00'),
+                        'descuento': 0, 'iva_total': Decimal('7.50'), 'total': Decimal('57.50'), 'pagada': True,
+                        'creada_en': fecha, 'actualizada_en': fecha, 'monto_recibido': Decimal('60.00'),
+                        'vuelto': Decimal('2.50'), 'moneda_codigo': 'USD', 'moneda_simbolo': '$', 'moneda_mixta': False,
+                        'numero': n + 1, 'metodo_pago': 'efectivo', 'turno_id': None, 'anulada': False, 'anulada_en': None,
+                    }
+                    facturas.append([valores[c] for c in columnas_f])
+                    for _ in range(LINEAS_POR_FACTURA):
+                        valores = {
+                            'id': siguiente_d, 'factura_id': factura_id, 'producto_id': random.choice(productos),
+                            'cantidad': 1, 'precio_unitario': Decimal('10.00'), 'subtotal': Decimal('10.00'),
+                            'moneda_id': None, 'iva': True, 'tasa_iva': Decimal('15.00'), 'iva_monto': Decimal('1.50'),
+                            'total_con_iva': Decimal('11.50'), 'metodo_pago': 'efectivo', 'id_transaccion': None,
+                            'ultimos_digitos': None, 'tipo_tarjeta': None, 'estado_pago': 'completado',
+                        }
+                        siguiente_d += 1
+                        lineas.append([valores[c] for c in columnas_d])
+                self._insertar(cursor, Factura, columnas_f, facturas)
+                self._insertar(cursor, DetalleFactura, columnas_d, lineas)
+        self.stdout.write(f'Datos generados en {time.perf_counter() - inicio:.1f} s')
+
+    def _insertar(self, cursor, modelo, columnas, filas):
+        cursor.executemany(
+            f'INSERT INTO {connection.ops.quote_name(modelo._meta.db_table)} '
+            f'({", ".join(connection.ops.quote_name(c) for c in columnas)}) VALUES ({", ".join(["%s"] * len(columnas))})',
+            filas,
+        )
+
+    def _consultas(self, org):
+        hoy = timezone.localdate()
+        mes = timezone.now() - timedelta(days=30)
+        facturas = Factura.objects.filter(organizacion=org)
+        return [
+            ('primera página del listado', lambda: list(facturas.order_by('-fecha', '-id')[:25])),
+            ('facturas de la organización', lambda: facturas.count()),
+            ('ventas por producto, 30 días', lambda: list(
+                DetalleFactura.objects.filter(factura__organizacion=org, factura__fecha__gte=mes)
+                .values('producto_id').annotate(n=Count('id'), s=Sum('subtotal')).order_by()
+            )),
+            ('facturas sin pagar', lambda: list(facturas.filter(pagada=False).order_by('-fecha', '-id')[:25])),
+            ('número más alto de hoy', lambda: facturas.filter(fecha__date=hoy).aggregate(m=Max('numero'))),
+        ]
+
+    def _medir(self, funcion, repeticiones):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            funcion()
+        return (time.perf_counter() - inicio) * 1000 / repeticiones
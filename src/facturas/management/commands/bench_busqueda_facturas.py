@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from organizaciones.models import Organizacion
+from facturas import busqueda
+from facturas.models import DocumentoBusquedaFactura, Factura
+
+NOMBRES = ['José', 'María', 'Juan', 'Ana', 'Carlos', 'Lucía', 'Pedro', 'Sofía', 'Luis', 'Elena', 'Jorge', 'Rosa']
+APELLIDOS = ['González', 'Martínez', 'López', 'Pérez', 'Rodríguez', 'Sánchez', 'Ramírez', 'Cruz', 'Flores',
+             'Morales', 'Ortiz', 'Castillo', 'Reyes', 'Jiménez', 'Vargas', 'Herrera']
+PRODUCTOS = ['arroz', 'frijol', 'azúcar', 'café', 'aceite', 'leche', 'queso', 'pan', 'huevos', 'jabón', 'pasta',
+             'galletas', 'refresco', 'cerveza', 'pollo', 'carne', 'tomate', 'cebolla', 'papa', 'plátano']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide la búsqueda de facturas con el índice de texto completo contra LIKE sobre N documentos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--facturas', type=int, default=200000, help='Facturas a generar (por defecto 200000)')
+        parser.add_argument('--consultas', type=int, default=50, help='Consultas por método (por defecto 50)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                org = Organizacion.objects.create(nombre='Bench Búsqueda', slug='bench-busqueda')
+                usuario = User.objects.create_user(username='bench_busqueda')
+                self._poblar(org, usuario, options['facturas'])
+                consultas = [self._consulta() for _ in range(options['consultas'])]
+
+                indice = self._medir(lambda q: busqueda.buscar(q, org), consultas)
+                like = self._medir(lambda q: self._like(q, org), consultas)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{options['facturas']} facturas, {options['consultas']} consultas")
+        for nombre, tiempos in (('índice de texto', indice), ('LIKE', like)):
+            tiempos.sort()
+            p99 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.99))]
+            self.stdout.write(f'  {nombre:<16} p50 {statistics.median(tiempos):8.2f} ms   p99 {p99:8.2f} ms')
+
+    def _poblar(self, org, usuario, total):
+        inicio = time.perf_counter()
+        lote = 5000
+        for desde in range(0, total, lote):
+            facturas = Factura.objects.bulk_create([
+                Factura(organizacion=org, usuario=usuario, numero=n + 1) for n in range(desde, min(desde + lote, total))
+            ])
+            busqueda.guardar_documentos({
+                f.pk: (org.pk, busqueda.normalizar(
+                    f'{busqueda._termino_organizacion(org.pk)} {f.numero} {random.choice(NOMBRES)} '
+                    f'{random.choice(APELLIDOS)} {random.randrange(10 ** 9, 10 ** 10)} '
+                    + ' '.join(random.sample(PRODUCTOS, 4))))
+                for f in facturas
+            })
+        self.stdout.write(f'Datos generados en {time.perf_counter() - inicio:.1f} s')
+
+    def _consulta(self):
+        return random.choice([
+            f'{random.choice(NOMBRES)} {random.choice(APELLIDOS)}',
+            f'{random.choice(APELLIDOS)[:4]} {random.choice(PRODUCTOS)}',
+            str(random.randrange(10 ** 9, 10 ** 10))[:6],
+        ])
+
+    def _like(self, consulta, org):
+        # Lo que haría search_fields: un LIKE por término sobre el texto, sin índice
+        documentos = DocumentoBusquedaFactura.objects.filter(organizacion=org)
+        for termino in busqueda._terminos(consulta):
+            documentos = documentos.filter(texto__contains=termino)
+        return list(documentos.order_by('-factura_id').values_list('factura_id', flat=True)[:20])
+
+    def _medir(self, buscar, consultas):
+        tiempos = []
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            buscar(consulta)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return tiempos
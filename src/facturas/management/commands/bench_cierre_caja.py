@@ -0,0 +1,63 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from organizaciones.models import Organizacion
+from facturas import caja
+from facturas.models import METODO_PAGO_CHOICES, Factura, TurnoCaja
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide el cierre de un turno de caja con N ventas: agregación condicional contra recorrer las facturas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ventas', type=int, default=2000, help='Ventas en el turno (por defecto 2000)')
+        parser.add_argument('--repeticiones', type=int, default=20, help='Mediciones por método (por defecto 20)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                org = Organizacion.objects.create(nombre='Bench Caja', slug='bench-caja')
+                usuario = User.objects.create_user(username='bench_caja')
+                turno = TurnoCaja.objects.create(organizacion=org, usuario=usuario, monto_inicial=Decimal('100.00'))
+                metodos = [m for m, _ in METODO_PAGO_CHOICES]
+                Factura.objects.bulk_create([
+                    Factura(organizacion=org, usuario=usuario, turno=turno, numero=n + 1, total=Decimal('11.50'),
+                            subtotal=Decimal('10.00'), iva_total=Decimal('1.50'), moneda_codigo='USD',
+                            metodo_pago=random.choice(metodos), anulada=random.random() < 0.02,
+                            monto_recibido=Decimal('20.00'), vuelto=Decimal('8.50'))
+                    for n in range(options['ventas'])
+                ], batch_size=1000)
+
+                agregado = self._medir(lambda: caja.resumen_turno(turno), options['repeticiones'])
+                recorrido = self._medir(lambda: self._recorrer(turno), options['repeticiones'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"Turno con {options['ventas']} ventas")
+        self.stdout.write(f'  resumen_turno (1 consulta):      {agregado:8.2f} ms')
+        self.stdout.write(f'  recorrer facturas en Python:     {recorrido:8.2f} ms')
+
+    def _recorrer(self, turno):
+        # Lo que haría un cierre "a mano": traer cada factura y sumar en Python
+        totales = {}
+        for factura in Factura.objects.filter(turno=turno):
+            if factura.anulada:
+                continue
+            totales[factura.metodo_pago] = totales.get(factura.metodo_pago, 0) + factura.total
+        return totales
+
+    def _medir(self, funcion, repeticiones):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            funcion()
+        return (time.perf_counter() - inicio) * 1000 / repeticiones
@@ -0,0 +1,83 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from categorias.models import Categoria
+from organizaciones.models import Organizacion
+from productos.models import Moneda, Producto
+from facturas import pdf_layout
+from facturas.models import Factura
+from facturas.pdf import renderizar_factura_pdf
+from facturas.services import confirmar_factura
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide el renderizado del PDF de factura con el layout reconstruido en cada llamada y con el layout cacheado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--muestras', type=int, default=200, help='Renderizados por escenario (por defecto 200)')
+        parser.add_argument('--lineas', type=int, default=10, help='Líneas de la factura de prueba (por defecto 10)')
+
+    def handle(self, *args, **options):
+        muestras = options['muestras']
+        # La factura de prueba se crea dentro de una transacción que se deshace al final
+        try:
+            with transaction.atomic():
+                factura = self._preparar_factura(options['lineas'])
+                renderizar_factura_pdf(factura)  # calentar imports y fuentes
+
+                obtener_layout, dpi_logo = pdf_layout.obtener_layout, pdf_layout.DPI_LOGO
+                # Equivalente al comportamiento anterior: estilos, encabezado y logo
+                # (leído del disco y a resolución original) en cada llamada
+                pdf_layout.obtener_layout = lambda org: pdf_layout.FacturaPDFLayout(pdf_layout.ruta_logo(org))
+                pdf_layout.DPI_LOGO = 10 ** 6
+                try:
+                    sin_cache = self._medir(factura, muestras)
+                finally:
+                    pdf_layout.obtener_layout, pdf_layout.DPI_LOGO = obtener_layout, dpi_logo
+                pdf_layout.limpiar_layouts()
+                con_cache = self._medir(factura, muestras)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{'escenario':>18} | {'p50 ms':>8} | {'p99 ms':>8} | {'media ms':>9}")
+        for nombre, tiempos in (('layout por llamada', sin_cache), ('layout cacheado', con_cache)):
+            self.stdout.write(f'{nombre:>18} | {self._percentil(tiempos, 50):>8.2f} | '
+                              f'{self._percentil(tiempos, 99):>8.2f} | {statistics.mean(tiempos):>9.2f}')
+        mejora = 1 - self._percentil(con_cache, 50) / self._percentil(sin_cache, 50)
+        self.stdout.write(self.style.SUCCESS(f'Reducción p50: {mejora:.0%}'))
+
+    def _medir(self, factura, muestras):
+        tiempos = []
+        for _ in range(muestras):
+            inicio = time.perf_counter()
+            renderizar_factura_pdf(factura)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return sorted(tiempos)
+
+    def _percentil(self, ordenados, p):
+        return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+    def _preparar_factura(self, lineas):
+        org = Organizacion.objects.create(nombre='Bench PDF', slug='bench-pdf')
+        usuario = User.objects.create_user(username='bench_pdf')
+        categoria = Categoria.objects.create(nombre='Bench PDF')
+        moneda, _ = Moneda.objects.get_or_create(
+            codigo='USD', defaults={'nombre': 'Dólar', 'simbolo': '$', 'cambio_a_usd': 1})
+        productos = Producto.all_objects.bulk_create([
+            Producto(organizacion=org, categoria=categoria, moneda=moneda,
+                     nombre=f'Producto {i:03d}', precio=Decimal('10.00'), stock=100)
+            for i in range(lineas)
+        ])
+        carrito = [{'id': p.id, 'cantidad': 1, 'precio': str(p.precio), 'iva': True} for p in productos]
+        factura = confirmar_factura(Factura(usuario=usuario), carrito, organizacion=org)
+        return Factura.objects.select_related('cliente', 'usuario', 'organizacion').get(pk=factura.pk)
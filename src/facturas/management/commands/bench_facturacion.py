@@ -0,0 +1,93 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from categorias.models import Categoria
+from organizaciones.models import Organizacion
+from productos.models import Moneda, Producto
+from facturas.models import Factura, DetalleFactura
+from facturas.services import confirmar_factura
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compara consultas y tiempo de la facturación línea a línea contra confirmar_factura'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lineas', nargs='+', type=int, default=[1, 10, 100, 1000],
+                            help='Tamaños de ticket a medir (por defecto: 1 10 100 1000)')
+
+    def handle(self, *args, **options):
+        tamanos = options['lineas']
+        resultados = []
+        # Todo se ejecuta dentro de una transacción que se deshace al final
+        try:
+            with transaction.atomic():
+                org, usuario, productos = self._preparar_datos(max(tamanos))
+                for n in tamanos:
+                    carrito = [
+                        {'id': p.id, 'cantidad': 1, 'precio': str(p.precio), 'iva': True}
+                        for p in productos[:n]
+                    ]
+                    actual = self._medir(lambda: self._ruta_linea_a_linea(org, usuario, carrito))
+                    lote = self._medir(lambda: confirmar_factura(
+                        Factura(usuario=usuario), carrito, organizacion=org))
+                    resultados.append((n, actual, lote))
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{'líneas':>7} | {'consultas actual':>16} | {'consultas lote':>14} | "
+                          f"{'ms actual':>10} | {'ms lote':>9}")
+        for n, (q_actual, t_actual), (q_lote, t_lote) in resultados:
+            self.stdout.write(f'{n:>7} | {q_actual:>16} | {q_lote:>14} | {t_actual:>10.1f} | {t_lote:>9.1f}')
+
+    def _preparar_datos(self, cantidad):
+        org = Organizacion.objects.create(nombre='Bench Facturación', slug='bench-facturacion')
+        usuario = User.objects.create_user(username='bench_facturacion')
+        categoria = Categoria.objects.create(nombre='Bench Facturación')
+        moneda, _ = Moneda.objects.get_or_create(
+            codigo='USD', defaults={'nombre': 'Dólar', 'simbolo': '$', 'cambio_a_usd': 1})
+        Producto.all_objects.bulk_create([
+            Producto(organizacion=org, categoria=categoria, moneda=moneda,
+                     nombre=f'Producto {i:05d}', precio=Decimal('10.00'), stock=10_000)
+            for i in range(cantidad)
+        ])
+        productos = list(Producto.objects.filter(organizacion=org).order_by('id'))
+        return org, usuario, productos
+
+    def _medir(self, funcion):
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            funcion()
+            duracion = (time.perf_counter() - inicio) * 1000
+        return len(consultas), duracion
+
+    def _ruta_linea_a_linea(self, org, usuario, carrito):
+        """Reproduce el flujo anterior de `facturar`: una línea y un save por producto."""
+        factura = Factura(usuario=usuario, organizacion=org)
+        factura.save()
+        productos = {p.id: p for p in Producto.objects.select_related('moneda').filter(
+            id__in=[int(p['id']) for p in carrito], organizacion=org)}
+        for prod_data in carrito:
+            producto = productos[int(prod_data['id'])]
+            cantidad = int(prod_data['cantidad'])
+            DetalleFactura.objects.create(
+                factura=factura,
+                producto=producto,
+                cantidad=cantidad,
+                precio_unitario=Decimal(str(prod_data['precio'])),
+                moneda=producto.moneda,
+                iva=prod_data.get('iva', True),
+            )
+            producto.stock -= cantidad
+            producto.save()
+        factura.calcular_totales()
+        factura.save()
@@ -0,0 +1,61 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from organizaciones.models import Organizacion
+from facturas.models import Factura, SecuenciaFactura
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compara count() + 1 contra la secuencia por organización a medida que crece el historial de facturas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--volumenes', nargs='+', type=int, default=[1_000, 10_000, 100_000],
+                            help='Cantidad de facturas existentes a simular (por defecto: 1000 10000 100000)')
+        parser.add_argument('--repeticiones', type=int, default=50, help='Mediciones por escenario (por defecto 50)')
+
+    def handle(self, *args, **options):
+        repeticiones = options['repeticiones']
+        resultados = []
+        # Todo se ejecuta dentro de una transacción que se deshace al final
+        try:
+            with transaction.atomic():
+                org = Organizacion.objects.create(nombre='Bench Numeración', slug='bench-numeracion')
+                usuario = User.objects.create_user(username='bench_numeracion')
+                SecuenciaFactura.objects.create(organizacion=org)
+                existentes = 0
+                for volumen in sorted(options['volumenes']):
+                    self._crear_facturas(org, usuario, existentes, volumen)
+                    existentes = volumen
+                    conteo = self._medir(lambda: Factura.objects.filter(organizacion=org).count() + 1, repeticiones)
+                    proximo = self._medir(lambda: SecuenciaFactura.proximo(org.id), repeticiones)
+                    siguiente = self._medir(lambda: SecuenciaFactura.siguiente(org.id), repeticiones)
+                    resultados.append((volumen, conteo, proximo, siguiente))
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{'facturas':>9} | {'count()+1 ms':>12} | {'proximo ms':>10} | {'siguiente ms':>12}")
+        for volumen, conteo, proximo, siguiente in resultados:
+            self.stdout.write(f'{volumen:>9} | {conteo:>12.3f} | {proximo:>10.3f} | {siguiente:>12.3f}')
+
+    def _crear_facturas(self, org, usuario, desde, hasta):
+        lote = 5000
+        for inicio in range(desde, hasta, lote):
+            Factura.objects.bulk_create([
+                Factura(organizacion=org, usuario=usuario, numero=n + 1)
+                for n in range(inicio, min(inicio + lote, hasta))
+            ])
+        SecuenciaFactura.objects.filter(organizacion=org).update(ultimo_numero=hasta)
+
+    def _medir(self, funcion, repeticiones):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            funcion()
+        return (time.perf_counter() - inicio) * 1000 / repeticiones
@@ -0,0 +1,81 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import stripe
+from django.core.management.base import BaseCommand
+
+from facturas import pasarela
+from facturas.stripe_local import ServidorStripeFalso
+
+
+class Command(BaseCommand):
+    help = 'Compara el cliente de Stripe por defecto contra facturas.pasarela con latencia y fallos inyectados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--llamadas', type=int, default=80, help='Cobros por escenario (por defecto 80)')
+        parser.add_argument('--hilos', type=int, default=8, help='Cajas cobrando a la vez (por defecto 8)')
+        parser.add_argument('--latencia', type=float, default=0.05, help='Latencia normal de Stripe en segundos')
+        parser.add_argument('--latencia-lenta', type=float, default=2.0, help='Latencia en el escenario lento')
+        parser.add_argument('--timeout-lectura', type=float, default=0.5, help='Timeout de lectura de la pasarela')
+        parser.add_argument('--solo-pasarela', action='store_true', help='No medir el cliente por defecto')
+
+    def handle(self, *args, **options):
+        escenarios = [
+            ('normal', {'latencia': options['latencia']}),
+            ('lento', {'latencia': options['latencia_lenta']}),
+            ('intermitente', {'latencia': options['latencia'], 'tasa_fallos': 0.2}),
+            ('caido', {'latencia': options['latencia'], 'tasa_fallos': 1.0}),
+        ]
+        self.stdout.write(f"{'escenario':<13} | {'cliente':<9} | {'ok':>4} | {'rápidos':>7} | {'fallidos':>8} | "
+                          f"{'peticiones':>10} | {'p50 ms':>8} | {'p99 ms':>8} | {'total s':>7}")
+        for nombre, falla in escenarios:
+            clientes = [('pasarela', self._pasarela(options))]
+            if not options['solo_pasarela']:
+                clientes.insert(0, ('librería', self._libreria()))
+            for etiqueta, crear in clientes:
+                with ServidorStripeFalso(**falla) as servidor:
+                    fila = self._medir(crear(servidor.url), options['llamadas'], options['hilos'])
+                    peticiones = servidor.peticiones
+                ok, rapidos, fallidos, latencias, total = fila
+                latencias.sort()
+                p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+                self.stdout.write(f'{nombre:<13} | {etiqueta:<9} | {ok:>4} | {rapidos:>7} | {fallidos:>8} | '
+                                  f'{peticiones:>10} | {statistics.median(latencias):>8.1f} | {p99:>8.1f} | {total:>7.2f}')
+
+    def _libreria(self):
+        # Lo que hacía la vista: cliente de la librería con sus valores por defecto (timeout de 80 s)
+        def crear(url):
+            cliente = stripe.StripeClient('sk_test_bench', base_addresses={'api': url})
+            return lambda: cliente.v1.payment_intents.create({'amount': 1000, 'currency': 'usd'})
+        return crear
+
+    def _pasarela(self, options):
+        def crear(url):
+            cliente = pasarela.PasarelaStripe('sk_test_bench', api_base=url, timeout_lectura=options['timeout_lectura'],
+                                              tamano_pool=options['hilos'])
+            return lambda: cliente.crear_payment_intent(1000, 'usd')
+        return crear
+
+    def _medir(self, cobrar, llamadas, hilos):
+        resultados = []
+
+        def una():
+            inicio = time.perf_counter()
+            try:
+                cobrar()
+                resultado = 'ok'
+            except pasarela.PasarelaNoDisponible as e:
+                # Sin causa: el circuito rechazó la llamada sin tocar la red
+                resultado = 'fallido' if e.__cause__ is not None else 'rapido'
+            except stripe.StripeError:
+                resultado = 'fallido'
+            resultados.append((resultado, (time.perf_counter() - inicio) * 1000))
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            for _ in range(llamadas):
+                pool.submit(una)
+        total = time.perf_counter() - inicio
+        cuenta = {clave: sum(1 for r, _ in resultados if r == clave) for clave in ('ok', 'rapido', 'fallido')}
+        return cuenta['ok'], cuenta['rapido'], cuenta['fallido'], [ms for _, ms in resultados], total
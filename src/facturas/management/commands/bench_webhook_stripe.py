@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from organizaciones.models import Organizacion
+from facturas import stripe_eventos, stripe_local
+from facturas.models import DetalleFactura, Factura
+from facturas.views import webhook_stripe
+
+SECRETO = 'whsec_bench'
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia del ack de webhook_stripe y el rendimiento del worker ante una ráfaga de eventos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--eventos', type=int, default=2000, help='Eventos distintos en la ráfaga (por defecto 2000)')
+        parser.add_argument('--reintentos', type=float, default=0.3,
+                            help='Fracción de eventos que Stripe reenvía (por defecto 0.3)')
+        parser.add_argument('--lote', type=int, default=stripe_eventos.TAMANO_LOTE, help='Eventos por lote del worker')
+
+    def handle(self, *args, **options):
+        cantidad = options['eventos']
+        fabrica = RequestFactory()
+        try:
+            with override_settings(STRIPE_WEBHOOK_SECRET=SECRETO), transaction.atomic():
+                facturas = self._preparar_facturas(cantidad)
+                eventos = [stripe_local.evento_pago(f) for f in facturas]
+                rafaga = eventos + random.sample(eventos, int(cantidad * options['reintentos']))
+                random.shuffle(rafaga)
+                peticiones = []
+                for evento in rafaga:
+                    cuerpo, firma = stripe_local.peticion_firmada(evento, SECRETO)
+                    peticiones.append(fabrica.post('/facturas/webhook-stripe/', cuerpo, content_type='application/json',
+                                                   HTTP_STRIPE_SIGNATURE=firma))
+
+                latencias = []
+                inicio_rafaga = time.perf_counter()
+                for peticion in peticiones:
+                    inicio = time.perf_counter()
+                    respuesta = webhook_stripe(peticion)
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                    assert respuesta.status_code == 200
+                duracion_rafaga = time.perf_counter() - inicio_rafaga
+
+                inicio = time.perf_counter()
+                aplicados = 0
+                while True:
+                    n = stripe_eventos.procesar_lote(options['lote'])
+                    if not n:
+                        break
+                    aplicados += n
+                duracion_worker = time.perf_counter() - inicio
+                pagadas = Factura.objects.filter(id__in=facturas, pagada=True).count()
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        latencias.sort()
+        p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        self.stdout.write(f'Ráfaga: {len(rafaga)} webhooks ({len(rafaga) - cantidad} reintentos)')
+        self.stdout.write(f'  ack p50 {statistics.median(latencias):.2f} ms | p99 {p99:.2f} ms | '
+                          f'{len(rafaga) / duracion_rafaga:.0f} webhooks/s')
+        self.stdout.write(f'Worker: {aplicados} eventos en {duracion_worker:.2f}s '
+                          f'({aplicados / duracion_worker:.0f} eventos/s, lote {options["lote"]})')
+        self.stdout.write(self.style.SUCCESS(f'{pagadas}/{cantidad} facturas marcadas pagadas una sola vez'))
+
+    def _preparar_facturas(self, cantidad):
+        org = Organizacion.objects.create(nombre='Bench Stripe', slug='bench-stripe')
+        usuario = User.objects.create_user(username='bench_stripe')
+        facturas = Factura.objects.bulk_create([
+            Factura(organizacion=org, usuario=usuario, numero=n + 1, total=Decimal('10.00'))
+            for n in range(cantidad)
+        ], batch_size=1000)
+        DetalleFactura.objects.bulk_create([
+            DetalleFactura(factura=f, cantidad=1, precio_unitario=Decimal('10.00'), subtotal=Decimal('10.00'),
+                           metodo_pago='tarjeta')
+            for f in facturas
+        ], batch_size=1000)
+        return [f.id for f in facturas]
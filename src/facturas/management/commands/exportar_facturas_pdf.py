@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from facturas import exportacion
+from facturas.views import filtrar_con_archivadas
+from organizaciones.models import Organizacion
+
+
+class Command(BaseCommand):
+    help = 'Exporta los PDFs de las facturas (incluidas las archivadas) de una organización en un rango de fechas (ZIP o PDF unido)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('organizacion', help='Slug de la organización')
+        parser.add_argument('--desde', required=True, help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', required=True, help='Fecha final inclusive (AAAA-MM-DD)')
+        parser.add_argument('--pagada', choices=['1', '0'], help='Solo pagadas (1) o pendientes (0)')
+        parser.add_argument('--tipo-venta', help='Filtrar por tipo de venta')
+        parser.add_argument('--formato', choices=['zip', 'pdf'], default='zip')
+        parser.add_argument('--salida', required=True, help='Archivo de destino')
+        parser.add_argument('--por-archivo', type=int, default=exportacion.PDFS_POR_ARCHIVO,
+                            help='Con --formato pdf: facturas por archivo (por defecto %(default)s)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Procesos para renderizar (por defecto FACTURA_EXPORT_WORKERS o núcleos, máx. 4)')
+
+    def handle(self, *args, **options):
+        org = Organizacion.objects.filter(slug=options['organizacion']).first()
+        if org is None:
+            raise CommandError(f"No existe la organización '{options['organizacion']}'")
+
+        params = {
+            'desde': options['desde'],
+            'hasta': options['hasta'],
+            'pagada': options['pagada'],
+            'tipo_venta': options['tipo_venta'],
+        }
+        facturas, archivadas, filtros = filtrar_con_archivadas(params, org)
+        if 'desde' not in filtros or 'hasta' not in filtros:
+            raise CommandError('Las fechas deben tener el formato AAAA-MM-DD')
+        ids = exportacion.ids_por_fecha(archivadas, facturas)
+        if not ids:
+            self.stdout.write('No hay facturas en el rango indicado')
+            return
+
+        workers = options['workers'] or exportacion.workers_por_defecto()
+        self.stdout.write(f'Exportando {len(ids)} facturas con {workers} procesos...')
+        inicio = time.perf_counter()
+        if options['formato'] == 'pdf':
+            try:
+                rutas = exportacion.unir_pdfs(ids, options['salida'], workers=workers,
+                                              por_archivo=options['por_archivo'])
+            except ImportError:
+                raise CommandError('Unir PDFs requiere pypdf (pip install pypdf)')
+            destino = ', '.join(rutas)
+        else:
+            with open(options['salida'], 'wb') as f:
+                for parte in exportacion.generar_zip(ids, workers=workers):
+                    f.write(parte)
+            destino = options['salida']
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(ids)} facturas exportadas a {destino} en {segundos:.1f}s"
+        ))
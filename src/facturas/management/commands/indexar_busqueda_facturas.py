@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from facturas import busqueda
+from facturas.models import Factura
+from organizaciones.models import Organizacion
+
+
+class Command(BaseCommand):
+    help = 'Genera (o regenera) los documentos de búsqueda de texto de las facturas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizacion', help='Slug de la organización (por defecto todas)')
+        parser.add_argument('--lote', type=int, default=busqueda.TAMANO_LOTE, help='Facturas por lote')
+
+    def handle(self, *args, **options):
+        facturas = Factura.objects.all()
+        if options['organizacion']:
+            org = Organizacion.objects.filter(slug=options['organizacion']).first()
+            if org is None:
+                raise CommandError(f"No existe la organización '{options['organizacion']}'")
+            facturas = facturas.filter(organizacion=org)
+
+        total = busqueda.indexar_facturas(facturas, lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{total} facturas indexadas'))
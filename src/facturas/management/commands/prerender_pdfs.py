@@ -0,0 +1,73 @@
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from facturas import prerender
+
+
+def _inicializar_proceso():
+    # Con 'spawn' el proceso hijo arranca sin Django configurado
+    import django
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Worker que pre-renderiza los PDFs de las facturas recién confirmadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Tamaño del pool (por defecto 2)')
+        parser.add_argument('--procesos', action='store_true',
+                            help='Usar un pool de procesos en lugar de hilos (ReportLab es CPU intensivo)')
+        parser.add_argument('--lote', type=int, default=20, help='Trabajos reclamados por iteración')
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--una-vez', action='store_true', help='Vaciar la cola y terminar')
+        parser.add_argument('--stats-cada', type=float, default=60.0,
+                            help='Segundos entre impresiones de estadísticas')
+        parser.add_argument('--purgar-dias', type=int, default=7,
+                            help='Borrar trabajos terminados hace más de N días')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        if options['procesos']:
+            # No heredar conexiones abiertas en los procesos hijos
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_proceso)
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prerender-pdf')
+
+        tipo = 'procesos' if options['procesos'] else 'hilos'
+        self.stdout.write(f'Pre-renderizado de PDFs con {workers} {tipo}')
+        ultimo_stats = time.monotonic()
+        procesados = 0
+        try:
+            prerender.liberar_abandonados()
+            prerender.purgar_terminados(options['purgar_dias'])
+            while True:
+                ids = prerender.reclamar_trabajos(options['lote'])
+                if ids:
+                    for _ in pool.map(prerender.procesar_en_pool, ids):
+                        procesados += 1
+                elif options['una_vez']:
+                    break
+                else:
+                    time.sleep(options['intervalo'])
+
+                if time.monotonic() - ultimo_stats >= options['stats_cada']:
+                    self._imprimir_estadisticas(procesados)
+                    prerender.liberar_abandonados()
+                    ultimo_stats = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown(wait=True)
+
+        self._imprimir_estadisticas(procesados)
+
+    def _imprimir_estadisticas(self, procesados):
+        stats = prerender.estadisticas()
+        stats['procesados_por_este_worker'] = procesados
+        self.stdout.write(json.dumps(stats, ensure_ascii=False))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from facturas import stripe_eventos
+
+
+class Command(BaseCommand):
+    help = 'Worker que aplica por lotes los webhooks de Stripe guardados por webhook_stripe'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=stripe_eventos.TAMANO_LOTE,
+                            help=f'Eventos por transacción (por defecto {stripe_eventos.TAMANO_LOTE})')
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Segundos de espera cuando no hay eventos pendientes')
+        parser.add_argument('--una-vez', action='store_true', help='Vaciar la bandeja y terminar')
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                try:
+                    procesados = stripe_eventos.procesar_lote(options['lote'])
+                except DatabaseError as e:
+                    # El lote se deshizo completo; los eventos siguen pendientes
+                    self.stderr.write(f'Error aplicando eventos de Stripe: {e}')
+                    procesados = 0
+                    if options['una_vez']:
+                        raise
+                total += procesados
+                if procesados:
+                    self.stdout.write(f'  {procesados} eventos aplicados ({total} en total)')
+                elif options['una_vez']:
+                    break
+                else:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'{total} eventos de Stripe aplicados'))
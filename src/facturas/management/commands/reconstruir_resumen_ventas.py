@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from facturas.models import ResumenVentaDiaria
+from organizaciones.models import Organizacion
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen diario de ventas a partir de las facturas en un rango de días'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Primer día (AAAA-MM-DD); por defecto el mismo que --hasta')
+        parser.add_argument('--hasta', help='Último día inclusive (AAAA-MM-DD); por defecto hoy')
+        parser.add_argument('--organizacion', help='Slug de la organización (por defecto todas)')
+
+    def handle(self, *args, **options):
+        try:
+            hasta = parse_date(options['hasta']) if options['hasta'] else timezone.localdate()
+            desde = parse_date(options['desde']) if options['desde'] else hasta
+        except ValueError:
+            desde = hasta = None
+        if desde is None or hasta is None:
+            raise CommandError('Las fechas deben tener el formato AAAA-MM-DD')
+        if desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta')
+
+        org = None
+        if options['organizacion']:
+            org = Organizacion.objects.filter(slug=options['organizacion']).first()
+            if org is None:
+                raise CommandError(f"No existe la organización '{options['organizacion']}'")
+
+        filas = ResumenVentaDiaria.reconstruir(desde, hasta, organizacion=org)
+        self.stdout.write(self.style.SUCCESS(f'Resumen de {desde} a {hasta} reconstruido: {filas} filas'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0004_factura_organizacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='moneda_codigo',
+            field=models.CharField(blank=True, default='', help_text="Código de la moneda de los detalles o 'MULTI' si hay mezcla", max_length=10),
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='moneda_mixta',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='moneda_simbolo',
+            field=models.CharField(blank=True, default='', max_length=5),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_cliente_organizacion'),
+        ('facturas', '0005_factura_resumen_moneda'),
+        ('organizaciones', '0003_alter_miembro_role'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['organizacion', '-fecha', '-id'], name='factura_org_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['organizacion', 'pagada', '-fecha', '-id'], name='factura_org_pagada_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['organizacion', 'tipo_venta', '-fecha', '-id'], name='factura_org_tipo_fecha_idx'),
+        ),
+    ]
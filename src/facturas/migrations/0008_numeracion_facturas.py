@@ -0,0 +1,66 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+LOTE = 1000
+
+
+def numerar_facturas(apps, schema_editor):
+    """Numera las facturas existentes de cada organización por fecha e id y crea su secuencia."""
+    Factura = apps.get_model('facturas', 'Factura')
+    SecuenciaFactura = apps.get_model('facturas', 'SecuenciaFactura')
+    organizaciones = Factura.objects.order_by().values_list('organizacion_id', flat=True).distinct()
+    for organizacion_id in list(organizaciones):
+        ids = Factura.objects.filter(organizacion_id=organizacion_id).order_by('fecha', 'id').values_list('id', flat=True)
+        lote = []
+        numero = 0
+        for factura_id in ids.iterator(chunk_size=LOTE):
+            numero += 1
+            lote.append(Factura(id=factura_id, numero=numero))
+            if len(lote) >= LOTE:
+                Factura.objects.bulk_update(lote, ['numero'])
+                lote = []
+        if lote:
+            Factura.objects.bulk_update(lote, ['numero'])
+        SecuenciaFactura.objects.create(organizacion_id=organizacion_id, ultimo_numero=numero)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_cliente_organizacion'),
+        ('facturas', '0007_trabajopdf'),
+        ('organizaciones', '0003_alter_miembro_role'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaFactura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_numero', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de facturas',
+                'verbose_name_plural': 'Secuencias de facturas',
+            },
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='numero',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='factura',
+            constraint=models.UniqueConstraint(fields=('organizacion', 'numero'), name='factura_org_numero_uniq'),
+        ),
+        migrations.AddField(
+            model_name='secuenciafactura',
+            name='organizacion',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='secuencia_factura', to='organizaciones.organizacion'),
+        ),
+        migrations.RunPython(numerar_facturas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0008_numeracion_facturas'),
+        ('organizaciones', '0003_alter_miembro_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64)),
+                ('respuesta', models.JSONField(default=dict)),
+                ('creada_en', models.DateTimeField(auto_now_add=True)),
+                ('factura', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='facturas.factura')),
+                ('organizacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='claves_idempotencia', to='organizaciones.organizacion')),
+            ],
+            options={
+                'verbose_name': 'Clave de idempotencia',
+                'verbose_name_plural': 'Claves de idempotencia',
+                'constraints': [models.UniqueConstraint(fields=('organizacion', 'clave'), name='clave_idempotencia_org_uniq')],
+            },
+        ),
+    ]
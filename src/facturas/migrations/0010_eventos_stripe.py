@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0009_claves_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoStripe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('evento_id', models.CharField(max_length=255, unique=True)),
+                ('tipo', models.CharField(max_length=100)),
+                ('datos', models.JSONField(default=dict, help_text='Objeto del evento (data.object)')),
+                ('creado_stripe', models.DateTimeField(blank=True, null=True)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesado', 'Procesado'), ('ignorado', 'Ignorado'), ('error', 'Error')], default='pendiente', max_length=12)),
+                ('error', models.TextField(blank=True, default='')),
+                ('recibido_en', models.DateTimeField(auto_now_add=True)),
+                ('procesado_en', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Evento de Stripe',
+                'verbose_name_plural': 'Eventos de Stripe',
+                'indexes': [models.Index(fields=['estado', 'recibido_en'], name='eventostripe_estado_idx')],
+            },
+        ),
+    ]
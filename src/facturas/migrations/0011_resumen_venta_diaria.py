@@ -0,0 +1,62 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+CAMPOS_SUMA = ('subtotal', 'iva_total', 'descuento', 'total')
+
+
+def resumir_facturas(apps, schema_editor):
+    """Crea el resumen diario de todas las facturas existentes."""
+    Factura = apps.get_model('facturas', 'Factura')
+    ResumenVentaDiaria = apps.get_model('facturas', 'ResumenVentaDiaria')
+    filas = (
+        Factura.objects.values('organizacion_id', 'moneda_codigo', 'usuario_id', 'tipo_venta', dia_local=TruncDate('fecha'))
+        .annotate(n=Count('id'), **{f'suma_{campo}': Sum(campo) for campo in CAMPOS_SUMA})
+        .order_by()
+    )
+    ResumenVentaDiaria.objects.bulk_create([
+        ResumenVentaDiaria(
+            organizacion_id=fila['organizacion_id'], dia=fila['dia_local'], moneda_codigo=fila['moneda_codigo'],
+            usuario_id=fila['usuario_id'], tipo_venta=fila['tipo_venta'], facturas=fila['n'],
+            **{campo: fila[f'suma_{campo}'] or 0 for campo in CAMPOS_SUMA},
+        )
+        for fila in filas.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0010_eventos_stripe'),
+        ('organizaciones', '0003_alter_miembro_role'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('moneda_codigo', models.CharField(blank=True, default='', max_length=10)),
+                ('tipo_venta', models.CharField(choices=[('contado', 'Contado'), ('credito', 'Crédito')], max_length=10)),
+                ('facturas', models.IntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('iva_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('descuento', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('organizacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_venta', to='organizaciones.organizacion')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_venta', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen de ventas diario',
+                'verbose_name_plural': 'Resúmenes de ventas diarios',
+                'constraints': [models.UniqueConstraint(fields=('organizacion', 'dia', 'moneda_codigo', 'usuario', 'tipo_venta'), name='resumenventa_clave_uniq')],
+            },
+        ),
+        migrations.RunPython(resumir_facturas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0011_resumen_venta_diaria'),
+        ('organizaciones', '0003_alter_miembro_role'),
+        ('productos', '0004_producto_organizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaAgregado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Marca de agregado',
+                'verbose_name_plural': 'Marcas de agregados',
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaProductoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('moneda_codigo', models.CharField(blank=True, default='', max_length=10)),
+                ('unidades', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('organizacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ventas_producto', to='organizaciones.organizacion')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_diarias', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Venta diaria de producto',
+                'verbose_name_plural': 'Ventas diarias de productos',
+                'indexes': [models.Index(fields=['organizacion', 'dia'], name='ventaproducto_org_dia_idx')],
+                'constraints': [models.UniqueConstraint(fields=('organizacion', 'dia', 'producto', 'moneda_codigo'), name='ventaproducto_clave_uniq')],
+            },
+        ),
+    ]
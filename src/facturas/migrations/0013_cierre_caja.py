@@ -0,0 +1,71 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def copiar_metodo_pago(apps, schema_editor):
+    """Copia a cada factura el método de pago de sus líneas (todas comparten el mismo)."""
+    Factura = apps.get_model('facturas', 'Factura')
+    DetalleFactura = apps.get_model('facturas', 'DetalleFactura')
+    primera_linea = DetalleFactura.objects.filter(factura=OuterRef('pk')).order_by('id').values('metodo_pago')[:1]
+    Factura.objects.update(metodo_pago=Coalesce(Subquery(primera_linea), Value('efectivo')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0012_ventas_producto_diarias'),
+        ('organizaciones', '0003_alter_miembro_role'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='anulada',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='anulada_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='metodo_pago',
+            field=models.CharField(choices=[('efectivo', 'Efectivo'), ('tarjeta', 'Tarjeta'), ('transferencia', 'Transferencia')], default='efectivo', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='TurnoCaja',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('abierto_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cerrado_en', models.DateTimeField(blank=True, null=True)),
+                ('monto_inicial', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('efectivo_contado', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('resumen', models.JSONField(blank=True, default=dict)),
+                ('organizacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='turnos_caja', to='organizaciones.organizacion')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='turnos_caja', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Turno de caja',
+                'verbose_name_plural': 'Turnos de caja',
+                'ordering': ['-abierto_en'],
+            },
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='turno',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='facturas', to='facturas.turnocaja'),
+        ),
+        migrations.AddConstraint(
+            model_name='turnocaja',
+            constraint=models.UniqueConstraint(condition=models.Q(('cerrado_en__isnull', True)), fields=('organizacion', 'usuario'), name='turnocaja_abierto_uniq'),
+        ),
+        migrations.RunPython(copiar_metodo_pago, migrations.RunPython.noop),
+    ]
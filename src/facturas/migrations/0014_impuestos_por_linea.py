@@ -0,0 +1,59 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:51
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.db.models.functions import Round
+
+
+def fijar_iva_lineas(apps, schema_editor):
+    """Guarda el IVA de las líneas existentes con el 15% con que se calcularon sus facturas."""
+    DetalleFactura = apps.get_model('facturas', 'DetalleFactura')
+    decimal = DecimalField(max_digits=12, decimal_places=2)
+    iva = Round(ExpressionWrapper(F('subtotal') * Decimal('0.15'), output_field=decimal), 2)
+    DetalleFactura.objects.filter(iva=True).update(tasa_iva=Decimal('15.00'), iva_monto=iva)
+    DetalleFactura.objects.update(total_con_iva=ExpressionWrapper(F('subtotal') + F('iva_monto'), output_field=decimal))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0013_cierre_caja'),
+        ('organizaciones', '0003_alter_miembro_role'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detallefactura',
+            name='iva_monto',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='detallefactura',
+            name='tasa_iva',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Porcentaje de IVA aplicado (0 si la línea está exenta)', max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='detallefactura',
+            name='total_con_iva',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.CreateModel(
+            name='TasaImpuesto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(default='IVA', max_length=20)),
+                ('porcentaje', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('actualizada_en', models.DateTimeField(auto_now=True)),
+                ('organizacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tasas_impuesto', to='organizaciones.organizacion')),
+            ],
+            options={
+                'verbose_name': 'Tasa de impuesto',
+                'verbose_name_plural': 'Tasas de impuesto',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('organizacion__isnull', False)), fields=('organizacion', 'nombre'), name='tasaimpuesto_org_nombre_uniq'), models.UniqueConstraint(condition=models.Q(('organizacion__isnull', True)), fields=('nombre',), name='tasaimpuesto_general_uniq'), models.CheckConstraint(condition=models.Q(('porcentaje__gte', 0), ('porcentaje__lte', 100)), name='tasaimpuesto_porcentaje_rango')],
+            },
+        ),
+        migrations.RunPython(fijar_iva_lineas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# El índice de texto completo no se puede declarar en el modelo: se crea con
+# SQL propio de cada motor. Los documentos de las facturas existentes se
+# generan con `python manage.py indexar_busqueda_facturas`.
+SQL_SQLITE = [
+    """CREATE VIRTUAL TABLE facturas_busqueda_fts USING fts5(
+        texto, content='facturas_documentobusquedafactura', content_rowid='factura_id',
+        tokenize='unicode61', prefix='2 3')""",
+    """CREATE TRIGGER facturas_busqueda_ai AFTER INSERT ON facturas_documentobusquedafactura BEGIN
+        INSERT INTO facturas_busqueda_fts(rowid, texto) VALUES (new.factura_id, new.texto);
+    END""",
+    """CREATE TRIGGER facturas_busqueda_ad AFTER DELETE ON facturas_documentobusquedafactura BEGIN
+        INSERT INTO facturas_busqueda_fts(facturas_busqueda_fts, rowid, texto) VALUES ('delete', old.factura_id, old.texto);
+    END""",
+    """CREATE TRIGGER facturas_busqueda_au AFTER UPDATE ON facturas_documentobusquedafactura BEGIN
+        INSERT INTO facturas_busqueda_fts(facturas_busqueda_fts, rowid, texto) VALUES ('delete', old.factura_id, old.texto);
+        INSERT INTO facturas_busqueda_fts(rowid, texto) VALUES (new.factura_id, new.texto);
+    END""",
+]
+SQL_SQLITE_REVERSO = [
+    'DROP TRIGGER IF EXISTS facturas_busqueda_au',
+    'DROP TRIGGER IF EXISTS facturas_busqueda_ad',
+    'DROP TRIGGER IF EXISTS facturas_busqueda_ai',
+    'DROP TABLE IF EXISTS facturas_busqueda_fts',
+]
+SQL_POSTGRESQL = [
+    """ALTER TABLE facturas_documentobusquedafactura
+        ADD COLUMN vector tsvector GENERATED ALWAYS AS (to_tsvector('simple', texto)) STORED""",
+    'CREATE INDEX facturas_busqueda_vector_idx ON facturas_documentobusquedafactura USING GIN (vector)',
+]
+SQL_POSTGRESQL_REVERSO = [
+    'DROP INDEX IF EXISTS facturas_busqueda_vector_idx',
+    'ALTER TABLE facturas_documentobusquedafactura DROP COLUMN IF EXISTS vector',
+]
+
+
+def _ejecutar(schema_editor, por_motor):
+    for sentencia in por_motor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sentencia)
+
+
+def crear_indice(apps, schema_editor):
+    _ejecutar(schema_editor, {'sqlite': SQL_SQLITE, 'postgresql': SQL_POSTGRESQL})
+
+
+def borrar_indice(apps, schema_editor):
+    _ejecutar(schema_editor, {'sqlite': SQL_SQLITE_REVERSO, 'postgresql': SQL_POSTGRESQL_REVERSO})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0014_impuestos_por_linea'),
+        ('organizaciones', '0003_alter_miembro_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusquedaFactura',
+            fields=[
+                ('factura', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='documento_busqueda', serialize=False, to='facturas.factura')),
+                ('texto', models.TextField()),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('organizacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='organizaciones.organizacion')),
+            ],
+            options={
+                'verbose_name': 'Documento de búsqueda de factura',
+                'verbose_name_plural': 'Documentos de búsqueda de facturas',
+            },
+        ),
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_cliente_organizacion'),
+        ('facturas', '0015_busqueda_facturas'),
+        ('organizaciones', '0003_alter_miembro_role'),
+        ('productos', '0005_tipos_cambio'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacturaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha', models.DateTimeField()),
+                ('tipo_venta', models.CharField(choices=[('contado', 'Contado'), ('credito', 'Crédito')], default='contado', max_length=10)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('descuento', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('iva_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('pagada', models.BooleanField(default=False)),
+                ('creada_en', models.DateTimeField()),
+                ('actualizada_en', models.DateTimeField()),
+                ('monto_recibido', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('vuelto', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('moneda_codigo', models.CharField(blank=True, default='', max_length=10)),
+                ('moneda_simbolo', models.CharField(blank=True, default='', max_length=5)),
+                ('moneda_mixta', models.BooleanField(default=False)),
+                ('numero', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('metodo_pago', models.CharField(choices=[('efectivo', 'Efectivo'), ('tarjeta', 'Tarjeta'), ('transferencia', 'Transferencia')], default='efectivo', max_length=20)),
+                ('anulada', models.BooleanField(default=False)),
+                ('anulada_en', models.DateTimeField(blank=True, null=True)),
+                ('cliente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='clientes.cliente')),
+                ('organizacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='facturas_archivadas', to='organizaciones.organizacion')),
+                ('turno', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='facturas.turnocaja')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Factura archivada',
+                'verbose_name_plural': 'Facturas archivadas',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DetalleFacturaArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('cantidad', models.PositiveIntegerField(default=1)),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('iva', models.BooleanField(default=True)),
+                ('tasa_iva', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('iva_monto', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_con_iva', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('metodo_pago', models.CharField(choices=[('efectivo', 'Efectivo'), ('tarjeta', 'Tarjeta'), ('transferencia', 'Transferencia')], default='efectivo', max_length=20)),
+                ('id_transaccion', models.CharField(blank=True, max_length=100, null=True)),
+                ('ultimos_digitos', models.CharField(blank=True, max_length=4, null=True)),
+                ('tipo_tarjeta', models.CharField(blank=True, max_length=20, null=True)),
+                ('estado_pago', models.CharField(default='pendiente', max_length=20)),
+                ('moneda', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='productos.moneda')),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='productos.producto')),
+                ('factura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='facturas.facturaarchivada')),
+            ],
+            options={
+                'verbose_name': 'Detalle de factura archivado',
+                'verbose_name_plural': 'Detalles de facturas archivados',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='facturaarchivada',
+            index=models.Index(fields=['organizacion', '-fecha', '-id'], name='facturaarch_org_fecha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='facturaarchivada',
+            constraint=models.UniqueConstraint(fields=('organizacion', 'numero'), name='facturaarchivada_org_numero_uniq'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+def quitar_claves_repetidas(apps, schema_editor):
+    """Sin organización la restricción anterior no evitaba duplicados: conserva la primera de cada clave."""
+    ClaveIdempotencia = apps.get_model('facturas', 'ClaveIdempotencia')
+    repetidas = (
+        ClaveIdempotencia.objects.filter(organizacion__isnull=True).order_by()
+        .values('clave').annotate(primera=models.Min('id'), n=models.Count('id')).filter(n__gt=1)
+    )
+    for fila in list(repetidas):
+        ClaveIdempotencia.objects.filter(organizacion__isnull=True, clave=fila['clave']).exclude(
+            id=fila['primera']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0016_archivo_facturas'),
+    ]
+
+    operations = [
+        migrations.RunPython(quitar_claves_repetidas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='claveidempotencia',
+            constraint=models.UniqueConstraint(condition=models.Q(('organizacion__isnull', True)), fields=('clave',), name='clave_idempotencia_sin_org_uniq'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:12
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def unir_secuencias_sin_organizacion(apps, schema_editor):
+    """Deja una sola secuencia sin organización, con el mayor número ya asignado."""
+    SecuenciaFactura = apps.get_model('facturas', 'SecuenciaFactura')
+    secuencias = list(SecuenciaFactura.objects.filter(organizacion__isnull=True).order_by('-ultimo_numero', 'id'))
+    if len(secuencias) > 1:
+        SecuenciaFactura.objects.filter(id__in=[s.id for s in secuencias[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0017_clave_idempotencia_sin_org_uniq'),
+        ('organizaciones', '0003_alter_miembro_role'),
+    ]
+
+    operations = [
+        migrations.RunPython(unir_secuencias_sin_organizacion, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='secuenciafactura',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('organizacion', models.Value(0)), condition=models.Q(('organizacion__isnull', True)), name='secuencia_factura_sin_org_uniq'),
+        ),
+    ]
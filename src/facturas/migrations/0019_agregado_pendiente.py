@@ -0,0 +1,50 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+LOTE = 1000
+
+
+def encolar_facturas_sin_agregar(apps, schema_editor):
+    """Encola las facturas con líneas posteriores a la marca anterior (aún no sumadas al reporte)."""
+    MarcaAgregado = apps.get_model('facturas', 'MarcaAgregado')
+    DetalleFactura = apps.get_model('facturas', 'DetalleFactura')
+    AgregadoPendiente = apps.get_model('facturas', 'AgregadoPendiente')
+    ultimo_id = MarcaAgregado.objects.filter(nombre='ventas_producto').values_list('ultimo_id', flat=True).first() or 0
+    facturas = (
+        DetalleFactura.objects.filter(id__gt=ultimo_id).order_by('factura_id')
+        .values_list('factura_id', flat=True).distinct()
+    )
+    lote = []
+    for factura_id in facturas.iterator(chunk_size=LOTE):
+        lote.append(AgregadoPendiente(factura_id=factura_id))
+        if len(lote) >= LOTE:
+            AgregadoPendiente.objects.bulk_create(lote, ignore_conflicts=True)
+            lote = []
+    AgregadoPendiente.objects.bulk_create(lote, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0018_secuencia_factura_sin_org_uniq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgregadoPendiente',
+            fields=[
+                ('factura', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='agregado_pendiente', serialize=False, to='facturas.factura')),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Agregado pendiente',
+                'verbose_name_plural': 'Agregados pendientes',
+            },
+        ),
+        migrations.RunPython(encolar_facturas_sin_agregar, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='MarcaAgregado',
+        ),
+    ]
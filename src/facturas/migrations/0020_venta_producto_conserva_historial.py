@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0019_agregado_pendiente'),
+        ('productos', '0007_estadisticas_catalogo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ventaproductodiaria',
+            name='producto',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ventas_diarias', to='productos.producto'),
+        ),
+    ]
@@ -1,20 +1,24 @@
-from django.db import models
-from django.db.models import Sum, F, ExpressionWrapper, DecimalField
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Sum, F, Max, ExpressionWrapper, DecimalField, Value
+from django.db.models.functions import Coalesce, TruncDate
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 from django.utils import timezone
+from django.conf import settings
 
-from django.db import models
-from django.db.models import Sum, F, ExpressionWrapper, DecimalField
-from django.core.exceptions import ValidationError
-from decimal import Decimal
-from django.utils import timezone
+METODO_PAGO_CHOICES = [
+    ('efectivo', 'Efectivo'),
+    ('tarjeta', 'Tarjeta'),
+    ('transferencia', 'Transferencia')
+]
 
 class Factura(models.Model):
     TIPO_VENTA_CHOICES = [
         ('contado', 'Contado'),
         ('credito', 'Crédito'),
     ]
+    # Las de períodos cerrados pasan a FacturaArchivada (ver facturas.archivo)
+    archivada = False
 
     fecha = models.DateTimeField(default=timezone.now)
     organizacion = models.ForeignKey('organizaciones.Organizacion', on_delete=models.CASCADE, null=True, blank=True, related_name='facturas')
@@ -30,40 +34,92 @@ class Factura(models.Model):
     actualizada_en = models.DateTimeField(auto_now=True)
     monto_recibido = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     vuelto = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Resumen de moneda desnormalizado (se escribe junto con los totales) para
+    # que los listados no tengan que recorrer los detalles de cada factura.
+    moneda_codigo = models.CharField(max_length=10, blank=True, default='', help_text="Código de la moneda de los detalles o 'MULTI' si hay mezcla")
+    moneda_simbolo = models.CharField(max_length=5, blank=True, default='')
+    moneda_mixta = models.BooleanField(default=False)
+    # Número fiscal correlativo por organización (ver SecuenciaFactura)
+    numero = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    # Método de pago de la venta (copia del de sus líneas) para el cierre de caja
+    metodo_pago = models.CharField(max_length=20, choices=METODO_PAGO_CHOICES, default='efectivo')
+    turno = models.ForeignKey('TurnoCaja', on_delete=models.SET_NULL, null=True, blank=True, related_name='facturas')
+    anulada = models.BooleanField(default=False)
+    anulada_en = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['organizacion', 'numero'], name='factura_org_numero_uniq'),
+        ]
+        indexes = [
+            # Listados por organización con paginación por cursor sobre (fecha, id)
+            models.Index(fields=['organizacion', '-fecha', '-id'], name='factura_org_fecha_idx'),
+            models.Index(fields=['organizacion', 'pagada', '-fecha', '-id'], name='factura_org_pagada_fecha_idx'),
+            models.Index(fields=['organizacion', 'tipo_venta', '-fecha', '-id'], name='factura_org_tipo_fecha_idx'),
+        ]
 
-    def calcular_totales(self):
-        """Calcula y actualiza todos los totales basados en los detalles"""
-        detalles = self.detalles.all()
-        
+    @property
+    def currency_code(self):
+        return self.moneda_codigo or getattr(settings, 'DEFAULT_CURRENCY', 'USD')
+
+    @property
+    def currency_symbol(self):
+        if self.moneda_mixta:
+            return ''
+        return self.moneda_simbolo or self.currency_code
+
+    @property
+    def currency_mixed(self):
+        return self.moneda_mixta
+
+    def aplicar_resumen_moneda(self, detalles):
+        """Calcula en memoria el resumen de moneda (única o mezcla) a partir de `detalles`"""
+        monedas = [d.moneda for d in detalles if d.moneda_id]
+        codigos = {m.codigo for m in monedas}
+        if len(codigos) == 1:
+            self.moneda_codigo = codigos.pop()
+            # preferir símbolo si existe, sino usar el código
+            self.moneda_simbolo = next((m.simbolo for m in monedas if m.simbolo), '')
+            self.moneda_mixta = False
+        elif len(codigos) > 1:
+            self.moneda_codigo = 'MULTI'
+            self.moneda_simbolo = ''
+            self.moneda_mixta = True
+        else:
+            self.moneda_codigo = ''
+            self.moneda_simbolo = ''
+            self.moneda_mixta = False
+
+    def aplicar_totales(self, detalles):
+        """Calcula subtotal, IVA, total y resumen de moneda en memoria a partir de `detalles` (no escribe en BD)"""
         # Calcular subtotal e IVA correctamente
-        subtotal = sum(detalle.subtotal for detalle in detalles)
+        subtotal = sum((detalle.subtotal for detalle in detalles), Decimal('0.00'))
         
-        # Calcular IVA solo para productos que lo tienen
-        iva_total = sum(
-            detalle.subtotal * Decimal('0.15') 
-            for detalle in detalles 
-            if detalle.iva
-        )
+        # IVA ya calculado y redondeado por línea (ver DetalleFactura.aplicar_iva)
+        iva_total = sum((detalle.iva_monto for detalle in detalles), Decimal('0.00'))
         
         # Aplicar descuento (no puede hacer el subtotal negativo)
         subtotal_con_descuento = max(Decimal('0.00'), subtotal - self.descuento)
         
-        # Calcular total final
-        total_final = subtotal_con_descuento + iva_total
-        
         # Actualizar los campos
         self.subtotal = subtotal
         self.iva_total = iva_total
-        self.total = total_final
+        self.total = subtotal_con_descuento + iva_total
+        self.aplicar_resumen_moneda(detalles)
+
+    def calcular_totales(self):
+        """Calcula y actualiza todos los totales basados en los detalles"""
+        self.aplicar_totales(list(self.detalles.select_related('moneda')))
         
         # Evitar recursión usando update()
         Factura.objects.filter(id=self.id).update(
             subtotal=self.subtotal,
             iva_total=self.iva_total,
             total=self.total,
+            moneda_codigo=self.moneda_codigo,
+            moneda_simbolo=self.moneda_simbolo,
+            moneda_mixta=self.moneda_mixta,
             actualizada_en=timezone.now()
         )
 
@@ -76,13 +132,29 @@ class Factura(models.Model):
             raise ValidationError({'descuento': 'El descuento no puede ser mayor al subtotal'})
 
     def save(self, *args, **kwargs):
-        """Sobrescribir save para asegurar cálculos"""
+        """Sobrescribir save para asegurar cálculos y asignar el número fiscal"""
         self.clean()
+        if self._state.adding and self.numero is None:
+            # El número se reserva en la misma transacción que el INSERT:
+            # si algo falla el número se libera y la secuencia no deja huecos
+            try:
+                with transaction.atomic():
+                    self.numero = SecuenciaFactura.siguiente(self.organizacion_id)
+                    super().save(*args, **kwargs)
+            except Exception:
+                self.numero = None
+                raise
+            return
         super().save(*args, **kwargs)
         # No calcular totales aquí para evitar loops
 
+    @property
+    def numero_visible(self):
+        """Número fiscal; las facturas sin numerar muestran su id"""
+        return self.numero if self.numero is not None else self.id
+
     def __str__(self):
-        return f"Factura #{self.id} - ${self.total:.2f}"
+        return f"Factura #{self.numero_visible} - ${self.total:.2f}"
 
 class DetalleFactura(models.Model):
     factura = models.ForeignKey(Factura, related_name='detalles', on_delete=models.CASCADE)
@@ -93,6 +165,11 @@ class DetalleFactura(models.Model):
     # Permitir null/blank temporalmente para evitar prompt en migraciones existentes.
     moneda = models.ForeignKey('productos.Moneda', on_delete=models.PROTECT, null=True, blank=True)
     iva = models.BooleanField(default=True)
+    # Impuesto de la línea fijado al confirmar la venta con la tasa vigente de
+    # la organización: las vistas, el PDF y los reportes solo leen estos campos.
+    tasa_iva = models.DecimalField(max_digits=5, decimal_places=2, default=0, editable=False, help_text="Porcentaje de IVA aplicado (0 si la línea está exenta)")
+    iva_monto = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    total_con_iva = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
 
     class Meta:
         verbose_name = "Detalle de Factura"
@@ -102,6 +179,14 @@ class DetalleFactura(models.Model):
         """Calcula el subtotal del detalle"""
         return Decimal(self.cantidad) * self.precio_unitario
 
+    def aplicar_iva(self, porcentaje):
+        """Calcula en memoria el IVA y el total de la línea con la tasa `porcentaje` (en %)"""
+        from .impuestos import calcular
+
+        self.tasa_iva = porcentaje if self.iva else Decimal('0.00')
+        self.iva_monto = calcular(self.subtotal, self.tasa_iva)
+        self.total_con_iva = self.subtotal + self.iva_monto
+
     def save(self, *args, **kwargs):
         """Asigna moneda por defecto desde el producto (si falta), calcula subtotal y guarda.
 
@@ -122,6 +207,14 @@ class DetalleFactura(models.Model):
             # En caso de valores no válidos, asegurar que subtotal sea 0
             self.subtotal = Decimal('0.00')
 
+        # Las líneas nuevas toman la tasa vigente; las existentes conservan la suya
+        if self._state.adding or (self.iva and not self.tasa_iva):
+            from .impuestos import porcentaje
+            tasa = porcentaje(self.factura.organizacion_id)
+        else:
+            tasa = self.tasa_iva
+        self.aplicar_iva(tasa)
+
         super().save(*args, **kwargs)
 
         # Actualizar totales de la factura después de guardar
@@ -149,11 +242,7 @@ class DetalleFactura(models.Model):
         return f"{self.cantidad} x {self.producto.nombre} - ${self.subtotal:.2f}"
     
     # Campos para pagos con tarjeta
-    metodo_pago = models.CharField(max_length=20, default='efectivo', choices=[
-        ('efectivo', 'Efectivo'),
-        ('tarjeta', 'Tarjeta'),
-        ('transferencia', 'Transferencia')
-    ])
+    metodo_pago = models.CharField(max_length=20, default='efectivo', choices=METODO_PAGO_CHOICES)
     id_transaccion = models.CharField(max_length=100, blank=True, null=True)
     ultimos_digitos = models.CharField(max_length=4, blank=True, null=True)
     tipo_tarjeta = models.CharField(max_length=20, blank=True, null=True)
@@ -163,4 +252,471 @@ class DetalleFactura(models.Model):
         ('fallido', 'Fallido')
     ])
     
-    # Nota: la propiedad subtotal se manejaba por campo y por property; se eliminó la property
\ No newline at end of file
+    # Nota: la propiedad subtotal se manejaba por campo y por property; se eliminó la property
+
+class DocumentoBusquedaFactura(models.Model):
+    """Texto de búsqueda de una factura: número, cliente (nombre, NIT, cédula) y productos.
+
+    Lo escribe `facturas.busqueda`; el índice de texto completo (FTS5 o
+    tsvector + GIN) se crea en la migración según el motor.
+    """
+    factura = models.OneToOneField(Factura, on_delete=models.CASCADE, primary_key=True, related_name='documento_busqueda')
+    organizacion = models.ForeignKey('organizaciones.Organizacion', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    texto = models.TextField()
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Documento de búsqueda de factura"
+        verbose_name_plural = "Documentos de búsqueda de facturas"
+
+    def __str__(self):
+        return f"Factura {self.factura_id}: {self.texto[:50]}"
+
+
+class TasaImpuesto(models.Model):
+    """Tasa de un impuesto por organización; la fila sin organización es la general.
+
+    Se lee a través de `facturas.impuestos.porcentaje`, que la guarda en caché.
+    """
+    organizacion = models.ForeignKey('organizaciones.Organizacion', on_delete=models.CASCADE, null=True, blank=True, related_name='tasas_impuesto')
+    nombre = models.CharField(max_length=20, default='IVA')
+    porcentaje = models.DecimalField(max_digits=5, decimal_places=2)
+    actualizada_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Tasa de impuesto"
+        verbose_name_plural = "Tasas de impuesto"
+        constraints = [
+            models.UniqueConstraint(fields=['organizacion', 'nombre'], condition=models.Q(organizacion__isnull=False),
+                                    name='tasaimpuesto_org_nombre_uniq'),
+            models.UniqueConstraint(fields=['nombre'], condition=models.Q(organizacion__isnull=True),
+                                    name='tasaimpuesto_general_uniq'),
+            models.CheckConstraint(condition=models.Q(porcentaje__gte=0, porcentaje__lte=100),
+                                   name='tasaimpuesto_porcentaje_rango'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} {self.porcentaje}% ({self.organizacion or 'general'})"
+
+
+class TrabajoPDF(models.Model):
+    """Cola de pre-renderizado de PDFs de facturas.
+
+    Se encola un trabajo al confirmar la factura y lo consume el comando
+    `python manage.py prerender_pdfs`, que deja el PDF en la caché de disco.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('listo', 'Listo'),
+        ('error', 'Error'),
+    ]
+
+    factura = models.ForeignKey(Factura, on_delete=models.CASCADE, related_name='trabajos_pdf')
+    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    reclamado_por = models.CharField(max_length=64, blank=True, default='')
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+    duracion_ms = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        verbose_name = "Trabajo de PDF"
+        verbose_name_plural = "Trabajos de PDF"
+        indexes = [
+            models.Index(fields=['estado', 'creado_en'], name='trabajopdf_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"PDF factura #{self.factura_id} ({self.estado})"
+
+
+class SecuenciaFactura(models.Model):
+    """Último número de factura asignado en cada organización.
+
+    `siguiente` incrementa la fila con un UPDATE, que la bloquea hasta el
+    commit de la transacción de la factura: dos workers de gunicorn nunca
+    obtienen el mismo número y el costo no depende de cuántas facturas haya.
+    """
+    organizacion = models.OneToOneField('organizaciones.Organizacion', on_delete=models.CASCADE, null=True, blank=True, related_name='secuencia_factura')
+    ultimo_numero = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Secuencia de facturas"
+        verbose_name_plural = "Secuencias de facturas"
+        constraints = [
+            # El OneToOne no impide dos filas con organización NULL: el índice parcial sobre
+            # COALESCE(organizacion, 0) deja una sola secuencia para las facturas sin organización
+            models.UniqueConstraint(Coalesce('organizacion', Value(0)), condition=models.Q(organizacion__isnull=True),
+                                    name='secuencia_factura_sin_org_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.organizacion or 'Sin organización'}: {self.ultimo_numero}"
+
+    @classmethod
+    def _crear(cls, organizacion_id):
+        # Primera factura de la organización: continuar desde el mayor número existente
+        inicial = Factura.objects.filter(organizacion_id=organizacion_id).aggregate(m=Max('numero'))['m'] or 0
+        try:
+            with transaction.atomic():
+                cls.objects.create(organizacion_id=organizacion_id, ultimo_numero=inicial)
+        except IntegrityError:
+            pass  # otro proceso la creó al mismo tiempo
+
+    @classmethod
+    def siguiente(cls, organizacion_id):
+        """Reserva y devuelve el siguiente número de la organización (usar dentro de una transacción)"""
+        secuencia = cls.objects.filter(organizacion_id=organizacion_id)
+        with transaction.atomic():
+            if not secuencia.update(ultimo_numero=F('ultimo_numero') + 1):
+                cls._crear(organizacion_id)
+                secuencia.update(ultimo_numero=F('ultimo_numero') + 1)
+            return secuencia.values_list('ultimo_numero', flat=True).get()
+
+    @classmethod
+    def proximo(cls, organizacion_id):
+        """Número que recibiría la próxima factura, sin reservarlo (solo informativo)"""
+        ultimo = cls.objects.filter(organizacion_id=organizacion_id).values_list('ultimo_numero', flat=True).first()
+        if ultimo is None:
+            ultimo = Factura.objects.filter(organizacion_id=organizacion_id).aggregate(m=Max('numero'))['m'] or 0
+        return ultimo + 1
+
+
+class ClaveIdempotencia(models.Model):
+    """Ventas ya sincronizadas desde terminales POS, por clave generada en la terminal.
+
+    Si una terminal reenvía una venta (p. ej. tras perder conexión) se
+    responde con `respuesta` sin volver a crear la factura.
+    """
+    organizacion = models.ForeignKey('organizaciones.Organizacion', on_delete=models.CASCADE, null=True, blank=True, related_name='claves_idempotencia')
+    clave = models.CharField(max_length=64)
+    factura = models.ForeignKey(Factura, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    respuesta = models.JSONField(default=dict)
+    creada_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Clave de idempotencia"
+        verbose_name_plural = "Claves de idempotencia"
+        constraints = [
+            models.UniqueConstraint(fields=['organizacion', 'clave'], name='clave_idempotencia_org_uniq'),
+            # NULL no se compara igual a NULL: sin organización la unicidad necesita su propio índice parcial
+            models.UniqueConstraint(fields=['clave'], condition=models.Q(organizacion__isnull=True),
+                                    name='clave_idempotencia_sin_org_uniq'),
+        ]
+
+    def __str__(self):
+        return self.clave
+
+
+class EventoStripe(models.Model):
+    """Bandeja de entrada de webhooks de Stripe.
+
+    `webhook_stripe` solo verifica la firma y guarda el evento (el id de
+    Stripe es único, así los reintentos no se registran dos veces). El
+    comando `procesar_eventos_stripe` los aplica por lotes.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesado', 'Procesado'),
+        ('ignorado', 'Ignorado'),
+        ('error', 'Error'),
+    ]
+
+    evento_id = models.CharField(max_length=255, unique=True)
+    tipo = models.CharField(max_length=100)
+    datos = models.JSONField(default=dict, help_text="Objeto del evento (data.object)")
+    creado_stripe = models.DateTimeField(null=True, blank=True)
+    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES, default='pendiente')
+    error = models.TextField(blank=True, default='')
+    recibido_en = models.DateTimeField(auto_now_add=True)
+    procesado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Evento de Stripe"
+        verbose_name_plural = "Eventos de Stripe"
+        indexes = [
+            models.Index(fields=['estado', 'recibido_en'], name='eventostripe_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} ({self.evento_id})"
+
+
+class ResumenVentaDiaria(models.Model):
+    """Totales de ventas por organización, día, moneda, cajero y tipo de venta.
+
+    `registrar` suma cada factura a su fila dentro de la misma transacción en
+    que se confirma (y la resta al anularla), con un UPDATE de incremento
+    (como `SecuenciaFactura`).
+    Los paneles leen unas pocas filas por mes en lugar de agregar todas las
+    facturas. `reconstruir` recalcula un rango de días desde `Factura`
+    (comando `reconstruir_resumen_ventas`).
+    """
+    organizacion = models.ForeignKey('organizaciones.Organizacion', on_delete=models.CASCADE, null=True, blank=True, related_name='resumenes_venta')
+    dia = models.DateField()
+    moneda_codigo = models.CharField(max_length=10, blank=True, default='')
+    usuario = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='resumenes_venta')
+    tipo_venta = models.CharField(max_length=10, choices=Factura.TIPO_VENTA_CHOICES)
+    facturas = models.IntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    iva_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    descuento = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    CAMPOS_SUMA = ('subtotal', 'iva_total', 'descuento', 'total')
+
+    class Meta:
+        verbose_name = "Resumen de ventas diario"
+        verbose_name_plural = "Resúmenes de ventas diarios"
+        constraints = [
+            models.UniqueConstraint(fields=['organizacion', 'dia', 'moneda_codigo', 'usuario', 'tipo_venta'],
+                                    name='resumenventa_clave_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.dia} {self.moneda_codigo} {self.tipo_venta}: {self.total}"
+
+    @staticmethod
+    def dia_de(fecha):
+        """Día local (TIME_ZONE) de la venta"""
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+        return timezone.localdate(fecha)
+
+    @classmethod
+    def registrar(cls, factura, signo=1):
+        """Suma (`signo=1`) o resta (`signo=-1`) la factura en su fila (usar dentro de su transacción)"""
+        clave = {
+            'organizacion_id': factura.organizacion_id,
+            'dia': cls.dia_de(factura.fecha),
+            'moneda_codigo': factura.moneda_codigo,
+            'usuario_id': factura.usuario_id,
+            'tipo_venta': factura.tipo_venta,
+        }
+        valores = {campo: signo * (getattr(factura, campo) or 0) for campo in cls.CAMPOS_SUMA}
+        incremento = {campo: F(campo) + valor for campo, valor in valores.items()}
+        incremento['facturas'] = F('facturas') + signo
+        fila = cls.objects.filter(**clave)
+        with transaction.atomic():
+            if fila.update(**incremento):
+                return
+            try:
+                with transaction.atomic():
+                    cls.objects.create(**clave, facturas=signo, **valores)
+            except IntegrityError:
+                fila.update(**incremento)  # otro proceso creó la fila al mismo tiempo
+
+    @classmethod
+    def reconstruir(cls, desde, hasta, organizacion=None):
+        """Recalcula los días `desde`..`hasta` (inclusive) a partir de las facturas. Devuelve las filas creadas.
+
+        Incluye las facturas archivadas: un día puede tener parte de sus
+        ventas ya archivadas y parte todavía en `Factura`.
+        """
+        resumenes = cls.objects.filter(dia__gte=desde, dia__lte=hasta)
+        if organizacion is not None:
+            resumenes = resumenes.filter(organizacion=organizacion)
+        filas = {}
+        for modelo in (Factura, FacturaArchivada):
+            facturas = modelo.objects.filter(fecha__date__gte=desde, fecha__date__lte=hasta, anulada=False)
+            if organizacion is not None:
+                facturas = facturas.filter(organizacion=organizacion)
+            for fila in (
+                facturas.values('organizacion_id', 'moneda_codigo', 'usuario_id', 'tipo_venta', dia_local=TruncDate('fecha'))
+                .annotate(n=Count('id'), **{f'suma_{campo}': Sum(campo) for campo in cls.CAMPOS_SUMA})
+                .order_by()
+            ):
+                clave = (fila['organizacion_id'], fila['moneda_codigo'], fila['usuario_id'], fila['tipo_venta'], fila['dia_local'])
+                if clave in filas:
+                    for campo in ['n'] + [f'suma_{campo}' for campo in cls.CAMPOS_SUMA]:
+                        filas[clave][campo] = (filas[clave][campo] or 0) + (fila[campo] or 0)
+                else:
+                    filas[clave] = fila
+        with transaction.atomic():
+            resumenes.delete()
+            nuevos = cls.objects.bulk_create([
+                cls(
+                    organizacion_id=fila['organizacion_id'],
+                    dia=fila['dia_local'],
+                    moneda_codigo=fila['moneda_codigo'],
+                    usuario_id=fila['usuario_id'],
+                    tipo_venta=fila['tipo_venta'],
+                    facturas=fila['n'],
+                    **{campo: fila[f'suma_{campo}'] or 0 for campo in cls.CAMPOS_SUMA},
+                )
+                for fila in filas.values()
+            ], batch_size=1000)
+        return len(nuevos)
+
+    @classmethod
+    def totales(cls, organizacion, desde, hasta=None):
+        """Cantidad de facturas y sumas del período, agregando las filas del resumen"""
+        filas = cls.objects.filter(dia__gte=desde)
+        if hasta is not None:
+            filas = filas.filter(dia__lte=hasta)
+        if organizacion is not None:
+            filas = filas.filter(organizacion=organizacion)
+        totales = filas.aggregate(facturas=Sum('facturas'), **{campo: Sum(campo) for campo in cls.CAMPOS_SUMA})
+        return {campo: valor or 0 for campo, valor in totales.items()}
+
+
+class VentaProductoDiaria(models.Model):
+    """Unidades e ingresos (subtotal sin IVA) por organización, día, producto y moneda.
+
+    Se alimenta de las líneas de las facturas en `AgregadoPendiente` (ver
+    `facturas.ventas_producto`), así el reporte de
+    productos recorre días × productos vendidos y no todas las líneas.
+    """
+    organizacion = models.ForeignKey('organizaciones.Organizacion', on_delete=models.CASCADE, null=True, blank=True, related_name='ventas_producto')
+    dia = models.DateField()
+    # Borrar un producto no borra el historial: sus filas quedan como 'Sin asignar'
+    producto = models.ForeignKey('productos.Producto', on_delete=models.SET_NULL, null=True, blank=True, related_name='ventas_diarias')
+    moneda_codigo = models.CharField(max_length=10, blank=True, default='')
+    unidades = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Venta diaria de producto"
+        verbose_name_plural = "Ventas diarias de productos"
+        constraints = [
+            models.UniqueConstraint(fields=['organizacion', 'dia', 'producto', 'moneda_codigo'],
+                                    name='ventaproducto_clave_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['organizacion', 'dia'], name='ventaproducto_org_dia_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.dia} {self.producto_id}: {self.unidades} u."
+
+
+class AgregadoPendiente(models.Model):
+    """Factura confirmada cuyas líneas aún no se sumaron a `VentaProductoDiaria`.
+
+    `confirmar_factura` la inserta en la misma transacción que la factura,
+    así solo es visible cuando la factura está confirmada, sin importar el
+    orden de los ids ni cuánto tarde la transacción.
+    """
+    factura = models.OneToOneField(Factura, on_delete=models.CASCADE, primary_key=True, related_name='agregado_pendiente')
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Agregado pendiente"
+        verbose_name_plural = "Agregados pendientes"
+
+    def __str__(self):
+        return f"Factura {self.factura_id}"
+
+
+class TurnoCaja(models.Model):
+    """Turno de caja de un cajero: se abre con el fondo inicial y se cierra con el efectivo contado.
+
+    Las facturas confirmadas con el turno abierto quedan ligadas a él
+    (`Factura.turno`). Al cerrar se guarda en `resumen` el cierre calculado
+    por `facturas.caja.resumen_turno`.
+    """
+    organizacion = models.ForeignKey('organizaciones.Organizacion', on_delete=models.CASCADE, null=True, blank=True, related_name='turnos_caja')
+    usuario = models.ForeignKey('auth.User', on_delete=models.PROTECT, related_name='turnos_caja')
+    abierto_en = models.DateTimeField(default=timezone.now)
+    cerrado_en = models.DateTimeField(null=True, blank=True)
+    monto_inicial = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    efectivo_contado = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    resumen = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        verbose_name = "Turno de caja"
+        verbose_name_plural = "Turnos de caja"
+        ordering = ['-abierto_en']
+        constraints = [
+            # Un solo turno abierto por cajero y organización
+            models.UniqueConstraint(fields=['organizacion', 'usuario'], condition=models.Q(cerrado_en__isnull=True),
+                                    name='turnocaja_abierto_uniq'),
+        ]
+
+    @property
+    def abierto(self):
+        return self.cerrado_en is None
+
+    def __str__(self):
+        return f"Turno de {self.usuario} ({timezone.localtime(self.abierto_en):%Y-%m-%d %H:%M})"
+
+
+class FacturaArchivada(models.Model):
+    """Factura de un período cerrado, movida fuera de `Factura` por `facturas.archivo`.
+
+    Tiene las mismas columnas y conserva el id original, así que las URLs
+    de la factura siguen sirviendo. Es de solo lectura.
+    """
+    archivada = True
+
+    id = models.BigIntegerField(primary_key=True)
+    fecha = models.DateTimeField()
+    organizacion = models.ForeignKey('organizaciones.Organizacion', on_delete=models.CASCADE, null=True, blank=True, related_name='facturas_archivadas')
+    cliente = models.ForeignKey('clientes.Cliente', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    usuario = models.ForeignKey('auth.User', on_delete=models.PROTECT, related_name='+')
+    tipo_venta = models.CharField(max_length=10, choices=Factura.TIPO_VENTA_CHOICES, default='contado')
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    descuento = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    iva_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    pagada = models.BooleanField(default=False)
+    creada_en = models.DateTimeField()
+    actualizada_en = models.DateTimeField()
+    monto_recibido = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    vuelto = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    moneda_codigo = models.CharField(max_length=10, blank=True, default='')
+    moneda_simbolo = models.CharField(max_length=5, blank=True, default='')
+    moneda_mixta = models.BooleanField(default=False)
+    numero = models.PositiveBigIntegerField(null=True, blank=True)
+    metodo_pago = models.CharField(max_length=20, choices=METODO_PAGO_CHOICES, default='efectivo')
+    turno = models.ForeignKey(TurnoCaja, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    anulada = models.BooleanField(default=False)
+    anulada_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Factura archivada"
+        verbose_name_plural = "Facturas archivadas"
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['organizacion', 'numero'], name='facturaarchivada_org_numero_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['organizacion', '-fecha', '-id'], name='facturaarch_org_fecha_idx'),
+        ]
+
+    # Misma presentación que una factura vigente (plantillas y PDF)
+    currency_code = Factura.currency_code
+    currency_symbol = Factura.currency_symbol
+    currency_mixed = Factura.currency_mixed
+    numero_visible = Factura.numero_visible
+    __str__ = Factura.__str__
+
+
+class DetalleFacturaArchivado(models.Model):
+    """Línea de una `FacturaArchivada`, con las columnas y el id de `DetalleFactura`"""
+    id = models.BigIntegerField(primary_key=True)
+    factura = models.ForeignKey(FacturaArchivada, related_name='detalles', on_delete=models.CASCADE)
+    producto = models.ForeignKey('productos.Producto', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    cantidad = models.PositiveIntegerField(default=1)
+    precio_unitario = models.DecimalField(max_digits=12, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    moneda = models.ForeignKey('productos.Moneda', on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    iva = models.BooleanField(default=True)
+    tasa_iva = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    iva_monto = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_con_iva = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    metodo_pago = models.CharField(max_length=20, default='efectivo', choices=METODO_PAGO_CHOICES)
+    id_transaccion = models.CharField(max_length=100, blank=True, null=True)
+    ultimos_digitos = models.CharField(max_length=4, blank=True, null=True)
+    tipo_tarjeta = models.CharField(max_length=20, blank=True, null=True)
+    estado_pago = models.CharField(max_length=20, default='pendiente')
+
+    class Meta:
+        verbose_name = "Detalle de factura archivado"
+        verbose_name_plural = "Detalles de facturas archivados"
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id} - ${self.subtotal:.2f}"
@@ -0,0 +1,89 @@
+# facturas/paginacion.py
+"""Paginación por cursor (keyset) para listados de facturas.
+
+En lugar de OFFSET/COUNT(*) se filtra por la posición de la última fila
+vista sobre (fecha, id), que está cubierta por el índice compuesto
+(organizacion, fecha, id). Por eso la página 5000 cuesta lo mismo que la
+primera.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+TAMANO_PAGINA = 50
+
+
+def codificar_cursor(factura):
+    valor = f'{factura.fecha.isoformat()}|{factura.pk}'
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha, id) o None si el cursor no es válido."""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha, pk = base64.urlsafe_b64decode(cursor + relleno).decode().split('|', 1)
+        return datetime.fromisoformat(fecha), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class PaginaKeyset:
+    def __init__(self, items, siguiente=None, anterior=None):
+        self.items = items
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def tiene_siguiente(self):
+        return self.siguiente is not None
+
+    @property
+    def tiene_anterior(self):
+        return self.anterior is not None
+
+
+def paginar_facturas(queryset, despues=None, antes=None, tamano=TAMANO_PAGINA):
+    """Devuelve una `PaginaKeyset` de `queryset` ordenado por fecha e id descendentes.
+
+    `despues` / `antes` son cursores opacos devueltos en `siguiente` / `anterior`
+    de una página previa. Solo se lee `tamano + 1` filas para saber si hay más.
+    """
+    posicion_despues = decodificar_cursor(despues)
+    posicion_antes = None if posicion_despues else decodificar_cursor(antes)
+
+    if posicion_antes:
+        fecha, pk = posicion_antes
+        filas = list(
+            queryset.filter(Q(fecha__gt=fecha) | Q(fecha=fecha, id__gt=pk))
+            .order_by('fecha', 'id')[:tamano + 1]
+        )
+        hay_mas = len(filas) > tamano
+        items = list(reversed(filas[:tamano]))
+        return PaginaKeyset(
+            items,
+            siguiente=codificar_cursor(items[-1]) if items else None,
+            anterior=codificar_cursor(items[0]) if items and hay_mas else None,
+        )
+
+    queryset = queryset.order_by('-fecha', '-id')
+    if posicion_despues:
+        fecha, pk = posicion_despues
+        queryset = queryset.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=pk))
+    filas = list(queryset[:tamano + 1])
+    items = filas[:tamano]
+    return PaginaKeyset(
+        items,
+        siguiente=codificar_cursor(items[-1]) if len(filas) > tamano else None,
+        # Si llegamos con un cursor hay páginas anteriores
+        anterior=codificar_cursor(items[0]) if items and posicion_despues else None,
+    )
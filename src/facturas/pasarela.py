@@ -0,0 +1,191 @@
+# facturas/pasarela.py
+"""Cliente de Stripe compartido por el proceso, con límites de tiempo.
+
+Las vistas de cobro usan `obtener_pasarela()` en lugar del cliente global de
+la librería. Hay una sola sesión HTTP por proceso, con un pool de
+conexiones, y los tiempos de conexión y lectura son explícitos, así que un
+Stripe lento no deja al worker de gunicorn esperando 80 segundos.
+
+Los fallos de red y los 5xx se reintentan con backoff exponencial y jitter.
+Todos los intentos de una misma operación usan la misma clave de
+idempotencia, de modo que un reintento nunca crea dos cobros. Si los fallos
+se acumulan, el `Circuito` se abre y las llamadas fallan al instante con
+`PasarelaNoDisponible` hasta que pase la espera configurada.
+"""
+import random
+import threading
+import time
+import uuid
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class PasarelaNoDisponible(Exception):
+    """Stripe no responde o el circuito está abierto; el cobro no se intentó o no terminó."""
+
+
+class Circuito:
+    """Circuit breaker: se abre tras `umbral` fallos seguidos y prueba de nuevo pasada `espera`.
+
+    Mientras está abierto rechaza las llamadas sin tocar la red. Pasada la
+    espera deja pasar una sola llamada de prueba (semiabierto). Si esa
+    llamada sale bien el circuito se cierra; si falla, vuelve a abrirse.
+    """
+
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, umbral=5, espera=30.0, reloj=time.monotonic):
+        self.umbral = umbral
+        self.espera = espera
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self._fallos = 0
+        self._abierto_desde = None
+        self._probando = False
+
+    @property
+    def estado(self):
+        with self._lock:
+            return self._estado()
+
+    def _estado(self):
+        if self._abierto_desde is None:
+            return self.CERRADO
+        if self._reloj() - self._abierto_desde >= self.espera:
+            return self.SEMIABIERTO
+        return self.ABIERTO
+
+    def permitir(self):
+        """True si la llamada puede salir; en semiabierto solo sale una a la vez."""
+        with self._lock:
+            estado = self._estado()
+            if estado == self.CERRADO:
+                return True
+            if estado == self.SEMIABIERTO and not self._probando:
+                self._probando = True
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            self._fallos = 0
+            self._abierto_desde = None
+            self._probando = False
+
+    def fallo(self):
+        with self._lock:
+            self._fallos += 1
+            if self._probando or self._fallos >= self.umbral:
+                self._abierto_desde = self._reloj()
+            self._probando = False
+
+
+def _reintentable(error):
+    """Errores transitorios: red, timeouts, 429 y 5xx. Los 4xx (tarjeta, parámetros) no se repiten."""
+    if isinstance(error, (stripe.APIConnectionError, stripe.RateLimitError)):
+        return True
+    return isinstance(error, stripe.APIError) and (error.http_status is None or error.http_status >= 500)
+
+
+class PasarelaStripe:
+    """Cliente de Stripe con sesión HTTP compartida, timeouts, reintentos y circuit breaker."""
+
+    def __init__(self, api_key, api_base=None, timeout_conexion=3.0, timeout_lectura=10.0,
+                 reintentos=2, espera_base=0.25, espera_max=2.0, tamano_pool=10, circuito=None):
+        sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamano_pool, max_retries=0)
+        sesion.mount('https://', adaptador)
+        sesion.mount('http://', adaptador)
+        self.sesion = sesion
+        self.cliente = stripe.StripeClient(
+            api_key,
+            base_addresses={'api': api_base} if api_base else {},
+            # Los reintentos los maneja `_llamar` para contarlos en el circuito
+            max_network_retries=0,
+            http_client=stripe.RequestsClient(timeout=(timeout_conexion, timeout_lectura), session=sesion),
+        )
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self.circuito = circuito or Circuito()
+
+    def _espera(self, intento):
+        # Full jitter: evita que todas las cajas reintenten al mismo tiempo
+        return random.uniform(0, min(self.espera_max, self.espera_base * (2 ** intento)))
+
+    def _llamar(self, operacion, clave_idempotencia):
+        ultimo_error = None
+        for intento in range(self.reintentos + 1):
+            if not self.circuito.permitir():
+                raise PasarelaNoDisponible('Stripe no está disponible, intente de nuevo en unos segundos') from ultimo_error
+            try:
+                resultado = operacion({'idempotency_key': clave_idempotencia})
+            except stripe.StripeError as e:
+                if not _reintentable(e):
+                    # Stripe respondió: el servicio funciona aunque rechace la operación
+                    self.circuito.exito()
+                    raise
+                self.circuito.fallo()
+                ultimo_error = e
+                if intento < self.reintentos:
+                    time.sleep(self._espera(intento))
+                continue
+            except Exception:
+                # Error inesperado (p. ej. de la sesión HTTP): cuenta como fallo y libera la llamada de prueba
+                self.circuito.fallo()
+                raise
+            self.circuito.exito()
+            return resultado
+        raise PasarelaNoDisponible('Stripe no respondió a tiempo') from ultimo_error
+
+    def crear_payment_intent(self, monto_centavos, moneda, metadata=None, clave_idempotencia=None):
+        """Crea un PaymentIntent. Sin clave explícita se genera una por llamada (compartida entre reintentos)."""
+        params = {'amount': monto_centavos, 'currency': moneda, 'metadata': metadata or {}}
+        clave = clave_idempotencia or f'pi-{uuid.uuid4().hex}'
+        return self._llamar(lambda opciones: self.cliente.v1.payment_intents.create(params, opciones), clave)
+
+
+_pasarelas = {}
+_lock = threading.Lock()
+
+
+def _configuracion():
+    return (
+        getattr(settings, 'STRIPE_SECRET_KEY', None) or '',
+        getattr(settings, 'STRIPE_API_BASE', None),
+        getattr(settings, 'STRIPE_TIMEOUT_CONEXION', 3.0),
+        getattr(settings, 'STRIPE_TIMEOUT_LECTURA', 10.0),
+        getattr(settings, 'STRIPE_REINTENTOS', 2),
+        getattr(settings, 'STRIPE_CIRCUITO_FALLOS', 5),
+        getattr(settings, 'STRIPE_CIRCUITO_ESPERA', 30.0),
+    )
+
+
+def obtener_pasarela():
+    """Pasarela del proceso, construida la primera vez y reutilizada (sesión y circuito compartidos)."""
+    clave = _configuracion()
+    pasarela = _pasarelas.get(clave)
+    if pasarela is None:
+        with _lock:
+            pasarela = _pasarelas.get(clave)
+            if pasarela is None:
+                api_key, api_base, conexion, lectura, reintentos, fallos, espera = clave
+                pasarela = PasarelaStripe(
+                    api_key, api_base=api_base, timeout_conexion=conexion, timeout_lectura=lectura,
+                    reintentos=reintentos, circuito=Circuito(umbral=fallos, espera=espera),
+                )
+                _pasarelas.clear()
+                _pasarelas[clave] = pasarela
+    return pasarela
+
+
+def limpiar_pasarelas():
+    with _lock:
+        for pasarela in _pasarelas.values():
+            pasarela.sesion.close()
+        _pasarelas.clear()
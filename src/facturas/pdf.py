@@ -0,0 +1,41 @@
+# facturas/pdf.py
+"""Generación del PDF de una factura con ReportLab.
+
+ReportLab se importa de forma perezosa: es una dependencia pesada que solo
+se necesita al generar PDFs y no debe impedir que arranque el proceso. Los
+estilos, el logo y los textos fijos viven en `pdf_layout.FacturaPDFLayout`,
+que se construye una vez por proceso y organización.
+"""
+from django.conf import settings
+
+
+def renderizar_factura_pdf(factura):
+    """Construye el PDF de `factura` y devuelve su contenido en bytes.
+
+    Lanza ImportError si ReportLab no está instalado.
+    """
+    # Las líneas ya traen guardados su tasa, IVA y total (ver DetalleFactura.aplicar_iva)
+    detalles = list(factura.detalles.select_related('producto', 'moneda'))
+
+    # IMPORT PEREZOSO: pdf_layout importa ReportLab
+    # (si no está instalado se propaga ImportError y la vista responde 501)
+    from .pdf_layout import obtener_layout
+
+    # Detectar si la factura tiene monedas mixtas
+    moneda_codigos = set(d.moneda.codigo for d in detalles if getattr(d, 'moneda', None))
+    moneda_simbolos = {d.moneda.codigo: (d.moneda.simbolo or '') for d in detalles if getattr(d, 'moneda', None)}
+    if len(moneda_codigos) == 1:
+        moneda_unica = moneda_codigos.pop()
+        moneda_simbolo = moneda_simbolos.get(moneda_unica, moneda_unica)
+        mixed = False
+    elif len(moneda_codigos) > 1:
+        moneda_unica = None
+        moneda_simbolo = ''
+        mixed = True
+    else:
+        moneda_unica = getattr(settings, 'DEFAULT_CURRENCY', 'USD')
+        moneda_simbolo = moneda_unica
+        mixed = False
+
+    layout = obtener_layout(factura.organizacion)
+    return layout.renderizar(factura, detalles, moneda_unica, moneda_simbolo, mixed)
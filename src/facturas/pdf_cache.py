@@ -0,0 +1,129 @@
+# facturas/pdf_cache.py
+"""Caché en disco de los PDFs de facturas.
+
+Cada PDF se guarda bajo `MEDIA_ROOT/<FACTURA_PDF_CACHE_DIR>/` con un nombre
+que incluye el id de la factura y su `actualizada_en`: cualquier cambio en la
+factura produce una versión nueva y la anterior deja de usarse. Cuando el
+directorio supera `FACTURA_PDF_CACHE_MAX_BYTES` se eliminan los archivos
+usados hace más tiempo (la fecha de modificación se renueva en cada lectura).
+"""
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+from .pdf import renderizar_factura_pdf
+
+logger = logging.getLogger(__name__)
+
+MAX_BYTES_POR_DEFECTO = 200 * 1024 * 1024
+
+
+def directorio():
+    return Path(settings.MEDIA_ROOT) / getattr(settings, 'FACTURA_PDF_CACHE_DIR', 'facturas_pdf')
+
+
+def version(factura):
+    """Identificador de la versión de la factura: id + marca de `actualizada_en`."""
+    return f'{factura.pk}-{int(factura.actualizada_en.timestamp() * 1_000_000)}'
+
+
+def etag(factura):
+    return f'"{version(factura)}"'
+
+
+def ultima_modificacion(factura):
+    """`actualizada_en` como timestamp entero (para Last-Modified)."""
+    return int(factura.actualizada_en.timestamp())
+
+
+def ruta(factura):
+    return directorio() / f'factura_{version(factura)}.pdf'
+
+
+def leer(factura):
+    """Devuelve el PDF cacheado de la versión actual de `factura` o None."""
+    archivo = ruta(factura)
+    try:
+        contenido = archivo.read_bytes()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(archivo)  # marcar como usado recientemente para la expulsión
+    except OSError:
+        pass
+    return contenido
+
+
+def guardar(factura, contenido):
+    """Guarda `contenido` como PDF de la versión actual y elimina versiones viejas."""
+    carpeta = directorio()
+    carpeta.mkdir(parents=True, exist_ok=True)
+    destino = ruta(factura)
+    # Escritura atómica: otro proceso nunca ve un PDF a medio escribir
+    fd, temporal = tempfile.mkstemp(dir=carpeta, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, destino)
+    except BaseException:
+        try:
+            os.unlink(temporal)
+        except OSError:
+            pass
+        raise
+
+    for viejo in carpeta.glob(f'factura_{factura.pk}-*.pdf'):
+        if viejo != destino:
+            try:
+                viejo.unlink()
+            except OSError:
+                pass
+
+    expulsar()
+    return destino
+
+
+def expulsar(max_bytes=None):
+    """Elimina los PDFs usados hace más tiempo hasta quedar por debajo del límite."""
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'FACTURA_PDF_CACHE_MAX_BYTES', MAX_BYTES_POR_DEFECTO)
+    carpeta = directorio()
+    try:
+        entradas = [e for e in os.scandir(carpeta) if e.is_file() and e.name.endswith('.pdf')]
+    except FileNotFoundError:
+        return 0
+    archivos = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entradas]
+    total = sum(tamano for _, tamano, _ in archivos)
+    if total <= max_bytes:
+        return 0
+
+    # Dejar margen para no expulsar en cada escritura
+    objetivo = max_bytes * 0.9
+    eliminados = 0
+    for _, tamano, camino in sorted(archivos):
+        if total <= objetivo:
+            break
+        try:
+            os.unlink(camino)
+        except OSError:
+            continue
+        total -= tamano
+        eliminados += 1
+    return eliminados
+
+
+def obtener_o_renderizar(factura):
+    """PDF de `factura` desde la caché; si no está, se genera y se guarda."""
+    contenido = leer(factura)
+    if contenido is not None:
+        return contenido
+    contenido = renderizar_factura_pdf(factura)
+    try:
+        guardar(factura, contenido)
+    except OSError:
+        # La caché es una optimización: si el disco falla se sirve igual el PDF
+        logger.exception('No se pudo guardar el PDF de la factura %s en caché', factura.pk)
+    return contenido
@@ -0,0 +1,306 @@
+# facturas/pdf_layout.py
+"""Diseño del PDF de factura, construido una vez por proceso y organización.
+
+Este módulo importa ReportLab al cargarse; `facturas/pdf.py` solo lo importa
+cuando hay que generar un PDF, así ReportLab sigue siendo opcional.
+
+`FacturaPDFLayout` guarda todo lo que no depende de la factura: estilos de
+párrafo y de tabla, el logo ya decodificado (`ImageReader`) y los párrafos
+fijos del encabezado y del pie. Por factura solo se construyen la tabla de
+datos del cliente, las líneas, los totales y el QR.
+"""
+import copy
+import os
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.utils.timezone import localtime
+from reportlab.graphics.barcode import qr
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+LOGO_POR_DEFECTO = os.path.join('static', 'img', 'logo-empresa.png')
+TAMANO_LOGO = 80
+DPI_LOGO = 200
+TAMANO_QR = 80
+MARGEN = 1 * cm
+
+
+def _cargar_logo(ruta):
+    """ImageReader del logo reducido a la resolución con la que se imprime.
+
+    ReportLab comprime los píxeles de la imagen en cada documento; el logo
+    original puede tener millones de píxeles para dibujarse en 80x80 puntos.
+    """
+    from PIL import Image as PILImage
+
+    imagen = PILImage.open(ruta)
+    imagen.load()
+    lado = round(TAMANO_LOGO / 72 * DPI_LOGO)
+    imagen.thumbnail((lado, lado))
+    logo = ImageReader(imagen)
+    logo.getRGBData()
+    return logo
+
+
+class FacturaPDFLayout:
+    def __init__(self, ruta_logo=None):
+        self.ancho = letter[0] - 2 * MARGEN
+
+        styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=14, spaceAfter=12, alignment=1)
+        self.company_style = ParagraphStyle('Company', parent=styles['Normal'], fontSize=12, spaceAfter=6, alignment=1, textColor=colors.black)
+        self.info_style = ParagraphStyle('Info', parent=styles['Normal'], fontSize=9, spaceAfter=3, textColor=colors.black)
+        self.footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=7, spaceAfter=3, textColor=colors.black, alignment=0)
+
+        self.info_table_style = TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ])
+        self.product_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('ALIGN', (0, 1), (0, -1), 'CENTER'),
+            ('ALIGN', (2, 1), (2, -1), 'CENTER'),
+            ('ALIGN', (3, 1), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+        self.total_table_style = TableStyle([
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTNAME', (0, 2), (1, 2), 'Helvetica-Bold'),
+            ('LINEABOVE', (0, 2), (1, 2), 1, colors.black),
+            ('FONTSIZE', (0, 2), (1, 2), 11),
+        ])
+        self.tax_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('ALIGN', (1, 1), (-1, 1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+        self.qr_table_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE')
+        ])
+        self.product_col_widths = [self.ancho * 0.05, self.ancho * 0.55, self.ancho * 0.10, self.ancho * 0.15, self.ancho * 0.15]
+
+        # Logo leído, decodificado y reducido una sola vez; se dibuja en el lienzo de la primera página
+        self.logo = None
+        if ruta_logo and os.path.exists(ruta_logo):
+            try:
+                self.logo = _cargar_logo(ruta_logo)
+            except Exception as e:
+                print(f"Error cargando logo: {e}")
+                self.logo = None
+
+        self.encabezado = []
+        if self.logo is not None:
+            # Reserva el espacio que ocupa el logo dibujado en `_dibujar_logo`
+            self.encabezado.append(Spacer(1, TAMANO_LOGO))
+        self.encabezado.extend([
+            Paragraph("GONZALEZ S.A", self.company_style),
+            Paragraph("Nit: 000000000-0", self.info_style),
+            Paragraph("Dolores Carazo", self.info_style),
+            Paragraph("Tel: 85727222", self.info_style),
+            Paragraph("FACTURA ELECTRONICA DE VENTA", self.title_style),
+        ])
+        self.pie = [
+            Spacer(1, 0.5 * cm),
+            Paragraph("Impreso por: GONZALEZ S.A — RUC: 1234567890000", self.footer_style),
+            Paragraph("Autorización de la DGI: No. 18900234 del 2024-01-01", self.footer_style),
+            Paragraph("Esta factura fue generada electrónicamente y tiene validez legal conforme normativa DGI Nicaragua.", self.footer_style),
+        ]
+
+    def _dibujar_logo(self, canvas, doc):
+        if self.logo is None:
+            return
+        x = (doc.pagesize[0] - TAMANO_LOGO) / 2
+        # El marco de SimpleDocTemplate tiene 6pt de relleno superior
+        y = doc.pagesize[1] - doc.topMargin - 6 - TAMANO_LOGO
+        canvas.drawImage(self.logo, x, y, width=TAMANO_LOGO, height=TAMANO_LOGO, mask='auto')
+
+    def _fijos(self, flowables):
+        # Copias superficiales: wrap()/split() guardan estado en el flowable y
+        # el mismo layout se usa desde varios hilos
+        return [copy.copy(f) for f in flowables]
+
+    def renderizar(self, factura, detalles, moneda_unica, moneda_simbolo, mixed):
+        """Devuelve los bytes del PDF; los importes de IVA salen de los campos guardados en `detalles`."""
+        info_style = self.info_style
+        fecha_local = localtime(factura.fecha)
+        cliente = factura.cliente
+        vendedor = factura.usuario.get_full_name() or factura.usuario.username
+
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=MARGEN, leftMargin=MARGEN, topMargin=MARGEN, bottomMargin=MARGEN)
+        elements = self._fijos(self.encabezado)
+
+        # Información de la factura
+        info_data = [
+            [Paragraph(f"<b>No.</b>{factura.numero_visible}", info_style),
+             Paragraph(f"<b>Cliente:</b> {cliente.nombre if cliente else 'Consumidor Final'}", info_style)],
+            [Paragraph(f"<b>Fecha:</b> {fecha_local.strftime('%Y-%m-%d')}", info_style),
+             Paragraph(f"<b>Nit:</b> {cliente.nit if cliente and cliente.nit else 'CF'}", info_style)],
+            [Paragraph(f"<b>Hora:</b> {fecha_local.strftime('%I:%M:%S %p')}", info_style),
+             Paragraph(f"<b>Dirección:</b> {cliente.direccion if cliente and cliente.direccion else '-'}", info_style)],
+            [Paragraph("", info_style),
+             Paragraph(f"<b>Tel:</b> {cliente.telefono if cliente and cliente.telefono else '-'}", info_style)],
+            [Paragraph("", info_style),
+             Paragraph(f"<b>Ciudad:</b> {cliente.ciudad if cliente and cliente.ciudad else '-'}", info_style)],
+        ]
+        info_table = Table(info_data, colWidths=[self.ancho / 2.0] * 2)
+        info_table.setStyle(self.info_table_style)
+        elements.append(info_table)
+
+        # Forma de pago y vendedor
+        elements.append(Spacer(1, 0.2 * cm))
+        elements.append(Paragraph(f"<b>Forma de Pago:</b> {factura.get_tipo_venta_display()}", info_style))
+        elements.append(Paragraph(f"<b>Vendedor:</b> {vendedor}", info_style))
+        elements.append(Spacer(1, 0.3 * cm))
+
+        # Tabla productos
+        product_data = [['Cant', 'Detalle', 'Iva', 'P. Unitario', 'Total']]
+        for detalle in detalles:
+            # usar el símbolo del propio detalle si existe, si no usar el código
+            moneda = detalle.moneda
+            simbolo_det = (moneda.simbolo or moneda.codigo) if moneda else ''
+            product_data.append([
+                str(detalle.cantidad),
+                detalle.producto.nombre,
+                _porcentaje(detalle.tasa_iva),
+                f"{simbolo_det}{detalle.precio_unitario:.2f}",
+                f"{simbolo_det}{detalle.total_con_iva:.2f}"
+            ])
+        product_table = Table(product_data, colWidths=self.product_col_widths, repeatRows=1)
+        product_table.setStyle(self.product_table_style)
+        elements.append(product_table)
+        elements.append(Spacer(1, 0.3 * cm))
+
+        # Totales (con monedas mixtas se muestran sin símbolo)
+        pref = (moneda_simbolo or moneda_unica) if (not mixed and moneda_unica) else ''
+        total_data = [
+            ['Subtotal:', f"{pref}{factura.subtotal:.2f}"],
+            ['Iva:', f"{pref}{factura.iva_total:.2f}"],
+            ['Total:', f"{pref}{factura.total:.2f}"]
+        ]
+        if factura.tipo_venta == 'contado':
+            total_data.extend([
+                ['Recibido:', f"{pref}{factura.monto_recibido:.2f}"],
+                ['Cambio:', f"{pref}{factura.vuelto:.2f}"]
+            ])
+        total_table = Table(total_data, colWidths=[self.ancho / 3.0, self.ancho / 3.0])
+        total_table.setStyle(self.total_table_style)
+        elements.append(total_table)
+        elements.append(Spacer(1, 0.3 * cm))
+
+        # Detalles de impuestos
+        elements.append(Paragraph("<b>DETALLES DE IMPUESTOS</b>", info_style))
+        pref_impuestos = moneda_simbolo if not mixed else ''
+        tax_data = [['% IVA', 'BASE', 'VALOR IVA']]
+        for tasa, (base, iva) in sorted(_por_tasa(detalles).items(), reverse=True):
+            tax_data.append([_porcentaje(tasa), f"{pref_impuestos}{base:.2f}", f"{pref_impuestos}{iva:.2f}"])
+        tax_table = Table(tax_data, colWidths=[self.ancho / 4.0] * 3)
+        tax_table.setStyle(self.tax_table_style)
+        elements.append(tax_table)
+
+        elements.append(Spacer(1, 0.2 * cm))
+        elements.append(Paragraph(f"<b>Cantidad items:</b> {len(detalles)}", info_style))
+
+        # QR centrado con info completa: incluir moneda o nota de mezcla
+        total_display = f"{moneda_simbolo}{factura.total:.2f}" if (not mixed and moneda_simbolo) else f"{factura.total:.2f}"
+        moneda_note = moneda_unica if (not mixed and moneda_unica) else ('MULTI' if mixed else '')
+        qr_text = f"""
+Factura No: {factura.numero_visible}
+Cliente: {cliente.nombre if cliente else 'Consumidor Final'}
+NIT: {cliente.nit if cliente and cliente.nit else 'CF'}
+Total: {total_display} {moneda_note}
+Fecha: {fecha_local.strftime('%Y-%m-%d %H:%M:%S')}
+Vendedor: {vendedor}
+"""
+        qr_code = qr.QrCodeWidget(qr_text)
+        bounds = qr_code.getBounds()
+        w = bounds[2] - bounds[0]
+        h = bounds[3] - bounds[1]
+        d = Drawing(TAMANO_QR, TAMANO_QR, transform=[TAMANO_QR / w, 0, 0, TAMANO_QR / h, 0, 0])
+        d.add(qr_code)
+        qr_table = Table([[d]], colWidths=[self.ancho])
+        qr_table.setStyle(self.qr_table_style)
+        elements.append(Spacer(1, 0.5 * cm))
+        elements.append(qr_table)
+
+        # Pie de página
+        elements.extend(self._fijos(self.pie))
+
+        doc.build(elements, onFirstPage=self._dibujar_logo)
+        return buffer.getvalue()
+
+
+def _porcentaje(tasa):
+    """'15' para 15.00, '7.5' para 7.50"""
+    return f"{tasa.normalize():f}"
+
+
+def _por_tasa(detalles):
+    """{tasa: (base, iva)} sumando los importes guardados en las líneas"""
+    grupos = {}
+    for detalle in detalles:
+        base, iva = grupos.get(detalle.tasa_iva, (0, 0))
+        grupos[detalle.tasa_iva] = (base + detalle.subtotal, iva + detalle.iva_monto)
+    return grupos
+
+
+_layouts = {}
+_lock = threading.Lock()
+
+
+def ruta_logo(organizacion):
+    """Logo de la organización si tiene uno cargado; si no, el logo estático por defecto."""
+    if organizacion is not None and organizacion.logo:
+        try:
+            return organizacion.logo.path
+        except (NotImplementedError, ValueError):
+            pass
+    return os.path.join(settings.BASE_DIR, LOGO_POR_DEFECTO)
+
+
+def obtener_layout(organizacion):
+    """Layout de la organización, construido la primera vez y reutilizado en el proceso.
+
+    La clave incluye la ruta del logo: al subir otro logo se construye uno nuevo.
+    """
+    logo = ruta_logo(organizacion)
+    clave = (organizacion.pk if organizacion is not None else None, logo)
+    layout = _layouts.get(clave)
+    if layout is None:
+        with _lock:
+            layout = _layouts.get(clave)
+            if layout is None:
+                layout = FacturaPDFLayout(logo)
+                # Un solo layout vigente por organización
+                for vieja in [c for c in _layouts if c[0] == clave[0]]:
+                    del _layouts[vieja]
+                _layouts[clave] = layout
+    return layout
+
+
+def limpiar_layouts():
+    with _lock:
+        _layouts.clear()
@@ -0,0 +1,145 @@
+# facturas/prerender.py
+"""Pre-renderizado de PDFs en segundo plano.
+
+`encolar_pdf` registra un `TrabajoPDF` dentro de la misma transacción en la
+que se confirma la factura. El comando `prerender_pdfs` reclama trabajos por
+lotes y los procesa con un pool de hilos o procesos, dejando el PDF en la
+caché de disco (`pdf_cache`). `factura_pdf` sirve ese archivo si ya existe y
+si no, genera el PDF en línea como antes.
+"""
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import pdf_cache
+from .models import Factura, TrabajoPDF
+
+MAX_INTENTOS = 3
+# Trabajos "procesando" más viejos que esto se consideran abandonados (worker caído)
+TIEMPO_ABANDONO = timedelta(minutes=5)
+
+
+def prerender_activo():
+    return getattr(settings, 'FACTURA_PDF_PRERENDER', False)
+
+
+def encolar_pdf(factura):
+    """Encola el pre-renderizado del PDF de `factura` si la función está activa."""
+    if not prerender_activo():
+        return None
+    return TrabajoPDF.objects.create(factura=factura)
+
+
+def reclamar_trabajos(limite):
+    """Marca hasta `limite` trabajos pendientes como 'procesando' y devuelve sus ids.
+
+    Cada llamada usa un token propio en `reclamado_por`, así dos workers que
+    lean los mismos pendientes nunca procesan el mismo trabajo, en cualquier
+    motor de base de datos.
+    """
+    token = uuid.uuid4().hex
+    candidatos = list(
+        TrabajoPDF.objects.filter(estado='pendiente').order_by('creado_en').values_list('id', flat=True)[:limite]
+    )
+    if not candidatos:
+        return []
+    TrabajoPDF.objects.filter(id__in=candidatos, estado='pendiente').update(
+        estado='procesando',
+        reclamado_por=token,
+        iniciado_en=timezone.now(),
+        intentos=F('intentos') + 1,
+    )
+    return list(TrabajoPDF.objects.filter(reclamado_por=token, estado='procesando').values_list('id', flat=True))
+
+
+def liberar_abandonados():
+    """Devuelve a la cola los trabajos que quedaron 'procesando' por un worker caído.
+
+    Los que ya agotaron `MAX_INTENTOS` pasan a 'error': una factura que tumba
+    al worker no se reintenta para siempre. Devuelve cuántos volvieron a la cola.
+    """
+    abandonados = TrabajoPDF.objects.filter(estado='procesando', iniciado_en__lt=timezone.now() - TIEMPO_ABANDONO)
+    abandonados.filter(intentos__gte=MAX_INTENTOS).update(
+        estado='error', error='Worker caído durante el render', terminado_en=timezone.now())
+    return abandonados.filter(intentos__lt=MAX_INTENTOS).update(estado='pendiente')
+
+
+def procesar_trabajo(trabajo_id):
+    """Genera el PDF de un trabajo reclamado y devuelve la duración en ms (None si falló)."""
+    trabajo = TrabajoPDF.objects.filter(id=trabajo_id).only('id', 'factura_id', 'intentos').first()
+    if trabajo is None:
+        return None
+    factura = Factura.objects.select_related('cliente', 'usuario', 'organizacion').filter(id=trabajo.factura_id).first()
+    if factura is None:
+        # La factura se archivó (o borró) después de encolar: el trabajo ya no tiene qué renderizar
+        TrabajoPDF.objects.filter(id=trabajo.id).delete()
+        return None
+    inicio = time.perf_counter()
+    try:
+        if pdf_cache.leer(factura) is None:
+            pdf_cache.guardar(factura, pdf_cache.renderizar_factura_pdf(factura))
+    except Exception as e:
+        estado = 'error' if trabajo.intentos >= MAX_INTENTOS else 'pendiente'
+        TrabajoPDF.objects.filter(id=trabajo.id).update(
+            estado=estado, error=f'{type(e).__name__}: {e}', terminado_en=timezone.now())
+        return None
+    duracion_ms = int((time.perf_counter() - inicio) * 1000)
+    TrabajoPDF.objects.filter(id=trabajo.id).update(
+        estado='listo', duracion_ms=duracion_ms, terminado_en=timezone.now(), error='')
+    return duracion_ms
+
+
+def procesar_en_pool(trabajo_id):
+    """Punto de entrada para hilos/procesos del pool: gestiona la conexión propia del worker."""
+    close_old_connections()
+    try:
+        return procesar_trabajo(trabajo_id)
+    finally:
+        connection.close()
+
+
+def purgar_terminados(dias):
+    limite = timezone.now() - timedelta(days=dias)
+    borrados, _ = TrabajoPDF.objects.filter(estado='listo', terminado_en__lt=limite).delete()
+    return borrados
+
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    indice = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+    return valores[indice]
+
+
+def estadisticas(muestra=500):
+    """Profundidad de la cola y tiempos de renderizado de los últimos `muestra` trabajos."""
+    por_estado = dict.fromkeys(dict(TrabajoPDF.ESTADO_CHOICES), 0)
+    for fila in TrabajoPDF.objects.values('estado').annotate(n=Count('id')).order_by():
+        por_estado[fila['estado']] = fila['n']
+    duraciones = sorted(
+        TrabajoPDF.objects.filter(estado='listo', duracion_ms__isnull=False)
+        .order_by('-terminado_en').values_list('duracion_ms', flat=True)[:muestra]
+    )
+    mas_viejo = (
+        TrabajoPDF.objects.filter(estado='pendiente').order_by('creado_en').values_list('creado_en', flat=True).first()
+    )
+    return {
+        'cola': por_estado['pendiente'],
+        'procesando': por_estado['procesando'],
+        'errores': por_estado['error'],
+        'listos': por_estado['listo'],
+        'espera_max_s': round((timezone.now() - mas_viejo).total_seconds(), 1) if mas_viejo else 0,
+        'render_ms': {
+            'muestra': len(duraciones),
+            'promedio': round(sum(duraciones) / len(duraciones), 1) if duraciones else None,
+            'p50': _percentil(duraciones, 50),
+            'p95': _percentil(duraciones, 95),
+            'max': duraciones[-1] if duraciones else None,
+        },
+    }
+
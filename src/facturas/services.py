@@ -0,0 +1,286 @@
+# facturas/services.py
+"""Servicios de facturación.
+
+`confirmar_factura` valida el carrito completo de una sola vez, inserta las
+líneas con `bulk_create`, calcula los totales en memoria y escribe la
+cabecera de la factura una sola vez. Así el número de consultas no crece
+con el tamaño del ticket como ocurría con `DetalleFactura.objects.create`
+(cada línea disparaba `calcular_totales`, que relee todas las líneas).
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from clientes.models import Cliente
+from productos.models import Producto
+from productos.services import descontar_stock, reponer_stock
+from .forms import FacturaForm
+from .models import AgregadoPendiente, ClaveIdempotencia, Factura, DetalleFactura, ResumenVentaDiaria, TurnoCaja
+from .prerender import encolar_pdf
+from . import busqueda, impuestos, ventas_producto
+
+# Tamaño de lote para los INSERT masivos de líneas
+LOTE_DETALLES = 500
+
+
+def normalizar_lineas(productos_data):
+    """Convierte los datos crudos del carrito (JSON del POS) en líneas validadas.
+
+    Devuelve una lista de dicts con `id`, `cantidad`, `precio` e `iva`.
+    Todos los errores se acumulan y se lanzan juntos en un `ValidationError`.
+    """
+    if not productos_data:
+        raise ValidationError('No se encontraron productos en la factura')
+
+    lineas = []
+    errores = []
+    for posicion, prod_data in enumerate(productos_data, start=1):
+        try:
+            producto_id = int(prod_data['id'])
+            cantidad = int(prod_data.get('cantidad', 1))
+            precio = Decimal(str(prod_data['precio']))
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            errores.append(f'Línea {posicion}: datos de producto inválidos')
+            continue
+        if cantidad < 1:
+            errores.append(f'Línea {posicion}: la cantidad debe ser al menos 1')
+            continue
+        if precio < 0:
+            errores.append(f'Línea {posicion}: el precio no puede ser negativo')
+            continue
+        lineas.append({
+            'id': producto_id,
+            'cantidad': cantidad,
+            'precio': precio,
+            'iva': bool(prod_data.get('iva', True)),
+        })
+
+    if errores:
+        raise ValidationError(errores)
+    return lineas
+
+
+def confirmar_factura(factura, productos_data, organizacion=None,
+                      metodo_pago='efectivo', id_transaccion='', estado_pago='pendiente'):
+    """Guarda `factura` (aún sin guardar) junto con todas sus líneas.
+
+    - Valida la existencia de todo el carrito y descuenta el stock con un
+      único UPDATE condicional (`productos.services.descontar_stock`).
+    - Inserta las líneas con `bulk_create` (no se disparan `save()` ni señales
+      por línea, por eso el subtotal y el stock se gestionan aquí).
+    - Fija en cada línea el IVA con la tasa vigente de la organización,
+      calcula subtotal/IVA/total en memoria y escribe la cabecera una vez.
+    - Suma la factura al `ResumenVentaDiaria` de su día, escribe su
+      documento de búsqueda y la liga al turno de caja abierto del cajero,
+      si lo hay.
+
+    Lanza `ValidationError` con todos los problemas encontrados; en ese caso
+    no queda nada escrito en la base de datos.
+    """
+    lineas = normalizar_lineas(productos_data)
+
+    with transaction.atomic():
+        ids = {linea['id'] for linea in lineas}
+        productos_qs = Producto.objects.select_related('moneda').filter(id__in=ids)
+        if organizacion is not None:
+            productos_qs = productos_qs.filter(organizacion=organizacion)
+        productos = {p.id: p for p in productos_qs}
+
+        # Cantidades totales por producto (un mismo producto puede repetirse en el ticket)
+        solicitado = {}
+        for linea in lineas:
+            solicitado[linea['id']] = solicitado.get(linea['id'], 0) + linea['cantidad']
+
+        errores = [f'Producto con ID {producto_id} no existe'
+                   for producto_id in solicitado if producto_id not in productos]
+        if errores:
+            raise ValidationError(errores)
+
+        # Descuento atómico y condicional de todo el carrito en un solo UPDATE;
+        # lanza StockInsuficiente con las líneas que no alcanzan.
+        descontar_stock(solicitado, organizacion=organizacion)
+
+        tasa_iva = impuestos.porcentaje(organizacion.id if organizacion is not None else factura.organizacion_id)
+        detalles = []
+        for linea in lineas:
+            producto = productos[linea['id']]
+            detalle = DetalleFactura(
+                producto=producto,
+                cantidad=linea['cantidad'],
+                precio_unitario=linea['precio'],
+                moneda=producto.moneda,
+                iva=linea['iva'],
+                metodo_pago=metodo_pago,
+                id_transaccion=id_transaccion or None,
+                estado_pago=estado_pago,
+            )
+            detalle.subtotal = detalle.calcular_subtotal()
+            detalle.aplicar_iva(tasa_iva)
+            detalles.append(detalle)
+
+        # Totales en memoria y una única escritura de la cabecera
+        factura.aplicar_totales(detalles)
+        if organizacion is not None:
+            factura.organizacion = organizacion
+        factura.metodo_pago = metodo_pago
+        if factura.turno_id is None:
+            factura.turno_id = TurnoCaja.objects.filter(
+                organizacion_id=factura.organizacion_id, usuario_id=factura.usuario_id, cerrado_en__isnull=True,
+            ).values_list('id', flat=True).first()
+        factura.save()
+
+        for detalle in detalles:
+            detalle.factura = factura
+        DetalleFactura.objects.bulk_create(detalles, batch_size=LOTE_DETALLES)
+        # Resumen diario para los paneles y documento de búsqueda, en la misma transacción que la factura
+        ResumenVentaDiaria.registrar(factura)
+        busqueda.indexar_factura(factura, detalles)
+        # Cola del reporte de productos: visible para `actualizar_ventas_producto` al confirmar
+        AgregadoPendiente.objects.create(factura=factura)
+
+        # El PDF se genera en segundo plano (comando prerender_pdfs) para que
+        # la impresión justo después de facturar no tenga que renderizarlo.
+        encolar_pdf(factura)
+
+    return factura
+
+
+def anular_factura(factura):
+    """Anula la factura: devuelve el stock y la resta de los resúmenes de ventas.
+
+    La factura se conserva (con su número) marcada como anulada. Lanza
+    `ValidationError` si ya estaba anulada.
+    """
+    with transaction.atomic():
+        # Bloquear la fila: dos anulaciones simultáneas no reponen el stock dos veces
+        factura = Factura.objects.select_for_update().get(pk=factura.pk)
+        if factura.anulada:
+            raise ValidationError(f'La factura #{factura.numero_visible} ya está anulada')
+        factura.anulada = True
+        factura.anulada_en = timezone.now()
+        factura.save(update_fields=['anulada', 'anulada_en', 'actualizada_en'])
+        reponer_stock(
+            factura.detalles.filter(producto__isnull=False).values_list('producto_id', 'cantidad'),
+            organizacion=factura.organizacion,
+        )
+        ResumenVentaDiaria.registrar(factura, signo=-1)
+        ventas_producto.descontar_factura(factura)
+    return factura
+
+
+METODOS_PAGO_POS = ('efectivo', 'tarjeta', 'transferencia')
+
+
+def _respuesta_factura(clave, factura):
+    return {
+        'clave': clave,
+        'estado': 'creada',
+        'factura_id': factura.id,
+        'numero': factura.numero,
+        'total': str(factura.total),
+    }
+
+
+def _venta_pos(datos, usuario, organizacion):
+    """Construye la factura (sin guardar) de una venta enviada por una terminal y la confirma."""
+    formulario = FacturaForm(data={
+        'cliente': datos.get('cliente_id') or '',
+        'tipo_venta': datos.get('tipo_venta', 'contado'),
+        'descuento': datos.get('descuento', '0'),
+    })
+    clientes = Cliente.objects.all()
+    if organizacion is not None:
+        clientes = clientes.filter(organizacion=organizacion)
+    formulario.fields['cliente'].queryset = clientes
+    if not formulario.is_valid():
+        raise ValidationError([f'{campo}: {error}' for campo, errores in formulario.errors.items() for error in errores])
+
+    factura = formulario.save(commit=False)
+    factura.usuario = usuario
+    # Hora real de la venta en la terminal (puede haberse hecho sin conexión)
+    try:
+        fecha = parse_datetime(str(datos.get('fecha') or ''))
+    except ValueError:
+        # Formato correcto pero fecha imposible (p. ej. 2024-02-30)
+        raise ValidationError('Fecha inválida')
+    if fecha is not None:
+        factura.fecha = timezone.make_aware(fecha) if timezone.is_naive(fecha) else fecha
+
+    metodo_pago = datos.get('metodo_pago', 'efectivo')
+    if metodo_pago not in METODOS_PAGO_POS:
+        raise ValidationError(f'Método de pago inválido: {metodo_pago}')
+    estado_pago = 'pendiente'
+    if metodo_pago == 'efectivo':
+        try:
+            factura.monto_recibido = Decimal(str(datos.get('monto_recibido', '0')))
+        except InvalidOperation:
+            raise ValidationError('Monto recibido inválido')
+        factura.pagada = True
+        estado_pago = 'completado'
+
+    confirmar_factura(factura, datos.get('productos'), organizacion=organizacion,
+                      metodo_pago=metodo_pago, id_transaccion=datos.get('id_transaccion', ''),
+                      estado_pago=estado_pago)
+    if metodo_pago == 'efectivo':
+        factura.vuelto = max(Decimal('0.00'), factura.monto_recibido - factura.total)
+        Factura.objects.filter(pk=factura.pk).update(vuelto=factura.vuelto)
+    return factura
+
+
+def sincronizar_ventas(ventas, usuario, organizacion=None):
+    """Confirma un lote de ventas de una terminal POS en una sola transacción.
+
+    Cada venta trae una `clave` única generada por la terminal. Devuelve un
+    resultado por venta, en el mismo orden:
+
+    - `creada`: se creó la factura.
+    - `duplicada`: la clave ya se había sincronizado; se devuelve la
+      respuesta guardada sin repetir el trabajo.
+    - `error`: la venta no es válida (p. ej. falta stock). No se guarda nada
+      de esa venta y la terminal puede reintentarla con la misma clave.
+
+    Cada venta corre en su propio savepoint, así un error no deshace las demás.
+    """
+    claves = [str(venta.get('clave') or '') if isinstance(venta, dict) else '' for venta in ventas]
+    previas = {
+        c.clave: c.respuesta
+        for c in ClaveIdempotencia.objects.filter(organizacion=organizacion, clave__in=[c for c in claves if c])
+    }
+
+    resultados = []
+    with transaction.atomic():
+        for clave, venta in zip(claves, ventas):
+            if not clave or len(clave) > 64:
+                resultados.append({'clave': clave, 'estado': 'error',
+                                   'errores': ['Cada venta necesita una clave de hasta 64 caracteres']})
+                continue
+            if clave in previas:
+                resultados.append(dict(previas[clave], estado='duplicada'))
+                continue
+            try:
+                with transaction.atomic():
+                    # Reservar la clave primero: otra petición simultánea con la
+                    # misma clave espera aquí y luego falla por la restricción única
+                    registro = ClaveIdempotencia.objects.create(organizacion=organizacion, clave=clave)
+                    factura = _venta_pos(venta, usuario, organizacion)
+                    registro.factura = factura
+                    registro.respuesta = _respuesta_factura(clave, factura)
+                    registro.save(update_fields=['factura', 'respuesta'])
+            except IntegrityError:
+                respuesta = ClaveIdempotencia.objects.filter(
+                    organizacion=organizacion, clave=clave).values_list('respuesta', flat=True).first()
+                if respuesta:
+                    resultados.append(dict(respuesta, estado='duplicada'))
+                else:
+                    resultados.append({'clave': clave, 'estado': 'error',
+                                       'errores': ['Conflicto al guardar la venta, reintente']})
+                continue
+            except ValidationError as e:
+                resultados.append({'clave': clave, 'estado': 'error', 'errores': e.messages})
+                continue
+            previas[clave] = registro.respuesta
+            resultados.append(registro.respuesta)
+    return resultados
@@ -1,7 +1,11 @@
 # facturas/signals.py (versión corregida)
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import DetalleFactura
+from clientes.models import Cliente
+from .models import DetalleFactura, Factura, TasaImpuesto
+from .impuestos import limpiar_tasas
+from . import busqueda
 
 @receiver(post_save, sender=DetalleFactura)
 def actualizar_stock(sender, instance, created, **kwargs):
@@ -9,4 +13,36 @@ def actualizar_stock(sender, instance, created, **kwargs):
     if created:
         producto = instance.producto
         producto.stock -= instance.cantidad
-        producto.save(update_fields=['stock'])
\ No newline at end of file
+        producto.save(update_fields=['stock'])
+
+
+@receiver(post_save, sender=TasaImpuesto)
+@receiver(post_delete, sender=TasaImpuesto)
+def invalidar_tasas(sender, **kwargs):
+    """Descarta las tasas en caché de este proceso al cambiar la tabla"""
+    limpiar_tasas()
+
+
+# Campos del cliente que forman parte del documento de búsqueda de sus facturas
+CAMPOS_BUSQUEDA_CLIENTE = ('nombre', 'apellido', 'nit', 'cedula')
+
+
+@receiver(pre_save, sender=Cliente)
+def recordar_datos_busqueda_cliente(sender, instance, update_fields=None, **kwargs):
+    """Guarda en la instancia los valores anteriores de los campos indexados"""
+    instance._busqueda_previa = None
+    if instance.pk is None or (update_fields is not None and not set(update_fields) & set(CAMPOS_BUSQUEDA_CLIENTE)):
+        return
+    instance._busqueda_previa = Cliente.objects.filter(pk=instance.pk).values_list(*CAMPOS_BUSQUEDA_CLIENTE).first()
+
+
+@receiver(post_save, sender=Cliente)
+def reindexar_facturas_cliente(sender, instance, created, **kwargs):
+    """Reindexa las facturas del cliente solo si cambió su nombre, apellido, NIT o cédula, al confirmar la transacción"""
+    previa = getattr(instance, '_busqueda_previa', None)
+    if created or previa is None:
+        return
+    if previa == tuple(getattr(instance, campo) for campo in CAMPOS_BUSQUEDA_CLIENTE):
+        return
+    cliente_id = instance.pk
+    transaction.on_commit(lambda: busqueda.indexar_facturas(Factura.objects.filter(cliente_id=cliente_id)))
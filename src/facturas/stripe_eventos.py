@@ -0,0 +1,132 @@
+# facturas/stripe_eventos.py
+"""Webhooks de Stripe: registro inmediato y aplicación por lotes.
+
+`registrar_evento` verifica la firma y guarda el evento en `EventoStripe`
+con un INSERT que ignora ids repetidos, así el webhook responde enseguida y
+los reintentos de Stripe no vuelven a aplicarse. `procesar_lote` toma los
+eventos pendientes y los aplica con pocos UPDATE dirigidos (sin `save()` de
+filas completas): uno para marcar las facturas pagadas, uno para el estado
+de pago de sus líneas y uno por resultado para los propios eventos.
+
+Dentro de un lote gana el evento más reciente de cada factura, pero Stripe
+puede entregar los eventos desordenados o repetirlos en lotes distintos.
+Un pago ya aplicado es definitivo: un `payment_failed` que llega en un lote
+posterior no cambia una factura pagada (el evento queda `ignorado`) y las
+líneas `completado` nunca vuelven atrás, así `Factura.pagada` y el estado
+de pago de las líneas no se contradicen.
+"""
+import json
+from datetime import datetime, timezone as dt_timezone
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, F, Value, When
+from django.utils import timezone
+
+from .models import DetalleFactura, EventoStripe, Factura
+
+TOLERANCIA_FIRMA = 300  # segundos, igual que las librerías de Stripe
+TAMANO_LOTE = 200
+
+# Eventos que cambian el estado de pago de una factura
+ESTADO_POR_EVENTO = {
+    'payment_intent.succeeded': 'completado',
+    'payment_intent.payment_failed': 'fallido',
+}
+
+
+def registrar_evento(payload, firma):
+    """Verifica la firma del webhook y guarda el evento si no se había recibido.
+
+    Lanza `stripe.SignatureVerificationError` si la firma no corresponde y
+    `ValueError` si el cuerpo no es un evento de Stripe.
+    """
+    texto = payload.decode('utf-8') if isinstance(payload, bytes) else payload
+    secreto = getattr(settings, 'STRIPE_WEBHOOK_SECRET', None)
+    if not secreto:
+        raise stripe.SignatureVerificationError('STRIPE_WEBHOOK_SECRET no está configurado', firma)
+    stripe.WebhookSignature.verify_header(texto, firma, secreto, TOLERANCIA_FIRMA)
+
+    evento = json.loads(texto)
+    if not isinstance(evento, dict) or not evento.get('id') or not evento.get('type'):
+        raise ValueError('El evento no tiene id o tipo')
+    creado = evento.get('created')
+    objeto = (evento.get('data') or {}).get('object') or {}
+    EventoStripe.objects.bulk_create([EventoStripe(
+        evento_id=evento['id'],
+        tipo=evento['type'],
+        datos=objeto,
+        creado_stripe=datetime.fromtimestamp(creado, tz=dt_timezone.utc) if isinstance(creado, (int, float)) else None,
+        # Los tipos que no usamos quedan registrados pero no se procesan
+        estado='pendiente' if evento['type'] in ESTADO_POR_EVENTO else 'ignorado',
+    )], ignore_conflicts=True)
+
+
+def _factura_id(evento):
+    try:
+        return int((evento.datos.get('metadata') or {}).get('factura_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def procesar_lote(limite=TAMANO_LOTE):
+    """Aplica hasta `limite` eventos pendientes en una transacción. Devuelve cuántos tomó."""
+    ahora = timezone.now()
+    with transaction.atomic():
+        # En PostgreSQL varios workers pueden correr a la vez sin tomar los mismos eventos
+        eventos = list(
+            EventoStripe.objects.select_for_update(skip_locked=True)
+            .filter(estado='pendiente').order_by('recibido_en', 'id')[:limite]
+        )
+        if not eventos:
+            return 0
+
+        errores = {}
+        ignorados = set()
+        por_factura = {}
+        # Si una factura recibe varios eventos en el lote gana el más reciente según Stripe
+        for evento in sorted(eventos, key=lambda e: (e.creado_stripe or e.recibido_en, e.id)):
+            factura_id = _factura_id(evento)
+            if factura_id is None:
+                errores[evento.id] = 'El PaymentIntent no tiene factura_id en metadata'
+                continue
+            por_factura[factura_id] = (evento, ESTADO_POR_EVENTO[evento.tipo], evento.datos.get('id') or '')
+
+        pagadas_antes = dict(Factura.objects.filter(id__in=por_factura).values_list('id', 'pagada'))
+        for factura_id, (evento, estado, _) in list(por_factura.items()):
+            if factura_id not in pagadas_antes:
+                errores[evento.id] = f'La factura {factura_id} no existe'
+                del por_factura[factura_id]
+            elif estado != 'completado' and pagadas_antes[factura_id]:
+                # Evento tardío o repetido de un pago que ya se aplicó en otro lote
+                ignorados.add(evento.id)
+                del por_factura[factura_id]
+
+        if por_factura:
+            pagadas = [f for f, (_, estado, _) in por_factura.items() if estado == 'completado']
+            if pagadas:
+                Factura.objects.filter(id__in=pagadas).update(pagada=True, actualizada_en=ahora)
+            DetalleFactura.objects.filter(factura_id__in=por_factura).update(
+                estado_pago=Case(
+                    # Una línea completada no vuelve atrás
+                    When(estado_pago='completado', then=F('estado_pago')),
+                    *[When(factura_id=f, then=Value(estado)) for f, (_, estado, _) in por_factura.items()],
+                    default=F('estado_pago'), output_field=CharField(),
+                ),
+                id_transaccion=Case(
+                    *[When(factura_id=f, then=Value(pi)) for f, (_, _, pi) in por_factura.items() if pi],
+                    default=F('id_transaccion'), output_field=CharField(),
+                ),
+            )
+
+        procesados = [e.id for e in eventos if e.id not in errores and e.id not in ignorados]
+        if procesados:
+            EventoStripe.objects.filter(id__in=procesados).update(estado='procesado', procesado_en=ahora)
+        if ignorados:
+            EventoStripe.objects.filter(id__in=ignorados).update(
+                estado='ignorado', error='La factura ya tiene un pago exitoso', procesado_en=ahora)
+        for mensaje in set(errores.values()):
+            EventoStripe.objects.filter(id__in=[i for i, m in errores.items() if m == mensaje]).update(
+                estado='error', error=mensaje, procesado_en=ahora)
+    return len(eventos)
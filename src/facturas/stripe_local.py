@@ -0,0 +1,183 @@
+# facturas/stripe_local.py
+"""Sustituto local de Stripe para tests y benchmarks.
+
+Genera eventos con la misma forma y la misma firma (`Stripe-Signature`,
+HMAC-SHA256 de "timestamp.payload") que envía Stripe, para ejercitar
+`webhook_stripe` sin red ni cuenta de Stripe.
+
+`ServidorStripeFalso` atiende la API de PaymentIntents en un puerto local
+con latencia y errores configurables, para probar `facturas.pasarela`
+(timeouts, reintentos, circuit breaker) bajo carga.
+"""
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+def firmar(payload, secreto, timestamp=None):
+    """Cabecera `Stripe-Signature` para `payload` (str) con el secreto del webhook."""
+    timestamp = int(time.time()) if timestamp is None else int(timestamp)
+    firma = hmac.new(secreto.encode('utf-8'), f'{timestamp}.{payload}'.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={firma}'
+
+
+def evento_pago(factura_id, tipo='payment_intent.succeeded', evento_id=None, payment_intent_id=None, creado=None):
+    """Evento de PaymentIntent como lo envía Stripe, con `factura_id` en metadata."""
+    payment_intent_id = payment_intent_id or f'pi_{uuid.uuid4().hex[:24]}'
+    return {
+        'id': evento_id or f'evt_{uuid.uuid4().hex[:24]}',
+        'object': 'event',
+        'type': tipo,
+        'created': int(time.time()) if creado is None else creado,
+        'livemode': False,
+        'data': {
+            'object': {
+                'id': payment_intent_id,
+                'object': 'payment_intent',
+                'status': 'succeeded' if tipo == 'payment_intent.succeeded' else 'requires_payment_method',
+                'metadata': {'factura_id': str(factura_id)},
+            },
+        },
+    }
+
+
+def peticion_firmada(evento, secreto):
+    """Devuelve (cuerpo, cabecera de firma) listos para enviar al webhook."""
+    payload = json.dumps(evento)
+    return payload, firmar(payload, secreto)
+
+
+class ReproductorWebhooks:
+    """Envía eventos firmados a `webhook_stripe` con un cliente de pruebas de Django.
+
+    `cliente` puede ser `django.test.Client` o cualquier objeto con un
+    método `post(ruta, data, content_type=..., **cabeceras)`.
+    """
+
+    def __init__(self, cliente, secreto, ruta='/facturas/webhook-stripe/'):
+        self.cliente = cliente
+        self.secreto = secreto
+        self.ruta = ruta
+
+    def enviar(self, evento):
+        payload, firma = peticion_firmada(evento, self.secreto)
+        return self.cliente.post(self.ruta, payload, content_type='application/json', HTTP_STRIPE_SIGNATURE=firma)
+
+    def reproducir(self, eventos, veces=1):
+        """Envía cada evento `veces` veces (como los reintentos de Stripe) y devuelve las respuestas."""
+        return [self.enviar(evento) for _ in range(veces) for evento in eventos]
+
+
+class _ManejadorStripe(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, estado, cuerpo, cabeceras=None):
+        datos = json.dumps(cuerpo).encode('utf-8')
+        try:
+            self.send_response(estado)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(datos)))
+            for nombre, valor in (cabeceras or {}).items():
+                self.send_header(nombre, valor)
+            self.end_headers()
+            self.wfile.write(datos)
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente se cansó de esperar (timeout de lectura)
+            self.close_connection = True
+
+    def do_POST(self):
+        servidor = self.server.stripe
+        largo = int(self.headers.get('Content-Length') or 0)
+        params = dict(parse_qsl(self.rfile.read(largo).decode('utf-8')))
+        servidor.registrar_peticion()
+        if servidor.latencia:
+            time.sleep(servidor.latencia)
+        if self.path.rstrip('/') != '/v1/payment_intents':
+            return self._responder(404, {'error': {'type': 'invalid_request_error', 'message': 'Ruta desconocida'}})
+        if servidor.tasa_fallos and random.random() < servidor.tasa_fallos:
+            return self._responder(servidor.estado_fallo, {'error': {'type': 'api_error', 'message': 'Fallo simulado'}})
+        if not params.get('amount', '').isdigit() or not params.get('currency'):
+            return self._responder(400, {'error': {'type': 'invalid_request_error', 'message': 'amount y currency son requeridos'}})
+        clave = self.headers.get('Idempotency-Key')
+        cuerpo, repetida = servidor.payment_intent(clave, params)
+        self._responder(200, cuerpo, {'Idempotent-Replayed': 'true'} if repetida else None)
+
+
+class ServidorStripeFalso:
+    """API de Stripe falsa en 127.0.0.1 para `PasarelaStripe(api_base=servidor.url)`.
+
+    `latencia` (segundos) y `tasa_fallos` (0 a 1, responde `estado_fallo`) se
+    pueden cambiar mientras el servidor corre. Respeta `Idempotency-Key`:
+    repetir la clave devuelve el mismo PaymentIntent sin crear otro.
+
+        with ServidorStripeFalso(latencia=0.05) as servidor:
+            pasarela = PasarelaStripe('sk_test_local', api_base=servidor.url)
+    """
+
+    def __init__(self, latencia=0.0, tasa_fallos=0.0, estado_fallo=500):
+        self.latencia = latencia
+        self.tasa_fallos = tasa_fallos
+        self.estado_fallo = estado_fallo
+        self.peticiones = 0
+        self.payment_intents = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._hilo = None
+
+    @property
+    def url(self):
+        host, puerto = self._httpd.server_address[:2]
+        return f'http://{host}:{puerto}'
+
+    def registrar_peticion(self):
+        with self._lock:
+            self.peticiones += 1
+
+    def payment_intent(self, clave, params):
+        """Devuelve (PaymentIntent, repetido) para la clave de idempotencia."""
+        with self._lock:
+            if clave and clave in self.payment_intents:
+                return self.payment_intents[clave], True
+            pi_id = f'pi_{uuid.uuid4().hex[:24]}'
+            cuerpo = {
+                'id': pi_id,
+                'object': 'payment_intent',
+                'amount': int(params['amount']),
+                'currency': params['currency'],
+                'status': 'requires_payment_method',
+                'client_secret': f'{pi_id}_secret_{uuid.uuid4().hex[:12]}',
+                'metadata': {k[len('metadata['):-1]: v for k, v in params.items() if k.startswith('metadata[')},
+                'livemode': False,
+            }
+            self.payment_intents[clave or pi_id] = cuerpo
+            return cuerpo, False
+
+    def iniciar(self):
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), _ManejadorStripe)
+        self._httpd.daemon_threads = True
+        self._httpd.stripe = self
+        self._hilo = threading.Thread(target=self._httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
@@ -1,3 +1,1193 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from categorias.models import Categoria
+from clientes.models import Cliente
+from organizaciones.models import Organizacion, Miembro
+from productos import codigos
+from productos.models import CodigoProducto, Moneda, Producto
+from .models import (
+    AgregadoPendiente, ClaveIdempotencia, Factura, DetalleFactura, DetalleFacturaArchivado, DocumentoBusquedaFactura, EventoStripe,
+    FacturaArchivada, ResumenVentaDiaria, SecuenciaFactura, TasaImpuesto, TrabajoPDF, TurnoCaja,
+    VentaProductoDiaria,
+)
+from . import archivo, busqueda, caja, exportacion, impuestos, pasarela, pdf_cache, prerender, stripe_eventos, ventas_producto
+from .paginacion import paginar_facturas
+from .services import anular_factura, confirmar_factura
+from productos.services import StockInsuficiente
+
+
+class FacturacionBaseTestCase(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.org = Organizacion.objects.create(nombre='OrgFact', slug='orgfact')
+        self.usuario = User.objects.create_user(username='cajero', password='pass')
+        self.categoria = Categoria.objects.create(nombre='General')
+        self.moneda = Moneda.objects.create(codigo='USD', nombre='Dolar', simbolo='$', cambio_a_usd=1)
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', organizacion=self.org, precio=Decimal('10.00'),
+                                    stock=5, categoria=self.categoria, moneda=self.moneda)
+            for i in range(3)
+        ]
+
+    def login(self):
+        Miembro.objects.create(organizacion=self.org, user=self.usuario, role='cajero')
+        self.client.post('/login/', {'company': 'OrgFact', 'username': 'cajero', 'password': 'pass'})
+
+    def carrito(self, cantidad=1, productos=None):
+        return [
+            {'id': p.id, 'cantidad': cantidad, 'precio': str(p.precio), 'iva': True}
+            for p in (productos or self.productos)
+        ]
+
+
+class ConfirmarFacturaTests(FacturacionBaseTestCase):
+    def test_guarda_lineas_totales_y_stock(self):
+        factura = confirmar_factura(Factura(usuario=self.usuario), self.carrito(cantidad=2), organizacion=self.org)
+
+        factura.refresh_from_db()
+        self.assertEqual(factura.detalles.count(), 3)
+        self.assertEqual(factura.subtotal, Decimal('60.00'))
+        self.assertEqual(factura.iva_total, Decimal('9.00'))
+        self.assertEqual(factura.total, Decimal('69.00'))
+        for producto in self.productos:
+            producto.refresh_from_db()
+            self.assertEqual(producto.stock, 3)
+
+    def test_descuento_aplicado_en_memoria(self):
+        factura = confirmar_factura(Factura(usuario=self.usuario, descuento=Decimal('5.00')),
+                                    self.carrito(), organizacion=self.org)
+        factura.refresh_from_db()
+        self.assertEqual(factura.total, Decimal('29.50'))
+
+    def test_consultas_no_crecen_con_el_ticket(self):
+        def contar(carrito):
+            with CaptureQueriesContext(connection) as consultas:
+                confirmar_factura(Factura(usuario=self.usuario), carrito, organizacion=self.org)
+            return len(consultas)
+
+        # La primera factura de la organización crea su secuencia de numeración y su fila del resumen diario
+        confirmar_factura(Factura(usuario=self.usuario), self.carrito(productos=self.productos[:1]), organizacion=self.org)
+        self.assertEqual(contar(self.carrito(productos=self.productos[:1])), contar(self.carrito()))
+
+    def test_stock_insuficiente_reporta_todo_y_no_escribe(self):
+        with self.assertRaises(ValidationError) as ctx:
+            confirmar_factura(Factura(usuario=self.usuario), self.carrito(cantidad=6), organizacion=self.org)
+
+        self.assertEqual(len(ctx.exception.messages), 3)
+        self.assertFalse(Factura.objects.exists())
+        self.assertFalse(DetalleFactura.objects.exists())
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock, 5)
+
+    def test_producto_de_otra_organizacion(self):
+        otra = Organizacion.objects.create(nombre='Otra', slug='otra')
+        with self.assertRaises(ValidationError):
+            confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=otra)
+
+
+class FacturarViewTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login()
+
+    def test_post_crea_factura_y_redirige_al_detalle(self):
+        response = self.client.post('/facturas/nueva/', {
+            'tipo_venta': 'contado',
+            'descuento': '0',
+            'metodo_pago': 'efectivo',
+            'monto_recibido': '50',
+            'vuelto': '15.50',
+            'productos_json': json.dumps(self.carrito()),
+        })
+        factura = Factura.objects.get()
+        self.assertRedirects(response, f'/facturas/{factura.id}/', fetch_redirect_response=False)
+        self.assertTrue(factura.pagada)
+        self.assertEqual(factura.detalles.count(), 3)
+        self.assertEqual(set(factura.detalles.values_list('estado_pago', flat=True)), {'completado'})
+
+    def test_post_con_codigo_de_barra(self):
+        codigos.limpiar_indices()
+        self.addCleanup(codigos.limpiar_indices)
+        codigo = CodigoProducto.objects.create(producto=self.productos[1], codigo_barra='7501234567890')
+        response = self.client.post('/facturas/nueva/', {
+            'tipo_venta': 'contado', 'descuento': '0', 'metodo_pago': 'efectivo', 'codigo_barra': codigo.codigo_barra,
+        })
+        factura = Factura.objects.get()
+        self.assertRedirects(response, f'/facturas/{factura.id}/', fetch_redirect_response=False)
+        self.assertEqual(list(factura.detalles.values_list('producto_id', 'cantidad')), [(self.productos[1].id, 1)])
+
+    def test_codigo_de_barra_cobra_el_precio_de_la_base(self):
+        codigos.limpiar_indices()
+        self.addCleanup(codigos.limpiar_indices)
+        CodigoProducto.objects.create(producto=self.productos[1], codigo_barra='7501234567890')
+        self.assertEqual(codigos.resolver('7501234567890', self.org)['precio'], '10.00')
+        # Cambio hecho por otro worker: el mapa de este proceso sigue con el precio viejo
+        Producto.objects.filter(pk=self.productos[1].pk).update(precio=Decimal('12.00'))
+        datos = {'tipo_venta': 'contado', 'descuento': '0', 'metodo_pago': 'efectivo', 'codigo_barra': '7501234567890'}
+
+        self.client.post('/facturas/nueva/', datos)
+        self.assertEqual(Factura.objects.get().detalles.get().precio_unitario, Decimal('12.00'))
+
+        Producto.objects.filter(pk=self.productos[1].pk).update(activo=False)
+        self.client.post('/facturas/nueva/', datos)
+        self.assertEqual(Factura.objects.count(), 1)
+
+
+class ResumenMonedaTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login()
+
+    def test_resumen_guardado_al_confirmar(self):
+        nio = Moneda.objects.create(codigo='NIO', nombre='Cordoba', simbolo='C$')
+        otro = Producto.objects.create(nombre='Otro', organizacion=self.org, precio=Decimal('1.00'), stock=5,
+                                       categoria=self.categoria, moneda=nio)
+        unica = confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        mixta = confirmar_factura(Factura(usuario=self.usuario), self.carrito(productos=[self.productos[0], otro]),
+                                  organizacion=self.org)
+        unica.refresh_from_db()
+        mixta.refresh_from_db()
+        self.assertEqual((unica.moneda_codigo, unica.currency_symbol, unica.moneda_mixta), ('USD', '$', False))
+        self.assertEqual((mixta.moneda_codigo, mixta.currency_symbol, mixta.moneda_mixta), ('MULTI', '', True))
+
+    def test_listado_con_consultas_constantes(self):
+        def contar():
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.get('/facturas/')
+            self.assertEqual(response.status_code, 200)
+            return len(consultas)
+
+        confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        pocas = contar()
+        for _ in range(4):
+            confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        self.assertEqual(contar(), pocas)
+
+    def test_backfill_rellena_facturas_existentes(self):
+        factura = confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        Factura.objects.filter(pk=factura.pk).update(moneda_codigo='', moneda_simbolo='')
+        call_command('backfill_moneda_facturas', stdout=StringIO())
+        factura.refresh_from_db()
+        self.assertEqual((factura.moneda_codigo, factura.moneda_simbolo), ('USD', '$'))
+
+
+class PaginacionKeysetTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        ahora = timezone.now()
+        # Algunas facturas comparten fecha para probar el desempate por id
+        Factura.objects.bulk_create([
+            Factura(usuario=self.usuario, organizacion=self.org, fecha=ahora - timedelta(hours=i // 2),
+                    tipo_venta='credito' if i % 3 == 0 else 'contado', pagada=i % 2 == 0)
+            for i in range(23)
+        ])
+        self.esperadas = list(Factura.objects.order_by('-fecha', '-id').values_list('id', flat=True))
+
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        vistas = []
+        pagina = paginar_facturas(Factura.objects.all(), tamano=5)
+        paginas = [pagina]
+        vistas += [f.id for f in pagina]
+        while pagina.tiene_siguiente:
+            pagina = paginar_facturas(Factura.objects.all(), despues=pagina.siguiente, tamano=5)
+            paginas.append(pagina)
+            vistas += [f.id for f in pagina]
+        self.assertEqual(vistas, self.esperadas)
+        self.assertEqual(len(paginas), 5)
+
+        # Volver hacia atrás desde la última página devuelve la penúltima
+        anterior = paginar_facturas(Factura.objects.all(), antes=paginas[-1].anterior, tamano=5)
+        self.assertEqual([f.id for f in anterior], [f.id for f in paginas[-2]])
+
+    def test_listado_filtra_por_tipo_y_pagada(self):
+        self.login()
+        response = self.client.get('/facturas/', {'tipo_venta': 'credito', 'pagada': '1'})
+        esperadas = set(Factura.objects.filter(tipo_venta='credito', pagada=True).values_list('id', flat=True))
+        self.assertEqual({f.id for f in response.context['facturas']}, esperadas)
+
+    def test_cursor_invalido_muestra_primera_pagina(self):
+        pagina = paginar_facturas(Factura.objects.all(), despues='no-es-un-cursor', tamano=5)
+        self.assertEqual([f.id for f in pagina], self.esperadas[:5])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='facturas_pdf_tests_'))
+class FacturaPdfCacheTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login()
+        self.factura = confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        self.factura.refresh_from_db()
+        self.url = f'/facturas/{self.factura.id}/pdf/'
+
+    def tearDown(self):
+        shutil.rmtree(pdf_cache.directorio(), ignore_errors=True)
+
+    def test_segunda_descarga_sale_de_cache_y_revalida_con_304(self):
+        with mock.patch('facturas.pdf_cache.renderizar_factura_pdf', wraps=pdf_cache.renderizar_factura_pdf) as render:
+            primera = self.client.get(self.url)
+            segunda = self.client.get(self.url)
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual(primera.content, segunda.content)
+        self.assertEqual(render.call_count, 1)
+
+        revalidacion = self.client.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(revalidacion.status_code, 304)
+
+    def test_cambio_en_factura_invalida_la_version(self):
+        etag_anterior = self.client.get(self.url)['ETag']
+        self.factura.pagada = True
+        self.factura.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag_anterior)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag_anterior)
+        self.assertEqual(len(list(pdf_cache.directorio().glob(f'factura_{self.factura.id}-*.pdf'))), 1)
+
+    def test_expulsion_por_tamano(self):
+        pdf_cache.guardar(self.factura, b'x' * 1000)
+        self.assertEqual(pdf_cache.expulsar(max_bytes=10), 1)
+        self.assertIsNone(pdf_cache.leer(self.factura))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='facturas_prerender_'), FACTURA_PDF_PRERENDER=True)
+class PrerenderPdfTests(FacturacionBaseTestCase):
+    def tearDown(self):
+        shutil.rmtree(pdf_cache.directorio(), ignore_errors=True)
+
+    def confirmar(self):
+        return confirmar_factura(Factura(usuario=self.usuario), self.carrito(1), organizacion=self.org)
+
+    def test_confirmar_encola_y_worker_deja_pdf_en_cache(self):
+        factura = self.confirmar()
+        trabajo = TrabajoPDF.objects.get(factura=factura)
+        self.assertEqual(trabajo.estado, 'pendiente')
+
+        ids = prerender.reclamar_trabajos(10)
+        self.assertEqual(ids, [trabajo.id])
+        self.assertEqual(prerender.reclamar_trabajos(10), [])
+        self.assertIsNotNone(prerender.procesar_trabajo(trabajo.id))
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'listo')
+        factura.refresh_from_db()
+        self.assertIsNotNone(pdf_cache.leer(factura))
+
+    def test_fallo_reintenta_y_luego_marca_error(self):
+        trabajo = TrabajoPDF.objects.get(factura=self.confirmar())
+        with mock.patch('facturas.pdf_cache.renderizar_factura_pdf', side_effect=RuntimeError('sin fuentes')):
+            for _ in range(prerender.MAX_INTENTOS):
+                prerender.procesar_trabajo(prerender.reclamar_trabajos(1)[0])
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'error')
+        self.assertIn('sin fuentes', trabajo.error)
+
+    def test_abandonados_se_reencolan_hasta_agotar_intentos(self):
+        reintento, agotado = (TrabajoPDF.objects.get(factura=self.confirmar()) for _ in range(2))
+        prerender.reclamar_trabajos(10)
+        TrabajoPDF.objects.filter(pk=agotado.pk).update(intentos=prerender.MAX_INTENTOS)
+        TrabajoPDF.objects.update(iniciado_en=timezone.now() - prerender.TIEMPO_ABANDONO - timedelta(seconds=1))
+
+        self.assertEqual(prerender.liberar_abandonados(), 1)
+        reintento.refresh_from_db()
+        agotado.refresh_from_db()
+        self.assertEqual((reintento.estado, agotado.estado), ('pendiente', 'error'))
+        self.assertEqual(prerender.reclamar_trabajos(10), [reintento.id])
+
+    def test_factura_archivada_descarta_sus_trabajos(self):
+        corte = archivo.corte_por_defecto()
+        reclamada, pendiente = self.confirmar(), self.confirmar()
+        Factura.objects.filter(pk__in=[reclamada.pk, pendiente.pk]).update(fecha=corte - timedelta(days=1))
+        trabajo_id = prerender.reclamar_trabajos(1)[0]
+        ventas_producto.actualizar_todo()
+
+        archivo.archivar(corte)
+        self.assertFalse(TrabajoPDF.objects.exists())
+        self.assertIsNone(prerender.procesar_trabajo(trabajo_id))
+
+        # Factura que desaparece entre el reclamo y el render: el worker descarta el trabajo sin reintentos
+        trabajo = TrabajoPDF.objects.get(factura=self.confirmar())
+        DetalleFactura.objects.filter(factura_id=trabajo.factura_id).delete()
+        DocumentoBusquedaFactura.objects.filter(factura_id=trabajo.factura_id).delete()
+        AgregadoPendiente.objects.filter(factura_id=trabajo.factura_id).delete()
+        Factura.objects.filter(pk=trabajo.factura_id)._raw_delete(connection.alias)
+        self.assertIsNone(prerender.procesar_trabajo(trabajo.id))
+        self.assertFalse(TrabajoPDF.objects.filter(pk=trabajo.pk).exists())
+
+    @override_settings(FACTURA_PDF_PRERENDER=False)
+    def test_desactivado_no_encola(self):
+        self.confirmar()
+        self.assertFalse(TrabajoPDF.objects.exists())
+
+    def test_estadisticas_solo_staff(self):
+        self.confirmar()
+        self.login()
+        self.assertEqual(self.client.get('/facturas/pdf/estadisticas/').status_code, 302)
+        self.usuario.is_staff = True
+        self.usuario.save()
+        datos = self.client.get('/facturas/pdf/estadisticas/').json()
+        self.assertEqual(datos['cola'], 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='facturas_export_'), FACTURA_EXPORT_WORKERS=1)
+class ExportacionPdfTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.facturas = [
+            confirmar_factura(Factura(usuario=self.usuario), self.carrito(1, [p]), organizacion=self.org)
+            for p in self.productos
+        ]
+        hoy = timezone.localdate().isoformat()
+        self.params = f'?desde={hoy}&hasta={hoy}'
+
+    def tearDown(self):
+        shutil.rmtree(pdf_cache.directorio(), ignore_errors=True)
+
+    def test_zip_contiene_un_pdf_por_factura(self):
+        self.login()
+        response = self.client.get('/facturas/exportar/' + self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archivo:
+            nombres = archivo.namelist()
+            self.assertEqual(nombres, [f'factura_{f.id}.pdf' for f in self.facturas])
+            self.assertTrue(archivo.read(nombres[0]).startswith(b'%PDF'))
+
+    def test_zip_incluye_facturas_archivadas(self):
+        self.login()
+        corte = archivo.corte_por_defecto()
+        fecha = corte - timedelta(days=1)
+        Factura.objects.filter(id=self.facturas[0].id).update(fecha=fecha)
+        ventas_producto.actualizar_todo()
+        archivo.archivar(corte)
+
+        dia = timezone.localdate(fecha).isoformat()
+        response = self.client.get(f'/facturas/exportar/?desde={dia}&hasta={timezone.localdate().isoformat()}')
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archivo_zip:
+            self.assertEqual(archivo_zip.namelist(), [f'factura_{f.id}.pdf' for f in self.facturas])
+
+    @override_settings(FACTURA_EXPORT_WORKERS=4)
+    def test_descarga_web_sin_pool_de_procesos(self):
+        self.login()
+        with mock.patch('facturas.exportacion.ProcessPoolExecutor') as pool:
+            response = self.client.get('/facturas/exportar/' + self.params + '&formato=pdf')
+            self.assertEqual(response['Content-Type'], 'application/zip')
+            b''.join(response.streaming_content)
+        pool.assert_not_called()
+
+    def test_pdf_unido_tiene_todas_las_paginas(self):
+        from pypdf import PdfReader
+
+        carpeta = tempfile.mkdtemp(prefix='facturas_unidas_')
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        ids = [f.id for f in self.facturas]
+        unico = exportacion.unir_pdfs(ids, f'{carpeta}/todas.pdf')
+        self.assertEqual(unico, [f'{carpeta}/todas.pdf'])
+        self.assertEqual(len(PdfReader(unico[0]).pages), len(self.facturas))
+
+        partes = exportacion.unir_pdfs(ids, f'{carpeta}/mes.pdf', por_archivo=2)
+        self.assertEqual(partes, [f'{carpeta}/mes_001.pdf', f'{carpeta}/mes_002.pdf'])
+        self.assertEqual([len(PdfReader(r).pages) for r in partes], [2, 1])
+
+    def test_rango_obligatorio_y_otra_organizacion_excluida(self):
+        self.login()
+        self.assertEqual(self.client.get('/facturas/exportar/').status_code, 400)
+        otra = Organizacion.objects.create(nombre='Otra', slug='otra')
+        Factura.objects.filter(id=self.facturas[0].id).update(organizacion=otra)
+        partes = list(exportacion.generar_zip(
+            Factura.objects.filter(organizacion=self.org).values_list('id', flat=True), workers=1))
+        with zipfile.ZipFile(BytesIO(b''.join(partes))) as archivo:
+            self.assertEqual(len(archivo.namelist()), 2)
+
+
+class FacturaPdfLayoutTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        from . import pdf_layout
+        self.pdf_layout = pdf_layout
+        pdf_layout.limpiar_layouts()
+        self.addCleanup(pdf_layout.limpiar_layouts)
+
+    def test_layout_se_construye_una_vez_por_organizacion(self):
+        factura = confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        with mock.patch.object(self.pdf_layout, 'FacturaPDFLayout', wraps=self.pdf_layout.FacturaPDFLayout) as clase:
+            primero = pdf_cache.renderizar_factura_pdf(factura)
+            segundo = pdf_cache.renderizar_factura_pdf(factura)
+            otra = Organizacion.objects.create(nombre='Otra', slug='otra')
+            self.pdf_layout.obtener_layout(otra)
+        self.assertTrue(primero.startswith(b'%PDF'))
+        self.assertEqual(len(primero), len(segundo))
+        self.assertEqual(clase.call_count, 2)
+        self.assertIs(self.pdf_layout.obtener_layout(self.org), self.pdf_layout.obtener_layout(self.org))
+
+
+class ExportacionDatosTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login()
+        self.facturas = [
+            confirmar_factura(Factura(usuario=self.usuario), self.carrito(1, self.productos[:n]), organizacion=self.org)
+            for n in (1, 2)
+        ]
+        otra = Organizacion.objects.create(nombre='Otra', slug='otra')
+        Factura.objects.create(usuario=self.usuario, organizacion=otra)
+
+    def leer_csv(self, contenido):
+        return list(csv.reader(StringIO(contenido.decode('utf-8-sig'))))
+
+    def test_csv_de_facturas_y_detalles_de_la_organizacion(self):
+        response = self.client.get('/facturas/exportar/facturas/')
+        self.assertEqual(response.status_code, 200)
+        filas = self.leer_csv(b''.join(response.streaming_content))
+        self.assertEqual(filas[0][:3], ['id', 'numero', 'fecha'])
+        self.assertEqual([int(f[0]) for f in filas[1:]], [f.id for f in self.facturas])
+
+        response = self.client.get('/facturas/exportar/detalles/?gzip=1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        filas = self.leer_csv(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(len(filas), 1 + 3)
+        self.assertEqual(filas[1][4], 'Producto 0')
+
+    def test_filtro_de_fechas(self):
+        Factura.objects.filter(id=self.facturas[0].id).update(fecha=timezone.now() - timedelta(days=40))
+        hoy = timezone.localdate().isoformat()
+        response = self.client.get(f'/facturas/exportar/facturas/?desde={hoy}&hasta={hoy}')
+        filas = self.leer_csv(b''.join(response.streaming_content))
+        self.assertEqual([int(f[0]) for f in filas[1:]], [self.facturas[1].id])
+
+    def test_incluye_facturas_archivadas_en_orden(self):
+        corte = archivo.corte_por_defecto()
+        Factura.objects.filter(id=self.facturas[1].id).update(fecha=corte - timedelta(days=1))
+        ventas_producto.actualizar_todo()
+        self.assertEqual(archivo.archivar(corte), 1)
+
+        response = self.client.get('/facturas/exportar/facturas/')
+        filas = self.leer_csv(b''.join(response.streaming_content))
+        self.assertEqual([int(f[0]) for f in filas[1:]], [self.facturas[1].id, self.facturas[0].id])
+        response = self.client.get('/facturas/exportar/detalles/')
+        filas = self.leer_csv(b''.join(response.streaming_content))
+        self.assertEqual([int(f[0]) for f in filas[1:]], [self.facturas[0].id] + [self.facturas[1].id] * 2)
+
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get('/facturas/exportar/detalles/?formato=xlsx')
+        self.assertEqual(response.status_code, 200)
+        hoja = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)['detalles']
+        filas = list(hoja.values)
+        self.assertEqual(len(filas), 1 + 3)
+        self.assertEqual(filas[1][5], 1)
+
+    def test_tabla_desconocida(self):
+        self.assertEqual(self.client.get('/facturas/exportar/clientes/').status_code, 404)
+
+
+class NumeracionFacturasTests(FacturacionBaseTestCase):
+    def test_numeros_correlativos_por_organizacion(self):
+        otra = Organizacion.objects.create(nombre='Otra', slug='otra')
+        numeros = [confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org).numero
+                   for _ in range(2)]
+        ajena = Factura.objects.create(usuario=self.usuario, organizacion=otra)
+        numeros.append(confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org).numero)
+        self.assertEqual(numeros, [1, 2, 3])
+        self.assertEqual(ajena.numero, 1)
+        self.assertEqual(SecuenciaFactura.proximo(self.org.id), 4)
+
+    def test_pdf_usa_el_numero_fiscal(self):
+        self.addCleanup(shutil.rmtree, pdf_cache.directorio(), ignore_errors=True)
+        self.login()
+        factura = confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        Factura.objects.filter(pk=factura.pk).update(numero=factura.id + 40)
+        pdf = self.client.get(f'/facturas/{factura.id}/pdf/')
+        self.assertIn(f'filename="Factura_{factura.id + 40}.pdf"', pdf['Content-Disposition'])
+
+    def test_una_sola_secuencia_sin_organizacion(self):
+        numeros = [Factura.objects.create(usuario=self.usuario).numero for _ in range(2)]
+        self.assertEqual(numeros, [1, 2])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SecuenciaFactura.objects.create(organizacion=None)
+        self.assertEqual(SecuenciaFactura.proximo(None), 3)
+
+    def test_venta_fallida_no_consume_numero(self):
+        confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        with self.assertRaises(StockInsuficiente):
+            confirmar_factura(Factura(usuario=self.usuario), self.carrito(cantidad=99), organizacion=self.org)
+        factura = confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        self.assertEqual(factura.numero, 2)
+
+    def test_facturar_muestra_el_proximo_numero_sin_contar(self):
+        self.login()
+        Factura.objects.create(usuario=self.usuario, organizacion=self.org)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/facturas/nueva/')
+        self.assertEqual(response.context['numero_factura'], 2)
+        self.assertFalse([q for q in consultas.captured_queries if 'COUNT(' in q['sql'].upper()])
+
+
+class NumeracionConcurrenciaTests(TransactionTestCase):
+    """Varios workers facturan a la vez: los números no se repiten ni saltan."""
+
+    HILOS = 8
+    FACTURAS_POR_HILO = 5
+
+    def test_numeros_unicos_bajo_concurrencia(self):
+        org = Organizacion.objects.create(nombre='OrgNum', slug='orgnum')
+        usuario = get_user_model().objects.create_user(username='cajero_num')
+        barrera = threading.Barrier(self.HILOS)
+
+        def cajero():
+            try:
+                barrera.wait()
+                for _ in range(self.FACTURAS_POR_HILO):
+                    while True:
+                        try:
+                            Factura.objects.create(usuario=usuario, organizacion=org)
+                        except OperationalError:
+                            # SQLite: la base está bloqueada por otro escritor, reintentar
+                            continue
+                        break
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=cajero) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        total = self.HILOS * self.FACTURAS_POR_HILO
+        numeros = sorted(Factura.objects.filter(organizacion=org).values_list('numero', flat=True))
+        self.assertEqual(numeros, list(range(1, total + 1)))
+        self.assertEqual(SecuenciaFactura.objects.get(organizacion=org).ultimo_numero, total)
+
+
+class SincronizacionPosTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login()
+
+    def enviar(self, ventas):
+        response = self.client.post('/facturas/sincronizar/', json.dumps({'ventas': ventas}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['resultados']
+
+    def venta(self, clave, cantidad=1, **extra):
+        return dict({'clave': clave, 'monto_recibido': '100', 'productos': self.carrito(cantidad, self.productos[:1])}, **extra)
+
+    def test_lote_con_resultado_por_venta_y_reenvio_sin_duplicar(self):
+        ventas = [self.venta('t1-0001'), self.venta('t1-0002', cantidad=2), self.venta('t1-0003', cantidad=50)]
+        resultados = self.enviar(ventas)
+        self.assertEqual([r['estado'] for r in resultados], ['creada', 'creada', 'error'])
+        self.assertEqual([r['numero'] for r in resultados[:2]], [1, 2])
+        self.assertIn('Stock insuficiente', resultados[2]['errores'][0])
+
+        reenvio = self.enviar(ventas)
+        self.assertEqual([r['estado'] for r in reenvio], ['duplicada', 'duplicada', 'error'])
+        self.assertEqual([r['factura_id'] for r in reenvio[:2]], [r['factura_id'] for r in resultados[:2]])
+        self.assertEqual(Factura.objects.filter(organizacion=self.org).count(), 2)
+        self.productos[0].refresh_from_db()
+        self.assertEqual(self.productos[0].stock, 2)
+
+        factura = Factura.objects.get(id=resultados[0]['factura_id'])
+        self.assertTrue(factura.pagada)
+        self.assertEqual(factura.vuelto, factura.monto_recibido - factura.total)
+
+    def test_clave_repetida_en_el_mismo_lote_y_cliente_ajeno(self):
+        from clientes.models import Cliente
+        otra = Organizacion.objects.create(nombre='Otra', slug='otra')
+        ajeno = Cliente.objects.create(nombre='Ana', apellido='Ruiz', organizacion=otra)
+        resultados = self.enviar([self.venta('x'), self.venta('x'), self.venta('y', cliente_id=ajeno.id), {'productos': []}])
+        self.assertEqual([r['estado'] for r in resultados], ['creada', 'duplicada', 'error', 'error'])
+        self.assertEqual(Factura.objects.count(), 1)
+
+    def test_fecha_imposible_es_error_de_la_venta(self):
+        resultados = self.enviar([self.venta('f1', fecha='2024-02-30T10:00:00'), self.venta('f2')])
+        self.assertEqual([r['estado'] for r in resultados], ['error', 'creada'])
+        self.assertEqual(resultados[0]['errores'], ['Fecha inválida'])
+
+    def test_clave_unica_sin_organizacion(self):
+        ClaveIdempotencia.objects.create(organizacion=None, clave='sin-org')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ClaveIdempotencia.objects.create(organizacion=None, clave='sin-org')
+        ClaveIdempotencia.objects.create(organizacion=self.org, clave='sin-org')
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_pruebas', STRIPE_EVENTOS_WORKER=True)
+class WebhookStripeTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        from .stripe_local import ReproductorWebhooks
+        self.stripe = ReproductorWebhooks(self.client, 'whsec_pruebas')
+        self.factura = confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org,
+                                         metodo_pago='tarjeta')
+
+    def test_ack_inmediato_y_reintentos_sin_duplicar(self):
+        from .stripe_local import evento_pago
+        evento = evento_pago(self.factura.id)
+        respuestas = self.stripe.reproducir([evento], veces=3)
+        self.assertEqual([r.status_code for r in respuestas], [200, 200, 200])
+        self.assertEqual(EventoStripe.objects.filter(evento_id=evento['id']).count(), 1)
+        # El ack no toca la factura
+        self.factura.refresh_from_db()
+        self.assertFalse(self.factura.pagada)
+
+        self.assertEqual(stripe_eventos.procesar_lote(), 1)
+        self.factura.refresh_from_db()
+        self.assertTrue(self.factura.pagada)
+        pi = evento['data']['object']['id']
+        self.assertEqual(set(self.factura.detalles.values_list('estado_pago', 'id_transaccion')), {('completado', pi)})
+        self.assertEqual(EventoStripe.objects.get().estado, 'procesado')
+        self.assertEqual(stripe_eventos.procesar_lote(), 0)
+
+    @override_settings(STRIPE_EVENTOS_WORKER=False)
+    def test_sin_worker_el_webhook_aplica_el_evento(self):
+        from .stripe_local import evento_pago
+        self.assertEqual(self.stripe.enviar(evento_pago(self.factura.id)).status_code, 200)
+        self.factura.refresh_from_db()
+        self.assertTrue(self.factura.pagada)
+        self.assertEqual(EventoStripe.objects.get().estado, 'procesado')
+
+    def test_fallo_en_un_lote_posterior_no_revierte_el_pago(self):
+        from .stripe_local import evento_pago
+        exito = evento_pago(self.factura.id)
+        self.stripe.enviar(exito)
+        self.assertEqual(stripe_eventos.procesar_lote(), 1)
+
+        # Entregado tarde (más viejo) y como reintento tardío (más nuevo): ninguno revierte el pago
+        for creado in (exito['created'] - 5, exito['created'] + 5):
+            self.stripe.enviar(evento_pago(self.factura.id, tipo='payment_intent.payment_failed', creado=creado))
+            self.assertEqual(stripe_eventos.procesar_lote(), 1)
+            self.factura.refresh_from_db()
+            self.assertTrue(self.factura.pagada)
+            self.assertEqual(set(self.factura.detalles.values_list('estado_pago', flat=True)), {'completado'})
+        self.assertEqual(list(EventoStripe.objects.order_by('id').values_list('estado', flat=True)),
+                         ['procesado', 'ignorado', 'ignorado'])
+
+    def test_firma_invalida(self):
+        from .stripe_local import ReproductorWebhooks, evento_pago
+        otro_secreto = ReproductorWebhooks(self.client, 'whsec_otro')
+        self.assertEqual(otro_secreto.enviar(evento_pago(self.factura.id)).status_code, 400)
+        self.assertEqual(self.client.post('/facturas/webhook-stripe/', '{}', content_type='application/json').status_code, 400)
+        self.assertFalse(EventoStripe.objects.exists())
+
+    def test_rafaga_con_consultas_constantes(self):
+        from .stripe_local import evento_pago
+        facturas = [self.factura] + [
+            confirmar_factura(Factura(usuario=self.usuario), self.carrito(1, self.productos[:1]), organizacion=self.org)
+            for _ in range(3)
+        ]
+        eventos = [evento_pago(f.id) for f in facturas]
+        eventos.append(evento_pago(facturas[1].id, tipo='payment_intent.payment_failed', creado=eventos[1]['created'] + 5))
+        eventos.append(evento_pago(999999))
+        eventos.append(dict(evento_pago(facturas[2].id), type='charge.refunded'))
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.stripe.reproducir(eventos, veces=2)
+        inserts = [q for q in consultas.captured_queries if 'facturas_eventostripe' in q['sql']]
+        self.assertEqual(len(inserts), len(eventos) * 2)
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(stripe_eventos.procesar_lote(), len(eventos) - 1)
+        self.assertLessEqual(len(consultas), 8)
+
+        estados = dict(Factura.objects.filter(id__in=[f.id for f in facturas]).values_list('id', 'pagada'))
+        self.assertEqual(estados[facturas[0].id], True)
+        self.assertEqual(set(facturas[1].detalles.values_list('estado_pago', flat=True)), {'fallido'})
+        self.assertEqual(EventoStripe.objects.get(estado='error').datos['metadata']['factura_id'], '999999')
+        self.assertEqual(EventoStripe.objects.get(tipo='charge.refunded').estado, 'ignorado')
+
+
+class PasarelaStripeTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        from .stripe_local import ServidorStripeFalso
+        self.servidor = ServidorStripeFalso().iniciar()
+        self.addCleanup(self.servidor.detener)
+        self.addCleanup(pasarela.limpiar_pasarelas)
+
+    def crear_pasarela(self, **kwargs):
+        kwargs.setdefault('espera_base', 0)
+        return pasarela.PasarelaStripe('sk_test_local', api_base=self.servidor.url, **kwargs)
+
+    def test_reintentos_con_la_misma_clave_de_idempotencia(self):
+        cliente = self.crear_pasarela(reintentos=2)
+        self.servidor.tasa_fallos = 1
+        with self.assertRaises(pasarela.PasarelaNoDisponible):
+            cliente.crear_payment_intent(1000, 'usd', clave_idempotencia='factura-1')
+        self.assertEqual(self.servidor.peticiones, 3)
+
+        self.servidor.tasa_fallos = 0
+        primero = cliente.crear_payment_intent(1000, 'usd', {'factura_id': 1}, clave_idempotencia='factura-1')
+        segundo = cliente.crear_payment_intent(1000, 'usd', {'factura_id': 1}, clave_idempotencia='factura-1')
+        self.assertEqual(primero.id, segundo.id)
+        self.assertEqual(len(self.servidor.payment_intents), 1)
+
+    def test_timeout_de_lectura_acota_la_espera(self):
+        import time
+        cliente = self.crear_pasarela(timeout_lectura=0.2, reintentos=0)
+        self.servidor.latencia = 2
+        inicio = time.perf_counter()
+        with self.assertRaises(pasarela.PasarelaNoDisponible):
+            cliente.crear_payment_intent(1000, 'usd')
+        self.assertLess(time.perf_counter() - inicio, 1.5)
+
+    def test_circuito_abre_y_falla_rapido(self):
+        reloj = [0.0]
+        circuito = pasarela.Circuito(umbral=2, espera=30, reloj=lambda: reloj[0])
+        cliente = self.crear_pasarela(reintentos=0, circuito=circuito)
+        self.servidor.tasa_fallos = 1
+        for _ in range(2):
+            with self.assertRaises(pasarela.PasarelaNoDisponible):
+                cliente.crear_payment_intent(1000, 'usd')
+        self.assertEqual(circuito.estado, pasarela.Circuito.ABIERTO)
+        with self.assertRaises(pasarela.PasarelaNoDisponible):
+            cliente.crear_payment_intent(1000, 'usd')
+        self.assertEqual(self.servidor.peticiones, 2)
+
+        # Pasada la espera sale una llamada de prueba; si funciona el circuito se cierra
+        reloj[0] = 31
+        self.servidor.tasa_fallos = 0
+        self.assertEqual(circuito.estado, pasarela.Circuito.SEMIABIERTO)
+        cliente.crear_payment_intent(1000, 'usd')
+        self.assertEqual(circuito.estado, pasarela.Circuito.CERRADO)
+
+    def test_prueba_con_error_inesperado_no_deja_el_circuito_trabado(self):
+        reloj = [0.0]
+        circuito = pasarela.Circuito(umbral=1, espera=30, reloj=lambda: reloj[0])
+        cliente = self.crear_pasarela(reintentos=0, circuito=circuito)
+        circuito.fallo()
+
+        def operacion_rota(opciones):
+            raise RuntimeError('sesión cerrada')
+
+        reloj[0] = 31
+        with self.assertRaises(RuntimeError):
+            cliente._llamar(operacion_rota, 'clave')
+        self.assertEqual(circuito.estado, pasarela.Circuito.ABIERTO)
+        # Pasada otra espera vuelve a salir una llamada de prueba
+        reloj[0] = 62
+        cliente.crear_payment_intent(1000, 'usd')
+        self.assertEqual(circuito.estado, pasarela.Circuito.CERRADO)
+
+    def test_vista_crear_pago_tarjeta(self):
+        self.login()
+        factura = confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org,
+                                    metodo_pago='tarjeta')
+        with override_settings(STRIPE_API_BASE=self.servidor.url, STRIPE_REINTENTOS=0, STRIPE_CIRCUITO_FALLOS=1):
+            respuesta = self.client.post('/facturas/crear-pago-tarjeta/', json.dumps({'factura_id': factura.id, 'monto': '33.60'}),
+                                         content_type='application/json')
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertTrue(respuesta.json()['clientSecret'].startswith('pi_'))
+            self.assertEqual(next(iter(self.servidor.payment_intents.values()))['metadata']['factura_id'], str(factura.id))
+
+            self.servidor.tasa_fallos = 1
+            for esperado in (503, 503):
+                respuesta = self.client.post('/facturas/crear-pago-tarjeta/', json.dumps({'monto': '5'}),
+                                             content_type='application/json')
+                self.assertEqual(respuesta.status_code, esperado)
+            self.assertIn('Retry-After', respuesta)
+            # La segunda llamada no llegó al servidor: el circuito ya estaba abierto
+            self.assertEqual(self.servidor.peticiones, 2)
+
+
+class ResumenVentaDiariaTests(FacturacionBaseTestCase):
+    def test_confirmar_suma_en_el_resumen_del_dia_local(self):
+        from datetime import datetime
+        # 23:30 en Managua ya es el día siguiente en UTC
+        noche = timezone.make_aware(datetime(2026, 3, 10, 23, 30))
+        for _ in range(2):
+            confirmar_factura(Factura(usuario=self.usuario, fecha=noche), self.carrito(1, self.productos[:1]), organizacion=self.org)
+        credito = confirmar_factura(Factura(usuario=self.usuario, fecha=noche, tipo_venta='credito'),
+                                    self.carrito(1, self.productos[1:2]), organizacion=self.org)
+
+        contado = ResumenVentaDiaria.objects.get(tipo_venta='contado')
+        self.assertEqual((contado.dia.isoformat(), contado.moneda_codigo, contado.facturas), ('2026-03-10', 'USD', 2))
+        self.assertEqual(contado.total, 2 * credito.total)
+        self.assertEqual(ResumenVentaDiaria.objects.get(tipo_venta='credito').iva_total, credito.iva_total)
+
+    def test_reconstruir_rango(self):
+        facturas = [confirmar_factura(Factura(usuario=self.usuario), self.carrito(1, self.productos[:1]), organizacion=self.org)
+                    for _ in range(3)]
+        hoy = timezone.localdate()
+        esperado = list(ResumenVentaDiaria.objects.values('dia', 'facturas', 'subtotal', 'iva_total', 'total'))
+        ResumenVentaDiaria.objects.update(facturas=99, total=0)
+
+        salida = StringIO()
+        call_command('reconstruir_resumen_ventas', '--desde', hoy.isoformat(), '--organizacion', 'orgfact', stdout=salida)
+        self.assertIn('1 filas', salida.getvalue())
+        self.assertEqual(list(ResumenVentaDiaria.objects.values('dia', 'facturas', 'subtotal', 'iva_total', 'total')), esperado)
+        self.assertEqual(esperado[0]['total'], sum(f.total for f in facturas))
+
+    def test_panel_lee_el_resumen(self):
+        self.login()
+        confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/dashboard/mi-dashboard/')
+        self.assertEqual(respuesta.context['ventas_mes_actual'], 1)
+        self.assertEqual(respuesta.context['ingresos_mes_actual'], Factura.objects.get().total)
+        self.assertFalse([q for q in consultas.captured_queries if 'SUM' in q['sql'] and 'facturas_factura' in q['sql']])
+
+        datos = self.client.get('/dashboard/dashboard-data/').json()
+        self.assertEqual(datos['ventas_mes'], 1)
+        self.assertEqual(datos['ventas_por_dia'][0]['dia'], timezone.localdate().isoformat())
+
+
+class VentasProductoTests(FacturacionBaseTestCase):
+    def test_actualizacion_incremental(self):
+        confirmar_factura(Factura(usuario=self.usuario), self.carrito(2), organizacion=self.org)
+        self.assertEqual(ventas_producto.actualizar(), 3)
+        self.assertEqual(VentaProductoDiaria.objects.count(), 3)
+
+        confirmar_factura(Factura(usuario=self.usuario), self.carrito(1, self.productos[:1]), organizacion=self.org)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(ventas_producto.actualizar(), 1)
+        # Solo se leen las líneas de las facturas pendientes
+        lecturas = [q['sql'] for q in consultas.captured_queries if 'FROM "facturas_detallefactura"' in q['sql']]
+        self.assertTrue(lecturas and all('"facturas_detallefactura"."factura_id" IN' in sql for sql in lecturas))
+        self.assertEqual(ventas_producto.actualizar(), 0)
+
+        fila = VentaProductoDiaria.objects.get(producto=self.productos[0])
+        self.assertEqual((fila.unidades, fila.ingresos, fila.moneda_codigo), (3, Decimal('30.00'), 'USD'))
+        self.assertFalse(AgregadoPendiente.objects.exists())
+
+    def test_factura_confirmada_tarde_con_ids_menores(self):
+        lenta = confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        confirmar_factura(Factura(usuario=self.usuario), self.carrito(1, self.productos[:1]), organizacion=self.org)
+        # La transacción de `lenta` (ids menores) aún no confirma: su fila de la cola no se ve
+        AgregadoPendiente.objects.filter(factura=lenta).delete()
+        self.assertEqual(ventas_producto.actualizar(), 1)
+
+        AgregadoPendiente.objects.create(factura=lenta)
+        self.assertEqual(ventas_producto.actualizar(), 3)
+        self.assertEqual(VentaProductoDiaria.objects.get(producto=self.productos[0]).unidades, 2)
+
+    def test_anular_antes_y_despues_de_agregar(self):
+        pendiente = confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        anular_factura(pendiente)
+        self.assertEqual(ventas_producto.actualizar_todo(), 0)
+        self.assertFalse(VentaProductoDiaria.objects.exists())
+
+        agregada = confirmar_factura(Factura(usuario=self.usuario), self.carrito(), organizacion=self.org)
+        ventas_producto.actualizar_todo()
+        anular_factura(agregada)
+        self.assertEqual(set(VentaProductoDiaria.objects.values_list('unidades', flat=True)), {0})
+
+    def test_reporte_por_producto_y_categoria(self):
+        self.login()
+        confirmar_factura(Factura(usuario=self.usuario), self.carrito(1), organizacion=self.org)
+        confirmar_factura(Factura(usuario=self.usuario), self.carrito(3, self.productos[1:2]), organizacion=self.org)
+        # La vista no actualiza el agregado
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get('/facturas/reportes/productos/').context['filas'], [])
+        self.assertFalse([q for q in consultas.captured_queries if 'facturas_detallefactura' in q['sql']])
+        call_command('actualizar_ventas_producto', stdout=StringIO())
+
+        respuesta = self.client.get('/facturas/reportes/productos/')
+        filas = respuesta.context['filas']
+        self.assertEqual(filas[0]['id'], self.productos[1].id)
+        self.assertEqual((filas[0]['unidades'], filas[0]['ingresos']), (4, Decimal('40.00')))
+
+        categorias = self.client.get('/facturas/reportes/productos/', {'agrupar': 'categoria'}).context['filas']
+        self.assertEqual([(f['nombre'], f['unidades']) for f in categorias], [('General', 6)])
+        proveedores = self.client.get('/facturas/reportes/productos/', {'agrupar': 'proveedor'}).context['filas']
+        self.assertEqual(proveedores[0]['nombre'], 'Sin asignar')
+
+    def test_borrar_producto_conserva_el_historial(self):
+        confirmar_factura(Factura(usuario=self.usuario), self.carrito(2, self.productos[:1]), organizacion=self.org)
+        ventas_producto.actualizar()
+        self.productos[0].delete()
+
+        fila = VentaProductoDiaria.objects.get()
+        self.assertEqual((fila.producto_id, fila.unidades, fila.ingresos), (None, 2, Decimal('20.00')))
+        hoy = timezone.localdate()
+        self.assertEqual([(f['nombre'], f['unidades']) for f in ventas_producto.reporte(self.org, hoy, hoy)],
+                         [('Sin asignar', 2)])
+
+    def test_reporte_convertido_con_la_tasa_de_cada_dia(self):
+        from productos.models import TipoCambio
+
+        Moneda.objects.create(codigo='NIO', nombre='Córdoba', simbolo='C$', cambio_a_usd=Decimal('0.027'))
+        ayer, hoy = timezone.localdate() - timedelta(days=1), timezone.localdate()
+        TipoCambio.objects.create(origen='USD', destino='NIO', vigente_desde=ayer, tasa=Decimal('36.00'))
+        TipoCambio.objects.create(origen='USD', destino='NIO', vigente_desde=hoy, tasa=Decimal('37.00'))
+        confirmar_factura(Factura(usuario=self.usuario, fecha=timezone.now() - timedelta(days=1)),
+                          self.carrito(1, self.productos[:1]), organizacion=self.org)
+        confirmar_factura(Factura(usuario=self.usuario), self.carrito(1, self.productos[:1]), organizacion=self.org)
+        ventas_producto.actualizar()
+
+        filas = ventas_producto.reporte(self.org, ayer, hoy, moneda='NIO')
+        self.assertEqual([(f['unidades'], f['ingresos'], f['moneda_codigo']) for f in filas],
+                         [(2, Decimal('730.00'), 'NIO')])
+
+
+class CierreCajaTests(FacturacionBaseTestCase):
+    def vender(self, cantidad=1, productos=None, **campos):
+        metodo_pago = campos.pop('metodo_pago', 'efectivo')
+        return confirmar_factura(Factura(usuario=self.usuario, **campos), self.carrito(cantidad, productos or self.productos[:1]),
+                                 organizacion=self.org, metodo_pago=metodo_pago)
+
+    def test_resumen_en_una_consulta(self):
+        turno = caja.abrir_turno(self.usuario, self.org, Decimal('50.00'))
+        efectivo = [self.vender(monto_recibido=Decimal('20.00'), vuelto=Decimal('8.40')) for _ in range(2)]
+        self.vender(metodo_pago='tarjeta')
+        self.vender(tipo_venta='credito', metodo_pago='transferencia')
+        anulada = self.vender(productos=self.productos[1:2])
+        anular_factura(anulada)
+        self.assertTrue(all(f.turno_id == turno.id for f in Factura.objects.all()))
+
+        with CaptureQueriesContext(connection) as consultas:
+            resumen = caja.resumen_turno(turno)
+        self.assertEqual(len([q for q in consultas.captured_queries if 'facturas_factura' in q['sql']]), 1)
+
+        total = efectivo[0].total
+        self.assertEqual((resumen['facturas'], resumen['anuladas']), (4, 1))
+        self.assertEqual(resumen['total'], 4 * total)
+        self.assertEqual(resumen['total_anulado'], anulada.total)
+        self.assertEqual(resumen['por_metodo']['efectivo'], {'etiqueta': 'Efectivo', 'facturas': 2, 'total': 2 * total})
+        self.assertEqual(resumen['por_metodo']['tarjeta']['facturas'], 1)
+        self.assertEqual(resumen['credito'], {'facturas': 1, 'total': total})
+        self.assertEqual(resumen['efectivo'], {'recibido': Decimal('40.00'), 'vuelto': Decimal('16.80'), 'neto': Decimal('23.20')})
+        self.assertEqual(resumen['efectivo_esperado'], Decimal('50.00') + 2 * total)
+        self.assertEqual(resumen['por_moneda'], {'USD': {'facturas': 4, 'total': 4 * total}})
+
+    def test_anular_repone_stock_y_resumenes(self):
+        factura = self.vender(cantidad=2)
+        ventas_producto.actualizar()
+        anular_factura(factura)
+
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock, 5)
+        resumen = ResumenVentaDiaria.objects.get()
+        self.assertEqual((resumen.facturas, resumen.total), (0, 0))
+        self.assertEqual(VentaProductoDiaria.objects.get().unidades, 0)
+        with self.assertRaises(ValidationError):
+            anular_factura(factura)
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock, 5)
+
+    def test_abrir_y_cerrar_desde_las_vistas(self):
+        self.login()
+        Miembro.objects.filter(user=self.usuario).update(role='admin')
+        self.client.post('/facturas/caja/abrir/', {'monto_inicial': '100'})
+        self.client.post('/facturas/caja/abrir/', {'monto_inicial': '100'})
+        self.assertEqual(TurnoCaja.objects.count(), 1)
+        factura = self.vender()
+        self.assertEqual(self.client.get('/facturas/caja/').context['resumen']['facturas'], 1)
+
+        respuesta = self.client.post('/facturas/caja/cerrar/', {'efectivo_contado': '110.00'})
+        turno = TurnoCaja.objects.get()
+        self.assertRedirects(respuesta, f'/facturas/caja/turnos/{turno.pk}/')
+        self.assertFalse(turno.abierto)
+        self.assertEqual(Decimal(turno.resumen['diferencia']), Decimal('110.00') - Decimal('100.00') - factura.total)
+
+        # Con el turno cerrado las ventas nuevas no se le asignan
+        self.assertIsNone(self.vender().turno_id)
+        self.client.post(f'/facturas/{factura.pk}/anular/')
+        self.assertTrue(Factura.objects.get(pk=factura.pk).anulada)
+
+
+class TasaImpuestoTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        impuestos.limpiar_tasas()
+        self.addCleanup(impuestos.limpiar_tasas)
+
+    def test_lineas_guardan_la_tasa_de_la_organizacion(self):
+        TasaImpuesto.objects.create(porcentaje=Decimal('13.00'))
+        TasaImpuesto.objects.create(organizacion=self.org, porcentaje=Decimal('7.50'))
+        carrito = self.carrito(productos=self.productos[:2])
+        carrito[1]['iva'] = False
+        factura = confirmar_factura(Factura(usuario=self.usuario), carrito, organizacion=self.org)
+
+        gravada, exenta = factura.detalles.order_by('id')
+        self.assertEqual((gravada.tasa_iva, gravada.iva_monto, gravada.total_con_iva),
+                         (Decimal('7.50'), Decimal('0.75'), Decimal('10.75')))
+        self.assertEqual((exenta.tasa_iva, exenta.iva_monto, exenta.total_con_iva),
+                         (Decimal('0.00'), Decimal('0.00'), Decimal('10.00')))
+        factura.refresh_from_db()
+        self.assertEqual((factura.iva_total, factura.total), (Decimal('0.75'), Decimal('20.75')))
+
+        # Sin tasa propia se usa la general
+        otra = Organizacion.objects.create(nombre='Otra', slug='otra')
+        self.assertEqual(impuestos.porcentaje(otra.id), Decimal('13.00'))
+
+    def test_cambiar_la_tasa_no_altera_facturas_emitidas(self):
+        factura = confirmar_factura(Factura(usuario=self.usuario), self.carrito(productos=self.productos[:1]),
+                                    organizacion=self.org)
+        TasaImpuesto.objects.create(organizacion=self.org, porcentaje=Decimal('20.00'))
+        self.login()
+
+        detalles = self.client.get(f'/facturas/{factura.pk}/').context['detalles']
+        self.assertEqual([d.iva_monto for d in detalles], [Decimal('1.50')])
+        self.assertEqual(self.client.get('/facturas/nueva/').context['tasa_iva'], Decimal('20.00'))
+
+    def test_cache_en_proceso_e_invalidacion(self):
+        self.assertEqual(impuestos.porcentaje(self.org.id), Decimal('15'))
+        with self.assertNumQueries(0):
+            impuestos.porcentaje(self.org.id)
+
+        tasa = TasaImpuesto.objects.create(organizacion=self.org, porcentaje=Decimal('12.00'))
+        self.assertEqual(impuestos.porcentaje(self.org.id), Decimal('12.00'))
+        tasa.delete()
+        self.assertEqual(impuestos.porcentaje(self.org.id), Decimal('15'))
+
+
+class BusquedaFacturasTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cliente = Cliente.objects.create(organizacion=self.org, nombre='José', apellido='González',
+                                              cedula='001-010190-0001A', nit='J0310000000001')
+
+    def vender(self, cliente=None, productos=None, organizacion=None):
+        return confirmar_factura(Factura(usuario=self.usuario, cliente=cliente),
+                                 self.carrito(productos=productos or self.productos[:1]),
+                                 organizacion=organizacion or self.org)
+
+    def test_busca_por_cliente_identificacion_y_producto(self):
+        factura = self.vender(self.cliente)
+        otra = self.vender(productos=self.productos[1:2])
+
+        self.assertEqual(busqueda.buscar('gonz', self.org), [factura.id])
+        self.assertEqual(busqueda.buscar('JOSE gonzalez', self.org), [factura.id])
+        self.assertEqual(busqueda.buscar('0010101900001A', self.org), [factura.id])
+        self.assertEqual(busqueda.buscar('001-010190-0001A', self.org), [factura.id])
+        # "1" también es el número de la primera factura: la del producto queda primero
+        self.assertEqual(busqueda.buscar('producto 1', self.org)[0], otra.id)
+        self.assertEqual(busqueda.buscar('"*)(', self.org), [])
+
+        ajena = Organizacion.objects.create(nombre='Ajena', slug='ajena')
+        self.assertEqual(busqueda.buscar('gonzalez', ajena), [])
+
+    @override_settings(FACTURA_BUSQUEDA_CANDIDATOS=2)
+    def test_coincidencia_exacta_aunque_no_este_entre_las_recientes(self):
+        Producto.objects.filter(organizacion=self.org).update(stock=100)
+        primera = self.vender(self.cliente)
+        for _ in range(11):
+            self.vender()
+
+        # "1" también es prefijo de las facturas 10, 11 y 12, más recientes
+        self.assertEqual(busqueda.buscar(str(primera.numero), self.org)[0], primera.id)
+        self.assertEqual(busqueda.buscar('001-010190-0001a', self.org), [primera.id])
+        self.assertEqual(busqueda.buscar('J0310000000001', Organizacion.objects.create(nombre='Ajena', slug='ajena')), [])
+
+    def test_endpoint_y_filtro_del_listado(self):
+        self.login()
+        factura = self.vender(self.cliente)
+        self.vender()
+
+        resultados = self.client.get('/facturas/buscar/', {'q': 'gonzález'}).json()['resultados']
+        self.assertEqual([(r['id'], r['cliente']) for r in resultados], [(factura.id, 'José González')])
+        listado = self.client.get('/facturas/', {'q': 'gonzalez'}).context['facturas']
+        self.assertEqual([f.id for f in listado], [factura.id])
+
+    def test_documentos_se_mantienen_al_cambiar_el_cliente_y_borrar(self):
+        factura = self.vender(self.cliente)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.cliente.telefono = '8888-0000'
+            self.cliente.save()
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.cliente.apellido = 'Martínez'
+            self.cliente.save()
+            # Hasta confirmar la transacción los documentos no cambian
+            self.assertEqual(busqueda.buscar('gonzalez', self.org), [factura.id])
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(busqueda.buscar('martinez', self.org), [factura.id])
+        self.assertEqual(busqueda.buscar('gonzalez', self.org), [])
+
+        factura.delete()
+        self.assertEqual(busqueda.buscar('martinez', self.org), [])
+
+    def test_comando_regenera_los_documentos(self):
+        factura = self.vender(self.cliente)
+        factura.documento_busqueda.delete()
+        self.assertEqual(busqueda.buscar('gonzalez', self.org), [])
+
+        call_command('indexar_busqueda_facturas', stdout=StringIO())
+        self.assertEqual(busqueda.buscar('gonzalez producto', self.org), [factura.id])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='facturas_archivo_'))
+class ArchivoFacturasTests(FacturacionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.corte = archivo.corte_por_defecto()
+
+    def tearDown(self):
+        shutil.rmtree(pdf_cache.directorio(), ignore_errors=True)
+
+    def vender(self, dias_antes_del_corte=None, **campos):
+        factura = confirmar_factura(Factura(usuario=self.usuario, **campos), self.carrito(1, self.productos[:2]),
+                                    organizacion=self.org)
+        if dias_antes_del_corte is not None:
+            Factura.objects.filter(pk=factura.pk).update(fecha=self.corte - timedelta(days=dias_antes_del_corte))
+        ventas_producto.actualizar_todo()
+        return factura
+
+    def test_mueve_periodos_cerrados_por_lotes_conservando_ids(self):
+        viejas = [self.vender(dias_antes_del_corte=d) for d in (1, 40, 400)]
+        credito_abierto = self.vender(dias_antes_del_corte=5, tipo_venta='credito')
+        reciente = self.vender()
+        lineas = list(DetalleFactura.objects.filter(factura__in=viejas).order_by('id').values_list('id', 'subtotal', 'iva_monto'))
+
+        self.assertEqual(archivo.archivar(self.corte, lote=2), 3)
+
+        self.assertEqual(set(Factura.objects.values_list('id', flat=True)), {credito_abierto.id, reciente.id})
+        self.assertEqual(set(FacturaArchivada.objects.values_list('id', flat=True)), {f.id for f in viejas})
+        self.assertEqual(list(DetalleFacturaArchivado.objects.order_by('id').values_list('id', 'subtotal', 'iva_monto')), lineas)
+        archivada = FacturaArchivada.objects.get(pk=viejas[0].pk)
+        self.assertEqual((archivada.numero, archivada.total, archivada.archivada), (viejas[0].numero, viejas[0].total, True))
+        self.assertEqual(archivo.archivar(self.corte), 0)
+
+    def test_no_archiva_facturas_sin_agregar(self):
+        factura = self.vender(dias_antes_del_corte=10)
+        AgregadoPendiente.objects.create(factura=factura)
+        self.assertEqual(archivo.archivar(self.corte), 0)
+        ventas_producto.actualizar_todo()
+        self.assertEqual(archivo.archivar(self.corte), 1)
+
+    def test_detalle_y_pdf_de_una_factura_archivada(self):
+        self.login()
+        factura = self.vender(dias_antes_del_corte=10)
+        archivo.archivar(self.corte)
+
+        detalle = self.client.get(f'/facturas/{factura.id}/')
+        self.assertEqual(detalle.status_code, 200)
+        self.assertContains(detalle, 'Archivada')
+        self.assertNotContains(detalle, 'Anular factura')
+        self.assertEqual(len(detalle.context['detalles']), 2)
+        pdf = self.client.get(f'/facturas/{factura.id}/pdf/')
+        self.assertEqual((pdf.status_code, pdf['Content-Type']), (200, 'application/pdf'))
+
+        Miembro.objects.filter(user=self.usuario).update(organizacion=Organizacion.objects.create(nombre='Otra', slug='otra'))
+        self.client.post('/login/', {'company': 'Otra', 'username': 'cajero', 'password': 'pass'})
+        self.assertEqual(self.client.get(f'/facturas/{factura.id}/').status_code, 404)
+
+    def test_resumen_reconstruido_incluye_archivadas_y_comando(self):
+        factura = self.vender(dias_antes_del_corte=3)
+        dia = timezone.localdate(self.corte - timedelta(days=3))
+
+        salida = StringIO()
+        call_command('archivar_facturas', stdout=salida)
+        self.assertIn('1 facturas', salida.getvalue())
+        ResumenVentaDiaria.reconstruir(dia, dia, organizacion=self.org)
+        self.assertEqual(ResumenVentaDiaria.objects.get(dia=dia).total, factura.total)
+
+        with self.assertRaises(CommandError):
+            call_command('archivar_facturas', '--antes-de', (timezone.localdate() + timedelta(days=40)).isoformat())
@@ -6,8 +6,19 @@ app_name = 'facturas'
 urlpatterns = [
     path('nueva/', views.facturar, name='facturar'),
     path('', views.factura_list, name='factura_list'),
+    path('buscar/', views.factura_buscar, name='factura_buscar'),
     path('<int:pk>/', views.factura_detalle, name='factura_detalle'),
     path('<int:pk>/pdf/', views.factura_pdf, name='factura_pdf'),
+    path('<int:pk>/anular/', views.factura_anular, name='factura_anular'),
+    path('caja/', views.caja_actual, name='caja_actual'),
+    path('caja/abrir/', views.caja_abrir, name='caja_abrir'),
+    path('caja/cerrar/', views.caja_cerrar, name='caja_cerrar'),
+    path('caja/turnos/<int:pk>/', views.caja_turno, name='caja_turno'),
+    path('sincronizar/', views.sincronizar_pos, name='sincronizar_pos'),
+    path('exportar/', views.factura_exportar, name='factura_exportar'),
+    path('exportar/<str:tabla>/', views.exportar_datos, name='exportar_datos'),
+    path('pdf/estadisticas/', views.pdf_estadisticas, name='pdf_estadisticas'),
+    path('reportes/productos/', views.reporte_productos, name='reporte_productos'),
     path('crear-pago-tarjeta/<int:factura_id>/', views.crear_pago_tarjeta, name='crear_pago_tarjeta'),
     path('crear-pago-tarjeta/', views.crear_pago_tarjeta, name='crear_pago_tarjeta_sin_id'),
     path('webhook-stripe/', views.webhook_stripe, name='webhook_stripe'),
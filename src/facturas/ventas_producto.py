@@ -0,0 +1,171 @@
+# facturas/ventas_producto.py
+"""Agregado diario de ventas por producto y reporte de productos.
+
+`confirmar_factura` deja cada factura en `AgregadoPendiente` dentro de su
+propia transacción. `actualizar` toma un lote de esas filas (que solo se
+ven cuando la factura ya está confirmada), suma sus líneas a
+`VentaProductoDiaria` y las borra, todo en la misma transacción. No depende
+del orden de los ids: una transacción lenta que confirma después (un lote
+grande de `sincronizar_ventas`, por ejemplo) se agrega en la pasada
+siguiente.
+
+Las facturas anuladas no se agregan; si la anulación llega después de que
+sus líneas ya se agregaron, `descontar_factura` las resta.
+
+`reporte` agrupa las filas diarias por producto, categoría o proveedor;
+con `moneda` convierte los ingresos de cada día con el tipo de cambio de
+ese día (`productos.tipos_cambio.convertir_moneda`, en una sola llamada).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from productos import tipos_cambio
+from .models import AgregadoPendiente, DetalleFactura, VentaProductoDiaria
+
+TAMANO_LOTE = 5000  # facturas por transacción
+
+AGRUPACIONES = {
+    'producto': ('producto_id', 'producto__nombre'),
+    'categoria': ('producto__categoria_id', 'producto__categoria__nombre'),
+    'proveedor': ('producto__proveedor_id', 'producto__proveedor__nombre_empresa'),
+}
+
+
+def _deltas(grupos, signo=1):
+    return {
+        (g['factura__organizacion_id'], g['dia'], g['producto_id'], g['moneda__codigo'] or ''):
+            (signo * (g['suma_unidades'] or 0), signo * (g['suma_ingresos'] or 0))
+        for g in grupos
+    }
+
+
+def _agrupar(lineas):
+    return (
+        lineas.values('factura__organizacion_id', 'producto_id', 'moneda__codigo', dia=TruncDate('factura__fecha'))
+        .annotate(suma_unidades=Sum('cantidad'), suma_ingresos=Sum('subtotal'), lineas=Count('id'))
+        .order_by()
+    )
+
+
+def _aplicar(deltas):
+    """Suma los deltas {(org, día, producto, moneda): (unidades, ingresos)} a las filas diarias"""
+    if not deltas:
+        return
+    existentes = VentaProductoDiaria.objects.filter(
+        dia__in={clave[1] for clave in deltas},
+        producto_id__in={clave[2] for clave in deltas},
+    )
+    cambiadas = []
+    for fila in existentes:
+        clave = (fila.organizacion_id, fila.dia, fila.producto_id, fila.moneda_codigo)
+        if clave in deltas:
+            unidades, ingresos = deltas.pop(clave)
+            fila.unidades += unidades
+            fila.ingresos += ingresos
+            cambiadas.append(fila)
+    VentaProductoDiaria.objects.bulk_update(cambiadas, ['unidades', 'ingresos'], batch_size=1000)
+    VentaProductoDiaria.objects.bulk_create([
+        VentaProductoDiaria(organizacion_id=org_id, dia=dia, producto_id=producto_id, moneda_codigo=moneda,
+                            unidades=unidades, ingresos=ingresos)
+        for (org_id, dia, producto_id, moneda), (unidades, ingresos) in deltas.items()
+    ], batch_size=1000)
+
+
+def _actualizar(limite):
+    with transaction.atomic():
+        # En PostgreSQL dos pasadas simultáneas (o una anulación) no toman las mismas facturas
+        ids = list(
+            AgregadoPendiente.objects.select_for_update(skip_locked=True)
+            .order_by('factura_id').values_list('factura_id', flat=True)[:limite]
+        )
+        if not ids:
+            return 0, 0
+        grupos = list(_agrupar(DetalleFactura.objects.filter(
+            factura_id__in=ids, producto__isnull=False, factura__anulada=False)))
+        _aplicar(_deltas(grupos))
+        AgregadoPendiente.objects.filter(factura_id__in=ids).delete()
+    return len(ids), sum(g['lineas'] for g in grupos)
+
+
+def actualizar(limite=TAMANO_LOTE):
+    """Incorpora las líneas de hasta `limite` facturas pendientes. Devuelve cuántas líneas sumó."""
+    return _actualizar(limite)[1]
+
+
+def descontar_factura(factura):
+    """Resta del agregado las líneas de `factura` si ya se habían agregado (usar dentro de la anulación)"""
+    # Si seguía pendiente basta con sacarla de la cola; si una pasada la tiene tomada, esto espera a que termine
+    borradas, _ = AgregadoPendiente.objects.filter(factura=factura).delete()
+    if borradas:
+        return
+    lineas = DetalleFactura.objects.filter(factura=factura, producto__isnull=False)
+    _aplicar(_deltas(_agrupar(lineas), signo=-1))
+
+
+def actualizar_todo(limite=TAMANO_LOTE):
+    """Actualiza por lotes hasta vaciar la cola de facturas pendientes. Devuelve cuántas líneas sumó."""
+    total = 0
+    while True:
+        facturas, lineas = _actualizar(limite)
+        if not facturas:
+            return total
+        total += lineas
+
+
+def _reporte_convertido(filas, campo_id, campo_nombre, moneda, limite):
+    diarias = list(
+        filas.values(campo_id, campo_nombre, 'moneda_codigo', 'dia')
+        .annotate(total_unidades=Sum('unidades'), total_ingresos=Sum('ingresos'))
+        .order_by()
+    )
+    por_defecto = getattr(settings, 'DEFAULT_CURRENCY', 'USD')
+    convertidos = tipos_cambio.convertir_moneda(
+        [(f['total_ingresos'], f['moneda_codigo'] or por_defecto, f['dia']) for f in diarias], moneda,
+    )
+    grupos = {}
+    for f, ingresos in zip(diarias, convertidos):
+        grupo = grupos.setdefault(f[campo_id], {
+            'id': f[campo_id],
+            'nombre': f[campo_nombre] or 'Sin asignar',
+            'moneda_codigo': moneda,
+            'unidades': 0,
+            'ingresos': Decimal('0.00'),
+        })
+        grupo['unidades'] += f['total_unidades']
+        grupo['ingresos'] += ingresos
+    return sorted(grupos.values(), key=lambda g: (g['ingresos'], g['unidades']), reverse=True)[:limite]
+
+
+def reporte(organizacion, desde, hasta, agrupar='producto', limite=50, moneda=None):
+    """Unidades e ingresos del rango por producto, categoría o proveedor, de mayor a menor ingreso.
+
+    Cada fila trae `id`, `nombre`, `moneda_codigo`, `unidades` e `ingresos`.
+    Sin `moneda` los ingresos no se suman entre monedas distintas; con
+    `moneda` todo se convierte a ella con el tipo de cambio de cada día
+    (lanza `TipoCambioNoDisponible` si falta alguno).
+    """
+    campo_id, campo_nombre = AGRUPACIONES[agrupar]
+    filas = VentaProductoDiaria.objects.filter(dia__gte=desde, dia__lte=hasta)
+    if organizacion is not None:
+        filas = filas.filter(organizacion=organizacion)
+    if moneda:
+        return _reporte_convertido(filas, campo_id, campo_nombre, moneda, limite)
+    filas = (
+        filas.values(campo_id, campo_nombre, 'moneda_codigo')
+        .annotate(total_unidades=Sum('unidades'), total_ingresos=Sum('ingresos'))
+        .order_by('-total_ingresos', '-total_unidades')[:limite]
+    )
+    return [
+        {
+            'id': f[campo_id],
+            'nombre': f[campo_nombre] or 'Sin asignar',
+            'moneda_codigo': f['moneda_codigo'],
+            'unidades': f['total_unidades'],
+            'ingresos': f['total_ingresos'],
+        }
+        for f in filas
+    ]
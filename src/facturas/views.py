@@ -1,33 +1,47 @@
 # facturas/views.py
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db import transaction
+from django.urls import reverse
+from django.db import DatabaseError
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.utils import timezone
 from django.utils.timezone import localtime
-from django.http import HttpResponse
+from django.utils.dateparse import parse_date
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.core.exceptions import ValidationError
 from django.conf import settings
 
+from datetime import datetime, time, timedelta
 from decimal import Decimal
+from urllib.parse import urlencode
 import json
+import logging
 import os
 
-from productos.models import Producto
+from productos.models import Moneda, Producto
+from productos.tipos_cambio import TipoCambioNoDisponible
+from productos import codigos
 from clientes.models import Cliente
-from .models import Factura, DetalleFactura
-from .forms import FacturaForm, DetalleFacturaFormSet
+from .models import Factura, FacturaArchivada, SecuenciaFactura, TurnoCaja
+from .forms import FacturaForm
+from .services import anular_factura, confirmar_factura, sincronizar_ventas
+from .paginacion import paginar_facturas
+from . import archivo, busqueda, caja, exportacion, exportacion_datos, impuestos, pasarela, pdf_cache, prerender, stripe_eventos, ventas_producto
 
-# NOTE: ReportLab imports moved to lazy imports inside `factura_pdf`
+# NOTE: ReportLab imports are lazy (see `facturas/pdf.py`)
 # because reportlab is an optional heavy dependency used only when
 # generating PDFs. Importing it at module import time made the
 # whole Django process fail if reportlab wasn't installed in the
-# active virtualenv. See `factura_pdf` where the real imports occur.
+# active virtualenv.
 
 import stripe
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 
+logger = logging.getLogger(__name__)
+
 
 
 
@@ -50,10 +64,17 @@ def es_vendedor(user):
         org_member = False
     return user.is_staff or user.groups.filter(name='cajeros').exists() or org_member
 
+def es_admin_organizacion(user):
+    """Staff o dueño/administrador de una organización (p. ej. para anular facturas)"""
+    try:
+        org_admin = user.organizaciones.filter(role__in=['owner', 'admin']).exists()
+    except Exception:
+        org_admin = False
+    return user.is_staff or org_admin
+
 # ---- Vista principal de facturación ----
 @login_required(login_url='/login/')
 @user_passes_test(es_vendedor)
-@transaction.atomic
 def facturar(request):
     org = getattr(request, 'organizacion', None)
     if request.method == 'POST':
@@ -67,55 +88,49 @@ def facturar(request):
         codigo_barra = request.POST.get('codigo_barra')
 
         if codigo_barra:
-            try:
-                if org is not None:
-                    producto = Producto.objects.get(codigo_barra=codigo_barra, activo=True, organizacion=org)
-                else:
-                    producto = Producto.objects.get(codigo_barra=codigo_barra, activo=True)
-                if producto.stock <= 0:
-                    messages.error(request, f"❌ El producto '{producto.nombre}' no tiene stock disponible.")
-                    return redirect('facturas:facturar')
-
-                productos_data = [{
-                    "id": producto.id,
-                    "cantidad": 1,  # ⚠️ ahora siempre 1, puedes cambiar a dinámico si quieres
-                    "precio": float(producto.precio),
-                    "moneda": producto.moneda.id,
-                    "iva": True
-                }]
-
-            except Producto.DoesNotExist:
+            # El mapa en memoria (productos/codigos.py) solo da el id: precio y activo se leen de
+            # la base porque el mapa de este worker puede estar atrasado; el stock lo valida confirmar_factura
+            resumen = codigos.resolver(codigo_barra, org)
+            producto = None
+            if resumen is not None:
+                producto = Producto.all_objects.filter(pk=resumen['id'], activo=True).values(
+                    'id', 'precio', 'moneda_id').first()
+            if producto is None:
                 messages.error(request, f"❌ No se encontró producto con código de barras {codigo_barra}")
                 return redirect('facturas:facturar')
 
+            productos_data = [{
+                "id": producto['id'],
+                "cantidad": 1,  # ⚠️ ahora siempre 1, puedes cambiar a dinámico si quieres
+                "precio": str(producto['precio']),
+                "moneda": producto['moneda_id'],
+                "iva": True
+            }]
+
         # ----------------------------
         # Validación del formulario
         # ----------------------------
         if form.is_valid():
-            try:
-                # Crear factura en memoria
-                factura = form.save(commit=False)
-                if org is not None:
-                    factura.organizacion = org
-                factura.usuario = request.user
-                factura.metodo_pago = request.POST.get('metodo_pago', 'efectivo')
-                factura.id_transaccion = request.POST.get('id_transaccion', '')
-                factura.estado_pago = request.POST.get('estado_pago', 'pendiente')
-
-                # Pagos en efectivo
-                if factura.metodo_pago == 'efectivo':
-                    try:
-                        factura.monto_recibido = Decimal(request.POST.get('monto_recibido', '0'))
-                        factura.vuelto = Decimal(request.POST.get('vuelto', '0'))
-                    except (ValueError, Exception):
-                        factura.monto_recibido = Decimal('0')
-                        factura.vuelto = Decimal('0')
-
-                    factura.pagada = True
-                    factura.estado_pago = 'completado'
-
-                factura.save()
+            # Crear factura en memoria; el servicio la guarda junto con sus líneas
+            factura = form.save(commit=False)
+            factura.usuario = request.user
+            metodo_pago = request.POST.get('metodo_pago', 'efectivo')
+            id_transaccion = request.POST.get('id_transaccion', '')
+            estado_pago = request.POST.get('estado_pago', 'pendiente')
+
+            # Pagos en efectivo
+            if metodo_pago == 'efectivo':
+                try:
+                    factura.monto_recibido = Decimal(request.POST.get('monto_recibido', '0'))
+                    factura.vuelto = Decimal(request.POST.get('vuelto', '0'))
+                except (ValueError, Exception):
+                    factura.monto_recibido = Decimal('0')
+                    factura.vuelto = Decimal('0')
+
+                factura.pagada = True
+                estado_pago = 'completado'
 
+            try:
                 # ----------------------------
                 # Procesar productos
                 # ----------------------------
@@ -123,52 +138,23 @@ def facturar(request):
                     productos_json = request.POST.get('productos_json')
                     if not productos_json:
                         raise ValidationError('No se encontraron productos en la factura')
-                    productos_data = json.loads(productos_json)
+                    try:
+                        productos_data = json.loads(productos_json)
+                    except ValueError:
+                        raise ValidationError('Los productos enviados no son válidos')
 
-                ids = [int(p['id']) for p in productos_data]
-                productos_qs = Producto.objects.select_related('moneda').filter(id__in=ids)
-                if org is not None:
-                    productos_qs = productos_qs.filter(organizacion=org)
-                productos = {p.id: p for p in productos_qs}
-
-                for prod_data in productos_data:
-                    producto = productos.get(int(prod_data['id']))
-                    if not producto:
-                        raise ValidationError(f'Producto con ID {prod_data["id"]} no existe')
-
-                    cantidad = int(prod_data['cantidad'])
-                    if producto.stock < cantidad:
-                        raise ValidationError(
-                            f'Stock insuficiente para {producto.nombre}. '
-                            f'Disponible: {producto.stock}, Solicitado: {cantidad}'
-                        )
-
-                    DetalleFactura.objects.create(
-                        factura=factura,
-                        producto=producto,
-                        cantidad=cantidad,
-                        precio_unitario=Decimal(str(prod_data['precio'])),
-                        moneda=producto.moneda,
-                        iva=prod_data.get('iva', True)
-                    )
-
-                    # Descontar stock
-                    producto.stock -= cantidad
-                    producto.save()
-
-                # Recalcular totales
-                factura.calcular_totales()
-                factura.save()
-
-                messages.success(request, f'Factura #{factura.id} creada correctamente ✅')
+                confirmar_factura(
+                    factura, productos_data, organizacion=org,
+                    metodo_pago=metodo_pago, id_transaccion=id_transaccion, estado_pago=estado_pago,
+                )
+
+                messages.success(request, f'Factura #{factura.numero_visible} creada correctamente ✅')
                 return redirect('facturas:factura_detalle', pk=factura.id)
 
             except ValidationError as e:
-                messages.error(request, str(e))
-                raise  # fuerza rollback
-            except Exception as e:
-                messages.error(request, f'⚠️ Error inesperado al guardar la factura')
-                raise  # log real -> logger.error(str(e))
+                for error in e.messages:
+                    messages.error(request, error)
+                return redirect('facturas:facturar')
 
         else:
             messages.error(request, 'Error en los datos del formulario')
@@ -178,313 +164,367 @@ def facturar(request):
 
     else:
         form = FacturaForm()
-        productos_con_moneda = Producto.objects.select_related('moneda').filter(stock__gt=0, activo=True)
-        if org is not None:
-            productos_con_moneda = productos_con_moneda.filter(organizacion=org)
-     
+
+    # El catálogo no se incluye en la página: el modal busca en productos:buscar_productos
     return render(request, 'core/facturar.html', {
         'form': form,
-        'productos': productos_con_moneda,
         'clientes': Cliente.objects.filter(organizacion=org) if org is not None else Cliente.objects.all(),
-        'numero_factura': Factura.objects.filter(organizacion=org).count() + 1 if org is not None else Factura.objects.count() + 1
+        # Solo informativo: el número definitivo se reserva al guardar la factura
+        'numero_factura': SecuenciaFactura.proximo(org.id if org is not None else None),
+        # Solo para la vista previa del carrito: el IVA definitivo se calcula al confirmar
+        'tasa_iva': impuestos.porcentaje(org.id if org is not None else None),
     })
     
 
 # ---- Listado de facturas ----
+def filtrar_facturas(facturas, params, organizacion=None):
+    """Aplica los filtros del listado (rango de fechas, pagada, tipo_venta y texto `q`).
+
+    Todos los filtros son compatibles con los índices (organizacion, ..., fecha, id):
+    las fechas se convierten en un rango sobre `fecha` en la zona horaria local y
+    `q` se resuelve con el índice de texto completo (las facturas más relevantes,
+    hasta FACTURA_BUSQUEDA_MAX).
+    Devuelve el queryset filtrado y un dict con los filtros válidos aplicados.
+    """
+    filtros = {}
+    q = (params.get('q') or '').strip()
+    if q:
+        ids = busqueda.buscar(q, organizacion, limite=getattr(settings, 'FACTURA_BUSQUEDA_MAX', 500))
+        facturas = facturas.filter(id__in=ids)
+        filtros['q'] = q
+    desde = parse_date(params.get('desde') or '')
+    hasta = parse_date(params.get('hasta') or '')
+    if desde:
+        facturas = facturas.filter(fecha__gte=timezone.make_aware(datetime.combine(desde, time.min)))
+        filtros['desde'] = desde.isoformat()
+    if hasta:
+        facturas = facturas.filter(fecha__lt=timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min)))
+        filtros['hasta'] = hasta.isoformat()
+    pagada = params.get('pagada')
+    if pagada in ('1', '0'):
+        facturas = facturas.filter(pagada=(pagada == '1'))
+        filtros['pagada'] = pagada
+    tipo_venta = params.get('tipo_venta')
+    if tipo_venta in dict(Factura.TIPO_VENTA_CHOICES):
+        facturas = facturas.filter(tipo_venta=tipo_venta)
+        filtros['tipo_venta'] = tipo_venta
+    return facturas, filtros
+
+
+def filtrar_con_archivadas(params, organizacion=None):
+    """`filtrar_facturas` sobre las facturas vigentes y las archivadas.
+
+    Devuelve (vigentes, archivadas, filtros). Las archivadas no tienen
+    documento de búsqueda: con `q` solo se encuentran facturas vigentes.
+    """
+    vigentes, archivadas = Factura.objects.all(), FacturaArchivada.objects.all()
+    if organizacion is not None:
+        vigentes, archivadas = vigentes.filter(organizacion=organizacion), archivadas.filter(organizacion=organizacion)
+    vigentes, filtros = filtrar_facturas(vigentes, params, organizacion)
+    archivadas, _ = filtrar_facturas(archivadas, params, organizacion)
+    return vigentes, archivadas, filtros
+
+
 @login_required
 @user_passes_test(es_admin_o_vendedor)
 def factura_list(request):
     org = getattr(request, 'organizacion', None)
-    facturas = Factura.objects.filter(organizacion=org).order_by('-fecha') if org is not None else Factura.objects.all().order_by('-fecha')
-    # Añadir información de moneda por factura (predominante o mezcla)
-    for factura in facturas:
-        detalles = factura.detalles.all()
-        codigos = set(d.moneda.codigo for d in detalles if getattr(d, 'moneda', None))
-        simbolos = set((d.moneda.simbolo or '') for d in detalles if getattr(d, 'moneda', None))
-        if len(codigos) == 1:
-            factura.currency_code = list(codigos)[0]
-            # preferir símbolo si existe, sino usar el código
-            s = next((d.moneda.simbolo for d in detalles if getattr(d, 'moneda', None) and d.moneda.simbolo), '')
-            factura.currency_symbol = s or factura.currency_code
-            factura.currency_mixed = False
-        elif len(codigos) > 1:
-            factura.currency_code = 'MULTI'
-            factura.currency_symbol = ''
-            factura.currency_mixed = True
-        else:
-            factura.currency_code = getattr(settings, 'DEFAULT_CURRENCY', 'USD')
-            factura.currency_symbol = factura.currency_code
-            factura.currency_mixed = False
+    facturas = Factura.objects.filter(organizacion=org) if org is not None else Factura.objects.all()
+    facturas, filtros = filtrar_facturas(facturas, request.GET, org)
+    # El resumen de moneda está guardado en la propia factura (moneda_codigo/simbolo/mixta),
+    # así que basta con traer cliente y usuario en la misma consulta.
+    facturas = facturas.select_related('cliente', 'usuario')
+    # Paginación por cursor sobre (fecha, id): sin OFFSET ni COUNT(*)
+    pagina = paginar_facturas(facturas, despues=request.GET.get('despues'), antes=request.GET.get('antes'))
+
+    return render(request, 'core/factura_list.html', {
+        'facturas': pagina,
+        'pagina': pagina,
+        'filtros': filtros,
+        'filtros_query': urlencode(filtros),
+        'tipos_venta': Factura.TIPO_VENTA_CHOICES,
+    })
 
-    return render(request, 'core/factura_list.html', {'facturas': facturas})
+@login_required
+@user_passes_test(es_admin_o_vendedor)
+def factura_buscar(request):
+    """Facturas por cliente, NIT, cédula, número o producto, de la más relevante a la menos (JSON)."""
+    org = getattr(request, 'organizacion', None)
+    try:
+        limite = max(1, min(int(request.GET.get('limite', 20)), 100))
+    except ValueError:
+        limite = 20
+    ids = busqueda.buscar(request.GET.get('q', ''), org, limite=limite)
+    facturas = Factura.objects.filter(id__in=ids).select_related('cliente')
+    if org is not None:
+        facturas = facturas.filter(organizacion=org)
+    por_id = {f.id: f for f in facturas}
+    resultados = [
+        {
+            'id': f.id,
+            'numero': f.numero_visible,
+            'fecha': localtime(f.fecha).isoformat(),
+            'cliente': str(f.cliente) if f.cliente else 'Consumidor Final',
+            'total': str(f.total),
+            'moneda': f.currency_code,
+            'anulada': f.anulada,
+            'url': reverse('facturas:factura_detalle', args=[f.id]),
+        }
+        for f in (por_id[i] for i in ids if i in por_id)
+    ]
+    return JsonResponse({'resultados': resultados})
 
 @login_required
 def factura_detalle(request, pk):
     org = getattr(request, 'organizacion', None)
-    factura = get_object_or_404(Factura.objects.filter(organizacion=org) if org is not None else Factura.objects, pk=pk)
-    detalles = factura.detalles.all()
-    for detalle in detalles:
-        if detalle.iva:
-            detalle.iva_monto = detalle.subtotal * Decimal('0.15')
-        else:
-            detalle.iva_monto = Decimal('0.00')
-        detalle.total_con_iva = detalle.subtotal + detalle.iva_monto
+    # Las facturas de períodos cerrados pueden estar en el archivo
+    factura = archivo.obtener_factura(pk, org)
+    # El IVA y el total de cada línea se guardaron al confirmar la venta
+    detalles = factura.detalles.select_related('producto')
     return render(request, 'core/factura_detalle.html', {
         'factura': factura,
         'detalles': detalles
     })
 
+@login_required
+@user_passes_test(es_admin_organizacion)
+def factura_anular(request, pk):
+    if request.method != 'POST':
+        return redirect('facturas:factura_detalle', pk=pk)
+    org = getattr(request, 'organizacion', None)
+    factura = get_object_or_404(Factura.objects.filter(organizacion=org) if org is not None else Factura.objects, pk=pk)
+    try:
+        anular_factura(factura)
+        messages.success(request, f'Factura #{factura.numero_visible} anulada; el stock fue repuesto')
+    except ValidationError as e:
+        for error in e.messages:
+            messages.error(request, error)
+    return redirect('facturas:factura_detalle', pk=pk)
+
+# ---- Turnos y cierre de caja ----
+def _monto(valor):
+    try:
+        return Decimal(str(valor or '0').replace(',', '.')).quantize(Decimal('0.01'))
+    except (ArithmeticError, ValueError):
+        raise ValidationError('Monto inválido')
+
+@login_required
+@user_passes_test(es_vendedor)
+def caja_actual(request):
+    """Turno abierto del cajero con su cierre en vivo, o el formulario para abrir uno."""
+    org = getattr(request, 'organizacion', None)
+    turno = caja.turno_abierto(request.user, org)
+    return render(request, 'core/caja.html', {
+        'turno': turno,
+        'resumen': caja.resumen_turno(turno) if turno else None,
+        'anteriores': TurnoCaja.objects.filter(organizacion=org, usuario=request.user, cerrado_en__isnull=False)[:10],
+    })
+
+@login_required
+@user_passes_test(es_vendedor)
+def caja_abrir(request):
+    if request.method == 'POST':
+        try:
+            caja.abrir_turno(request.user, getattr(request, 'organizacion', None),
+                             _monto(request.POST.get('monto_inicial')))
+            messages.success(request, 'Turno de caja abierto')
+        except ValidationError as e:
+            for error in e.messages:
+                messages.error(request, error)
+    return redirect('facturas:caja_actual')
+
+@login_required
+@user_passes_test(es_vendedor)
+def caja_cerrar(request):
+    if request.method != 'POST':
+        return redirect('facturas:caja_actual')
+    turno = caja.turno_abierto(request.user, getattr(request, 'organizacion', None))
+    if turno is None:
+        messages.error(request, 'No tiene un turno de caja abierto')
+        return redirect('facturas:caja_actual')
+    try:
+        turno = caja.cerrar_turno(turno, _monto(request.POST.get('efectivo_contado')))
+    except ValidationError as e:
+        for error in e.messages:
+            messages.error(request, error)
+        return redirect('facturas:caja_actual')
+    messages.success(request, 'Turno cerrado')
+    return redirect('facturas:caja_turno', pk=turno.pk)
+
+@login_required
+@user_passes_test(es_vendedor)
+def caja_turno(request, pk):
+    """Reporte de cierre de un turno (el guardado al cerrarlo, o en vivo si sigue abierto)."""
+    org = getattr(request, 'organizacion', None)
+    turnos = TurnoCaja.objects.filter(organizacion=org) if org is not None else TurnoCaja.objects.all()
+    if not es_admin_organizacion(request.user):
+        turnos = turnos.filter(usuario=request.user)
+    turno = get_object_or_404(turnos.select_related('usuario'), pk=pk)
+    return render(request, 'core/caja_turno.html', {
+        'turno': turno,
+        'resumen': turno.resumen if not turno.abierto else caja.resumen_turno(turno),
+    })
+
 # ---- Generar PDF de factura con hora local y QR centrado ----
 @login_required
 @user_passes_test(es_admin_o_vendedor)
 def factura_pdf(request, pk):
     org = getattr(request, 'organizacion', None)
-    factura = get_object_or_404(Factura.objects.filter(organizacion=org) if org is not None else Factura.objects, id=pk)
-    detalles = factura.detalles.all()
-    for detalle in detalles:
-        detalle.iva_monto = detalle.subtotal * Decimal('0.19') if detalle.iva else Decimal('0.00')
-        detalle.total_con_iva = detalle.subtotal + detalle.iva_monto
+    factura = archivo.obtener_factura(pk, org, relacionadas=('cliente', 'usuario', 'organizacion'))
+
+    # GET condicional: si el cliente ya tiene esta versión se responde 304 sin tocar el PDF
+    etag = pdf_cache.etag(factura)
+    ultima_modificacion = pdf_cache.ultima_modificacion(factura)
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+    if no_modificado is not None:
+        no_modificado['Cache-Control'] = 'private, no-cache'
+        return no_modificado
 
-    # IMPORTS PEREZOSOS: importar ReportLab solo cuando se genera el PDF
     try:
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.lib.units import cm, inch
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-        from reportlab.lib import colors
-        from reportlab.graphics.barcode import qr
-        from reportlab.graphics.shapes import Drawing
-    except Exception:
+        contenido = pdf_cache.obtener_o_renderizar(factura)
+    except ImportError:
         # Si reportlab no está disponible, devolver un mensaje claro en vez de romper el arranque
         return HttpResponse(
             "ReportLab no está instalado en este entorno. Para generar PDFs instala el paquete 'reportlab'.",
             status=501,
         )
 
-    # Detectar si la factura tiene monedas mixtas
-    moneda_codigos = set(d.moneda.codigo for d in detalles if getattr(d, 'moneda', None))
-    moneda_simbolos = {d.moneda.codigo: (d.moneda.simbolo or '') for d in detalles if getattr(d, 'moneda', None)}
-    if len(moneda_codigos) == 1:
-        moneda_unica = moneda_codigos.pop()
-        moneda_simbolo = moneda_simbolos.get(moneda_unica, moneda_unica)
-        mixed = False
-    elif len(moneda_codigos) > 1:
-        moneda_unica = None
-        moneda_simbolo = ''
-        mixed = True
-    else:
-        moneda_unica = getattr(settings, 'DEFAULT_CURRENCY', 'USD')
-        moneda_simbolo = moneda_unica
-        mixed = False
+    response = HttpResponse(contenido, content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="Factura_{factura.numero_visible}.pdf"'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima_modificacion)
+    # El navegador puede guardar el PDF pero debe revalidar (obteniendo 304) en cada uso
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+@login_required
+@user_passes_test(es_vendedor)
+def sincronizar_pos(request):
+    """Recibe en JSON un lote de ventas de una terminal POS y devuelve un resultado por venta.
 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="Factura_{factura.id}.pdf"'
+    Cuerpo: {"ventas": [{"clave": "...", "productos": [...], ...}, ...]}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    try:
+        ventas = json.loads(request.body).get('ventas')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    if not isinstance(ventas, list):
+        return JsonResponse({'error': 'Se esperaba una lista "ventas"'}, status=400)
+    maximo = getattr(settings, 'FACTURA_SYNC_MAX_LOTE', 500)
+    if len(ventas) > maximo:
+        return JsonResponse({'error': f'El lote admite como máximo {maximo} ventas'}, status=400)
 
-    doc = SimpleDocTemplate(response, pagesize=letter, rightMargin=1*cm, leftMargin=1*cm, topMargin=1*cm, bottomMargin=1*cm)
-    elements = []
-    styles = getSampleStyleSheet()
+    org = getattr(request, 'organizacion', None)
+    resultados = sincronizar_ventas(ventas, request.user, organizacion=org)
+    return JsonResponse({'resultados': resultados})
 
-    # Estilos personalizados
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=14, spaceAfter=12, alignment=1)
-    company_style = ParagraphStyle('Company', parent=styles['Normal'], fontSize=12, spaceAfter=6, alignment=1, textColor=colors.black)
-    info_style = ParagraphStyle('Info', parent=styles['Normal'], fontSize=9, spaceAfter=3, textColor=colors.black)
-    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=7, spaceAfter=3, textColor=colors.black, alignment=0)
-    fecha_style = ParagraphStyle('Fecha', parent=footer_style, alignment=0)
+@login_required
+@user_passes_test(es_admin_o_vendedor)
+def exportar_datos(request, tabla):
+    """Exporta facturas o sus líneas (mismos filtros que el listado) a CSV, CSV.gz o XLSX.
 
-    fecha_local = localtime(factura.fecha)
+    Incluye las facturas archivadas del rango.
+    """
+    if tabla not in exportacion_datos.TABLAS:
+        raise Http404('Tabla de exportación desconocida')
+    org = getattr(request, 'organizacion', None)
+    facturas, archivadas, filtros = filtrar_con_archivadas(request.GET, org)
+    _, columnas = exportacion_datos.TABLAS[tabla]
+    filas = exportacion_datos.filas_para_exportar(tabla, facturas, archivadas)
+    nombre = '_'.join([tabla] + [filtros[k] for k in ('desde', 'hasta') if k in filtros])
 
-    # Logo de la empresa
-    try:
-        logo_path = os.path.join(settings.BASE_DIR, "static", "img", "logo-empresa.png")
-        if os.path.exists(logo_path):
-            logo = Image(logo_path, width=80, height=80)
-            logo.hAlign = 'CENTER'
-            elements.append(logo)
-        elements.append(Paragraph("GONZALEZ S.A", company_style))
-    except Exception as e:
-        print(f"Error cargando logo: {e}")
-        elements.append(Paragraph("GONZALEZ S.A", company_style))
-
-    # Información empresa
-    elements.append(Paragraph("Nit: 000000000-0", info_style))
-    elements.append(Paragraph("Dolores Carazo", info_style))
-    elements.append(Paragraph("Tel: 85727222", info_style))
-
-    # Título factura
-    elements.append(Paragraph("FACTURA ELECTRONICA DE VENTA", title_style))
-
-    # Información de la factura
-    info_data = [
-        [Paragraph(f"<b>No.</b>{factura.id}", info_style),
-         Paragraph(f"<b>Cliente:</b> {factura.cliente.nombre if factura.cliente else 'Consumidor Final'}", info_style)],
-        [Paragraph(f"<b>Fecha:</b> {fecha_local.strftime('%Y-%m-%d')}", info_style),
-         Paragraph(f"<b>Nit:</b> {factura.cliente.nit if factura.cliente and factura.cliente.nit else 'CF'}", info_style)],
-        [Paragraph(f"<b>Hora:</b> {fecha_local.strftime('%I:%M:%S %p')}", info_style),
-         Paragraph(f"<b>Dirección:</b> {factura.cliente.direccion if factura.cliente and factura.cliente.direccion else '-'}", info_style)],
-        [Paragraph("", info_style),
-         Paragraph(f"<b>Tel:</b> {factura.cliente.telefono if factura.cliente and factura.cliente.telefono else '-'}", info_style)],
-        [Paragraph("", info_style),
-         Paragraph(f"<b>Ciudad:</b> {factura.cliente.ciudad if factura.cliente and factura.cliente.ciudad else '-'}", info_style)],
-    ]
-    info_table = Table(info_data, colWidths=[doc.width/2.0]*2)
-    info_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    elements.append(info_table)
-
-    # Forma de pago y vendedor
-    elements.append(Spacer(1, 0.2*cm))
-    elements.append(Paragraph(f"<b>Forma de Pago:</b> {factura.get_tipo_venta_display()}", info_style))
-    elements.append(Paragraph(f"<b>Vendedor:</b> {factura.usuario.get_full_name() or factura.usuario.username}", info_style))
-    elements.append(Spacer(1, 0.3*cm))
-
-    # Tabla productos
-    product_data = [['Cant', 'Detalle', 'Iva', 'P. Unitario', 'Total']]
-    for detalle in detalles:
-        # usar el símbolo del propio detalle si existe, si no usar el código
-        simbolo_det = ''
+    if request.GET.get('formato') == 'xlsx':
         try:
-            simbolo_det = detalle.moneda.simbolo if detalle.moneda and detalle.moneda.simbolo else detalle.moneda.codigo if detalle.moneda else ''
-        except Exception:
-            simbolo_det = ''
-
-        product_data.append([
-            str(detalle.cantidad),
-            detalle.producto.nombre,
-            '19' if detalle.iva else '0',
-            f"{simbolo_det}{detalle.precio_unitario:.2f}",
-            f"{simbolo_det}{detalle.total_con_iva:.2f}"
-        ])
-    product_table = Table(product_data,
-                         colWidths=[doc.width*0.05, doc.width*0.55, doc.width*0.10, doc.width*0.15, doc.width*0.15],
-                         repeatRows=1)
-    product_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('ALIGN', (0, 1), (0, -1), 'CENTER'),
-        ('ALIGN', (2, 1), (2, -1), 'CENTER'),
-        ('ALIGN', (3, 1), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(product_table)
-    elements.append(Spacer(1, 0.3*cm))
-
-    # Totales
-    total_data = []
-    if not mixed and moneda_unica:
-        pref = moneda_simbolo or moneda_unica
-        total_data = [
-            ['Subtotal:', f"{pref}{factura.subtotal:.2f}"],
-            ['Iva:', f"{pref}{factura.iva_total:.2f}"],
-            ['Total:', f"{pref}{factura.total:.2f}"]
-        ]
-        if factura.tipo_venta == 'contado':
-            total_data.extend([
-                ['Recibido:', f"{pref}{factura.monto_recibido:.2f}"],
-                ['Cambio:', f"{pref}{factura.vuelto:.2f}"]
-            ])
+            ruta = exportacion_datos.escribir_xlsx(filas, columnas, tabla)
+        except ImportError:
+            return HttpResponse('Exportar a Excel requiere openpyxl. Instale openpyxl en el entorno del servidor.', status=501)
+        salida = open(ruta, 'rb')
+        os.unlink(ruta)
+        return FileResponse(salida, as_attachment=True, filename=f'{nombre}.xlsx',
+                            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+    contenido = exportacion_datos.generar_csv(filas, columnas)
+    if request.GET.get('gzip') == '1':
+        response = StreamingHttpResponse(exportacion_datos.comprimir_gzip(contenido), content_type='application/gzip')
+        response['Content-Disposition'] = f'attachment; filename="{nombre}.csv.gz"'
     else:
-        # Monedas mixtas: mostrar totales sin símbolo y agregar nota
-        total_data = [
-            ['Subtotal:', f"{factura.subtotal:.2f}"],
-            ['Iva:', f"{factura.iva_total:.2f}"],
-            ['Total:', f"{factura.total:.2f}"]
-        ]
-        if factura.tipo_venta == 'contado':
-            total_data.extend([
-                ['Recibido:', f"{factura.monto_recibido:.2f}"],
-                ['Cambio:', f"{factura.vuelto:.2f}"]
-            ])
-    total_table = Table(total_data, colWidths=[doc.width/3.0, doc.width/3.0])
-    total_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTNAME', (0, 2), (1, 2), 'Helvetica-Bold'),
-        ('LINEABOVE', (0, 2), (1, 2), 1, colors.black),
-        ('FONTSIZE', (0, 2), (1, 2), 11),
-    ]))
-    elements.append(total_table)
-    elements.append(Spacer(1, 0.3*cm))
-
-    # Detalles de impuestos
-    elements.append(Paragraph("<b>DETALLES DE IMPUESTOS</b>", info_style))
-    tax_data = [['% IVA', 'BASE', 'VALOR IVA']]
-    # Para la tabla de impuestos usamos el prefijo si no es mixto
-    if not mixed and moneda_simbolo:
-        tax_data.append(['19', f"{moneda_simbolo}{factura.subtotal:.2f}", f"{moneda_simbolo}{factura.iva_total:.2f}"])
-    else:
-        tax_data.append(['19', f"{factura.subtotal:.2f}", f"{factura.iva_total:.2f}"])
-    tax_table = Table(tax_data, colWidths=[doc.width/4.0]*3)
-    tax_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('ALIGN', (1, 1), (-1, 1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(tax_table)
-
-    elements.append(Spacer(1, 0.2*cm))
-    elements.append(Paragraph(f"<b>Cantidad items:</b> {len(detalles)}", info_style))
-
-    # QR centrado con info completa
-    # QR: incluir moneda o nota de mezcla
-    total_display = f"{moneda_simbolo}{factura.total:.2f}" if (not mixed and moneda_simbolo) else f"{factura.total:.2f}"
-    moneda_note = moneda_unica if (not mixed and moneda_unica) else ('MULTI' if mixed else '')
-    qr_text = f"""
-Factura No: {factura.id}
-Cliente: {factura.cliente.nombre if factura.cliente else 'Consumidor Final'}
-NIT: {factura.cliente.nit if factura.cliente and factura.cliente.nit else 'CF'}
-Total: {total_display} {moneda_note}
-Fecha: {fecha_local.strftime('%Y-%m-%d %H:%M:%S')}
-Vendedor: {factura.usuario.get_full_name() or factura.usuario.username}
-"""
-    qr_code = qr.QrCodeWidget(qr_text)
-    bounds = qr_code.getBounds()
-    size = 80
-    w = bounds[2] - bounds[0]
-    h = bounds[3] - bounds[1]
-    d = Drawing(size, size, transform=[size/w, 0, 0, size/h, 0, 0])
-    d.add(qr_code)
-
-    qr_table = Table([[d]], colWidths=[doc.width])
-    qr_table.setStyle(TableStyle([
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE')
-    ]))
-    elements.append(Spacer(1, 0.5*cm))
-    elements.append(qr_table)
-
-    # Pie de página y fechas
-    elements.append(Spacer(1, 0.5*cm))
-    elements.append(Paragraph("Impreso por: GONZALEZ S.A — RUC: 1234567890000", footer_style))
-    elements.append(Paragraph("Autorización de la DGI: No. 18900234 del 2024-01-01", footer_style))
-    elements.append(Paragraph("Esta factura fue generada electrónicamente y tiene validez legal conforme normativa DGI Nicaragua.", footer_style))
-
-    doc.build(elements)
+        response = StreamingHttpResponse(contenido, content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
     return response
 
-# Inicialización de Stripe se hace de forma perezosa dentro de las vistas
-def _init_stripe():
-    key = getattr(settings, 'STRIPE_SECRET_KEY', None)
-    if key:
-        stripe.api_key = key
-    return key
+@login_required
+@user_passes_test(es_admin_o_vendedor)
+def reporte_productos(request):
+    """Productos (o categorías/proveedores) más vendidos en un rango de días, desde el agregado diario."""
+    hoy = timezone.localdate()
+    desde = parse_date(request.GET.get('desde') or '') or hoy.replace(day=1)
+    hasta = parse_date(request.GET.get('hasta') or '') or hoy
+    agrupar = request.GET.get('agrupar')
+    if agrupar not in ventas_producto.AGRUPACIONES:
+        agrupar = 'producto'
+    try:
+        limite = max(1, min(int(request.GET.get('limite', 50)), 500))
+    except ValueError:
+        limite = 50
+
+    monedas = list(Moneda.objects.order_by('codigo').values_list('codigo', flat=True))
+    moneda = request.GET.get('moneda')
+    if moneda not in monedas:
+        moneda = None
+
+    # Solo lee el agregado: lo pone al día el comando actualizar_ventas_producto (Procfile/start.sh)
+    org = getattr(request, 'organizacion', None)
+    error_cambio = None
+    try:
+        filas = ventas_producto.reporte(org, desde, hasta, agrupar=agrupar, limite=limite, moneda=moneda)
+    except TipoCambioNoDisponible as e:
+        error_cambio = f'{e}: se muestran los ingresos sin convertir'
+        moneda = None
+        filas = ventas_producto.reporte(org, desde, hasta, agrupar=agrupar, limite=limite)
+    return render(request, 'core/reporte_productos.html', {
+        'filas': filas,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'agrupar': agrupar,
+        'limite': limite,
+        'agrupaciones': [('producto', 'Producto'), ('categoria', 'Categoría'), ('proveedor', 'Proveedor')],
+        'monedas': monedas,
+        'moneda': moneda or '',
+        'error_cambio': error_cambio,
+    })
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def pdf_estadisticas(request):
+    """Profundidad de la cola de pre-renderizado y tiempos de renderizado (JSON)."""
+    return JsonResponse(prerender.estadisticas())
+
+@login_required
+@user_passes_test(es_admin_o_vendedor)
+def factura_exportar(request):
+    """Descarga los PDFs de las facturas filtradas (mismos filtros que el listado) como ZIP.
+
+    Incluye las facturas archivadas del rango. Se renderizan en este proceso;
+    el PDF unido y los pools de procesos quedan para el comando exportar_facturas_pdf.
+    """
+    org = getattr(request, 'organizacion', None)
+    facturas, archivadas, filtros = filtrar_con_archivadas(request.GET, org)
+    if 'desde' not in filtros or 'hasta' not in filtros:
+        return HttpResponse('Indique el rango de fechas (desde y hasta).', status=400)
+
+    limite = getattr(settings, 'FACTURA_EXPORT_MAX', 1000)
+    ids = exportacion.ids_por_fecha(archivadas, facturas, limite=limite + 1)
+    if len(ids) > limite:
+        return HttpResponse(f'El rango incluye más de {limite} facturas; acótelo o use el comando exportar_facturas_pdf.', status=400)
+
+    nombre = f"facturas_{filtros['desde']}_{filtros['hasta']}"
+    response = StreamingHttpResponse(exportacion.generar_zip(ids), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.zip"'
+    return response
 
-def crear_pago_tarjeta(request, factura_id):
+def crear_pago_tarjeta(request, factura_id=None):
     # Esta vista acepta dos modos:
     # - POST con JSON: { monto: <number>, currency: 'USD' }
     # - GET/URL con factura_id para compatibilidad (no recomendado)
@@ -530,17 +570,17 @@ def crear_pago_tarjeta(request, factura_id):
             if not currency:
                 currency = getattr(settings, 'DEFAULT_CURRENCY', 'usd')
 
-        # Inicializar Stripe con la clave (si está configurada)
-        _init_stripe()
-
-        # Crear un Payment Intent en Stripe
-        intent = stripe.PaymentIntent.create(
-            amount=int(monto * 100),  # Stripe usa centavos
-            currency=currency,
+        # Crear un Payment Intent en Stripe (cliente compartido, con timeouts y circuit breaker)
+        centavos = int(monto * 100)  # Stripe usa centavos
+        intent = pasarela.obtener_pasarela().crear_payment_intent(
+            centavos,
+            currency,
             metadata={
                 'factura_id': factura.id if factura else '',
                 'cliente': factura.cliente.nombre if factura and factura.cliente else 'Consumidor Final'
-            }
+            },
+            # Repetir el cobro de la misma factura devuelve el mismo PaymentIntent
+            clave_idempotencia=f'factura-{factura.id}-{centavos}-{currency}' if factura else None,
         )
 
         return JsonResponse({
@@ -548,40 +588,31 @@ def crear_pago_tarjeta(request, factura_id):
             'factura_id': factura.id if factura else None,
             'monto': float(monto)
         })
+    except pasarela.PasarelaNoDisponible as e:
+        response = JsonResponse({'error': str(e)}, status=503)
+        response['Retry-After'] = str(int(getattr(settings, 'STRIPE_CIRCUITO_ESPERA', 30)))
+        return response
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
 def webhook_stripe(request):
-    # Esta vista maneja las notificaciones de Stripe
-    payload = request.body
-    sig_header = request.META['HTTP_STRIPE_SIGNATURE']
-    
+    """Recibe las notificaciones de Stripe: verifica la firma, guarda el evento y responde.
+
+    Con `STRIPE_EVENTOS_WORKER` la factura se actualiza después, en lote, con
+    `python manage.py procesar_eventos_stripe`; sin worker los eventos
+    pendientes se aplican aquí mismo, antes de responder.
+    """
+    if request.method != 'POST':
+        return HttpResponse(status=405)
     try:
-        _init_stripe()
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, getattr(settings, 'STRIPE_WEBHOOK_SECRET', None)
-        )
-    except ValueError as e:
-        return HttpResponse(status=400)
-    except stripe.error.SignatureVerificationError as e:
+        stripe_eventos.registrar_evento(request.body, request.META.get('HTTP_STRIPE_SIGNATURE', ''))
+    except (ValueError, stripe.SignatureVerificationError):
         return HttpResponse(status=400)
-
-    # Manejar el evento de pago exitoso
-    if event.type == 'payment_intent.succeeded':
-        payment_intent = event.data.object
-        factura_id = payment_intent.metadata.get('factura_id')
-
-        if factura_id:
-            try:
-                # Webhooks are external and may not include org context; attempt to find by id.
-                factura = Factura.objects.filter(id=factura_id).first()
-                if factura:
-                    factura.estado_pago = 'completado'
-                    factura.id_transaccion = payment_intent.id
-                    factura.pagada = True
-                    factura.save()
-            except Exception:
-                pass
-    
-    return HttpResponse(status=200)
\ No newline at end of file
+    if not getattr(settings, 'STRIPE_EVENTOS_WORKER', False):
+        try:
+            stripe_eventos.procesar_lote()
+        except DatabaseError:
+            # El evento ya está guardado: queda pendiente para el próximo webhook o el worker
+            logger.exception('No se pudieron aplicar los eventos de Stripe')
+    return HttpResponse(status=200)
@@ -1,6 +1,6 @@
 # productos/admin.py
 from django.contrib import admin
-from .models import Producto, CodigoProducto
+from .models import Producto, CodigoProducto, TipoCambio
 
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
@@ -20,4 +20,11 @@ class CodigoProductoAdmin(admin.ModelAdmin):
     
     def get_categoria(self, obj):
         return obj.producto.categoria if obj.producto else 'N/A'
-    get_categoria.short_description = 'Categoría'
\ No newline at end of file
+    get_categoria.short_description = 'Categoría'
+
+
+@admin.register(TipoCambio)
+class TipoCambioAdmin(admin.ModelAdmin):
+    list_display = ['origen', 'destino', 'vigente_desde', 'tasa', 'fuente']
+    list_filter = ['origen', 'destino', 'fuente']
+    date_hierarchy = 'vigente_desde'
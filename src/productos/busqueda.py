@@ -0,0 +1,219 @@
+# productos/busqueda.py
+"""Búsqueda de productos por nombre y códigos, con coincidencia por subcadena.
+
+Cada producto tiene un documento de búsqueda (`DocumentoBusquedaProducto`)
+con su nombre y sus códigos de barras y QR, normalizados (minúsculas, sin
+tildes). Las señales de `Producto` y `CodigoProducto` lo mantienen al día;
+las cargas masivas llaman a `indexar_productos`.
+
+El índice es de trigramas, así que cada término se encuentra en cualquier
+parte del texto ("lech" -> "leche", "7501" -> "007501..."):
+
+- SQLite: tabla virtual FTS5 con `tokenize='trigram'` sobre los
+  documentos, sincronizada con triggers; responde a `LIKE '%término%'`.
+- PostgreSQL: índice GIN `gin_trgm_ops` (pg_trgm) sobre el texto.
+- Otros motores: `LIKE` sobre el documento (sin índice).
+
+Los términos de menos de tres letras no tienen trigramas: deben empezar
+alguna palabra y se comprueban sobre las coincidencias de los demás (si
+la consulta solo tiene términos cortos, contra el principio del nombre).
+
+`buscar` (autocompletado de la caja) toma las `PRODUCTOS_BUSQUEDA_CANDIDATOS`
+coincidencias y las ordena en Python: primero el código exacto, luego los
+nombres que empiezan con la consulta y las palabras que empiezan con cada
+término. `filtrar` hace lo mismo para los listados paginados, sobre un
+queryset con los demás filtros de la vista.
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+
+from .models import CodigoProducto, DocumentoBusquedaProducto, Producto
+
+TABLA_FTS = 'productos_busqueda_fts'
+TAMANO_LOTE = 1000
+MAX_TERMINOS = 6
+MIN_TRIGRAMA = 3
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, igual para los documentos y las consultas"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def documento(nombre, codigos):
+    """(nombre, texto) normalizados del documento de un producto con esos códigos"""
+    nombre = normalizar(nombre)[:100]
+    return nombre, ' '.join([nombre] + sorted(set(normalizar(c) for c in codigos if c)))
+
+
+def guardar_documentos(documentos):
+    """Inserta o reemplaza los documentos {producto_id: (organizacion_id, nombre, texto)} en una consulta"""
+    DocumentoBusquedaProducto.objects.bulk_create(
+        [DocumentoBusquedaProducto(producto_id=producto_id, organizacion_id=org_id, nombre=nombre, texto=texto)
+         for producto_id, (org_id, nombre, texto) in documentos.items()],
+        batch_size=TAMANO_LOTE, update_conflicts=True, unique_fields=['producto'],
+        update_fields=['organizacion', 'nombre', 'texto', 'actualizado_en'],
+    )
+
+
+def indexar_productos(productos, lote=TAMANO_LOTE):
+    """Reconstruye por lotes los documentos de `productos` (queryset). Devuelve cuántos escribió."""
+    total = 0
+    ids = productos.order_by('id').values_list('id', flat=True)
+    ultimo = 0
+    while True:
+        bloque = list(ids.filter(id__gt=ultimo)[:lote])
+        if not bloque:
+            return total
+        ultimo = bloque[-1]
+        codigos = {}
+        for producto_id, barra, qr in CodigoProducto.objects.filter(producto_id__in=bloque).values_list(
+            'producto_id', 'codigo_barra', 'codigo_qr'
+        ):
+            codigos.setdefault(producto_id, []).extend([barra, qr])
+        guardar_documentos({
+            producto_id: (org_id, *documento(nombre, codigos.get(producto_id, [])))
+            for producto_id, org_id, nombre in Producto.all_objects.filter(id__in=bloque).values_list(
+                'id', 'organizacion_id', 'nombre'
+            )
+        })
+        total += len(bloque)
+
+
+def indexar_producto(producto_id):
+    indexar_productos(Producto.all_objects.filter(pk=producto_id))
+
+
+def _terminos(consulta):
+    return re.findall(r'[^\W_]+', normalizar(consulta))[:MAX_TERMINOS]
+
+
+def _candidatos(terminos, organizacion, disponibles, cuantos, productos=None):
+    """(producto_id, nombre, texto) de hasta `cuantos` documentos que contienen todos los términos.
+
+    Con `productos` (queryset) solo los de esos productos.
+    """
+    # Los términos son solo letras y dígitos (ver _terminos): no hay comodines que escapar
+    largos = [t for t in terminos if len(t) >= MIN_TRIGRAMA]
+    prefijo = None if largos else terminos[0]
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        documentos = DocumentoBusquedaProducto.objects.all()
+        if organizacion is not None:
+            documentos = documentos.filter(organizacion_id=organizacion.pk)
+        if disponibles:
+            documentos = documentos.filter(producto__activo=True, producto__stock__gt=0)
+        if productos is not None:
+            documentos = documentos.filter(producto_id__in=productos.order_by().values('pk'))
+        for termino in largos:
+            documentos = documentos.filter(texto__contains=termino)
+        if prefijo:
+            documentos = documentos.filter(nombre__startswith=prefijo)
+        return list(documentos.values_list('producto_id', 'nombre', 'texto')[:cuantos])
+
+    tabla = DocumentoBusquedaProducto._meta.db_table
+    if connection.vendor == 'sqlite' and largos:
+        # El LIKE sobre la tabla FTS5 con trigramas usa el índice; CROSS JOIN obliga a SQLite a
+        # empezar por él en vez de recorrer los documentos de la organización y probar cada uno
+        desde = f'{TABLA_FTS} f CROSS JOIN {tabla} d ON d.producto_id = f.rowid'
+        columna = 'f.texto'
+    else:
+        desde = f'{tabla} d'
+        columna = 'd.texto'
+    condiciones = [f'{columna} LIKE %s' for _ in largos]
+    parametros = [f'%{termino}%' for termino in largos]
+    if prefijo:
+        condiciones.append('d.nombre LIKE %s')
+        parametros.append(f'{prefijo}%')
+    if organizacion is not None:
+        condiciones.append('d.organizacion_id = %s')
+        parametros.append(organizacion.pk)
+    if disponibles:
+        desde += f' JOIN {Producto._meta.db_table} p ON p.id = d.producto_id'
+        condiciones.append('p.activo AND p.stock > 0')
+    if productos is not None:
+        subconsulta, parametros_subconsulta = productos.order_by().values('pk').query.sql_with_params()
+        condiciones.append(f'd.producto_id IN ({subconsulta})')
+        parametros.extend(parametros_subconsulta)
+    sql = f'SELECT d.producto_id, d.nombre, d.texto FROM {desde} WHERE {" AND ".join(condiciones)} LIMIT %s'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros + [cuantos])
+        return cursor.fetchall()
+
+
+def _contiene_cortos(texto, terminos):
+    # Términos de una o dos letras: deben empezar alguna palabra del documento
+    palabras = texto.split()
+    return all(any(p.startswith(t) for p in palabras) for t in terminos if len(t) < MIN_TRIGRAMA)
+
+
+def _relevancia(consulta, nombre, texto, terminos):
+    palabras_nombre = nombre.split()
+    puntos = 0
+    if consulta in texto.split()[len(palabras_nombre):]:
+        puntos += 8  # código exacto
+    if nombre.startswith(consulta):
+        puntos += 4
+    for termino in terminos:
+        if any(palabra.startswith(termino) for palabra in palabras_nombre):
+            puntos += 2
+        elif termino in nombre:
+            puntos += 1
+    return puntos
+
+
+def _ordenados(consulta, organizacion, disponibles, cuantos, productos=None):
+    """Ids de hasta `cuantos` coincidencias, de la más relevante a la menos; a igual relevancia, por nombre"""
+    terminos = _terminos(consulta)
+    if not terminos:
+        return []
+    candidatos = [c for c in _candidatos(terminos, organizacion, disponibles, cuantos, productos)
+                  if _contiene_cortos(c[2], terminos)]
+    normalizada = ' '.join(terminos)
+    candidatos.sort(key=lambda c: (-_relevancia(normalizada, c[1], c[2], terminos), c[1], c[0]))
+    return [producto_id for producto_id, _, _ in candidatos]
+
+
+def buscar(consulta, organizacion=None, pagina=1, tamano=20, disponibles=False):
+    """Ids de los productos cuyo nombre o códigos contienen todos los términos de `consulta`.
+
+    Devuelve `(ids, hay_mas)` de la página `pagina`, de lo más relevante a lo
+    menos; a igual relevancia, por nombre. Con `disponibles` solo productos
+    activos con stock.
+    """
+    fin = max(1, pagina) * tamano
+    cuantos = max(fin + 1, getattr(settings, 'PRODUCTOS_BUSQUEDA_CANDIDATOS', 500))
+    ids = _ordenados(consulta, organizacion, disponibles, cuantos)
+    return ids[fin - tamano:fin], len(ids) > fin
+
+
+class Resultados:
+    """Productos en orden de relevancia para `Paginator`: solo carga de la base los de la página pedida"""
+
+    def __init__(self, productos, ids):
+        self.productos = productos
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, indice):
+        if not isinstance(indice, slice):
+            return self[indice:indice + 1][0]
+        ids = self.ids[indice]
+        encontrados = self.productos.in_bulk(ids)
+        return [encontrados[i] for i in ids if i in encontrados]
+
+
+def filtrar(productos, consulta, organizacion=None):
+    """Los productos de `productos` (queryset con los filtros de la vista) que coinciden con `consulta`.
+
+    Van de lo más relevante a lo menos, como en `buscar`, hasta
+    `PRODUCTOS_BUSQUEDA_MAX_RESULTADOS` coincidencias.
+    """
+    # Los demás filtros de la vista (categoría, stock, proveedor...) van como subconsulta en la misma consulta
+    cuantos = getattr(settings, 'PRODUCTOS_BUSQUEDA_MAX_RESULTADOS', 5000)
+    return Resultados(productos, _ordenados(consulta, organizacion, False, cuantos, productos))
@@ -0,0 +1,147 @@
+# productos/codigos.py
+"""Resolución de códigos de barras y QR para el escaneo en caja.
+
+Cada organización tiene en memoria un mapa {código: resumen del producto}
+con los códigos de barras y QR de sus productos; `resolver` es una
+búsqueda en un dict, sin consultas. El resumen lleva lo que muestra la
+caja (nombre, precio, moneda, categoría, proveedor, activo) pero no el
+stock: cambia con cada venta por UPDATE directos que no emiten señales.
+
+El mapa de otro worker puede estar desactualizado hasta
+`PRODUCTOS_CODIGOS_TTL` segundos, así que solo es fiable para pasar del
+código al id: quien cobra o valida lee precio, activo y stock de la base
+por id (una consulta por clave primaria).
+
+Guardar o borrar un `Producto` o un `CodigoProducto` vuelve a cargar solo
+las entradas de ese producto en los mapas de este proceso al confirmar la
+transacción (ver `signals.py`); los demás workers recargan su mapa completo
+a los `PRODUCTOS_CODIGOS_TTL` segundos como mucho. `precargar` llena los mapas
+de todas las organizaciones al arrancar el servidor (`wsgi.py`/`asgi.py`).
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+TODAS = 'todas'  # clave del mapa sin filtro de organización (staff sin organización)
+
+_indices = {}
+_lock = threading.Lock()
+
+
+class _Indice:
+    def __init__(self, expira):
+        self.expira = expira
+        self.codigos = {}
+        self.por_producto = {}
+
+    def agregar(self, resumen):
+        claves = [c for c in (resumen['codigo_barra'], resumen['codigo_qr']) if c]
+        for codigo in claves:
+            self.codigos[codigo] = resumen
+        self.por_producto.setdefault(resumen['id'], []).extend(claves)
+
+    def quitar(self, producto_id):
+        for codigo in self.por_producto.pop(producto_id, []):
+            if self.codigos.get(codigo, {}).get('id') == producto_id:
+                del self.codigos[codigo]
+
+
+def _ttl():
+    return getattr(settings, 'PRODUCTOS_CODIGOS_TTL', 300)
+
+
+def _filas(**filtros):
+    from .models import CodigoProducto
+
+    return (
+        CodigoProducto.objects.filter(producto__isnull=False, **filtros)
+        .values('codigo_barra', 'codigo_qr', 'producto_id', organizacion_id=F('producto__organizacion_id'),
+                nombre=F('producto__nombre'), precio=F('producto__precio'), activo=F('producto__activo'),
+                moneda_id=F('producto__moneda_id'), moneda=F('producto__moneda__codigo'),
+                moneda_simbolo=F('producto__moneda__simbolo'), categoria=F('producto__categoria__nombre'),
+                proveedor_id=F('producto__proveedor_id'), proveedor=F('producto__proveedor__nombre_empresa'))
+        .order_by()
+    )
+
+
+def _resumen(fila):
+    fila['id'] = fila.pop('producto_id')
+    fila['precio'] = str(fila['precio'])
+    return fila
+
+
+def _clave(organizacion):
+    if organizacion is None:
+        return TODAS
+    return getattr(organizacion, 'pk', organizacion)
+
+
+def _cargar(clave):
+    indice = _Indice(time.monotonic() + _ttl())
+    filtros = {} if clave == TODAS else {'producto__organizacion_id': clave}
+    for fila in _filas(**filtros).iterator(chunk_size=5000):
+        indice.agregar(_resumen(fila))
+    return indice
+
+
+def _indice(clave):
+    indice = _indices.get(clave)
+    if indice is None or indice.expira <= time.monotonic():
+        indice = _cargar(clave)
+        with _lock:
+            _indices[clave] = indice
+    return indice
+
+
+def resolver(codigo, organizacion=None):
+    """Resumen (dict) del producto con código de barras o QR `codigo` en la organización, o None"""
+    return _indice(_clave(organizacion)).codigos.get((codigo or '').strip())
+
+
+def precargar():
+    """Carga los mapas de todas las organizaciones con una consulta. Devuelve cuántos códigos cargó."""
+    expira = time.monotonic() + _ttl()
+    nuevos = {}
+    total = 0
+    for fila in _filas().iterator(chunk_size=5000):
+        # Los productos sin organización solo están en el mapa TODAS, que se carga al usarlo
+        if fila['organizacion_id'] is not None:
+            nuevos.setdefault(fila['organizacion_id'], _Indice(expira)).agregar(_resumen(fila))
+            total += 1
+    with _lock:
+        _indices.update(nuevos)
+    return total
+
+
+def precargar_al_iniciar():
+    """`precargar` si `PRODUCTOS_CODIGOS_PRECARGAR` está activo; un fallo de la base no impide arrancar"""
+    if not getattr(settings, 'PRODUCTOS_CODIGOS_PRECARGAR', True):
+        return
+    try:
+        total = precargar()
+    except DatabaseError:
+        logger.exception('No se pudieron precargar los códigos de productos')
+        return
+    logger.info('%s códigos de productos precargados', total)
+
+
+def actualizar_producto(producto_id):
+    """Vuelve a cargar las entradas de un producto en los mapas ya cargados de este proceso"""
+    filas = [_resumen(fila) for fila in _filas(producto_id=producto_id)]
+    with _lock:
+        for clave, indice in _indices.items():
+            indice.quitar(producto_id)
+            for fila in filas:
+                if clave in (TODAS, fila['organizacion_id']):
+                    indice.agregar(dict(fila))
+
+
+def limpiar_indices():
+    with _lock:
+        _indices.clear()
@@ -0,0 +1,307 @@
+# productos/importacion.py
+"""Importación masiva de productos desde CSV o XLSX.
+
+El archivo se lee fila a fila (`csv.reader`, u openpyxl en modo
+`read_only`) y se procesa por lotes de `lote` filas, así la memoria no
+crece con el tamaño del archivo. Por cada lote:
+
+1. Se valida cada fila y se resuelven categoría, proveedor y moneda con
+   mapas en memoria cargados una vez (las categorías que no existen se
+   crean).
+2. Una consulta trae los `CodigoProducto` ya existentes con los códigos de
+   barras o QR del lote: esas filas actualizan su producto, las demás lo
+   crean.
+3. En una transacción: `bulk_create` de productos y códigos nuevos,
+   `bulk_update` de los existentes y los documentos de búsqueda del lote.
+
+Las filas con errores no se guardan y se informan con su número de fila;
+el resto del archivo sigue. Como `bulk_create`/`bulk_update` no emiten
+señales, al terminar se recalculan las estadísticas del catálogo y se
+descarta el mapa de códigos de este proceso (los demás workers lo
+recargan a los `PRODUCTOS_CODIGOS_TTL` segundos).
+
+Columnas (la primera fila es el encabezado; mayúsculas y tildes dan igual):
+`nombre` (obligatoria), `precio`, `stock`, `categoria` (obligatoria),
+`proveedor`, `moneda` (código; por defecto la principal), `activo`,
+`codigo_barra` y `codigo_qr`. openpyxl es opcional y se importa solo al
+leer un XLSX.
+"""
+import csv
+import io
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from categorias.models import Categoria
+from proveedores.models import Proveedor
+
+from . import busqueda, codigos
+from .models import CodigoProducto, EstadisticasCatalogo, Moneda, Producto
+
+TAMANO_LOTE = 1000
+MAX_ERRORES = 1000  # errores que se guardan con su detalle; el resto solo se cuenta
+
+ALIAS_COLUMNAS = {
+    'codigo_de_barras': 'codigo_barra',
+    'codigo_de_barra': 'codigo_barra',
+    'codigo': 'codigo_barra',
+    'qr': 'codigo_qr',
+    'codigo_de_qr': 'codigo_qr',
+}
+COLUMNAS_OBLIGATORIAS = ('nombre', 'categoria')
+CAMPOS_ACTUALIZABLES = ['nombre', 'precio', 'stock', 'categoria', 'proveedor', 'moneda', 'activo']
+VERDADEROS = {'', 'si', '1', 'true', 'verdadero', 'x', 'activo'}
+FALSOS = {'no', '0', 'false', 'falso', 'inactivo'}
+CENTAVO = Decimal('0.01')
+MAX_PRECIO = Decimal('99999999.99')  # max_digits=10, decimal_places=2
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.creados = 0
+        self.actualizados = 0
+        self.total_errores = 0
+        self.errores = []  # [(número de fila, mensaje)], hasta MAX_ERRORES
+
+    def error(self, numero, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append((numero, mensaje))
+
+
+def formato_de(nombre):
+    """'csv' o 'xlsx' según la extensión del archivo; ValueError si no es ninguno"""
+    extension = str(nombre).rsplit('.', 1)[-1].lower()
+    if extension not in ('csv', 'xlsx'):
+        raise ValueError('El archivo debe ser .csv o .xlsx')
+    return extension
+
+
+def _columnas(encabezados):
+    columnas = []
+    for encabezado in encabezados:
+        nombre = '_'.join(busqueda.normalizar(str(encabezado or '')).split())
+        columnas.append(ALIAS_COLUMNAS.get(nombre, nombre))
+    faltan = [c for c in COLUMNAS_OBLIGATORIAS if c not in columnas]
+    if faltan:
+        raise ValueError(f"Faltan columnas en el encabezado: {', '.join(faltan)}")
+    return columnas
+
+
+def leer_filas(archivo, formato):
+    """Genera (número de fila, {columna: texto}) de un archivo binario abierto, sin cargarlo entero"""
+    if formato == 'xlsx':
+        from openpyxl import load_workbook
+
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            filas = libro.active.iter_rows(values_only=True)
+            columnas = _columnas(next(filas, ()))
+            for numero, valores in enumerate(filas, start=2):
+                if any(v not in (None, '') for v in valores):
+                    yield numero, {c: _texto(v) for c, v in zip(columnas, valores)}
+        finally:
+            libro.close()
+        return
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    try:
+        lector = csv.reader(texto)
+        columnas = _columnas(next(lector, []))
+        for numero, valores in enumerate(lector, start=2):
+            if any(v.strip() for v in valores):
+                yield numero, dict(zip(columnas, (v.strip() for v in valores)))
+    except UnicodeDecodeError:
+        raise ValueError('El archivo CSV debe estar en UTF-8')
+    finally:
+        texto.detach()  # no cerrar el archivo del que llama
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))  # Excel guarda stock y códigos numéricos como 5.0
+    return str(valor).strip()
+
+
+class _Mapas:
+    """Categorías, proveedores y monedas por nombre/código normalizado, cargados una vez por importación"""
+
+    def __init__(self, organizacion):
+        self.categorias = {busqueda.normalizar(n).strip(): pk for pk, n in Categoria.objects.values_list('id', 'nombre')}
+        self.proveedores = {
+            busqueda.normalizar(n).strip(): pk
+            for pk, n in Proveedor.objects.filter(organizacion=organizacion).values_list('id', 'nombre_empresa')
+        }
+        self.monedas = dict(Moneda.objects.values_list('codigo', 'id'))
+        self.moneda_principal = Moneda.objects.filter(principal=True).values_list('id', flat=True).first()
+
+    def categoria(self, nombre):
+        clave = busqueda.normalizar(nombre)
+        if clave not in self.categorias:
+            self.categorias[clave] = Categoria.objects.get_or_create(nombre=nombre)[0].pk
+        return self.categorias[clave]
+
+
+def _validar(datos, mapas):
+    """Valores del producto de una fila ya leída; ValueError con el motivo si no es válida"""
+    nombre = datos.get('nombre', '')
+    if not nombre:
+        raise ValueError('falta el nombre')
+    if len(nombre) > 100:
+        raise ValueError('el nombre tiene más de 100 caracteres')
+    try:
+        precio = Decimal(datos.get('precio') or '0').quantize(CENTAVO)
+        valido = Decimal(0) <= precio <= MAX_PRECIO  # NaN también falla aquí
+    except InvalidOperation:
+        valido = False
+    if not valido:
+        raise ValueError(f"precio inválido: {datos.get('precio')}")
+    stock = datos.get('stock') or '0'
+    if not stock.isdigit():
+        raise ValueError(f'stock inválido: {stock}')
+    activo = busqueda.normalizar(datos.get('activo', ''))
+    if activo not in VERDADEROS | FALSOS:
+        raise ValueError(f"activo inválido: {datos.get('activo')}")
+
+    categoria = datos.get('categoria', '')
+    if not categoria:
+        raise ValueError('falta la categoría')
+    if len(categoria) > 100:
+        raise ValueError('la categoría tiene más de 100 caracteres')
+    proveedor_id = None
+    if datos.get('proveedor'):
+        proveedor_id = mapas.proveedores.get(busqueda.normalizar(datos['proveedor']))
+        if proveedor_id is None:
+            raise ValueError(f"no existe el proveedor '{datos['proveedor']}'")
+    codigo_moneda = datos.get('moneda', '').upper()
+    moneda_id = mapas.monedas.get(codigo_moneda) if codigo_moneda else mapas.moneda_principal
+    if moneda_id is None:
+        raise ValueError(f"no existe la moneda '{codigo_moneda}'" if codigo_moneda else 'falta la moneda')
+
+    codigo_barra = datos.get('codigo_barra') or None
+    codigo_qr = datos.get('codigo_qr') or None
+    if codigo_barra and len(codigo_barra) > 50:
+        raise ValueError('el código de barras tiene más de 50 caracteres')
+    if codigo_qr and len(codigo_qr) > 100:
+        raise ValueError('el código QR tiene más de 100 caracteres')
+    return {
+        'nombre': nombre,
+        'precio': precio,
+        'stock': int(stock),
+        'activo': activo in VERDADEROS,
+        'categoria_id': mapas.categoria(categoria),
+        'proveedor_id': proveedor_id,
+        'moneda_id': moneda_id,
+        'codigo_barra': codigo_barra,
+        'codigo_qr': codigo_qr,
+    }
+
+
+def _codigos_existentes(filas):
+    """{('barra'|'qr', código): (id del código, producto_id, organizacion_id)} de los códigos del lote"""
+    barras = [f['codigo_barra'] for _, f in filas if f['codigo_barra']]
+    qrs = [f['codigo_qr'] for _, f in filas if f['codigo_qr']]
+    if not barras and not qrs:
+        return {}
+    existentes = {}
+    for pk, producto_id, org_id, barra, qr in CodigoProducto.objects.filter(
+        Q(codigo_barra__in=barras) | Q(codigo_qr__in=qrs)
+    ).values_list('id', 'producto_id', 'producto__organizacion_id', 'codigo_barra', 'codigo_qr'):
+        existentes[('barra', barra)] = existentes[('qr', qr)] = (pk, producto_id, org_id)
+    return existentes
+
+
+def _guardar_lote(filas, organizacion, resultado):
+    """Crea o actualiza los productos de las filas válidas de un lote [(número, valores)]"""
+    existentes = _codigos_existentes(filas)
+    org_id = getattr(organizacion, 'pk', None)
+    nuevos, codigos_nuevos, actualizados, codigos_actualizados = [], [], [], []
+    for numero, f in filas:
+        por_barra = existentes.get(('barra', f['codigo_barra'])) if f['codigo_barra'] else None
+        por_qr = existentes.get(('qr', f['codigo_qr'])) if f['codigo_qr'] else None
+        if por_barra and por_qr and por_barra != por_qr:
+            resultado.error(numero, 'el código de barras y el QR son de productos distintos')
+            continue
+        existente = por_barra or por_qr
+        producto = Producto(organizacion_id=org_id, **{c: f[c] for c in
+                            ('nombre', 'precio', 'stock', 'activo', 'categoria_id', 'proveedor_id', 'moneda_id')})
+        if existente is None:
+            nuevos.append(producto)
+            if f['codigo_barra'] or f['codigo_qr']:
+                # Igual que CodigoProducto.save: el código que falta se genera
+                codigos_nuevos.append((producto, f['codigo_barra'] or str(uuid.uuid4())[:12],
+                                       f['codigo_qr'] or str(uuid.uuid4())))
+            continue
+        codigo_id, producto_id, org_existente = existente
+        if producto_id is None or org_existente != org_id:
+            resultado.error(numero, 'el código ya está asignado a otro producto')
+            continue
+        producto.pk = producto_id
+        actualizados.append(producto)
+        codigo = CodigoProducto(pk=codigo_id, codigo_barra=f['codigo_barra'], codigo_qr=f['codigo_qr'])
+        if f['codigo_barra'] and f['codigo_qr']:
+            codigos_actualizados.append(codigo)
+
+    try:
+        with transaction.atomic():
+            Producto.all_objects.bulk_create(nuevos)
+            CodigoProducto.objects.bulk_create([
+                CodigoProducto(producto=producto, codigo_barra=barra, codigo_qr=qr) for producto, barra, qr in codigos_nuevos
+            ])
+            Producto.all_objects.bulk_update(actualizados, CAMPOS_ACTUALIZABLES)
+            CodigoProducto.objects.bulk_update(codigos_actualizados, ['codigo_barra', 'codigo_qr'])
+            busqueda.indexar_productos(Producto.all_objects.filter(pk__in=[p.pk for p in nuevos + actualizados]))
+    except IntegrityError:
+        # Otro proceso tomó alguno de los códigos mientras tanto: el lote entero queda sin guardar
+        for numero, _ in filas:
+            resultado.error(numero, 'código duplicado al guardar (el lote no se importó)')
+        return
+    resultado.creados += len(nuevos)
+    resultado.actualizados += len(actualizados)
+
+
+def importar(filas, organizacion=None, lote=TAMANO_LOTE, progreso=None):
+    """Importa los productos de `filas` (ver `leer_filas`) en `organizacion`. Devuelve un `ResultadoImportacion`.
+
+    Una fila cuyo código de barras o QR ya existe en la organización
+    actualiza ese producto; si no, se crea uno nuevo. `progreso(resultado)`
+    se llama después de cada lote.
+    """
+    resultado = ResultadoImportacion()
+    mapas = _Mapas(organizacion)
+    vistos = set()
+    pendientes = []
+    for numero, datos in filas:
+        try:
+            valores = _validar(datos, mapas)
+        except ValueError as e:
+            resultado.error(numero, str(e))
+            continue
+        claves = [(tipo, valores[campo]) for tipo, campo in (('barra', 'codigo_barra'), ('qr', 'codigo_qr')) if valores[campo]]
+        if any(clave in vistos for clave in claves):
+            resultado.error(numero, 'código repetido en el archivo')
+            continue
+        vistos.update(claves)
+        pendientes.append((numero, valores))
+        if len(pendientes) >= lote:
+            _guardar_lote(pendientes, organizacion, resultado)
+            pendientes = []
+            if progreso is not None:
+                progreso(resultado)
+    if pendientes:
+        _guardar_lote(pendientes, organizacion, resultado)
+        if progreso is not None:
+            progreso(resultado)
+
+    if organizacion is not None:
+        EstadisticasCatalogo.reconstruir(organizacion)
+    codigos.limpiar_indices()
+    return resultado
+
+
+def importar_archivo(archivo, nombre, organizacion=None, lote=TAMANO_LOTE, progreso=None):
+    """`importar` de un archivo binario abierto; `nombre` decide el formato por su extensión"""
+    return importar(leer_filas(archivo, formato_de(nombre)), organizacion, lote, progreso)
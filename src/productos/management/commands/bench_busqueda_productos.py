@@ -0,0 +1,108 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q
+
+from categorias.models import Categoria
+from organizaciones.models import Organizacion
+from productos import busqueda
+from productos.models import CodigoProducto, Moneda, Producto
+
+PALABRAS = ['arroz', 'frijol', 'azúcar', 'café', 'aceite', 'leche', 'queso', 'pan', 'huevos', 'jabón', 'pasta',
+            'galletas', 'refresco', 'cerveza', 'pollo', 'carne', 'tomate', 'cebolla', 'papa', 'plátano']
+MARCAS = ['La Perla', 'Don Juan', 'Eskimo', 'Parmalat', 'Toña', 'Victoria', 'Maggi', 'Nestlé', 'Colgate', 'Xtra']
+PRESENTACIONES = ['1L', '500g', '1kg', '250ml', '12 oz', 'paquete', 'lata', 'botella', 'bolsa', 'caja']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide la búsqueda de productos con el índice de trigramas contra icontains sobre N productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=20000, help='Productos de la organización (por defecto 20000)')
+        parser.add_argument('--otras', type=int, default=80000, help='Productos de otras organizaciones (por defecto 80000)')
+        parser.add_argument('--consultas', type=int, default=200, help='Consultas por método (por defecto 200)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                org = self._poblar(options['productos'], options['otras'])
+                consultas = [self._consulta() for _ in range(options['consultas'])]
+                indice = self._medir(lambda q: busqueda.buscar(q, org, disponibles=True), consultas)
+                like = self._medir(lambda q: self._icontains(q, org), consultas)
+                # Listado paginado (producto_list): conteo y primera página de 10
+                productos = Producto.objects.filter(organizacion=org)
+                listado = self._medir(lambda q: self._pagina(busqueda.filtrar(productos, q, org)), consultas)
+                listado_like = self._medir(lambda q: self._pagina(productos.filter(
+                    Q(nombre__icontains=q) | Q(codigos__codigo_barra__icontains=q) | Q(codigos__codigo_qr__icontains=q)
+                ).distinct()), consultas)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{options['productos']} productos en la organización (+{options['otras']} de otras), "
+                          f"{options['consultas']} consultas")
+        for nombre, tiempos in (('índice trigramas', indice), ('icontains', like),
+                                ('listado índice', listado), ('listado icontains', listado_like)):
+            tiempos.sort()
+            p99 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.99))]
+            self.stdout.write(f'  {nombre:<17} p50 {statistics.median(tiempos):8.2f} ms   p99 {p99:8.2f} ms')
+
+    def _poblar(self, propios, otros):
+        inicio = time.perf_counter()
+        categoria = Categoria.objects.create(nombre='Bench Búsqueda')
+        moneda, _ = Moneda.objects.get_or_create(codigo='USD', defaults={'nombre': 'Dólar', 'simbolo': '$', 'cambio_a_usd': 1})
+        organizaciones = [Organizacion.objects.create(nombre=f'Bench Productos {i}', slug=f'bench-productos-{i}')
+                          for i in range(5)]
+        principal = organizaciones[0]
+        for org, cantidad in [(principal, propios)] + [(o, otros // 4) for o in organizaciones[1:]]:
+            productos = Producto.objects.bulk_create([
+                Producto(organizacion=org, categoria=categoria, moneda=moneda, precio=Decimal('10.00'),
+                         stock=random.randrange(0, 50),
+                         nombre=f'{random.choice(PALABRAS).title()} {random.choice(MARCAS)} {random.choice(PRESENTACIONES)} {n}')
+                for n in range(cantidad)
+            ], batch_size=5000)
+            CodigoProducto.objects.bulk_create([
+                CodigoProducto(producto=p, codigo_barra=f'{org.pk:02d}{p.pk:011d}', codigo_qr=f'QR-{org.pk}-{p.pk}')
+                for p in productos
+            ], batch_size=5000)
+            busqueda.indexar_productos(Producto.all_objects.filter(organizacion=org))
+        self.stdout.write(f'Datos generados en {time.perf_counter() - inicio:.1f} s')
+        return principal
+
+    def _consulta(self):
+        return random.choice([
+            random.choice(PALABRAS)[:random.randrange(3, 6)],
+            f'{random.choice(PALABRAS)} {random.choice(MARCAS).split()[0][:4]}',
+            random.choice(MARCAS).split()[-1][:5],
+            f'{random.randrange(10 ** 5, 10 ** 6)}',
+        ])
+
+    def _icontains(self, consulta, org):
+        # Lo que hacían las vistas: OR sobre nombre y códigos con un JOIN y DISTINCT
+        return list(
+            Producto.objects.filter(organizacion=org, stock__gt=0).filter(
+                Q(nombre__icontains=consulta) | Q(codigos__codigo_barra__icontains=consulta) |
+                Q(codigos__codigo_qr__icontains=consulta)
+            ).distinct().order_by('nombre').values_list('id', flat=True)[:20]
+        )
+
+    def _pagina(self, productos):
+        pagina = Paginator(productos, 10).get_page(1)
+        return pagina.paginator.count, list(pagina)
+
+    def _medir(self, buscar, consultas):
+        tiempos = []
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            buscar(consulta)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return tiempos
@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from categorias.models import Categoria
+from organizaciones.models import Organizacion
+from productos import codigos
+from productos.models import CodigoProducto, Moneda, Producto
+from proveedores.models import Proveedor
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide la resolución de códigos de barras/QR con el mapa en memoria contra la consulta OR sobre N códigos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--codigos', type=int, default=200000, help='Códigos de barras y QR a generar (por defecto 200000)')
+        parser.add_argument('--consultas', type=int, default=2000, help='Búsquedas por método (por defecto 2000)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                org = Organizacion.objects.create(nombre='Bench Códigos', slug='bench-codigos')
+                existentes = self._poblar(org, options['codigos'] // 2)
+                muestra = [random.choice(existentes) for _ in range(options['consultas'])]
+
+                codigos.limpiar_indices()
+                inicio = time.perf_counter()
+                codigos.precargar()
+                carga = time.perf_counter() - inicio
+                mapa = self._medir(lambda c: codigos.resolver(c, org), muestra)
+                consulta = self._medir(lambda c: self._consulta(c, org), muestra)
+                codigos.limpiar_indices()
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{options['codigos']} códigos, {options['consultas']} búsquedas; mapa precargado en {carga:.2f} s")
+        for nombre, tiempos in (('mapa en memoria', mapa), ('consulta OR', consulta)):
+            tiempos.sort()
+            p99 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.99))]
+            self.stdout.write(f'  {nombre:<16} p50 {statistics.median(tiempos):9.4f} ms   p99 {p99:9.4f} ms')
+
+    def _poblar(self, org, filas):
+        inicio = time.perf_counter()
+        categoria = Categoria.objects.create(nombre='Bench Códigos')
+        moneda, _ = Moneda.objects.get_or_create(codigo='USD', defaults={'nombre': 'Dólar', 'simbolo': '$', 'cambio_a_usd': 1})
+        proveedor = Proveedor.objects.create(organizacion=org, nombre_empresa='Proveedor Bench')
+        productos = Producto.objects.bulk_create([
+            Producto(organizacion=org, categoria=categoria, moneda=moneda, proveedor=proveedor if i % 2 else None,
+                     nombre=f'Producto {i}', precio=Decimal('10.00'), stock=100)
+            for i in range(filas // 2)
+        ], batch_size=5000)
+        nuevos = CodigoProducto.objects.bulk_create([
+            CodigoProducto(producto=productos[i % len(productos)], codigo_barra=f'{7_000_000_000_000 + i}',
+                           codigo_qr=str(uuid.uuid4()))
+            for i in range(filas)
+        ], batch_size=5000)
+        self.stdout.write(f'Datos generados en {time.perf_counter() - inicio:.1f} s')
+        return [c.codigo_barra for c in nuevos[::2]] + [c.codigo_qr for c in nuevos[1::2]]
+
+    def _consulta(self, codigo, org):
+        # Lo que hacía la vista: OR sobre las dos columnas y categoría/proveedor cargados después
+        producto = (
+            CodigoProducto.objects.filter(Q(codigo_barra=codigo) | Q(codigo_qr=codigo), producto__organizacion=org)
+            .select_related('producto').get().producto
+        )
+        return producto.categoria.nombre, producto.proveedor.nombre_empresa if producto.proveedor else None
+
+    def _medir(self, buscar, muestra):
+        tiempos = []
+        for codigo in muestra:
+            inicio = time.perf_counter()
+            buscar(codigo)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return tiempos
@@ -0,0 +1,51 @@
+import random
+import resource
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from organizaciones.models import Organizacion
+from productos import importacion
+from productos.models import Moneda
+
+CATEGORIAS = ['Granos', 'Lácteos', 'Bebidas', 'Limpieza', 'Panadería', 'Carnes', 'Verduras', 'Snacks']
+PALABRAS = ['arroz', 'frijol', 'azúcar', 'café', 'aceite', 'leche', 'queso', 'pan', 'huevos', 'jabón', 'pasta',
+            'galletas', 'refresco', 'cerveza', 'pollo', 'carne', 'tomate', 'cebolla', 'papa', 'plátano']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide la importación de un CSV de N productos (se deshace al terminar)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=100000, help='Filas del archivo (por defecto 100000)')
+        parser.add_argument('--lote', type=int, default=importacion.TAMANO_LOTE, help='Filas por lote')
+
+    def handle(self, *args, **options):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', newline='') as archivo:
+            archivo.write('nombre,categoria,precio,stock,moneda,codigo_barra\n')
+            for n in range(options['filas']):
+                archivo.write(f'{random.choice(PALABRAS).title()} {n},{random.choice(CATEGORIAS)},'
+                              f'{random.randrange(100, 100000) / 100},{random.randrange(0, 200)},USD,BENCH{n:09d}\n')
+            archivo.flush()
+
+            try:
+                with transaction.atomic():
+                    org = Organizacion.objects.create(nombre='Bench Importación', slug='bench-importacion')
+                    Moneda.objects.get_or_create(codigo='USD', defaults={'nombre': 'Dólar', 'simbolo': '$'})
+                    inicio = time.perf_counter()
+                    with open(archivo.name, 'rb') as entrada:
+                        resultado = importacion.importar_archivo(entrada, archivo.name, org, options['lote'])
+                    segundos = time.perf_counter() - inicio
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+        memoria = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(f"{options['filas']} filas: {resultado.creados} creadas, {resultado.total_errores} errores "
+                          f'en {segundos:.1f} s ({options["filas"] / segundos:,.0f} filas/s), memoria máxima {memoria:.0f} MB')
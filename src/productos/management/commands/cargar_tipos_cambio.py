@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from productos import tipos_cambio
+
+
+class Command(BaseCommand):
+    help = 'Carga los tipos de cambio con fecha de vigencia desde la fuente configurada (TIPOS_CAMBIO_FUENTE)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fuente', help='Ruta de la clase de la fuente (por defecto TIPOS_CAMBIO_FUENTE)')
+        parser.add_argument('--archivo', help='CSV de la fuente local (por defecto TIPOS_CAMBIO_ARCHIVO)')
+        parser.add_argument('--desde', help='Cargar solo tasas vigentes desde este día (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Cargar solo tasas vigentes hasta este día inclusive (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        try:
+            desde = parse_date(options['desde']) if options['desde'] else None
+            hasta = parse_date(options['hasta']) if options['hasta'] else None
+        except ValueError:
+            raise CommandError('Las fechas deben tener el formato AAAA-MM-DD')
+        if (options['desde'] and desde is None) or (options['hasta'] and hasta is None):
+            raise CommandError('Las fechas deben tener el formato AAAA-MM-DD')
+
+        opciones = {'ruta': options['archivo']} if options['archivo'] else {}
+        try:
+            fuente = tipos_cambio.obtener_fuente(options['fuente'], **opciones)
+        except ImportError as e:
+            raise CommandError(f'Fuente inválida: {e}')
+        try:
+            filas = tipos_cambio.cargar(fuente, desde, hasta)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'{filas} tipos de cambio cargados desde {type(fuente).__name__}'))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from organizaciones.models import Organizacion
+from productos import importacion
+
+
+class Command(BaseCommand):
+    help = 'Importa productos (y sus códigos) desde un archivo CSV o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument('--organizacion', required=True, help='Slug de la organización')
+        parser.add_argument('--lote', type=int, default=importacion.TAMANO_LOTE, help='Filas por lote')
+        parser.add_argument('--errores', type=int, default=20, help='Errores a mostrar (por defecto 20)')
+
+    def handle(self, *args, **options):
+        org = Organizacion.objects.filter(slug=options['organizacion']).first()
+        if org is None:
+            raise CommandError(f"No existe la organización '{options['organizacion']}'")
+
+        inicio = time.perf_counter()
+
+        def progreso(resultado):
+            self.stdout.write(f'  {resultado.creados} creados, {resultado.actualizados} actualizados, '
+                              f'{resultado.total_errores} con errores')
+
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importacion.importar_archivo(archivo, options['archivo'], org, options['lote'],
+                                                         progreso if options['verbosity'] > 1 else None)
+        except ImportError:
+            raise CommandError('Importar archivos XLSX requiere openpyxl')
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for numero, mensaje in resultado.errores[:options['errores']]:
+            self.stdout.write(self.style.WARNING(f'Fila {numero}: {mensaje}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.creados} productos creados, {resultado.actualizados} actualizados, '
+            f'{resultado.total_errores} filas con errores ({time.perf_counter() - inicio:.1f} s)'
+        ))
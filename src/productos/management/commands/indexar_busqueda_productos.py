@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from organizaciones.models import Organizacion
+from productos import busqueda
+from productos.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Genera (o regenera) los documentos de búsqueda de los productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizacion', help='Slug de la organización (por defecto todas)')
+        parser.add_argument('--lote', type=int, default=busqueda.TAMANO_LOTE, help='Productos por lote')
+
+    def handle(self, *args, **options):
+        productos = Producto.all_objects.all()
+        if options['organizacion']:
+            org = Organizacion.objects.filter(slug=options['organizacion']).first()
+            if org is None:
+                raise CommandError(f"No existe la organización '{options['organizacion']}'")
+            productos = productos.filter(organizacion=org)
+
+        total = busqueda.indexar_productos(productos, lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{total} productos indexados'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from organizaciones.models import Organizacion
+from productos.models import EstadisticasCatalogo
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores del catálogo (total, activos, stock bajo) de cada organización'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizacion', help='Slug de la organización (por defecto todas)')
+
+    def handle(self, *args, **options):
+        organizaciones = Organizacion.objects.all()
+        if options['organizacion']:
+            organizaciones = organizaciones.filter(slug=options['organizacion'])
+            if not organizaciones.exists():
+                raise CommandError(f"No existe la organización '{options['organizacion']}'")
+
+        total = 0
+        for org in organizaciones.iterator():
+            EstadisticasCatalogo.reconstruir(org)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'Estadísticas de {total} organizaciones recalculadas'))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0004_producto_organizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TipoCambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origen', models.CharField(max_length=3)),
+                ('destino', models.CharField(max_length=3)),
+                ('vigente_desde', models.DateField()),
+                ('tasa', models.DecimalField(decimal_places=8, max_digits=18)),
+                ('fuente', models.CharField(blank=True, default='', max_length=50)),
+                ('cargado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Tipo de cambio',
+                'verbose_name_plural': 'Tipos de cambio',
+                'ordering': ['origen', 'destino', '-vigente_desde'],
+                'constraints': [models.UniqueConstraint(fields=('origen', 'destino', 'vigente_desde'), name='tipocambio_par_fecha_uniq'), models.CheckConstraint(condition=models.Q(('tasa__gt', 0)), name='tipocambio_tasa_positiva')],
+            },
+        ),
+    ]
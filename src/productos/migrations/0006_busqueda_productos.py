@@ -0,0 +1,99 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:39
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# El índice de trigramas no se puede declarar en el modelo: se crea con SQL
+# propio de cada motor. Los documentos de los productos existentes se
+# generan aquí (el catálogo es chico comparado con las facturas).
+SQL_SQLITE = [
+    """CREATE VIRTUAL TABLE productos_busqueda_fts USING fts5(
+        texto, content='productos_documentobusquedaproducto', content_rowid='producto_id', tokenize='trigram')""",
+    """CREATE TRIGGER productos_busqueda_ai AFTER INSERT ON productos_documentobusquedaproducto BEGIN
+        INSERT INTO productos_busqueda_fts(rowid, texto) VALUES (new.producto_id, new.texto);
+    END""",
+    """CREATE TRIGGER productos_busqueda_ad AFTER DELETE ON productos_documentobusquedaproducto BEGIN
+        INSERT INTO productos_busqueda_fts(productos_busqueda_fts, rowid, texto) VALUES ('delete', old.producto_id, old.texto);
+    END""",
+    """CREATE TRIGGER productos_busqueda_au AFTER UPDATE ON productos_documentobusquedaproducto BEGIN
+        INSERT INTO productos_busqueda_fts(productos_busqueda_fts, rowid, texto) VALUES ('delete', old.producto_id, old.texto);
+        INSERT INTO productos_busqueda_fts(rowid, texto) VALUES (new.producto_id, new.texto);
+    END""",
+]
+SQL_SQLITE_REVERSO = [
+    'DROP TRIGGER IF EXISTS productos_busqueda_au',
+    'DROP TRIGGER IF EXISTS productos_busqueda_ad',
+    'DROP TRIGGER IF EXISTS productos_busqueda_ai',
+    'DROP TABLE IF EXISTS productos_busqueda_fts',
+]
+SQL_POSTGRESQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX productos_busqueda_trgm_idx ON productos_documentobusquedaproducto USING GIN (texto gin_trgm_ops)',
+]
+SQL_POSTGRESQL_REVERSO = [
+    'DROP INDEX IF EXISTS productos_busqueda_trgm_idx',
+]
+
+
+def _ejecutar(schema_editor, por_motor):
+    for sentencia in por_motor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sentencia)
+
+
+def _normalizar(texto):
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def crear_indice(apps, schema_editor):
+    _ejecutar(schema_editor, {'sqlite': SQL_SQLITE, 'postgresql': SQL_POSTGRESQL})
+
+    Producto = apps.get_model('productos', 'Producto')
+    CodigoProducto = apps.get_model('productos', 'CodigoProducto')
+    DocumentoBusquedaProducto = apps.get_model('productos', 'DocumentoBusquedaProducto')
+    codigos = {}
+    for producto_id, barra, qr in CodigoProducto.objects.filter(producto__isnull=False).values_list(
+        'producto_id', 'codigo_barra', 'codigo_qr'
+    ):
+        codigos.setdefault(producto_id, set()).update(_normalizar(c) for c in (barra, qr) if c)
+    documentos = []
+    for producto_id, org_id, nombre in Producto.objects.values_list('id', 'organizacion_id', 'nombre'):
+        nombre = _normalizar(nombre)[:100]
+        documentos.append(DocumentoBusquedaProducto(
+            producto_id=producto_id, organizacion_id=org_id, nombre=nombre,
+            texto=' '.join([nombre] + sorted(codigos.get(producto_id, ()))),
+        ))
+    DocumentoBusquedaProducto.objects.bulk_create(documentos, batch_size=1000)
+
+
+def borrar_indice(apps, schema_editor):
+    _ejecutar(schema_editor, {'sqlite': SQL_SQLITE_REVERSO, 'postgresql': SQL_POSTGRESQL_REVERSO})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizaciones', '0003_alter_miembro_role'),
+        ('productos', '0005_tipos_cambio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusquedaProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='documento_busqueda', serialize=False, to='productos.producto')),
+                ('nombre', models.CharField(max_length=100)),
+                ('texto', models.TextField()),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('organizacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='organizaciones.organizacion')),
+            ],
+            options={
+                'verbose_name': 'Documento de búsqueda de producto',
+                'verbose_name_plural': 'Documentos de búsqueda de productos',
+                'indexes': [models.Index(fields=['organizacion', 'nombre'], name='docproducto_org_nombre_idx')],
+            },
+        ),
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizaciones', '0003_alter_miembro_role'),
+        ('productos', '0006_busqueda_productos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticasCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0)),
+                ('activos', models.IntegerField(default=0)),
+                ('stock_bajo', models.IntegerField(default=0)),
+                ('organizacion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas_catalogo', to='organizaciones.organizacion')),
+            ],
+            options={
+                'verbose_name': 'Estadísticas del catálogo',
+                'verbose_name_plural': 'Estadísticas del catálogo',
+            },
+        ),
+    ]
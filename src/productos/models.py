@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Q
 from django.core.exceptions import ValidationError
 import uuid
 from organizaciones.models import Organizacion
@@ -13,6 +14,33 @@ class Moneda(models.Model):
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
 
+class TipoCambio(models.Model):
+    """Tasa de cambio `origen` -> `destino` vigente desde una fecha (1 origen = tasa destino).
+
+    Cada fila rige hasta la siguiente del mismo par; así los reportes
+    convierten cada venta con la tasa del día en que se hizo. Se consulta a
+    través de `productos.tipos_cambio`.
+    """
+    origen = models.CharField(max_length=3)
+    destino = models.CharField(max_length=3)
+    vigente_desde = models.DateField()
+    tasa = models.DecimalField(max_digits=18, decimal_places=8)
+    fuente = models.CharField(max_length=50, blank=True, default='')
+    cargado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Tipo de cambio"
+        verbose_name_plural = "Tipos de cambio"
+        ordering = ['origen', 'destino', '-vigente_desde']
+        constraints = [
+            # También sirve de índice para buscar la última tasa del par hasta una fecha
+            models.UniqueConstraint(fields=['origen', 'destino', 'vigente_desde'], name='tipocambio_par_fecha_uniq'),
+            models.CheckConstraint(condition=models.Q(tasa__gt=0), name='tipocambio_tasa_positiva'),
+        ]
+
+    def __str__(self):
+        return f"{self.origen}/{self.destino} {self.tasa} desde {self.vigente_desde}"
+
 class ConfiguracionTienda(models.Model):
     moneda_principal = models.ForeignKey(Moneda, on_delete=models.PROTECT)
     permitir_multimoneda = models.BooleanField(default=False)
@@ -62,6 +90,22 @@ class Producto(models.Model):
     def __str__(self):
         return f"{self.nombre} (Stock: {self.stock})"
 
+    def recordar_estado_catalogo(self):
+        """Guarda (organización, activo, stock) como están en la base, para ajustar EstadisticasCatalogo al guardar"""
+        cargados = self.__dict__
+        if all(campo in cargados for campo in ('organizacion_id', 'activo', 'stock')):
+            self._estado_catalogo = (self.organizacion_id, self.activo, self.stock)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        producto = super().from_db(db, field_names, values)
+        producto.recordar_estado_catalogo()
+        return producto
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.recordar_estado_catalogo()
+
     def clean(self):
         if self.stock < 0:
             raise ValidationError("El stock no puede ser negativo")
@@ -87,4 +131,102 @@ class CodigoProducto(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.producto.nombre if self.producto else 'Sin producto'} - QR: {self.codigo_qr or 'N/A'} / Barra: {self.codigo_barra or 'N/A'}"
\ No newline at end of file
+        return f"{self.producto.nombre if self.producto else 'Sin producto'} - QR: {self.codigo_qr or 'N/A'} / Barra: {self.codigo_barra or 'N/A'}"
+
+
+class DocumentoBusquedaProducto(models.Model):
+    """Texto de búsqueda de un producto: nombre y códigos de barras/QR, normalizado.
+
+    Lo escribe `productos.busqueda`; el índice de trigramas (FTS5 o
+    pg_trgm + GIN) se crea en la migración según el motor.
+    """
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='documento_busqueda')
+    organizacion = models.ForeignKey(Organizacion, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    nombre = models.CharField(max_length=100)
+    texto = models.TextField()
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Documento de búsqueda de producto"
+        verbose_name_plural = "Documentos de búsqueda de productos"
+        indexes = [
+            models.Index(fields=['organizacion', 'nombre'], name='docproducto_org_nombre_idx'),
+        ]
+
+    def __str__(self):
+        return self.texto
+
+
+class EstadisticasCatalogo(models.Model):
+    """Contadores del catálogo de una organización para las tarjetas de los listados de productos.
+
+    Las altas, ediciones y bajas de `Producto` (señales) y los movimientos
+    de stock de `services` los ajustan con un UPDATE de incremento dentro de
+    su transacción, así los listados leen una fila en lugar de contar el
+    catálogo. Si la fila no existe, `de` la calcula con una sola consulta
+    de agregados condicionales; `reconstruir` la recalcula (comando
+    `reconstruir_estadisticas_catalogo`, p. ej. después de cargas masivas).
+    """
+    STOCK_BAJO = 10  # stock por debajo del cual un producto cuenta como "stock bajo"
+    CAMPOS = ('total', 'activos', 'stock_bajo')
+
+    organizacion = models.OneToOneField(Organizacion, on_delete=models.CASCADE, related_name='estadisticas_catalogo')
+    total = models.IntegerField(default=0)
+    activos = models.IntegerField(default=0)
+    stock_bajo = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Estadísticas del catálogo"
+        verbose_name_plural = "Estadísticas del catálogo"
+
+    def __str__(self):
+        return f"{self.organizacion_id}: {self.total} productos"
+
+    @classmethod
+    def aportes(cls, activo, stock):
+        """Lo que suma un producto con ese estado a cada contador"""
+        return {'total': 1, 'activos': int(bool(activo)), 'stock_bajo': int(stock < cls.STOCK_BAJO)}
+
+    @classmethod
+    def calcular(cls, productos):
+        """Contadores de `productos` (queryset) en una sola consulta"""
+        return productos.aggregate(
+            total=Count('id'),
+            activos=Count('id', filter=Q(activo=True)),
+            stock_bajo=Count('id', filter=Q(stock__lt=cls.STOCK_BAJO)),
+        )
+
+    @classmethod
+    def ajustar(cls, organizacion_id, **cambios):
+        """Suma `cambios` ({contador: delta}) a la fila de la organización (usar dentro de la transacción del cambio).
+
+        Si la fila todavía no existe no hace nada: se calculará completa al leerla.
+        """
+        cambios = {campo: delta for campo, delta in cambios.items() if delta}
+        if organizacion_id is None or not cambios:
+            return
+        cls.objects.filter(organizacion_id=organizacion_id).update(
+            **{campo: F(campo) + delta for campo, delta in cambios.items()}
+        )
+
+    @classmethod
+    def reconstruir(cls, organizacion):
+        """Recalcula los contadores de la organización desde `Producto`. Devuelve el dict de contadores."""
+        valores = cls.calcular(Producto.all_objects.filter(organizacion=organizacion))
+        with transaction.atomic():
+            if cls.objects.filter(organizacion=organizacion).update(**valores):
+                return valores
+            try:
+                with transaction.atomic():
+                    cls.objects.create(organizacion=organizacion, **valores)
+            except IntegrityError:
+                cls.objects.filter(organizacion=organizacion).update(**valores)  # otro proceso creó la fila al mismo tiempo
+        return valores
+
+    @classmethod
+    def de(cls, organizacion):
+        """Contadores de la organización; sin organización (staff), calculados sobre todo el catálogo"""
+        if organizacion is None:
+            return cls.calcular(Producto.all_objects.all())
+        valores = cls.objects.filter(organizacion=organizacion).values(*cls.CAMPOS).first()
+        return valores if valores is not None else cls.reconstruir(organizacion)
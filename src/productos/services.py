@@ -0,0 +1,175 @@
+# productos/services.py
+"""Movimientos de stock.
+
+`descontar_stock` descuenta el stock de varios productos con un único
+UPDATE condicional (`stock >= cantidad`) calculado por la base de datos.
+No hay lectura-modificación-escritura en Python, así que dos cajeros
+concurrentes no pueden pisarse las actualizaciones ni vender de más, y
+solo se escribe la columna `stock` en lugar de la fila completa.
+`reponer_stock` hace lo inverso (p. ej. al anular una factura). El UPDATE
+devuelve el stock nuevo de cada fila (RETURNING), así los productos que
+cruzan el umbral de stock bajo ajustan su contador de
+`EstadisticasCatalogo` sin otra lectura; si ninguno lo cruza, el
+movimiento sigue siendo una sola sentencia.
+"""
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import EstadisticasCatalogo, Producto
+
+
+class StockInsuficiente(ValidationError):
+    """Uno o más productos no tienen stock suficiente.
+
+    `faltantes` es una lista de dicts con `producto_id`, `nombre`,
+    `disponible` y `solicitado` (disponible es None si el producto no existe).
+    """
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        mensajes = []
+        for f in faltantes:
+            if f['disponible'] is None:
+                mensajes.append(f"Producto con ID {f['producto_id']} no existe")
+            else:
+                mensajes.append(
+                    f"Stock insuficiente para {f['nombre']}. "
+                    f"Disponible: {f['disponible']}, Solicitado: {f['solicitado']}"
+                )
+        super().__init__(mensajes)
+
+
+class _GuardaFallida(Exception):
+    pass
+
+
+def agrupar_cantidades(lineas):
+    """Suma cantidades por producto. Acepta un dict {id: cantidad} o pares (id, cantidad)."""
+    items = lineas.items() if isinstance(lineas, dict) else lineas
+    cantidades = {}
+    for producto_id, cantidad in items:
+        cantidades[int(producto_id)] = cantidades.get(int(producto_id), 0) + int(cantidad)
+    return cantidades
+
+
+def _caso_por_producto(cantidades):
+    return Case(
+        *[When(pk=producto_id, then=Value(cantidad)) for producto_id, cantidad in cantidades.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _sql_actualizar_stock(cantidades, organizacion_id=None, signo=1):
+    """UPDATE ... RETURNING que suma `signo * cantidad` al stock de cada producto de `cantidades`.
+
+    Con `signo` negativo solo toca las filas con stock suficiente. Devuelve
+    (sql, parámetros); las filas devueltas son (organizacion_id, stock, id).
+    """
+    q = connection.ops.quote_name
+    tabla, pk, stock, org = q(Producto._meta.db_table), q('id'), q('stock'), q('organizacion_id')
+    caso = f"CASE {pk} {' '.join(['WHEN %s THEN %s'] * len(cantidades))} END"
+    por_producto = [valor for par in cantidades.items() for valor in par]
+    marcadores = ', '.join(['%s'] * len(cantidades))
+
+    sql = f"UPDATE {tabla} SET {stock} = {stock} {'+' if signo > 0 else '-'} {caso} WHERE {pk} IN ({marcadores})"
+    parametros = por_producto + list(cantidades)
+    if organizacion_id is not None:
+        sql += f' AND {org} = %s'
+        parametros.append(organizacion_id)
+    if signo < 0:
+        sql += f' AND {stock} >= {caso}'
+        parametros += por_producto
+    return f'{sql} RETURNING {org}, {stock}, {pk}', parametros
+
+
+def _actualizar_stock(cantidades, organizacion, signo):
+    """Aplica el movimiento de stock. Devuelve [(organizacion_id, stock nuevo, producto_id)] de las filas tocadas.
+
+    También toca productos desactivados: el stock vendido vuelve aunque ya
+    no se ofrezcan. En SQLite y PostgreSQL las filas salen del mismo UPDATE
+    con RETURNING (`_sql_actualizar_stock`); en otros motores se leen
+    después, dentro de la misma transacción.
+    """
+    organizacion_id = getattr(organizacion, 'pk', organizacion)
+    if connection.vendor in ('sqlite', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute(*_sql_actualizar_stock(cantidades, organizacion_id, signo))
+            return cursor.fetchall()
+
+    qs = Producto.all_objects.filter(pk__in=list(cantidades))
+    if organizacion_id is not None:
+        qs = qs.filter(organizacion_id=organizacion_id)
+    cantidad = _caso_por_producto(cantidades)
+    if signo < 0:
+        qs = qs.filter(stock__gte=cantidad)
+    ids = list(qs.values_list('pk', flat=True))
+    qs.update(stock=F('stock') + signo * cantidad)
+    return list(Producto.all_objects.filter(pk__in=ids).values_list('organizacion_id', 'stock', 'pk'))
+
+
+def _contar_cruces_stock_bajo(filas, cantidades, signo):
+    """Ajusta el contador de stock bajo con los productos que cruzaron el umbral al sumarles `signo * cantidad`"""
+    umbral = EstadisticasCatalogo.STOCK_BAJO
+    cruces = {}
+    for organizacion_id, stock, producto_id in filas:
+        anterior = stock - signo * cantidades[producto_id]
+        if (anterior < umbral) != (stock < umbral):
+            cruces[organizacion_id] = cruces.get(organizacion_id, 0) + (1 if stock < umbral else -1)
+    for organizacion_id, cambio in cruces.items():
+        EstadisticasCatalogo.ajustar(organizacion_id, stock_bajo=cambio)
+
+
+def descontar_stock(lineas, organizacion=None):
+    """Descuenta el stock de todos los productos de `lineas` en un solo UPDATE.
+
+    La operación es todo o nada: si algún producto no existe (o no pertenece
+    a `organizacion`) o no tiene stock suficiente, no se descuenta nada y se
+    lanza `StockInsuficiente` con el detalle de las líneas que fallaron.
+    Devuelve el dict {producto_id: cantidad} aplicado.
+    """
+    cantidades = agrupar_cantidades(lineas)
+    if not cantidades:
+        return cantidades
+
+    try:
+        with transaction.atomic():
+            filas = _actualizar_stock(cantidades, organizacion, -1)
+            if len(filas) != len(cantidades):
+                # Deshacer las filas que sí pasaron la guarda
+                raise _GuardaFallida()
+            _contar_cruces_stock_bajo(filas, cantidades, -1)
+    except _GuardaFallida:
+        qs = Producto.all_objects.filter(pk__in=list(cantidades))
+        if organizacion is not None:
+            qs = qs.filter(organizacion=organizacion)
+        actuales = {pk: (nombre, stock) for pk, nombre, stock in qs.values_list('pk', 'nombre', 'stock')}
+        faltantes = []
+        for producto_id, solicitado in cantidades.items():
+            nombre, disponible = actuales.get(producto_id, (None, None))
+            faltantes.append({
+                'producto_id': producto_id,
+                'nombre': nombre,
+                'disponible': disponible,
+                'solicitado': solicitado,
+            })
+        # Solo se informan las líneas que fallan; si otro cajero repuso stock
+        # entre el UPDATE y esta lectura, se informan todas.
+        faltantes = [
+            f for f in faltantes if f['disponible'] is None or f['disponible'] < f['solicitado']
+        ] or faltantes
+        raise StockInsuficiente(faltantes)
+
+    return cantidades
+
+
+
+def reponer_stock(lineas, organizacion=None):
+    """Devuelve al stock las cantidades de `lineas` en un solo UPDATE. Devuelve el dict aplicado."""
+    cantidades = agrupar_cantidades(lineas)
+    if not cantidades:
+        return cantidades
+    with transaction.atomic():
+        filas = _actualizar_stock(cantidades, organizacion, 1)
+        _contar_cruces_stock_bajo(filas, cantidades, 1)
+    return cantidades
@@ -0,0 +1,79 @@
+# productos/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import busqueda, codigos
+from .models import CodigoProducto, EstadisticasCatalogo, Moneda, Producto, TipoCambio
+from .tipos_cambio import limpiar_cache
+
+
+@receiver(post_save, sender=TipoCambio)
+@receiver(post_delete, sender=TipoCambio)
+@receiver(post_save, sender=Moneda)
+@receiver(post_delete, sender=Moneda)
+def invalidar_tipos_cambio(sender, **kwargs):
+    """Descarta las tasas en caché de este proceso al cambiar una tasa o el cambio a USD de una moneda"""
+    limpiar_cache()
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def actualizar_codigos_producto(sender, instance, update_fields=None, **kwargs):
+    """Renueva en el mapa de códigos el resumen del producto (nombre, precio, activo...)"""
+    if update_fields is not None and set(update_fields) <= {'stock'}:
+        return  # el stock no está en el mapa
+    # Al confirmar: recargar antes leería la fila sin confirmar o dejaría en el mapa un cambio que se deshace
+    producto_id = instance.pk
+    transaction.on_commit(lambda: codigos.actualizar_producto(producto_id))
+
+
+@receiver(post_save, sender=CodigoProducto)
+@receiver(post_delete, sender=CodigoProducto)
+def actualizar_codigos(sender, instance, **kwargs):
+    producto_id = instance.producto_id
+    if producto_id is not None:
+        transaction.on_commit(lambda: codigos.actualizar_producto(producto_id))
+
+
+@receiver(post_save, sender=Producto)
+def indexar_busqueda_producto(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'stock'}:
+        return  # el stock no está en el documento
+    busqueda.indexar_producto(instance.pk)
+
+
+@receiver(post_save, sender=CodigoProducto)
+@receiver(post_delete, sender=CodigoProducto)
+def indexar_busqueda_codigo(sender, instance, origin=None, **kwargs):
+    """Rehace el documento de búsqueda del producto al cambiar sus códigos"""
+    # Si el código se borra en cascada (con su producto u organización) el documento también se borra
+    if origin is not None and not isinstance(origin, CodigoProducto) and getattr(origin, 'model', None) is not CodigoProducto:
+        return
+    if instance.producto_id is not None:
+        busqueda.indexar_producto(instance.producto_id)
+
+
+
+@receiver(post_save, sender=Producto)
+def contar_producto(sender, instance, created, **kwargs):
+    """Ajusta los contadores del catálogo con la diferencia entre el estado cargado y el guardado"""
+    anterior = getattr(instance, '_estado_catalogo', None)
+    instance.recordar_estado_catalogo()
+    if not created and anterior is None:
+        return  # instancia armada a mano: no se sabe qué cambió (ver reconstruir_estadisticas_catalogo)
+    nuevos = EstadisticasCatalogo.aportes(instance.activo, instance.stock)
+    if anterior is not None:
+        org_anterior, activo, stock = anterior
+        viejos = EstadisticasCatalogo.aportes(activo, stock)
+        if org_anterior != instance.organizacion_id:
+            EstadisticasCatalogo.ajustar(org_anterior, **{campo: -valor for campo, valor in viejos.items()})
+        else:
+            nuevos = {campo: valor - viejos[campo] for campo, valor in nuevos.items()}
+    EstadisticasCatalogo.ajustar(instance.organizacion_id, **nuevos)
+
+
+@receiver(post_delete, sender=Producto)
+def descontar_producto(sender, instance, **kwargs):
+    aportes = EstadisticasCatalogo.aportes(instance.activo, instance.stock)
+    EstadisticasCatalogo.ajustar(instance.organizacion_id, **{campo: -valor for campo, valor in aportes.items()})
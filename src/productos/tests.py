@@ -1,3 +1,444 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import threading
+from datetime import date
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from categorias.models import Categoria
+from organizaciones.models import Miembro, Organizacion
+from proveedores.models import Proveedor
+from . import busqueda, codigos, importacion, tipos_cambio
+from .models import CodigoProducto, DocumentoBusquedaProducto, EstadisticasCatalogo, Moneda, Producto, TipoCambio
+from .services import StockInsuficiente, _sql_actualizar_stock, descontar_stock, reponer_stock
+
+
+def crear_producto(org, nombre='Producto', stock=10):
+    categoria, _ = Categoria.objects.get_or_create(nombre='General')
+    moneda, _ = Moneda.objects.get_or_create(codigo='USD', defaults={'nombre': 'Dolar', 'simbolo': '$'})
+    return Producto.objects.create(nombre=nombre, organizacion=org, precio=1, stock=stock,
+                                   categoria=categoria, moneda=moneda)
+
+
+class DescontarStockTests(TestCase):
+    def setUp(self):
+        self.org = Organizacion.objects.create(nombre='OrgStock', slug='orgstock')
+        self.a = crear_producto(self.org, 'A', stock=5)
+        self.b = crear_producto(self.org, 'B', stock=2)
+
+    def test_descuenta_todo_el_carrito_en_un_update(self):
+        with CaptureQueriesContext(connection) as consultas:
+            descontar_stock({self.a.id: 3, self.b.id: 2}, organizacion=self.org)
+        sentencias = [q['sql'] for q in consultas if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(sentencias), 1)
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.stock, self.b.stock), (2, 0))
+
+    def test_sql_del_update_con_returning(self):
+        sql, parametros = _sql_actualizar_stock({self.a.id: 3, self.b.id: 2}, self.org.id, -1)
+        self.assertEqual(sql, (
+            'UPDATE "productos_producto" SET "stock" = "stock" - CASE "id" WHEN %s THEN %s WHEN %s THEN %s END '
+            'WHERE "id" IN (%s, %s) AND "organizacion_id" = %s '
+            'AND "stock" >= CASE "id" WHEN %s THEN %s WHEN %s THEN %s END '
+            'RETURNING "organizacion_id", "stock", "id"'
+        ))
+        por_producto = [self.a.id, 3, self.b.id, 2]
+        self.assertEqual(parametros, por_producto + [self.a.id, self.b.id, self.org.id] + por_producto)
+
+        sql, parametros = _sql_actualizar_stock({self.a.id: 1}, signo=1)
+        self.assertEqual(sql, 'UPDATE "productos_producto" SET "stock" = "stock" + CASE "id" WHEN %s THEN %s END '
+                              'WHERE "id" IN (%s) RETURNING "organizacion_id", "stock", "id"')
+        self.assertEqual(parametros, [self.a.id, 1, self.a.id])
+
+    def test_agrupa_lineas_repetidas(self):
+        descontar_stock([(self.a.id, 2), (self.a.id, 2)])
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.stock, 1)
+
+    def test_todo_o_nada_e_informa_lineas_fallidas(self):
+        with self.assertRaises(StockInsuficiente) as ctx:
+            descontar_stock({self.a.id: 1, self.b.id: 3, 999999: 1}, organizacion=self.org)
+        faltantes = {f['producto_id']: f for f in ctx.exception.faltantes}
+        self.assertEqual(set(faltantes), {self.b.id, 999999})
+        self.assertEqual(faltantes[self.b.id]['disponible'], 2)
+        self.assertIsNone(faltantes[999999]['disponible'])
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.stock, 5)
+
+
+class DescontarStockConcurrenciaTests(TransactionTestCase):
+    """Muchos cajeros compiten por el mismo producto: nunca se vende de más.
+
+    Corre contra la base configurada (SQLite por defecto, PostgreSQL si
+    DATABASE_URL apunta a uno).
+    """
+
+    HILOS = 12
+    VENTAS_POR_HILO = 5
+    STOCK_INICIAL = 40
+
+    def test_sin_sobreventa_bajo_concurrencia(self):
+        org = Organizacion.objects.create(nombre='OrgConc', slug='orgconc')
+        producto = crear_producto(org, stock=self.STOCK_INICIAL)
+        barrera = threading.Barrier(self.HILOS)
+        vendidas = []
+        rechazadas = []
+        lock = threading.Lock()
+
+        def cajero():
+            try:
+                barrera.wait()
+                for _ in range(self.VENTAS_POR_HILO):
+                    while True:
+                        try:
+                            descontar_stock({producto.id: 1}, organizacion=org)
+                            resultado = vendidas
+                        except StockInsuficiente:
+                            resultado = rechazadas
+                        except OperationalError:
+                            # SQLite: la base está bloqueada por otro escritor, reintentar
+                            continue
+                        break
+                    with lock:
+                        resultado.append(1)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=cajero) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        producto.refresh_from_db()
+        self.assertEqual(len(vendidas), self.STOCK_INICIAL)
+        self.assertEqual(len(rechazadas), self.HILOS * self.VENTAS_POR_HILO - self.STOCK_INICIAL)
+        self.assertEqual(producto.stock, 0)
+
+
+class TiposCambioTests(TestCase):
+    def setUp(self):
+        tipos_cambio.limpiar_cache()
+        self.addCleanup(tipos_cambio.limpiar_cache)
+        TipoCambio.objects.bulk_create([
+            TipoCambio(origen='USD', destino='NIO', vigente_desde=date(2024, 1, 1), tasa=Decimal('36.50')),
+            TipoCambio(origen='USD', destino='NIO', vigente_desde=date(2024, 6, 1), tasa=Decimal('36.80')),
+            TipoCambio(origen='EUR', destino='USD', vigente_desde=date(2024, 1, 1), tasa=Decimal('1.10')),
+        ])
+
+    def test_tasa_vigente_en_la_fecha(self):
+        self.assertEqual(tipos_cambio.obtener_tasa_cambio('USD', 'NIO', date(2024, 3, 1)), Decimal('36.50'))
+        self.assertEqual(tipos_cambio.obtener_tasa_cambio('USD', 'NIO', date(2024, 6, 1)), Decimal('36.80'))
+        self.assertEqual(tipos_cambio.obtener_tasa_cambio('NIO', 'USD', date(2024, 3, 1)), 1 / Decimal('36.50'))
+        self.assertEqual(tipos_cambio.obtener_tasa_cambio('EUR', 'NIO', date(2024, 3, 1)), Decimal('1.10') * Decimal('36.50'))
+        with self.assertRaises(tipos_cambio.TipoCambioNoDisponible):
+            tipos_cambio.obtener_tasa_cambio('USD', 'NIO', date(2023, 12, 31))
+
+        # Sin historial se usa el cambio a USD de la moneda
+        Moneda.objects.create(codigo='CRC', nombre='Colón', simbolo='₡', cambio_a_usd=Decimal('0.0020'))
+        self.assertEqual(tipos_cambio.obtener_tasa_cambio('CRC', 'USD'), Decimal('0.0020'))
+
+    def test_cache_por_par_y_fecha(self):
+        dia = date(2024, 7, 1)
+        tipos_cambio.obtener_tasa_cambio('USD', 'NIO', dia)
+        with self.assertNumQueries(0):
+            tipos_cambio.obtener_tasa_cambio('USD', 'NIO', dia)
+        TipoCambio.objects.create(origen='USD', destino='NIO', vigente_desde=date(2024, 7, 1), tasa=Decimal('37.00'))
+        self.assertEqual(tipos_cambio.obtener_tasa_cambio('USD', 'NIO', dia), Decimal('37.00'))
+
+    def test_convertir_miles_de_montos_en_una_consulta(self):
+        montos = [(Decimal('10.00'), 'NIO' if i % 2 else 'EUR', date(2024, 1 + i % 12, 15)) for i in range(3000)]
+        with self.assertNumQueries(1):
+            convertidos = tipos_cambio.convertir_moneda(montos, 'USD')
+        self.assertEqual(len(convertidos), 3000)
+        self.assertEqual(convertidos[0], Decimal('11.00'))
+        self.assertEqual(convertidos[1], (Decimal('10.00') / Decimal('36.50')).quantize(Decimal('0.01')))
+        self.assertEqual(convertidos[7], (Decimal('10.00') / Decimal('36.80')).quantize(Decimal('0.01')))
+
+    def test_firmas_anteriores_en_core_utils(self):
+        from core import utils
+
+        usd = Moneda.objects.create(codigo='USD', nombre='Dólar', simbolo='$', cambio_a_usd=Decimal('1'))
+        nio = Moneda.objects.create(codigo='NIO', nombre='Córdoba', simbolo='C$', cambio_a_usd=Decimal('0.027'))
+        self.assertEqual(utils.convertir_moneda(Decimal('2'), usd, nio), Decimal('73.60'))
+        self.assertEqual(utils.convertir_moneda(Decimal('2'), usd, usd), Decimal('2'))
+        # Sin tasa conocida se mantiene el comportamiento anterior
+        self.assertEqual(utils.obtener_tasa_cambio('USD', 'XXX'), Decimal('1.0'))
+
+    def test_comando_carga_desde_archivo(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as archivo:
+            archivo.write('fecha,origen,destino,tasa\n2024-06-01,usd,NIO,36.90\n2025-01-01,USD,NIO,37.10\n')
+        self.addCleanup(os.unlink, archivo.name)
+
+        call_command('cargar_tipos_cambio', archivo=archivo.name, hasta='2024-12-31', stdout=StringIO())
+        self.assertEqual(TipoCambio.objects.get(vigente_desde=date(2024, 6, 1)).tasa, Decimal('36.90'))
+        self.assertFalse(TipoCambio.objects.filter(vigente_desde=date(2025, 1, 1)).exists())
+
+        with open(archivo.name, 'a') as f:
+            f.write('2025-02-01,USD,NIO,-1\n')
+        with self.assertRaises(CommandError):
+            call_command('cargar_tipos_cambio', archivo=archivo.name, stdout=StringIO())
+
+
+class CodigosProductoTests(TestCase):
+    def setUp(self):
+        # Los ids se reutilizan entre tests: no arrastrar mapas de otro test
+        codigos.limpiar_indices()
+        self.addCleanup(codigos.limpiar_indices)
+        self.org = Organizacion.objects.create(nombre='OrgCodigos', slug='orgcodigos')
+        self.producto = crear_producto(self.org, 'Café', stock=3)
+        self.codigo = CodigoProducto.objects.create(producto=self.producto, codigo_barra='7501', codigo_qr='QR-CAFE')
+
+    def test_resuelve_en_memoria_por_organizacion(self):
+        codigos.precargar()
+        with self.assertNumQueries(0):
+            por_barra = codigos.resolver('7501', self.org)
+            por_qr = codigos.resolver(' QR-CAFE ', self.org)
+            self.assertIsNone(codigos.resolver('no-existe', self.org))
+        self.assertEqual((por_barra['id'], por_barra['nombre'], por_barra['precio'], por_barra['categoria']),
+                         (self.producto.id, 'Café', '1.00', 'General'))
+        self.assertEqual(por_qr['id'], self.producto.id)
+
+        ajena = Organizacion.objects.create(nombre='Ajena', slug='ajena')
+        self.assertIsNone(codigos.resolver('7501', ajena))
+        self.assertEqual(codigos.resolver('7501')['id'], self.producto.id)
+
+    def test_senales_actualizan_el_mapa(self):
+        self.assertEqual(codigos.resolver('7501', self.org)['precio'], '1.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.precio = Decimal('2.50')
+            self.producto.save()
+            # Hasta confirmar, el mapa no ve el cambio (podría deshacerse)
+            self.assertEqual(codigos.resolver('7501', self.org)['precio'], '1.00')
+        self.assertEqual(codigos.resolver('7501', self.org)['precio'], '2.50')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.codigo.codigo_barra = '7502'
+            self.codigo.save()
+        self.assertIsNone(codigos.resolver('7501', self.org))
+        self.assertEqual(codigos.resolver('7502', self.org)['id'], self.producto.id)
+
+        # Los movimientos de stock no tocan el mapa
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks() as callbacks:
+            self.producto.stock = 1
+            self.producto.save(update_fields=['stock'])
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.delete()
+        self.assertIsNone(codigos.resolver('7502', self.org))
+        self.assertIsNone(codigos.resolver('QR-CAFE', self.org))
+
+    def test_endpoint(self):
+        usuario = get_user_model().objects.create_user(username='cajero', password='pass')
+        Miembro.objects.create(organizacion=self.org, user=usuario, role='cajero')
+        self.client.post('/login/', {'company': 'OrgCodigos', 'username': 'cajero', 'password': 'pass'})
+
+        datos = self.client.get('/productos/codigo/', {'codigo': 'QR-CAFE'}).json()
+        self.assertEqual((datos['id'], datos['stock'], datos['proveedor'], datos['codigo_barra']),
+                         (self.producto.id, 3, 'Sin proveedor', '7501'))
+        self.assertEqual(self.client.get('/productos/codigo/', {'codigo': 'nada'}).status_code, 404)
+        Producto.all_objects.filter(pk=self.producto.pk).update(stock=0)
+        self.assertEqual(self.client.get('/productos/codigo/', {'codigo': '7501'}).json()['error'], 'Producto sin stock')
+
+
+class BusquedaProductosTests(TestCase):
+    def setUp(self):
+        self.org = Organizacion.objects.create(nombre='OrgBusqueda', slug='orgbusqueda')
+        self.leche = crear_producto(self.org, 'Leche entera 1L', stock=5)
+        self.dulce = crear_producto(self.org, 'Dulce de leche', stock=5)
+        self.cafe = crear_producto(self.org, 'Café molido', stock=0)
+        CodigoProducto.objects.create(producto=self.cafe, codigo_barra='7501055300', codigo_qr='QR-CAFE')
+
+    def test_subcadena_prefijo_codigos_y_relevancia(self):
+        ids, hay_mas = busqueda.buscar('lech', self.org)
+        # "Leche..." empieza con la consulta; "Dulce de leche" solo la contiene
+        self.assertEqual((ids, hay_mas), ([self.leche.id, self.dulce.id], False))
+        self.assertEqual(busqueda.buscar('ECHE 1l', self.org)[0], [self.leche.id])
+        self.assertEqual(busqueda.buscar('cafe', self.org)[0], [self.cafe.id])
+        self.assertEqual(busqueda.buscar('0553', self.org)[0], [self.cafe.id])
+        self.assertEqual(busqueda.buscar('du', self.org)[0], [self.dulce.id])
+        self.assertEqual(busqueda.buscar('cafe', self.org, disponibles=True)[0], [])
+        self.assertEqual(busqueda.buscar('lech', self.org, tamano=1), ([self.leche.id], True))
+        self.assertEqual(busqueda.buscar('lech', self.org, pagina=2, tamano=1), ([self.dulce.id], False))
+
+        ajena = Organizacion.objects.create(nombre='Ajena', slug='ajena')
+        self.assertEqual(busqueda.buscar('leche', ajena)[0], [])
+
+    def test_documentos_se_mantienen_con_las_senales(self):
+        self.leche.nombre = 'Yogur natural'
+        self.leche.save()
+        self.assertEqual(busqueda.buscar('yogur', self.org)[0], [self.leche.id])
+        codigo = CodigoProducto.objects.create(producto=self.leche, codigo_barra='99887766')
+        self.assertEqual(busqueda.buscar('998877', self.org)[0], [self.leche.id])
+        codigo.delete()
+        self.assertEqual(busqueda.buscar('998877', self.org)[0], [])
+        self.cafe.delete()
+        self.assertEqual(busqueda.buscar('cafe', self.org)[0], [])
+
+        DocumentoBusquedaProducto.objects.all().delete()
+        call_command('indexar_busqueda_productos', stdout=StringIO())
+        self.assertEqual(busqueda.buscar('dulce', self.org)[0], [self.dulce.id])
+
+    def test_endpoint_paginado(self):
+        usuario = get_user_model().objects.create_user(username='cajero', password='pass')
+        Miembro.objects.create(organizacion=self.org, user=usuario, role='cajero')
+        self.client.post('/login/', {'company': 'OrgBusqueda', 'username': 'cajero', 'password': 'pass'})
+
+        datos = self.client.get('/productos/buscar/', {'q': 'leche'}).json()
+        self.assertEqual([r['id'] for r in datos['resultados']], [self.leche.id, self.dulce.id])
+        self.assertEqual((datos['resultados'][0]['precio'], datos['resultados'][0]['moneda'], datos['hay_mas']), ('1.00', 'USD', False))
+        # Sin texto: catálogo con stock en orden alfabético; un número también busca por id
+        self.assertEqual([r['id'] for r in self.client.get('/productos/buscar/').json()['resultados']],
+                         [self.dulce.id, self.leche.id])
+        self.assertEqual([r['id'] for r in self.client.get('/productos/buscar/', {'q': str(self.leche.id)}).json()['resultados']][0],
+                         self.leche.id)
+        self.assertNotContains(self.client.get('/facturas/nueva/'), 'Dulce de leche')
+
+    def test_listados_buscan_por_relevancia(self):
+        usuario = get_user_model().objects.create_user(username='dueno', password='pass')
+        Miembro.objects.create(organizacion=self.org, user=usuario, role='admin')
+        self.client.post('/login/', {'company': 'OrgBusqueda', 'username': 'dueno', 'password': 'pass'})
+        proveedor = Proveedor.objects.create(organizacion=self.org, nombre_empresa='Lácteos SA', nombre_contacto='Ana',
+                                             email='ana@example.com', telefono='88888888', direccion='-', ciudad='León')
+        Producto.objects.filter(pk__in=[self.leche.pk, self.dulce.pk]).update(proveedor=proveedor)
+
+        respuesta = self.client.get('/productos/', {'search': 'lech'})
+        self.assertEqual([p.id for p in respuesta.context['productos']], [self.leche.id, self.dulce.id])
+        respuesta = self.client.get('/productos/', {'search': 'lech', 'stock': 'alto'})
+        self.assertEqual(list(respuesta.context['productos']), [])
+        respuesta = self.client.get('/productos/', {'search': '7501055'})
+        self.assertEqual([p.id for p in respuesta.context['productos']], [self.cafe.id])
+
+        respuesta = self.client.get(f'/productos/proveedor/{proveedor.pk}/', {'search': 'dulce'})
+        self.assertEqual([p.id for p in respuesta.context['productos']], [self.dulce.id])
+
+        self.client.logout()
+        respuesta = self.client.get(f'/productos/proveedor/{proveedor.pk}/')
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertNotContains(respuesta, 'Dulce de leche', status_code=302)
+
+
+class EstadisticasCatalogoTests(TestCase):
+    def setUp(self):
+        self.org = Organizacion.objects.create(nombre='OrgStats', slug='orgstats')
+        self.a = crear_producto(self.org, 'A', stock=12)
+        self.b = crear_producto(self.org, 'B', stock=3)
+
+    def assertContadores(self, total, activos, stock_bajo):
+        esperados = {'total': total, 'activos': activos, 'stock_bajo': stock_bajo}
+        self.assertEqual(EstadisticasCatalogo.de(self.org), esperados)
+        self.assertEqual(EstadisticasCatalogo.calcular(Producto.all_objects.filter(organizacion=self.org)), esperados)
+
+    def test_contadores_se_ajustan_con_cada_cambio(self):
+        self.assertContadores(2, 2, 1)
+        # Con la fila ya creada, leer los contadores es una consulta
+        with self.assertNumQueries(1):
+            EstadisticasCatalogo.de(self.org)
+        crear_producto(self.org, 'C', stock=0)
+        self.assertContadores(3, 3, 2)
+        self.a.activo = False
+        self.a.save()
+        self.assertContadores(3, 2, 2)
+
+        descontar_stock({self.a.id: 3}, organizacion=self.org)  # 12 -> 9
+        self.assertContadores(3, 2, 3)
+        reponer_stock({self.a.id: 1, self.b.id: 20}, organizacion=self.org)  # 9 -> 10, 3 -> 23
+        self.assertContadores(3, 2, 1)
+
+        otra = Organizacion.objects.create(nombre='OrgStats2', slug='orgstats2')
+        EstadisticasCatalogo.reconstruir(otra)
+        self.b.refresh_from_db()
+        self.b.organizacion = otra
+        self.b.save()
+        self.assertContadores(2, 1, 1)
+        self.assertEqual(EstadisticasCatalogo.de(otra), {'total': 1, 'activos': 1, 'stock_bajo': 0})
+        Producto.all_objects.get(pk=self.a.pk).delete()
+        self.assertContadores(1, 1, 1)
+
+    def test_listado_lee_la_fila_de_contadores(self):
+        usuario = get_user_model().objects.create_user(username='dueno_stats', password='pass')
+        Miembro.objects.create(organizacion=self.org, user=usuario, role='admin')
+        self.client.post('/login/', {'company': 'OrgStats', 'username': 'dueno_stats', 'password': 'pass'})
+        EstadisticasCatalogo.reconstruir(self.org)
+        EstadisticasCatalogo.objects.filter(organizacion=self.org).update(total=40, activos=30, stock_bajo=5)
+        respuesta = self.client.get('/productos/')
+        self.assertEqual((respuesta.context['total_productos'], respuesta.context['productos_activos'],
+                          respuesta.context['stock_bajo_count']), (40, 30, 5))
+
+        call_command('reconstruir_estadisticas_catalogo', stdout=StringIO())
+        respuesta = self.client.get('/productos/')
+        self.assertEqual((respuesta.context['total_productos'], respuesta.context['stock_bajo_count']), (2, 1))
+
+
+class ImportacionProductosTests(TestCase):
+    def setUp(self):
+        codigos.limpiar_indices()
+        self.addCleanup(codigos.limpiar_indices)
+        self.org = Organizacion.objects.create(nombre='OrgImport', slug='orgimport')
+        self.existente = crear_producto(self.org, 'Arroz 1kg', stock=4)
+        CodigoProducto.objects.create(producto=self.existente, codigo_barra='1001', codigo_qr='QR-1001')
+        ajeno = crear_producto(Organizacion.objects.create(nombre='Otra', slug='otra'), 'Ajeno')
+        CodigoProducto.objects.create(producto=ajeno, codigo_barra='9009', codigo_qr='QR-9009')
+        Moneda.objects.get_or_create(codigo='NIO', defaults={'nombre': 'Córdoba', 'simbolo': 'C$', 'principal': True})
+
+    def test_csv_crea_actualiza_e_informa_errores(self):
+        csv_texto = (
+            'Nombre,Categoría,Precio,Stock,Moneda,Código de barras,QR,Activo\n'
+            'Arroz 1kg premium,General,2.50,40,USD,1001,,si\n'
+            'Frijol rojo,Granos,1.75,8,,2002,,\n'
+            'Sin precio,Granos,abc,1,,,,\n'
+            'Moneda rara,Granos,1,1,XYZ,,,\n'
+            'Repetido,Granos,1,1,,2002,,\n'
+            'Robado,Granos,1,1,,9009,,\n'
+            'Azúcar,granos,1.10,0,,,,no\n'
+        )
+        resultado = importacion.importar_archivo(io.BytesIO(csv_texto.encode('utf-8-sig')), 'productos.csv', self.org, lote=3)
+
+        self.assertEqual((resultado.creados, resultado.actualizados, resultado.total_errores), (2, 1, 4))
+        self.assertEqual([numero for numero, _ in resultado.errores], [4, 5, 6, 7])
+        self.existente.refresh_from_db()
+        self.assertEqual((self.existente.nombre, self.existente.precio, self.existente.stock), ('Arroz 1kg premium', Decimal('2.50'), 40))
+        frijol = Producto.all_objects.get(organizacion=self.org, nombre='Frijol rojo')
+        self.assertEqual((frijol.moneda.codigo, frijol.categoria.nombre, frijol.codigos.get().codigo_barra), ('NIO', 'Granos', '2002'))
+        self.assertFalse(Producto.all_objects.get(nombre='Azúcar').activo)
+        self.assertEqual(Categoria.objects.filter(nombre__iexact='granos').count(), 1)
+        # Índice de búsqueda, mapa de códigos y contadores al día aunque bulk_create no emite señales
+        self.assertEqual(busqueda.buscar('frijol', self.org)[0], [frijol.id])
+        self.assertEqual(codigos.resolver('2002', self.org)['id'], frijol.id)
+        self.assertEqual(EstadisticasCatalogo.de(self.org), {'total': 3, 'activos': 2, 'stock_bajo': 2})
+
+        with self.assertRaises(ValueError):
+            importacion.importar_archivo(io.BytesIO(b'precio,stock\n1,2\n'), 'productos.csv', self.org)
+
+    def test_vista_importa_xlsx(self):
+        from openpyxl import Workbook
+
+        libro = Workbook()
+        hoja = libro.active
+        hoja.append(['nombre', 'categoria', 'precio', 'stock', 'codigo_barra'])
+        hoja.append(['Leche 1L', 'Lácteos', 1.2, 12, 3003])
+        hoja.append(['', 'Lácteos', 1, 1, None])
+        archivo = io.BytesIO()
+        libro.save(archivo)
+        archivo.seek(0)
+        archivo.name = 'catalogo.xlsx'
+
+        usuario = get_user_model().objects.create_user(username='dueno_import', password='pass')
+        Miembro.objects.create(organizacion=self.org, user=usuario, role='admin')
+        self.client.post('/login/', {'company': 'OrgImport', 'username': 'dueno_import', 'password': 'pass'})
+        respuesta = self.client.post('/productos/importar/', {'archivo': archivo})
+
+        resultado = respuesta.context['resultado']
+        self.assertEqual((resultado.creados, resultado.errores), (1, [(3, 'falta el nombre')]))
+        leche = Producto.all_objects.get(nombre='Leche 1L')
+        self.assertEqual((leche.organizacion, leche.precio, leche.stock, leche.codigos.get().codigo_barra),
+                         (self.org, Decimal('1.20'), 12, '3003'))
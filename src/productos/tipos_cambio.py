@@ -0,0 +1,212 @@
+# productos/tipos_cambio.py
+"""Tipos de cambio con fecha de vigencia.
+
+`obtener_tasa_cambio(origen, destino, fecha)` usa la última fila de
+`TipoCambio` del par vigente en esa fecha; si no hay, la del par inverso o
+el cruce por USD y, como último recurso, el `Moneda.cambio_a_usd` actual.
+El resultado queda en una caché LRU por (par, fecha) que se renueva cada
+`TIPOS_CAMBIO_TTL` segundos para ver las tasas que cargue otro proceso.
+
+`convertir_moneda` convierte miles de montos, cada uno con su moneda y su
+fecha, en una sola llamada: trae el historial de los pares involucrados en
+una consulta y resuelve cada (moneda, fecha) con búsqueda binaria.
+
+Las tasas se cargan con `python manage.py cargar_tipos_cambio` desde la
+fuente configurada en `TIPOS_CAMBIO_FUENTE`: cualquier clase con un método
+`obtener(desde, hasta)` que devuelva tuplas (fecha, origen, destino, tasa).
+`FuenteArchivo` lee un CSV local y sirve de reemplazo de un proveedor real.
+"""
+import bisect
+import csv
+import time
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import cache, lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.module_loading import import_string
+
+from .models import Moneda, TipoCambio
+
+PIVOTE = 'USD'
+CENTAVO = Decimal('0.01')
+UNO = Decimal('1')
+
+
+class TipoCambioNoDisponible(LookupError):
+    pass
+
+
+def _ttl():
+    return getattr(settings, 'TIPOS_CAMBIO_TTL', 300)
+
+
+def _codigo(moneda):
+    return getattr(moneda, 'codigo', moneda)
+
+
+def _dia(fecha, hoy):
+    if fecha is None:
+        return hoy
+    if isinstance(fecha, datetime):
+        return timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date()
+    return fecha
+
+
+def _cambios_a_usd():
+    return dict(Moneda.objects.filter(cambio_a_usd__gt=0).values_list('codigo', 'cambio_a_usd'))
+
+
+def _resolver(buscar, origen, destino):
+    """Tasa origen -> destino con `buscar(origen, destino)`, que devuelve la tasa guardada del par o None"""
+    if origen == destino:
+        return UNO
+    directa = buscar(origen, destino)
+    if directa is not None:
+        return directa
+    inversa = buscar(destino, origen)
+    if inversa is not None:
+        return UNO / inversa
+    if PIVOTE not in (origen, destino):
+        try:
+            return _resolver(buscar, origen, PIVOTE) * _resolver(buscar, PIVOTE, destino)
+        except TipoCambioNoDisponible:
+            pass
+    raise TipoCambioNoDisponible(f'No hay tipo de cambio {origen}/{destino}')
+
+
+def _tasa(buscar, cambios_a_usd, origen, destino):
+    try:
+        return _resolver(buscar, origen, destino)
+    except TipoCambioNoDisponible:
+        # Sin historial para el par: cruzar con el cambio a USD actual de cada moneda
+        respaldo = cambios_a_usd()
+
+        def buscar_con_respaldo(o, d):
+            tasa = buscar(o, d)
+            if tasa is None and d == PIVOTE:
+                tasa = respaldo.get(o)
+            return tasa
+
+        return _resolver(buscar_con_respaldo, origen, destino)
+
+
+@lru_cache(maxsize=4096)
+def _tasa_en_cache(origen, destino, dia, periodo):
+    def buscar(o, d):
+        return (
+            TipoCambio.objects.filter(origen=o, destino=d, vigente_desde__lte=dia)
+            .order_by('-vigente_desde').values_list('tasa', flat=True).first()
+        )
+    return _tasa(buscar, _cambios_a_usd, origen, destino)
+
+
+def obtener_tasa_cambio(origen, destino, fecha=None):
+    """Tasa para convertir 1 `origen` a `destino` vigente en `fecha` (hoy si no se indica).
+
+    Acepta códigos o instancias de `Moneda`. Lanza `TipoCambioNoDisponible`
+    si alguna de las monedas no tiene tasa.
+    """
+    dia = _dia(fecha, timezone.localdate())
+    # El período forma parte de la clave: al cambiar de período se vuelve a leer la tabla
+    periodo = int(time.monotonic() // _ttl())
+    return _tasa_en_cache(_codigo(origen), _codigo(destino), dia, periodo)
+
+
+def convertir_moneda(montos, destino):
+    """Convierte a `destino` una lista de `(monto, moneda, fecha)` y devuelve los montos convertidos.
+
+    Cada monto usa la tasa vigente en su fecha (hoy si es None) y se
+    redondea al centavo. Son una o dos consultas sin importar cuántos
+    montos haya. Lanza `TipoCambioNoDisponible` si falta alguna tasa.
+    """
+    destino = _codigo(destino)
+    hoy = timezone.localdate()
+    filas = [(monto, _codigo(moneda), _dia(fecha, hoy)) for monto, moneda, fecha in montos]
+    if not filas:
+        return []
+
+    monedas = {moneda for _, moneda, _ in filas} | {destino, PIVOTE}
+    historial = {}
+    for origen, destino_par, vigente_desde, tasa in (
+        TipoCambio.objects.filter(origen__in=monedas, destino__in=monedas,
+                                  vigente_desde__lte=max(dia for _, _, dia in filas))
+        .order_by('vigente_desde').values_list('origen', 'destino', 'vigente_desde', 'tasa')
+    ):
+        fechas, tasas = historial.setdefault((origen, destino_par), ([], []))
+        fechas.append(vigente_desde)
+        tasas.append(tasa)
+
+    def buscar_en(dia):
+        def buscar(o, d):
+            par = historial.get((o, d))
+            if par is None:
+                return None
+            i = bisect.bisect_right(par[0], dia)
+            return par[1][i - 1] if i else None
+        return buscar
+
+    cambios_a_usd = cache(_cambios_a_usd)
+    tasas = {}
+    convertidos = []
+    for monto, moneda, dia in filas:
+        tasa = tasas.get((moneda, dia))
+        if tasa is None:
+            tasa = tasas[(moneda, dia)] = _tasa(buscar_en(dia), cambios_a_usd, moneda, destino)
+        convertidos.append((Decimal(monto) * tasa).quantize(CENTAVO, rounding=ROUND_HALF_UP))
+    return convertidos
+
+
+def limpiar_cache():
+    _tasa_en_cache.cache_clear()
+
+
+class FuenteArchivo:
+    """Fuente local: CSV con columnas `fecha,origen,destino,tasa` (fecha AAAA-MM-DD)"""
+    nombre = 'archivo'
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or getattr(settings, 'TIPOS_CAMBIO_ARCHIVO', None)
+
+    def obtener(self, desde=None, hasta=None):
+        with open(self.ruta, newline='', encoding='utf-8') as archivo:
+            for numero, fila in enumerate(csv.DictReader(archivo), start=2):
+                try:
+                    fecha = parse_date(fila['fecha'].strip())
+                    tasa = Decimal(fila['tasa'].strip())
+                    origen, destino = fila['origen'].strip().upper(), fila['destino'].strip().upper()
+                    valida = fecha is not None and tasa > 0 and len(origen) == 3 and len(destino) == 3
+                except (KeyError, AttributeError, ValueError, InvalidOperation):
+                    valida = False
+                if not valida:
+                    raise ValueError(f'{self.ruta}, línea {numero}: fila inválida')
+                if (desde is None or fecha >= desde) and (hasta is None or fecha <= hasta):
+                    yield fecha, origen, destino, tasa
+
+
+def obtener_fuente(ruta_clase=None, **opciones):
+    """Instancia la fuente `ruta_clase` (por defecto `TIPOS_CAMBIO_FUENTE`)"""
+    ruta_clase = ruta_clase or getattr(settings, 'TIPOS_CAMBIO_FUENTE', 'productos.tipos_cambio.FuenteArchivo')
+    return import_string(ruta_clase)(**opciones)
+
+
+def cargar(fuente, desde=None, hasta=None):
+    """Guarda las tasas de `fuente` (las ya existentes del mismo par y fecha se actualizan).
+
+    Devuelve cuántas filas escribió.
+    """
+    nombre = getattr(fuente, 'nombre', type(fuente).__name__)
+    filas = [
+        TipoCambio(vigente_desde=fecha, origen=origen, destino=destino, tasa=tasa, fuente=nombre)
+        for fecha, origen, destino, tasa in fuente.obtener(desde, hasta)
+    ]
+    with transaction.atomic():
+        TipoCambio.objects.bulk_create(
+            filas, batch_size=1000, update_conflicts=True,
+            unique_fields=['origen', 'destino', 'vigente_desde'], update_fields=['tasa', 'fuente', 'cargado_en'],
+        )
+    limpiar_cache()
+    return len(filas)
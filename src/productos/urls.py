@@ -5,8 +5,12 @@ from . import views
 urlpatterns = [
     path('', views.producto_list, name='producto_list'),
     path('crear/', views.producto_create, name='producto_create'),
+    path('importar/', views.importar_productos, name='importar_productos'),
     path('editar/<int:pk>/', views.producto_edit, name='producto_edit'),
     path('<int:pk>/eliminar/', views.producto_delete, name='producto_delete'),
+    path('codigo/', views.buscar_producto_por_codigo, name='buscar_producto_por_codigo'),
+    path('buscar/', views.buscar_productos, name='buscar_productos'),
+    path('proveedor/<int:proveedor_id>/', views.productos_por_proveedor, name='productos_por_proveedor'),
     # Agrega eliminar si tienes
     
     # Nuevas URLs para monedas (usando las vistas de views.py)
@@ -1,5 +1,5 @@
 # views.py (corregido)
-from django.db.models import Q
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.admin.views.decorators import staff_member_required
 from django.core.exceptions import PermissionDenied
@@ -10,7 +10,7 @@ from django.contrib.auth.decorators import login_required
 from django.views.generic import CreateView, UpdateView
 
 # Importar modelos desde la app actual
-from .models import Producto, CodigoProducto, Moneda, ConfiguracionTienda
+from .models import Producto, CodigoProducto, Moneda, ConfiguracionTienda, EstadisticasCatalogo
 from categorias.models import Categoria
 
 # Importar modelos externos
@@ -18,6 +18,7 @@ from proveedores.models import Proveedor
 
 # Importar TODOS los formularios necesarios
 from .forms import ProductoForm, CodigoProductoFormSet, MonedaForm, ConfiguracionTiendaForm
+from . import busqueda, codigos, importacion
 
 
 
@@ -32,12 +33,6 @@ def producto_list(request):
     
     org = getattr(request, 'organizacion', None)
     productos = Producto.objects.filter(organizacion=org) if org is not None else Producto.objects.all()
-    if search_query:
-        productos = productos.filter(
-            Q(nombre__icontains=search_query) |
-            Q(codigos__codigo_barra__icontains=search_query) |
-            Q(codigos__codigo_qr__icontains=search_query)
-        ).distinct()
     if categoria_id:
         productos = productos.filter(categoria_id=categoria_id)
     if proveedor_id:
@@ -56,27 +51,27 @@ def producto_list(request):
             productos = productos.filter(stock__gte=10, stock__lt=50)
         elif stock_filter == 'alto':
             productos = productos.filter(stock__gte=50)
+    if search_query:
+        # Índice de trigramas, ordenado por relevancia
+        productos = busqueda.filtrar(productos, search_query, org)
     paginator = Paginator(productos, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     categorias = Categoria.objects.all()
-    org = getattr(request, 'organizacion', None)
     proveedores = Proveedor.objects.filter(organizacion=org, estado='activo') if org is not None else Proveedor.objects.filter(estado='activo')
+    # La plantilla ya recorre las monedas para el filtro: len() carga esa misma lista
     monedas = Moneda.objects.all()
-    # Estadísticas rápidas usadas en la plantilla (scope por organización)
-    total_productos = Producto.objects.filter(organizacion=org).count() if org is not None else Producto.objects.count()
-    productos_activos = Producto.objects.filter(organizacion=org, activo=True).count() if org is not None else Producto.objects.filter(activo=True).count()
-    stock_bajo_count = Producto.objects.filter(organizacion=org, stock__lt=10).count() if org is not None else Producto.objects.filter(stock__lt=10).count()
-    total_monedas = monedas.count()
+    # Estadísticas rápidas usadas en la plantilla (contadores por organización)
+    estadisticas = EstadisticasCatalogo.de(org)
     context = {
         'productos': page_obj,
         'categorias': categorias,
         'proveedores': proveedores,
         'monedas': monedas,
-        'total_productos': total_productos,
-        'productos_activos': productos_activos,
-        'stock_bajo_count': stock_bajo_count,
-        'total_monedas': total_monedas,
+        'total_productos': estadisticas['total'],
+        'productos_activos': estadisticas['activos'],
+        'stock_bajo_count': estadisticas['stock_bajo'],
+        'total_monedas': len(monedas),
     }
     return render(request, 'core/producto_list.html', context)
 
@@ -157,67 +152,130 @@ def producto_delete(request, pk):
     return render(request, 'core/producto_confirm_delete.html', {'object': producto})
 
 # Búsqueda rápida para facturación - Busca por código de barras o QR
+@login_required
 def buscar_producto_por_codigo(request):
     codigo = request.GET.get('codigo', '').strip()
     
     if not codigo:
         return JsonResponse({'error': 'Código no proporcionado'}, status=400)
     
+    # El mapa de códigos de la organización está en memoria (ver productos/codigos.py)
+    org = getattr(request, 'organizacion', None)
+    resumen = codigos.resolver(codigo, org)
+    if resumen is None:
+        return JsonResponse({'error': 'Producto no encontrado'}, status=404)
+    
+    # El mapa solo da el id: precio, activo y stock se leen de la base (el mapa de este worker puede estar atrasado)
+    actual = Producto.all_objects.filter(pk=resumen['id']).values('precio', 'activo', 'stock').first()
+    if actual is None or not actual['activo']:
+        return JsonResponse({'error': 'Producto inactivo'}, status=400)
+    
+    stock = actual['stock']
+    if (stock or 0) <= 0:
+        return JsonResponse({'error': 'Producto sin stock'}, status=400)
+    
+    # Devolver datos del producto (incluyendo información del proveedor)
+    data = {
+        'id': resumen['id'],
+        'nombre': resumen['nombre'],
+        'precio': str(actual['precio']),
+        'stock': stock,
+        'moneda': resumen['moneda'],
+        'moneda_simbolo': resumen['moneda_simbolo'],
+        'categoria': resumen['categoria'],
+        'proveedor': resumen['proveedor'] or 'Sin proveedor',  # Info del proveedor
+        'proveedor_id': resumen['proveedor_id'],
+        'codigo_barra': resumen['codigo_barra'],
+        'codigo_qr': resumen['codigo_qr']
+    }
+    
+    return JsonResponse(data)
+
+# Búsqueda con autocompletado para la caja (JSON paginado)
+@login_required
+def buscar_productos(request):
+    """Productos activos con stock cuyo nombre o códigos contienen lo escrito.
+
+    Parámetros: `q` (texto; un número también se prueba como id), `pagina` (desde 1).
+    Sin `q` devuelve la página del catálogo en orden alfabético.
+    """
+    org = getattr(request, 'organizacion', None)
+    consulta = request.GET.get('q', '').strip()
     try:
-        # Buscar el código en los códigos de barras o QR, respetando organización
-        org = getattr(request, 'organizacion', None)
-        codigo_qs = CodigoProducto.objects.filter(Q(codigo_barra=codigo) | Q(codigo_qr=codigo))
-        if org is not None:
-            codigo_qs = codigo_qs.filter(producto__organizacion=org)
-        codigo_producto = codigo_qs.select_related('producto').get()
-        
-        producto = codigo_producto.producto
-        
-        # Verificar si el producto está activo y tiene stock
-        if not producto.activo:
-            return JsonResponse({'error': 'Producto inactivo'}, status=400)
-            
-        if producto.stock <= 0:
-            return JsonResponse({'error': 'Producto sin stock'}, status=400)
-        
-        # Devolver datos del producto (incluyendo información del proveedor)
-        data = {
-            'id': producto.id,
-            'nombre': producto.nombre,
-            'precio': str(producto.precio),
-            'stock': producto.stock,
-            'categoria': producto.categoria.nombre,
-            'proveedor': producto.proveedor.nombre_empresa if producto.proveedor else 'Sin proveedor',  # Info del proveedor
-            'proveedor_id': producto.proveedor.id if producto.proveedor else None,
-            'codigo_barra': codigo_producto.codigo_barra,
-            'codigo_qr': codigo_producto.codigo_qr
+        pagina = max(1, int(request.GET.get('pagina', 1)))
+    except ValueError:
+        pagina = 1
+    tamano = getattr(settings, 'PRODUCTOS_BUSQUEDA_PAGINA', 20)
+    disponibles = Producto.objects.filter(stock__gt=0)
+    if org is not None:
+        disponibles = disponibles.filter(organizacion=org)
+
+    if consulta:
+        ids, hay_mas = busqueda.buscar(consulta, org, pagina=pagina, tamano=tamano, disponibles=True)
+        if consulta.isdigit() and len(consulta) < 18 and pagina == 1 and int(consulta) not in ids and disponibles.filter(pk=consulta).exists():
+            ids.insert(0, int(consulta))
+    else:
+        ids = list(disponibles.order_by('nombre', 'id').values_list('id', flat=True)[(pagina - 1) * tamano:pagina * tamano + 1])
+        hay_mas = len(ids) > tamano
+        ids = ids[:tamano]
+
+    productos = Producto.objects.select_related('moneda').in_bulk(ids)
+    barras = {}
+    for producto_id, codigo_barra in CodigoProducto.objects.filter(producto_id__in=ids).order_by('id').values_list('producto_id', 'codigo_barra'):
+        barras.setdefault(producto_id, codigo_barra)
+    resultados = [
+        {
+            'id': p.id,
+            'nombre': p.nombre,
+            'precio': str(p.precio),
+            'stock': p.stock,
+            'moneda': p.moneda.codigo,
+            'moneda_simbolo': p.moneda.simbolo,
+            'moneda_principal': p.moneda.principal,
+            'codigo_barra': barras.get(p.id, ''),
         }
-        
-        return JsonResponse(data)
-        
-    except CodigoProducto.DoesNotExist:
-        return JsonResponse({'error': 'Producto no encontrado'}, status=404)
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        for p in (productos[i] for i in ids if i in productos)
+    ]
+    return JsonResponse({'resultados': resultados, 'pagina': pagina, 'hay_mas': hay_mas})
+
+# Importación masiva de productos (CSV/XLSX)
+@login_required
+def importar_productos(request):
+    org = getattr(request, 'organizacion', None)
+    # Allow staff or organization owner/admin
+    if not (request.user.is_staff or (org is not None and request.user.organizaciones.filter(organizacion=org, role__in=['owner','admin']).exists())):
+        raise PermissionDenied()
+    contexto = {}
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            contexto['error'] = 'Seleccione un archivo.'
+        else:
+            try:
+                contexto['resultado'] = importacion.importar_archivo(archivo, archivo.name, org)
+            except ImportError:
+                contexto['error'] = 'Importar archivos Excel requiere openpyxl. Instale openpyxl en el entorno del servidor.'
+            except ValueError as e:
+                contexto['error'] = str(e)
+    return render(request, 'core/importar_productos.html', contexto)
 
 # Listar productos por proveedor específico
+@login_required
 def productos_por_proveedor(request, proveedor_id):
     org = getattr(request, 'organizacion', None)
+    # Sin organización solo el staff ve los proveedores de todas
+    if org is None and not request.user.is_staff:
+        raise PermissionDenied()
     proveedor = get_object_or_404(Proveedor.objects.filter(organizacion=org) if org is not None else Proveedor.objects, id=proveedor_id)
-    productos = Producto.objects.filter(proveedor=proveedor)
+    productos = Producto.objects.filter(proveedor=proveedor).select_related('categoria', 'moneda')
+    if org is not None:
+        productos = productos.filter(organizacion=org)
     
     # Obtener parámetros de filtrado
     search_query = request.GET.get('search', '')
     categoria_id = request.GET.get('categoria', '')
     stock_filter = request.GET.get('stock', '')
     
-    if search_query:
-        productos = productos.filter(
-            Q(nombre__icontains=search_query) |
-            Q(codigos__codigo_barra__icontains=search_query) |
-            Q(codigos__codigo_qr__icontains=search_query)
-        ).distinct()
-    
     if categoria_id:
         productos = productos.filter(categoria_id=categoria_id)
     
@@ -229,6 +287,9 @@ def productos_por_proveedor(request, proveedor_id):
         elif stock_filter == 'alto':
             productos = productos.filter(stock__gte=50)
     
+    if search_query:
+        productos = busqueda.filtrar(productos, search_query, org)
+    
     # Paginación
     paginator = Paginator(productos, 10)
     page_number = request.GET.get('page')
@@ -316,9 +377,6 @@ def lista_productos(request):
     stock_filter = request.GET.get('stock', '')
     estado_filter = request.GET.get('estado', '')
     
-    if search:
-        productos = productos.filter(nombre__icontains=search)
-    
     if categoria_id:
         productos = productos.filter(categoria_id=categoria_id)
     
@@ -339,12 +397,13 @@ def lista_productos(request):
         elif estado_filter == 'inactivo':
             productos = productos.filter(activo=False)
     
-    # Estadísticas para el template (scoped)
-    total_products_qs = Producto.all_objects.filter(organizacion=org) if org is not None else Producto.all_objects
-    total_productos = total_products_qs.count()
-    productos_activos = Producto.objects.filter(organizacion=org).count() if org is not None else Producto.objects.count()
-    stock_bajo_count = total_products_qs.filter(stock__lt=10).count()
-    total_monedas = Moneda.objects.count()
+    if search:
+        # Nombre o códigos, por relevancia
+        productos = busqueda.filtrar(productos, search, org)
+    
+    # Estadísticas para el template (contadores por organización)
+    estadisticas = EstadisticasCatalogo.de(org)
+    monedas = Moneda.objects.all()
     
     # Paginación
     paginator = Paginator(productos, 20)
@@ -359,11 +418,11 @@ def lista_productos(request):
     context = {
         'productos': productos,
         'categorias': Categoria.objects.all(),
-        'monedas': Moneda.objects.all(),
-        'total_productos': total_productos,
-        'productos_activos': productos_activos,
-        'stock_bajo_count': stock_bajo_count,
-        'total_monedas': total_monedas,
+        'monedas': monedas,
+        'total_productos': estadisticas['total'],
+        'productos_activos': estadisticas['activos'],
+        'stock_bajo_count': estadisticas['stock_bajo'],
+        'total_monedas': len(monedas),
     }
     
     return render(request, 'core/lista_productos.html', context)
\ No newline at end of file
@@ -5,6 +5,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import user_passes_test
 from django.db import transaction
 from django.contrib import messages
+from productos.services import descontar_stock, StockInsuficiente
 
 def es_gerente(user):
     return user.is_staff or user.is_superuser  
@@ -22,18 +23,17 @@ def nueva_requiza(request):
     if request.method == 'POST':
         form = RequizaForm(request.POST)
         if form.is_valid():
-            with transaction.atomic():
-                requiza = form.save(commit=False)
-                requiza.usuario = request.user
-                producto = requiza.producto
-                if producto.stock >= requiza.cantidad:
-                    producto.stock -= requiza.cantidad
-                    producto.save()
+            requiza = form.save(commit=False)
+            requiza.usuario = request.user
+            try:
+                with transaction.atomic():
+                    # Descuento condicional en la BD: evita carreras con ventas simultáneas
+                    descontar_stock({requiza.producto_id: requiza.cantidad})
                     requiza.save()
-                    messages.success(request, "Requiza registrada con éxito.")
-                    return redirect('requiza_list')  # corregido el nombre
-                else:
-                    form.add_error('cantidad', 'No hay suficiente stock disponible.')
+                messages.success(request, "Requiza registrada con éxito.")
+                return redirect('requiza_list')  # corregido el nombre
+            except StockInsuficiente:
+                form.add_error('cantidad', 'No hay suficiente stock disponible.')
     else:
         form = RequizaForm()
     return render(request, 'core/requiza_form.html', {'form': form}) 
\ No newline at end of file
@@ -4,5 +4,13 @@
 # Ejecutar migraciones
 python manage.py migrate
 
+# Worker de PDFs en el mismo servicio: la caché de PDFs vive en el disco de la web
+if [ "$FACTURA_PDF_PRERENDER" = "True" ]; then
+    python manage.py prerender_pdfs &
+fi
+
+# Agregado del reporte de productos: la vista solo lo lee
+python manage.py actualizar_ventas_producto --intervalo 60 &
+
 # Iniciar la aplicación
 exec gunicorn tienda.wsgi:application --bind 0.0.0.0:$PORT
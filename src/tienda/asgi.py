@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tienda.settings')
 
 application = get_asgi_application()
+
+# Mapa de códigos de barras/QR listo antes del primer escaneo
+from productos.codigos import precargar_al_iniciar  # noqa: E402
+
+precargar_al_iniciar()
@@ -159,6 +159,37 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Caché en disco de PDFs de facturas (bajo MEDIA_ROOT)
+FACTURA_PDF_CACHE_DIR = 'facturas_pdf'
+FACTURA_PDF_CACHE_MAX_BYTES = int(os.environ.get('FACTURA_PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+# Encolar el PDF al confirmar la factura: activar solo si `prerender_pdfs` corre junto a la web (start.sh), que comparte su disco
+FACTURA_PDF_PRERENDER = os.environ.get('FACTURA_PDF_PRERENDER', 'False') == 'True'
+# Exportación masiva de PDFs: procesos del comando exportar_facturas_pdf (la web no usa pool) y máximo por descarga web
+FACTURA_EXPORT_WORKERS = int(os.environ.get('FACTURA_EXPORT_WORKERS', 0)) or None
+FACTURA_EXPORT_MAX = int(os.environ.get('FACTURA_EXPORT_MAX', 1000))
+# Máximo de ventas por lote en la sincronización de terminales POS
+FACTURA_SYNC_MAX_LOTE = int(os.environ.get('FACTURA_SYNC_MAX_LOTE', 500))
+# Búsqueda de texto: máximo de facturas del filtro `q` del listado y coincidencias recientes que se ordenan por relevancia
+FACTURA_BUSQUEDA_MAX = int(os.environ.get('FACTURA_BUSQUEDA_MAX', 500))
+FACTURA_BUSQUEDA_CANDIDATOS = int(os.environ.get('FACTURA_BUSQUEDA_CANDIDATOS', 500))
+# IVA (%) cuando ni la organización ni la tabla general tienen tasa, y segundos que vive la caché de tasas
+FACTURA_IVA_PORCENTAJE = os.environ.get('FACTURA_IVA_PORCENTAJE', '15')
+FACTURA_TASAS_TTL = int(os.environ.get('FACTURA_TASAS_TTL', 300))
+# Meses que quedan en las tablas vigentes; las facturas de meses anteriores se pueden archivar (`archivar_facturas`)
+FACTURA_ARCHIVO_MESES = int(os.environ.get('FACTURA_ARCHIVO_MESES', 24))
+# Tipos de cambio: fuente que usa `cargar_tipos_cambio`, CSV de la fuente local y segundos de la caché de tasas
+TIPOS_CAMBIO_FUENTE = os.environ.get('TIPOS_CAMBIO_FUENTE', 'productos.tipos_cambio.FuenteArchivo')
+TIPOS_CAMBIO_ARCHIVO = os.environ.get('TIPOS_CAMBIO_ARCHIVO', str(BASE_DIR / 'productos' / 'datos' / 'tipos_cambio.csv'))
+TIPOS_CAMBIO_TTL = int(os.environ.get('TIPOS_CAMBIO_TTL', 300))
+# Mapa de códigos de barras/QR en memoria para el escaneo: cargarlo al arrancar el servidor y segundos hasta recargarlo
+PRODUCTOS_CODIGOS_PRECARGAR = os.environ.get('PRODUCTOS_CODIGOS_PRECARGAR', 'True') == 'True'
+PRODUCTOS_CODIGOS_TTL = int(os.environ.get('PRODUCTOS_CODIGOS_TTL', 300))
+# Búsqueda de productos: resultados por página del autocompletado y coincidencias que se ordenan por relevancia
+PRODUCTOS_BUSQUEDA_PAGINA = int(os.environ.get('PRODUCTOS_BUSQUEDA_PAGINA', 20))
+PRODUCTOS_BUSQUEDA_CANDIDATOS = int(os.environ.get('PRODUCTOS_BUSQUEDA_CANDIDATOS', 500))
+# Coincidencias como máximo que muestran los listados de productos al buscar
+PRODUCTOS_BUSQUEDA_MAX_RESULTADOS = int(os.environ.get('PRODUCTOS_BUSQUEDA_MAX_RESULTADOS', 5000))
+
 # -----------------------------
 # Login / Logout
 # -----------------------------
@@ -194,5 +225,15 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 STRIPE_PUBLIC_KEY = 'pk_test_tu_llave_publica'
 STRIPE_SECRET_KEY = 'sk_test_tu_llave_secreta'
 STRIPE_WEBHOOK_SECRET = 'whsec_tu_webhook_secret'
+# True si corre el worker `procesar_eventos_stripe` (Procfile/render.yaml); si no, el webhook aplica los eventos al recibirlos
+STRIPE_EVENTOS_WORKER = os.environ.get('STRIPE_EVENTOS_WORKER', 'False') == 'True'
+# Cliente de cobro (facturas.pasarela): API alternativa (p. ej. ServidorStripeFalso), timeouts en segundos,
+# reintentos ante fallos de red/5xx y circuit breaker (fallos seguidos para abrir, segundos abierto)
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE') or None
+STRIPE_TIMEOUT_CONEXION = float(os.environ.get('STRIPE_TIMEOUT_CONEXION', 3))
+STRIPE_TIMEOUT_LECTURA = float(os.environ.get('STRIPE_TIMEOUT_LECTURA', 10))
+STRIPE_REINTENTOS = int(os.environ.get('STRIPE_REINTENTOS', 2))
+STRIPE_CIRCUITO_FALLOS = int(os.environ.get('STRIPE_CIRCUITO_FALLOS', 5))
+STRIPE_CIRCUITO_ESPERA = float(os.environ.get('STRIPE_CIRCUITO_ESPERA', 30))
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
@@ -102,3 +102,7 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/login/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Workers (Procfile/render.yaml)
+STRIPE_EVENTOS_WORKER = os.environ.get('STRIPE_EVENTOS_WORKER', 'False') == 'True'
+FACTURA_PDF_PRERENDER = os.environ.get('FACTURA_PDF_PRERENDER', 'False') == 'True'
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tienda.settings_simple')
 
 application = get_wsgi_application()
+
+# Mapa de códigos de barras/QR listo antes del primer escaneo
+from productos.codigos import precargar_al_iniciar  # noqa: E402
+
+precargar_al_iniciar()